@@ -4,6 +4,8 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Any
 
+from app.domain.value_objects.generation_result import STATUS_METADATA_KEY
+
 
 @dataclass
 class Conversation:
@@ -35,6 +37,10 @@ class Conversation:
         """会話が完了しているか（レスポンスがあるか）"""
         return self.response is not None
 
+    def is_interrupted(self) -> bool:
+        """クライアントの切断で回答の生成を打ち切った会話か"""
+        return (self.metadata or {}).get(STATUS_METADATA_KEY) == "interrupted"
+
     def update_response(self, response: str) -> None:
         """レスポンスを更新"""
         if not response:
@@ -0,0 +1,22 @@
+"""ドメイン例外"""
+
+
+class AIServiceUnavailableError(Exception):
+    """
+    AIサービスが一時的に利用できない（過負荷・サーキットブレーカー作動中）
+
+    上流の障害を待たずに即座に返すためのエラーで、時間をおいて再試行できる
+    """
+
+    def __init__(self, message: str, *, retry_after: float | None = None):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class RateLimitExceededError(Exception):
+    """ユーザーまたはセッションのレート制限を超えた"""
+
+    def __init__(self, message: str, *, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(message)
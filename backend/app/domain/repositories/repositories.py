@@ -24,6 +24,13 @@ class IConversationRepository(ABC):
         """セッションIDで会話を取得"""
         pass
 
+    @abstractmethod
+    async def get_after_id(
+        self, conversation_id: int, limit: int
+    ) -> list[Conversation]:
+        """指定したIDより後の会話をID順に最大limit件取得"""
+        pass
+
     @abstractmethod
     async def update(self, conversation: Conversation) -> Conversation:
         """会話を更新"""
@@ -1,5 +1,23 @@
 """サービスインターフェース"""
 
-from app.domain.services.services import IAIService, ICacheService
+from app.domain.services.services import (
+    IAIService,
+    ICacheService,
+    IConversationMemory,
+    IConversationSearchIndex,
+    IEmbeddingService,
+    IIntentClassifier,
+    IRateLimiter,
+    IRetriever,
+)
 
-__all__ = ["IAIService", "ICacheService"]
+__all__ = [
+    "IAIService",
+    "ICacheService",
+    "IConversationMemory",
+    "IConversationSearchIndex",
+    "IEmbeddingService",
+    "IIntentClassifier",
+    "IRateLimiter",
+    "IRetriever",
+]
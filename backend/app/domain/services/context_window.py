@@ -0,0 +1,238 @@
+"""コンテキストウィンドウ構築ドメインサービス"""
+
+from collections.abc import Sequence
+import math
+import re
+
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.conversation_turn import ConversationTurn
+from app.domain.value_objects.retrieved_passage import RetrievedPassage
+
+# 日本語（かな・漢字・全角記号）は概ね1文字1トークンとして数える
+_CJK_CHAR_RE = re.compile(
+    r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]"
+)
+# それ以外は英数字の連なりと記号単位で数える
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+# 英数字は概ね4文字で1トークン
+_CHARS_PER_TOKEN = 4
+
+# ターンごとに付く "User: " / "AI: " などの書式分
+_TURN_OVERHEAD_TOKENS = 4
+
+_USER_PREFIX = "User:"
+_AI_PREFIX = "AI:"
+_SUMMARY_PREFIX = "Summary:"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数を推定
+
+    トークナイザーを呼ばずに、日本語は1文字1トークン、
+    英数字は4文字で1トークン、記号は1つで1トークンとして概算する。
+
+    Args:
+        text: 対象テキスト
+
+    Returns:
+        推定トークン数
+    """
+    if not text:
+        return 0
+    cjk_chars = len(_CJK_CHAR_RE.findall(text))
+    rest = _CJK_CHAR_RE.sub(" ", text) if cjk_chars else text
+    tokens = cjk_chars
+    for word in _WORD_RE.findall(rest):
+        tokens += math.ceil(len(word) / _CHARS_PER_TOKEN)
+    return tokens
+
+
+def estimate_turn_tokens(turn: ConversationTurn) -> int:
+    """1ターン分の推定トークン数"""
+    return (
+        estimate_tokens(turn.user_message)
+        + estimate_tokens(turn.ai_response)
+        + _TURN_OVERHEAD_TOKENS
+    )
+
+
+def parse_context(context: str) -> list[ConversationTurn]:
+    """
+    "User: ...\\nAI: ..." 形式のコンテキスト文字列をターンに分解
+
+    "User:" / "AI:" で始まらない行は直前の発話の続きとして扱う
+
+    Args:
+        context: コンテキスト文字列
+
+    Returns:
+        古い順のターンのリスト
+    """
+    turns: list[ConversationTurn] = []
+    user_lines: list[str] | None = None
+    ai_lines: list[str] | None = None
+
+    def flush() -> None:
+        if user_lines is None and ai_lines is None:
+            return
+        turns.append(
+            ConversationTurn(
+                user_message="\n".join(user_lines or []).strip(),
+                ai_response="\n".join(ai_lines or []).strip(),
+            )
+        )
+
+    for line in context.strip().split("\n"):
+        if line.startswith(_USER_PREFIX):
+            flush()
+            user_lines = [line[len(_USER_PREFIX) :].strip()]
+            ai_lines = None
+        elif line.startswith(_AI_PREFIX):
+            if ai_lines is not None:
+                flush()
+                user_lines = None
+            ai_lines = [line[len(_AI_PREFIX) :].strip()]
+        elif ai_lines is not None:
+            ai_lines.append(line)
+        elif user_lines is not None:
+            user_lines.append(line)
+
+    flush()
+    return turns
+
+
+def render_context(turns: Sequence[ConversationTurn]) -> str:
+    """ターンを "User: ...\\nAI: ..." 形式のコンテキスト文字列に変換"""
+    lines: list[str] = []
+    for turn in turns:
+        if turn.user_message:
+            lines.append(f"{_USER_PREFIX} {turn.user_message}")
+        if turn.ai_response:
+            lines.append(f"{_AI_PREFIX} {turn.ai_response}")
+    return "\n".join(lines)
+
+
+def render_history(history: ConversationHistory) -> str:
+    """要約付きの会話履歴をコンテキスト文字列に変換（要約は先頭行）"""
+    context = render_context(history.turns)
+    if not history.summary:
+        return context
+    summary_line = f"{_SUMMARY_PREFIX} {history.summary}"
+    return f"{summary_line}\n{context}" if context else summary_line
+
+
+def render_passages(
+    passages: Sequence[RetrievedPassage], max_tokens: int
+) -> str:
+    """
+    検索結果のパッセージを予算内で番号付きのテキストに変換
+
+    類似度の高い順に採用し、予算に収まらないパッセージは飛ばす
+
+    Args:
+        passages: 類似度の高い順のパッセージ
+        max_tokens: 使えるトークン数
+
+    Returns:
+        "[1] 出典\n本文" 形式のブロックを空行で区切った文字列
+    """
+    blocks: list[str] = []
+    budget = max_tokens
+    for passage in passages:
+        block = f"[{len(blocks) + 1}] {passage.source}\n{passage.text}"
+        cost = estimate_tokens(block)
+        if cost > budget:
+            continue
+        blocks.append(block)
+        budget -= cost
+    return "\n\n".join(blocks)
+
+
+class ContextWindowBuilder:
+    """
+    トークン予算内でコンテキストを構築するドメインサービス
+
+    最大トークン数からシステムプロンプトと応答用の余裕を差し引いた
+    予算の範囲で、新しいターンから順にターン単位で採用する。
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        system_prompt_tokens: int = 0,
+        response_reserve_tokens: int = 0,
+    ) -> None:
+        if max_tokens <= 0:
+            raise ValueError("max_tokensは正の整数である必要があります")
+        self._max_tokens = max_tokens
+        self._system_prompt_tokens = system_prompt_tokens
+        self._response_reserve_tokens = response_reserve_tokens
+
+    @property
+    def history_budget(self) -> int:
+        """会話履歴に使えるトークン数"""
+        return max(
+            0,
+            self._max_tokens
+            - self._system_prompt_tokens
+            - self._response_reserve_tokens,
+        )
+
+    def select(
+        self, turns: Sequence[ConversationTurn], message: str = ""
+    ) -> list[ConversationTurn]:
+        """
+        予算内に収まるターンを新しい順に選択
+
+        Args:
+            turns: 古い順のターン
+            message: これから送信するユーザーメッセージ（予算から差し引く）
+
+        Returns:
+            古い順に並んだ採用ターン
+        """
+        return self._select(
+            turns, self.history_budget - estimate_tokens(message)
+        )
+
+    def fit(
+        self, history: ConversationHistory, message: str = ""
+    ) -> ConversationHistory:
+        """
+        要約付きの会話履歴を予算内に収める
+
+        要約は常に残し、その分を差し引いた予算でターンを選択する
+
+        Args:
+            history: 会話履歴
+            message: これから送信するユーザーメッセージ（予算から差し引く）
+
+        Returns:
+            予算内の会話履歴
+        """
+        budget = (
+            self.history_budget
+            - estimate_tokens(message)
+            - estimate_tokens(history.summary)
+        )
+        return ConversationHistory(
+            turns=tuple(self._select(history.turns, budget)),
+            summary=history.summary,
+        )
+
+    @staticmethod
+    def _select(
+        turns: Sequence[ConversationTurn], budget: int
+    ) -> list[ConversationTurn]:
+        """予算内に収まるターンを新しい順に選択し、古い順に並べて返す"""
+        selected: list[ConversationTurn] = []
+        for turn in reversed(turns):
+            cost = estimate_turn_tokens(turn)
+            if cost > budget:
+                break
+            selected.append(turn)
+            budget -= cost
+        selected.reverse()
+        return selected
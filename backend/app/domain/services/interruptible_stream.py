@@ -0,0 +1,131 @@
+"""クライアントの切断で打ち切れるストリームの読み出し"""
+
+import asyncio
+from collections.abc import AsyncGenerator, Awaitable, Callable, Coroutine
+import contextlib
+import time
+from typing import Any
+
+from app.domain.value_objects.generation_result import GenerationResult
+
+# チャンクをクライアントに送る関数（届かなかった場合はFalse）
+ChunkSender = Callable[[str], Awaitable[bool]]
+
+# クライアントが切断するまで待つ関数
+DisconnectWaiter = Callable[[], Coroutine[Any, Any, None]]
+
+
+async def consume_stream(
+    stream: AsyncGenerator[str, None],
+    *,
+    on_chunk: ChunkSender | None = None,
+    disconnected: DisconnectWaiter | None = None,
+) -> GenerationResult:
+    """
+    AIレスポンスのストリームを最後まで読み、回答を組み立てる
+
+    on_chunkがチャンクを送れなかった場合、またはdisconnectedが戻った
+    （クライアントが切断した）場合は読み出しを打ち切り、ストリームを
+    閉じる。閉じる処理はジェネレーターの連鎖をたどって上流のLLM呼び出し
+    まで伝わるため、切断後のトークンは生成しない。
+
+    Args:
+        stream: AIサービスのgenerate_streamが返すストリーム
+        on_chunk: チャンクごとに呼ぶ送信関数
+        disconnected: クライアントが切断するまで待つ関数
+
+    Returns:
+        生成結果（打ち切った場合はそれまでの部分の回答）
+
+    Raises:
+        Exception: ストリームのエラーはそのまま伝える
+    """
+    started = time.perf_counter()
+    chunks: list[str] = []
+
+    async def read() -> bool:
+        """最後まで読めたらFalse、送信できずに打ち切ったらTrue"""
+        async with contextlib.aclosing(stream):
+            async for chunk in stream:
+                if not chunk:
+                    continue
+                chunks.append(chunk)
+                if on_chunk is not None and not await on_chunk(chunk):
+                    return True
+        return False
+
+    if disconnected is None:
+        interrupted = await read()
+    else:
+        reader = asyncio.create_task(read())
+        watcher = asyncio.create_task(disconnected())
+        try:
+            await asyncio.wait(
+                (reader, watcher), return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            # 切断時は読み出し中のタスクをキャンセルして上流まで止める
+            for task in (reader, watcher):
+                task.cancel()
+            await asyncio.gather(reader, watcher, return_exceptions=True)
+        if reader.cancelled():
+            interrupted = True
+        else:
+            interrupted = reader.result()
+
+    return GenerationResult(
+        response="".join(chunks),
+        status="interrupted" if interrupted else "completed",
+        chunks=len(chunks),
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 3),
+    )
+
+
+async def await_response(
+    generation: Coroutine[Any, Any, str],
+    *,
+    disconnected: DisconnectWaiter | None = None,
+) -> GenerationResult:
+    """
+    ストリームを使わない回答の生成を、クライアントの切断で打ち切れるよう待つ
+
+    disconnectedが先に戻った場合は生成のタスクをキャンセルする。
+    キャンセルはawaitの連鎖をたどって上流のLLM呼び出しまで伝わる。
+    チャンク単位の回答がないため、打ち切った場合の回答は空になる。
+
+    Args:
+        generation: AIサービスのgenerate_responseのコルーチン
+        disconnected: クライアントが切断するまで待つ関数
+
+    Returns:
+        生成結果（打ち切った場合は空の回答）
+
+    Raises:
+        Exception: 生成のエラーはそのまま伝える
+    """
+    started = time.perf_counter()
+    if disconnected is None:
+        response = await generation
+    else:
+        generator = asyncio.create_task(generation)
+        watcher = asyncio.create_task(disconnected())
+        try:
+            await asyncio.wait(
+                (generator, watcher), return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            for task in (generator, watcher):
+                task.cancel()
+            await asyncio.gather(generator, watcher, return_exceptions=True)
+        if generator.cancelled():
+            return GenerationResult(
+                response="",
+                status="interrupted",
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 3),
+            )
+        response = generator.result()
+
+    return GenerationResult(
+        response=response,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 3),
+    )
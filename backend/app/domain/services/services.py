@@ -2,8 +2,17 @@
 
 from abc import ABC, abstractmethod
 from collections.abc import AsyncGenerator
+from typing import Any
 
+from app.domain.entities.conversation import Conversation
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.conversation_search import (
+    ConversationSearchPage,
+)
+from app.domain.value_objects.conversation_turn import ConversationTurn
+from app.domain.value_objects.intent import IntentDecision
 from app.domain.value_objects.message import Message
+from app.domain.value_objects.retrieved_passage import RetrievedPassage
 
 
 class IAIService(ABC):
@@ -11,16 +20,30 @@ class IAIService(ABC):
 
     @abstractmethod
     async def generate_response(
-        self, message: Message, context: str = ""
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
     ) -> str:
-        """AIレスポンスを生成"""
+        """
+        AIレスポンスを生成
+
+        historyが指定された場合はcontext文字列より優先して会話履歴に使う
+        """
         pass
 
     @abstractmethod
     def generate_stream(
-        self, message: Message, context: str = ""
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
     ) -> AsyncGenerator[str, None]:
-        """AIレスポンスをストリームで生成"""
+        """
+        AIレスポンスをストリームで生成
+
+        historyが指定された場合はcontext文字列より優先して会話履歴に使う
+        """
         pass
 
 
@@ -46,3 +69,130 @@ class ICacheService(ABC):
     async def exists(self, key: str) -> bool:
         """キャッシュキーの存在確認"""
         pass
+
+
+class IEmbeddingService(ABC):
+    """埋め込み（ベクトル化）サービスインターフェース"""
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        """埋め込みベクトルの次元数"""
+        pass
+
+    @abstractmethod
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """テキストのリストを埋め込みベクトルのリストに変換"""
+        pass
+
+
+class IConversationMemory(ABC):
+    """セッションごとの会話履歴（ターン単位）を保持するメモリインターフェース"""
+
+    @abstractmethod
+    async def load(self, session_id: str) -> ConversationHistory:
+        """会話履歴（古い順のターンと要約）を取得"""
+        pass
+
+    @abstractmethod
+    async def append(self, session_id: str, turn: ConversationTurn) -> None:
+        """会話履歴の末尾にターンを追加"""
+        pass
+
+    @abstractmethod
+    async def clear(self, session_id: str) -> None:
+        """会話履歴を削除"""
+        pass
+
+
+class IIntentClassifier(ABC):
+    """ユーザーメッセージの意図判定インターフェース"""
+
+    @abstractmethod
+    def classify(self, text: str) -> IntentDecision:
+        """メッセージの意図（ルーティング先）を判定"""
+        pass
+
+
+class IRateLimiter(ABC):
+    """ユーザー・セッション単位のレート制限インターフェース"""
+
+    @abstractmethod
+    async def acquire(
+        self, *, user_id: str, session_id: str, message: str
+    ) -> None:
+        """
+        リクエスト1件とメッセージの推定トークン数（応答分を含む）を消費
+
+        Raises:
+            RateLimitExceededError: いずれかの制限を超えた場合（何も消費しない）
+        """
+        pass
+
+
+class IRetriever(ABC):
+    """文書の取り込みと類似検索（RAG）のインターフェース"""
+
+    @abstractmethod
+    async def ingest(
+        self,
+        doc_id: str,
+        text: str,
+        metadata: dict[str, Any] | None = None,
+    ) -> int:
+        """
+        文書をチャンクに分割して索引に追加（同じIDの文書は置き換える）
+
+        Returns:
+            追加したチャンク数
+        """
+        pass
+
+    @abstractmethod
+    async def remove(self, doc_id: str) -> int:
+        """文書を索引から削除し、削除したチャンク数を返す"""
+        pass
+
+    @abstractmethod
+    async def search(
+        self, query: str, k: int | None = None
+    ) -> list[RetrievedPassage]:
+        """クエリに近いチャンクを類似度の高い順に取得"""
+        pass
+
+
+class IConversationSearchIndex(ABC):
+    """保存済みの会話の全文・類似検索のインターフェース"""
+
+    @property
+    @abstractmethod
+    def ready(self) -> bool:
+        """保存済みの会話を読み込み終え、検索結果が欠けていないか"""
+        pass
+
+    @abstractmethod
+    async def index(self, conversations: list[Conversation]) -> None:
+        """会話を索引に追加（同じIDの会話は置き換える）"""
+        pass
+
+    @abstractmethod
+    async def remove(self, conversation_id: int) -> None:
+        """会話を索引から削除"""
+        pass
+
+    @abstractmethod
+    async def search(
+        self,
+        query: str,
+        *,
+        user_id: str | None = None,
+        session_id: str | None = None,
+        limit: int = 10,
+        offset: int = 0,
+    ) -> ConversationSearchPage:
+        """
+        クエリに関連する会話を関連度の高い順に取得
+
+        クエリが空の場合は新しい順に取得する
+        """
+        pass
@@ -0,0 +1,20 @@
+"""バッチ生成結果値オブジェクト"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    """
+    バッチ生成の1項目分の結果
+
+    成功した場合はresponse、失敗・タイムアウトした場合はerrorを持つ
+    """
+
+    response: str | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        """生成に成功したか"""
+        return self.error is None
@@ -0,0 +1,22 @@
+"""会話履歴値オブジェクト"""
+
+from dataclasses import dataclass, field
+
+from app.domain.value_objects.conversation_turn import ConversationTurn
+
+
+@dataclass(frozen=True)
+class ConversationHistory:
+    """
+    会話履歴値オブジェクト
+
+    直近のターンと、それより前のターンを畳み込んだ要約を保持する。
+    要約を使わないメモリでは要約は空文字列になる。
+    """
+
+    turns: tuple[ConversationTurn, ...] = field(default_factory=tuple)
+    summary: str = ""
+
+    def __len__(self) -> int:
+        """保持しているターン数"""
+        return len(self.turns)
@@ -0,0 +1,24 @@
+"""会話検索結果値オブジェクト"""
+
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class ConversationSearchHit:
+    """
+    検索に一致した会話
+
+    scoreはキーワード検索とベクトル検索の順位を融合したスコア
+    （Reciprocal Rank Fusion、大きいほど上位）
+    """
+
+    conversation_id: int
+    score: float
+
+
+@dataclass(frozen=True)
+class ConversationSearchPage:
+    """検索結果の1ページ分と、条件に一致した全件数"""
+
+    hits: list[ConversationSearchHit] = field(default_factory=list)
+    total: int = 0
@@ -0,0 +1,16 @@
+"""会話ターン値オブジェクト"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ConversationTurn:
+    """
+    会話ターン値オブジェクト
+
+    ユーザー発話とAI応答の1往復を表現する。
+    コンテキストの切り詰めはターン単位で行い、発話の途中で切らない。
+    """
+
+    user_message: str
+    ai_response: str = ""
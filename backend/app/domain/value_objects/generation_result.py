@@ -0,0 +1,37 @@
+"""生成結果値オブジェクト"""
+
+from dataclasses import dataclass
+from typing import Any, Literal
+
+GenerationStatus = Literal["completed", "interrupted"]
+
+# 会話のメタデータに生成の状態を記録するキー
+STATUS_METADATA_KEY = "status"
+
+
+@dataclass(frozen=True)
+class GenerationResult:
+    """
+    1回の回答生成の結果
+
+    クライアントの切断で生成を打ち切った場合はstatusがinterruptedで、
+    responseはそれまでに生成した部分の回答
+    """
+
+    response: str
+    status: GenerationStatus = "completed"
+    chunks: int = 0
+    elapsed_ms: float = 0.0
+
+    @property
+    def interrupted(self) -> bool:
+        """クライアントの切断で打ち切ったか"""
+        return self.status == "interrupted"
+
+    def conversation_metadata(
+        self, metadata: dict[str, Any] | None
+    ) -> dict[str, Any] | None:
+        """保存する会話のメタデータ（打ち切った場合は状態を付ける）"""
+        if not self.interrupted:
+            return metadata
+        return {**(metadata or {}), STATUS_METADATA_KEY: self.status}
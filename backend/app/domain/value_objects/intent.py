@@ -0,0 +1,29 @@
+"""意図判定値オブジェクト"""
+
+from dataclasses import dataclass, field
+from typing import Literal
+
+IntentRoute = Literal["normal", "rag", "tool"]
+
+INTENT_ROUTES: tuple[IntentRoute, ...] = ("normal", "rag", "tool")
+
+
+@dataclass(frozen=True)
+class IntentDecision:
+    """
+    意図判定値オブジェクト
+
+    判定したルートと確信度（0.0〜1.0）、判定の根拠を保持する
+    """
+
+    route: IntentRoute
+    confidence: float
+    source: str
+    matched: tuple[str, ...] = field(default_factory=tuple)
+
+    def __post_init__(self) -> None:
+        """値オブジェクトの検証"""
+        if self.route not in INTENT_ROUTES:
+            raise ValueError(f"不明なルートです: {self.route}")
+        if not 0.0 <= self.confidence <= 1.0:
+            raise ValueError("confidenceは0.0〜1.0である必要があります")
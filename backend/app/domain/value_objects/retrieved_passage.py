@@ -0,0 +1,23 @@
+"""検索結果パッセージ値オブジェクト"""
+
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass(frozen=True)
+class RetrievedPassage:
+    """
+    検索で取得した文書の断片（チャンク）
+
+    scoreはクエリとのコサイン類似度（大きいほど近い）
+    """
+
+    doc_id: str
+    text: str
+    score: float
+    metadata: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def source(self) -> str:
+        """出典の表示名（metadataのtitle、なければ文書ID）"""
+        return str(self.metadata.get("title") or self.doc_id)
@@ -0,0 +1,41 @@
+"""ツール呼び出し値オブジェクト"""
+
+from dataclasses import dataclass, field
+from typing import Any, Literal
+
+ToolStatus = Literal["ok", "error", "timeout"]
+
+
+@dataclass(frozen=True)
+class ToolCall:
+    """
+    1回のツール呼び出しの要求
+
+    call_idはモデルが付けた呼び出しのID（意図判定から計画した場合は空）
+    """
+
+    name: str
+    arguments: dict[str, Any] = field(default_factory=dict)
+    call_id: str = ""
+
+
+@dataclass(frozen=True)
+class ToolResult:
+    """
+    ツール呼び出しの結果
+
+    contentは成功時は結果の文字列、失敗・タイムアウト時はエラーの説明
+    """
+
+    name: str
+    content: str
+    status: ToolStatus = "ok"
+    call_id: str = ""
+    elapsed_ms: float = 0.0
+    truncated: bool = False
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        """実行に成功したか"""
+        return self.status == "ok"
@@ -19,21 +19,252 @@ class Settings(BaseSettings):
     GOOGLE_AI_API_KEY: str = ""
     GOOGLE_AI_MODEL: str = "gemini-flash-latest"  # デフォルトはgemini-flash-latest（常に最新のFlashモデルを使用）
 
+    # LLM Backend Settings（負荷試験用にフェイクへ切り替える）
+    LLM_BACKEND: str = "google"  # google, fake（チャットモデルをフェイクに）
+    AI_SERVICE_BACKEND: str = (
+        "langgraph"  # langgraph, fake（LangGraphを通さない）
+    )
+    FAKE_LLM_TTFT_SECONDS: float = 0.2  # 最初のチャンクまでの秒数
+    FAKE_LLM_TOKENS_PER_SECOND: float = 50.0  # 0以下は待機なし
+    FAKE_LLM_CHUNK_TOKENS: int = 4  # 1チャンクあたりのトークン数
+    FAKE_LLM_RESPONSE_TOKENS: int = 64  # 応答全体のトークン数
+    FAKE_LLM_ERROR_RATE: float = 0.0  # 呼び出しが失敗する確率
+    FAKE_LLM_SEED: int = 0
+
     # LangChain Settings
     LANGCHAIN_MEMORY_TYPE: str = "buffer"  # buffer, summary, summary_buffer
     LANGCHAIN_MAX_TOKENS: int = 4000
+    LANGCHAIN_RESPONSE_RESERVE_TOKENS: int = 1024  # 応答用に確保するトークン数
     LANGCHAIN_TEMPERATURE: float = 0.7
     LANGCHAIN_SYSTEM_PROMPT: str = "あなたは親切で丁寧なAIアシスタントです。ユーザーの質問に分かりやすく答えてください。"
 
+    # Conversation Memory Settings（Redisリストに保存する会話履歴）
+    CONVERSATION_MEMORY_MAX_TURNS: int = 50  # セッションごとに保持するターン数
+    CONVERSATION_MEMORY_TTL: int = 3600  # 秒（最後の更新から）
+    # LANGCHAIN_MEMORY_TYPEがsummary/summary_bufferの場合の要約設定
+    CONVERSATION_SUMMARY_BUFFER_TURNS: int = 6  # 要約せずに残す直近のターン数
+    CONVERSATION_SUMMARY_MAX_CHARS: int = 800  # 要約の目安の文字数
+    CONVERSATION_SUMMARY_DRAIN_TIMEOUT: float = 10.0  # 終了時に要約を待つ秒数
+    # 要約中のセッションのロックの有効期限（要約のLLM呼び出しより長く）
+    CONVERSATION_SUMMARY_LOCK_SECONDS: float = 60.0
+
+    # Response Cache Settings（完全一致のLLMレスポンスキャッシュ）
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_TTL: int = 3600  # 秒
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # キャッシュ全体の上限
+    RESPONSE_CACHE_MAX_VALUE_BYTES: int = 32 * 1024  # 1エントリの上限
+
+    # Embedding Settings
+    # google（意味の埋め込み）, local（CPU上のハッシュ埋め込み。字面の
+    # 一致のみを表すため、セマンティックキャッシュには使えない）
+    EMBEDDING_BACKEND: str = "google"
+    LOCAL_EMBEDDING_DIMENSION: int = 512
+    GOOGLE_EMBEDDING_MODEL: str = "models/text-embedding-004"
+    GOOGLE_EMBEDDING_DIMENSION: int = 768
+    # 内容のハッシュで埋め込みを再利用する件数（0で無効）
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 10000
+
+    # Semantic Cache Settings（埋め込みの類似度によるレスポンスキャッシュ）
+    # EMBEDDING_BACKEND=google の場合のみ有効（ハッシュ埋め込みでは使わない）
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # コサイン類似度のしきい値
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000
+    SEMANTIC_CACHE_MAX_CONTEXT_CHARS: int = 200  # これより長い文脈では使わない
+
+    # RAG Settings（プロセス内のベクトル索引による検索）
+    # EMBEDDING_BACKEND=google の場合のみ有効（ハッシュ埋め込みでは使わない）
+    RAG_ENABLED: bool = False
+    RAG_DOCUMENTS_DIR: str | None = None  # 起動時に取り込む文書（.md/.txt）
+    RAG_CHUNK_TOKENS: int = 256  # 1チャンクの推定トークン数の上限
+    RAG_CHUNK_OVERLAP_TOKENS: int = 32  # 前のチャンクと重ねるトークン数
+    RAG_TOP_K: int = 4
+    RAG_MIN_SCORE: float = 0.2  # これ未満の類似度のチャンクは使わない
+    RAG_CONTEXT_MAX_TOKENS: int = 1500  # プロンプトに入れる検索結果の上限
+    RAG_HNSW_THRESHOLD: int = 50000  # これ以上の件数でHNSWに切り替える
+    RAG_HNSW_M: int = 16  # 1ノードあたりの近傍リンク数
+    RAG_HNSW_EF_CONSTRUCTION: int = 100
+    RAG_HNSW_EF_SEARCH: int = 64
+    RAG_INDEX_DIR: str | None = (
+        None  # 索引を永続化するディレクトリ（未指定はメモリのみ）
+    )
+    RAG_INDEX_DTYPE: str = (
+        "float32"  # float16はサイズが半分だが総当たり検索は変換の分遅い
+    )
+    RAG_INDEX_MAX_SEGMENTS: int = 8  # 追記セグメントがこれを超えたら圧縮
+    RAG_INDEX_COMPACT_DELETED_RATIO: float = 0.3  # 削除済みの割合の上限
+    RAG_INDEX_QUANTIZATION: str = (
+        "none"  # int8: 量子化した符号とIVFで検索し、上位を元のベクトルで再計算
+    )
+    RAG_IVF_THRESHOLD: int = 20000  # これ以上の件数でIVFのリストを学習する
+    RAG_IVF_LISTS: int = 256  # リスト（セントロイド）の数
+    RAG_IVF_PROBES: int = 16  # 1回の検索で調べるリストの数
+    RAG_IVF_RERANK: int = 64  # 元のベクトルで類似度を再計算する候補数
+
+    # Conversation Search Settings（MCPの会話検索。BM25とベクトル検索の順位融合）
+    # 索引はワーカーごとにメモリ上に持ち、起動時に全件を読み込む。
+    # ほかのワーカーが保存した会話は含まないため既定では無効
+    # （無効な間と読み込み中はデータベースの部分一致で検索する）
+    CONVERSATION_SEARCH_ENABLED: bool = False
+    CONVERSATION_SEARCH_CANDIDATES: int = 100  # 各検索方式から融合に使う件数
+    CONVERSATION_SEARCH_RRF_K: int = 60  # Reciprocal Rank Fusionの定数
+    CONVERSATION_SEARCH_MIN_SIMILARITY: float = 0.3  # ベクトル検索の下限
+    CONVERSATION_SEARCH_BM25_K1: float = 1.2
+    CONVERSATION_SEARCH_BM25_B: float = 0.75
+    CONVERSATION_SEARCH_LOAD_BATCH: int = 500  # 起動時に1回で読み込む会話数
+    CONVERSATION_SEARCH_INDEX_DIR: str | None = (
+        None  # 埋め込みとバックフィルの進捗を永続化するディレクトリ
+    )
+
+    # Embedding Ingestion Settings（埋め込みをチャットの処理の外で計算する）
+    EMBEDDING_WORKER_BATCH_SIZE: int = 64  # 1回の埋め込み呼び出しの件数
+    EMBEDDING_WORKER_MAX_WAIT_MS: int = 200  # バッチが埋まるまで待つ時間
+    EMBEDDING_WORKER_MAX_QUEUE: int = (
+        10000  # 超えた分は捨てる（バックフィルで補う）
+    )
+    EMBEDDING_WORKER_MAX_RETRIES: int = 3
+    EMBEDDING_WORKER_SHUTDOWN_TIMEOUT_SECONDS: float = 5.0
+
+    # Tool Settings（LangGraphのツール実行ノード）
+    TOOLS_ENABLED: bool = True
+    TOOL_TIMEOUT_SECONDS: float = 10.0  # ツールごとの既定のタイムアウト
+    TOOL_MAX_RESULT_CHARS: int = 4000  # これを超える結果は切り詰める
+    TOOL_MAX_CALLS: int = 8  # 1ターンで実行する呼び出しの上限
+    TOOL_PROCESS_WORKERS: int = 2  # CPUを使うツールのプロセス数
+    TOOL_CACHE_MAX_ENTRIES: int = 1000  # 引数のハッシュによるキャッシュ
+    TOOL_CACHE_TTL_SECONDS: float = 300.0
+    TOOL_CONTEXT_MAX_TOKENS: int = 1500  # プロンプトに入れる結果の上限
+
     # LangGraph Settings
     LANGGRAPH_ENABLED: bool = False
     LANGGRAPH_DEBUG: bool = False
+    SINGLE_FLIGHT_ENABLED: bool = True  # 同一プロンプトの同時ストリームを集約
+    LANGGRAPH_FAST_PATH_ENABLED: bool = (
+        True  # 通常会話の非ストリーミング生成はグラフを通さない
+    )
+
+    # Intent Classifier Settings（LangGraphのルーティング）
+    INTENT_CLASSIFIER_BACKEND: str = (
+        "keyword"  # keyword, hybrid（キーワード＋ローカル埋め込み）
+    )
+    INTENT_KEYWORDS: dict[str, list[str]] = Field(
+        default_factory=lambda: {
+            "rag": ["検索", "調べて", "情報", "データ"],
+            "tool": ["計算", "実行", "ツール"],
+        }
+    )
+    INTENT_PROTOTYPES: dict[str, list[str]] = Field(
+        default_factory=lambda: {
+            "normal": [
+                "こんにちは",
+                "ありがとうございます",
+                "おすすめを教えてください",
+            ],
+            "rag": [
+                "社内の資料から該当する箇所を探してください",
+                "ドキュメントに書かれている内容を教えてください",
+                "過去の記録を参照して答えてください",
+            ],
+            "tool": [
+                "この式の値を求めてください",
+                "コマンドを走らせて結果を返してください",
+                "APIを呼び出して結果を取得してください",
+            ],
+        }
+    )
+    INTENT_PROTOTYPE_THRESHOLD: float = 0.3  # これ未満の類似度はnormal扱い
+    INTENT_PROTOTYPE_MAX_CHARS: int = 2000  # 埋め込みに使う先頭の文字数
+
+    # Model Router Settings（リクエストごとのモデル選択）
+    MODEL_ROUTER_ENABLED: bool = False
+    MODEL_ROUTER_FAST_MODELS: list[str] = Field(
+        default_factory=lambda: ["gemini-flash-lite-latest"]
+    )
+    MODEL_ROUTER_STRONG_MODELS: list[str] = Field(
+        default_factory=lambda: ["gemini-flash-latest"]
+    )
+    MODEL_ROUTER_SHORT_MESSAGE_TOKENS: int = 200  # これ以下は高速モデル候補
+    MODEL_ROUTER_MIN_INTENT_CONFIDENCE: float = 0.6  # 未満は高性能モデル
+    MODEL_ROUTER_EWMA_ALPHA: float = 0.2  # TTFT・エラー率の移動平均の重み
+    MODEL_ROUTER_MAX_ERROR_RATE: float = 0.5  # 超えたモデルは一時的に除外
+    MODEL_ROUTER_RECOVERY_SECONDS: float = (
+        30.0  # 除外したモデルを再試行するまで
+    )
+    MODEL_ROUTER_ESCALATION_ENABLED: bool = True  # 低確信の回答を再生成
+    MODEL_ROUTER_UNCERTAIN_MARKERS: list[str] = Field(
+        default_factory=lambda: [
+            "わかりません",
+            "分かりません",
+            "お答えできません",
+            "I'm not sure",
+            "I don't know",
+        ]
+    )
+
+    # Hedging Settings
+    HEDGING_ENABLED: bool = False  # 最初のチャンクが遅い場合に再発行
+    HEDGING_PERCENTILE: float = 95.0  # 待機時間とするTTFTのパーセンタイル
+    HEDGING_BUDGET_RATIO: float = 0.05  # リクエスト数に対するヘッジの上限比率
+    HEDGING_WINDOW_SIZE: int = 200  # パーセンタイル計算に使う直近のTTFT数
+    HEDGING_MIN_SAMPLES: int = 20  # これ未満の計測数ではヘッジしない
+    HEDGING_MIN_DELAY_SECONDS: float = 0.2  # 待機時間の下限
+
+    # Resilience Settings（LLM呼び出しの同時実行数制限とサーキットブレーカー）
+    AI_RESILIENCE_ENABLED: bool = True
+    AI_LIMITER_INITIAL_LIMIT: int = 20  # 同時実行数の初期上限
+    AI_LIMITER_MIN_LIMIT: int = 2
+    AI_LIMITER_MAX_LIMIT: int = 200
+    AI_LIMITER_BACKOFF: float = 0.9  # 失敗・遅延時に上限へ掛ける倍率
+    AI_LIMITER_LATENCY_THRESHOLD_SECONDS: float = (
+        10.0  # 超えたら遅延とみなす（ストリームは最初のチャンクまで）
+    )
+    AI_LIMITER_MAX_QUEUE: int = 100  # 上限超過時に待機できる件数
+    AI_LIMITER_MAX_WAIT_SECONDS: float = 5.0  # 待機の最大秒数
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5  # 遮断するまでの連続失敗数
+    CIRCUIT_BREAKER_RESET_SECONDS: float = 30.0  # 遮断後に再試行するまで
+
+    # Batch Settings（オフライン評価・バックフィル用のバッチ生成）
+    BATCH_MAX_ITEMS: int = 100  # 1回のバッチの最大項目数
+    BATCH_DEFAULT_CONCURRENCY: int = 4
+    BATCH_MAX_CONCURRENCY: int = 16
+    BATCH_ITEM_TIMEOUT_SECONDS: float = 60.0  # 1件あたりの上限
+
+    # Disconnect Settings（クライアントの切断で生成を打ち切る）
+    CHAT_CANCEL_ON_DISCONNECT: bool = True
+    CHAT_DISCONNECT_POLL_SECONDS: float = 0.25  # HTTPの切断を確認する間隔
+
+    # Rate Limit Settings（ユーザー・セッション単位のトークンバケット）
+    RATE_LIMIT_ENABLED: bool = False
+    RATE_LIMIT_USER_RPS: float = 2.0  # 毎秒補充するリクエスト数
+    RATE_LIMIT_USER_BURST: int = 10  # 連続して受け付けるリクエスト数
+    RATE_LIMIT_USER_TPM: int = 100000  # 毎分の推定トークン数（0で無効）
+    RATE_LIMIT_SESSION_RPS: float = 1.0
+    RATE_LIMIT_SESSION_BURST: int = 5
+    RATE_LIMIT_SESSION_TPM: int = 50000
+    RATE_LIMIT_REDIS_TIMEOUT_SECONDS: float = 0.1
+    RATE_LIMIT_REDIS_RETRY_SECONDS: float = (
+        5.0  # Redisのエラー後、プロセス内のバケットで制限する秒数
+    )
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = 10000
+
+    # LLM Metrics Settings（/metricsで出力するLLM呼び出しのヒストグラム）
+    LLM_METRICS_ENABLED: bool = True
 
     # LangFuse Settings
     LANGFUSE_PUBLIC_KEY: str | None = None
     LANGFUSE_SECRET_KEY: str | None = None
     LANGFUSE_BASE_URL: str = "https://cloud.langfuse.com"
     LANGFUSE_ENABLED: bool = False
+    LANGFUSE_SAMPLE_RATE: float = 0.1  # 送るリクエストの割合（開始時に判定）
+    LANGFUSE_SAMPLE_ON_ERROR: bool = True  # エラーになったリクエストは必ず送る
+    LANGFUSE_SLOW_TRACE_SECONDS: float = (
+        10.0  # これ以上かかったリクエストは必ず送る（0で無効）
+    )
+    LANGFUSE_MAX_OPEN_TRACES: int = 1000  # 完了を待つトレースの上限
+    LANGFUSE_EXPORT_QUEUE_SIZE: int = 1000  # 送信待ちの上限（満杯なら破棄）
+    LANGFUSE_EXPORT_BATCH_SIZE: int = 50  # 1回の送信にまとめるトレース数
+    LANGFUSE_EXPORT_INTERVAL_SECONDS: float = 1.0  # 送信待ちをまとめる時間
+    LANGFUSE_EXPORT_TIMEOUT_SECONDS: float = 10.0
 
     # API Settings
     API_TITLE: str = "AI Chatbot API"
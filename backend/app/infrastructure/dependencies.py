@@ -1,20 +1,39 @@
 """依存性注入の設定"""
 
+from collections.abc import Mapping
+from typing import Any
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.domain.repositories import IConversationRepository, ISessionRepository
-from app.domain.services import IAIService, ICacheService
-from app.infrastructure.database import get_db
-from app.infrastructure.repositories.dynamodb_repository import (
-    DynamoDBSessionRepository,
+from app.domain.services import (
+    IAIService,
+    ICacheService,
+    IConversationMemory,
+    IConversationSearchIndex,
+    IRateLimiter,
+)
+from app.domain.services.context_window import (
+    ContextWindowBuilder,
+    estimate_tokens,
 )
+from app.infrastructure.config import settings
+from app.infrastructure.database import get_db
+from app.infrastructure.registry import service_registry
 from app.infrastructure.repositories.postgres_repository import (
     PostgresConversationRepository,
 )
-from app.infrastructure.services.cache_service import RedisCacheService
-from app.infrastructure.services.langgraph_ai_service import (
-    LangGraphAIService,
+from app.infrastructure.services.embedding_service import (
+    CachedEmbeddingService,
+)
+from app.infrastructure.services.interruption import (
+    GenerationInterruptionTracker,
+)
+from app.infrastructure.services.llm_metrics import (
+    LLMMetricsRecorder,
+    llm_metrics,
 )
+from app.usecase.use_cases.chat import GenerateBatchUseCase
 
 
 async def get_conversation_repository(
@@ -29,19 +48,145 @@ async def get_conversation_repository(
     if db is None:
         raise RuntimeError("データベースセッションを取得できませんでした")
 
-    return PostgresConversationRepository(db)
+    return PostgresConversationRepository(
+        db, search_index=service_registry.conversation_search
+    )
 
 
 def get_session_repository() -> ISessionRepository:
-    """セッションリポジトリを取得"""
-    return DynamoDBSessionRepository()
+    """セッションリポジトリを取得（プロセス内で共有）"""
+    return service_registry.session_repository
 
 
 def get_ai_service() -> IAIService:
-    """AIサービスを取得"""
-    return LangGraphAIService()
+    """AIサービスを取得（プロセス内で共有）"""
+    return service_registry.ai_service
 
 
 def get_cache_service() -> ICacheService:
-    """キャッシュサービスを取得"""
-    return RedisCacheService()
+    """キャッシュサービスを取得（プロセス内で共有）"""
+    return service_registry.cache_service
+
+
+def get_conversation_memory() -> IConversationMemory:
+    """会話履歴メモリを取得（プロセス内で共有）"""
+    return service_registry.conversation_memory
+
+
+def get_conversation_search() -> IConversationSearchIndex | None:
+    """会話のハイブリッド検索を取得（無効な場合はNone）"""
+    return service_registry.conversation_search
+
+
+def get_rate_limiter() -> IRateLimiter | None:
+    """レート制限を取得（無効な場合はNone）"""
+    return service_registry.rate_limiter
+
+
+def get_interruption_tracker() -> GenerationInterruptionTracker:
+    """切断による生成の打ち切りの記録を取得（プロセス内で共有）"""
+    return service_registry.interruption_tracker
+
+
+def get_llm_metrics() -> LLMMetricsRecorder:
+    """LLM呼び出しのメトリクスを取得（プロセス内で共有）"""
+    return llm_metrics
+
+
+def get_context_window_builder() -> ContextWindowBuilder:
+    """コンテキストウィンドウビルダーを取得"""
+    return ContextWindowBuilder(
+        max_tokens=settings.LANGCHAIN_MAX_TOKENS,
+        system_prompt_tokens=estimate_tokens(settings.LANGCHAIN_SYSTEM_PROMPT),
+        response_reserve_tokens=settings.LANGCHAIN_RESPONSE_RESERVE_TOKENS,
+    )
+
+
+def get_generate_batch_use_case() -> GenerateBatchUseCase:
+    """バッチ生成ユースケースを取得（上限は設定値）"""
+    return GenerateBatchUseCase(
+        ai_service=get_ai_service(),
+        rate_limiter=get_rate_limiter(),
+        max_items=settings.BATCH_MAX_ITEMS,
+        default_concurrency=settings.BATCH_DEFAULT_CONCURRENCY,
+        max_concurrency=settings.BATCH_MAX_CONCURRENCY,
+        item_timeout=settings.BATCH_ITEM_TIMEOUT_SECONDS,
+    )
+
+
+def get_response_cache_stats() -> dict[str, dict[str, int] | None]:
+    """レスポンスキャッシュの統計情報を取得（無効なキャッシュはNone）"""
+    exact = service_registry.response_cache
+    semantic = service_registry.semantic_cache
+    return {
+        "exact": exact.stats() if exact is not None else None,
+        "semantic": semantic.stats() if semantic is not None else None,
+    }
+
+
+def get_model_router_stats() -> (
+    dict[str, dict[str, float | int | None]] | None
+):
+    """モデルごとのTTFT・エラー率を取得（ルーターが無効な場合はNone）"""
+    router = service_registry.model_router
+    return router.stats() if router is not None else None
+
+
+def get_hedging_stats() -> dict[str, float | int | None] | None:
+    """ヘッジの発行率・勝率を取得（ヘッジが無効な場合はNone）"""
+    hedger = service_registry.hedger
+    return hedger.stats() if hedger is not None else None
+
+
+def get_resilience_stats() -> dict[str, Mapping[str, str | int]] | None:
+    """同時実行数の上限・待機列・サーキットブレーカーの状態を取得"""
+    resilience = service_registry.resilience
+    return resilience.stats() if resilience is not None else None
+
+
+def get_rate_limit_stats() -> dict[str, int | bool] | None:
+    """レート制限の許可・拒否の回数を取得（無効な場合はNone）"""
+    limiter = service_registry.rate_limiter
+    return limiter.stats() if limiter is not None else None
+
+
+def get_retrieval_stats() -> dict[str, int | float | str] | None:
+    """文書検索の件数・平均検索時間を取得（RAGが無効な場合はNone）"""
+    retriever = service_registry.retriever
+    return retriever.stats() if retriever is not None else None
+
+
+def get_conversation_search_stats() -> dict[str, object] | None:
+    """会話検索の件数・平均検索時間・埋め込みの取り込み状況を取得"""
+    search = service_registry.conversation_search
+    return search.stats() if search is not None else None
+
+
+def get_embedding_cache_stats() -> dict[str, int | float] | None:
+    """埋め込みキャッシュのヒット率を取得（無効な場合はNone）"""
+    service = service_registry.embedding_service
+    if isinstance(service, CachedEmbeddingService):
+        return service.stats()
+    return None
+
+
+def get_tool_stats() -> dict[str, Any] | None:
+    """ツールの呼び出し数・キャッシュヒット・失敗の件数を取得"""
+    executor = service_registry.tool_executor
+    return executor.stats() if executor is not None else None
+
+
+def get_interruption_stats() -> dict[str, int | float | dict[str, int]]:
+    """切断で打ち切った生成の件数と節約したトークン数を取得"""
+    return service_registry.interruption_tracker.stats()
+
+
+def get_llm_metrics_stats() -> list[dict[str, Any]]:
+    """LLM呼び出しのメトリクスをラベルごとに取得"""
+    return llm_metrics.stats()
+
+
+def get_tracing_stats() -> dict[str, Any] | None:
+    """LangFuseのトレースのサンプリングと送信の件数を取得（無効な場合None）"""
+    handler = service_registry.langfuse_handler
+    return handler.stats() if handler is not None else None
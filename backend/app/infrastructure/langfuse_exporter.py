@@ -0,0 +1,370 @@
+"""LangFuseへのトレースのバックグラウンド送信"""
+
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+import queue
+import threading
+import time
+from typing import Any, Literal
+import uuid
+
+import httpx
+
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+ObservationKind = Literal["span", "generation"]
+
+# トレースを送った理由（head: 開始時のサンプリング）
+SampleReason = Literal["head", "error", "slow"]
+
+# LangFuseの公開インジェスチョンAPI
+_INGESTION_PATH = "/api/public/ingestion"
+
+# 入出力の文字列の上限（超えた分は切り詰める）
+_MAX_TEXT_LENGTH = 20000
+
+
+@dataclass(slots=True)
+class TraceObservation:
+    """トレース内の1つの実行（チェーン・LLM・ツールなど）"""
+
+    id: str
+    parent_id: str | None
+    kind: ObservationKind
+    name: str
+    start_time: float
+    input: Any = None
+    end_time: float | None = None
+    output: Any = None
+    model: str | None = None
+    completion_start_time: float | None = None
+    error: str | None = None
+
+
+@dataclass(slots=True)
+class TraceRecord:
+    """
+    1つのリクエストのトレース
+
+    入出力はコールバックで受け取ったオブジェクトをそのまま持ち、
+    JSONへの変換は送信スレッドで行う（ホットパスで変換しない）
+    """
+
+    id: str
+    name: str
+    start_time: float
+    observations: list[TraceObservation] = field(default_factory=list)
+    end_time: float | None = None
+    tags: Sequence[str] = ()
+    metadata: Mapping[str, Any] = field(default_factory=dict)
+    sample_reason: SampleReason | None = None
+    error: bool = False
+
+    @property
+    def duration(self) -> float:
+        """所要時間（秒）"""
+        end = self.end_time if self.end_time is not None else time.time()
+        return end - self.start_time
+
+
+class LangfuseTraceExporter:
+    """
+    サンプリングしたトレースをLangFuseに送る
+
+    submit()は上限付きのキューに入れるだけで、キューが満杯の場合は
+    待たずに破棄する。送信はデーモンスレッドでまとめて行うため、
+    イベントループ（ストリーミング）を止めない。
+    """
+
+    def __init__(
+        self,
+        *,
+        base_url: str | None = None,
+        public_key: str | None = None,
+        secret_key: str | None = None,
+        max_queue: int | None = None,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+        timeout: float | None = None,
+        client: httpx.Client | None = None,
+    ) -> None:
+        self._url = (base_url or settings.LANGFUSE_BASE_URL).rstrip(
+            "/"
+        ) + _INGESTION_PATH
+        self._auth = (
+            public_key or settings.LANGFUSE_PUBLIC_KEY or "",
+            secret_key or settings.LANGFUSE_SECRET_KEY or "",
+        )
+        self._batch_size = batch_size or settings.LANGFUSE_EXPORT_BATCH_SIZE
+        self._flush_interval = (
+            flush_interval or settings.LANGFUSE_EXPORT_INTERVAL_SECONDS
+        )
+        self._timeout = timeout or settings.LANGFUSE_EXPORT_TIMEOUT_SECONDS
+        self._client = client
+        # Noneは送信スレッドの終了の合図
+        self._queue: queue.Queue[TraceRecord | None] = queue.Queue(
+            maxsize=max_queue or settings.LANGFUSE_EXPORT_QUEUE_SIZE
+        )
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self._submitted = 0
+        self._dropped = 0
+        self._exported = 0
+        self._failed = 0
+        self._failed_batches = 0
+
+    def submit(self, trace: TraceRecord) -> bool:
+        """
+        トレースを送信待ちに追加（待たない）
+
+        Returns:
+            追加した場合True、キューが満杯または終了済みで破棄した場合False
+        """
+        if self._closed:
+            self._dropped += 1
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self._dropped += 1
+            if self._dropped == 1 or self._dropped % 100 == 0:
+                logger.warning(
+                    "langfuse_export_queue_full",
+                    dropped=self._dropped,
+                    queue_size=self._queue.maxsize,
+                )
+            return False
+        self._submitted += 1
+        return True
+
+    def close(self, timeout: float | None = None) -> None:
+        """送信待ちのトレースを送ってから送信スレッドを終了"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout or self._timeout)
+        except queue.Full:
+            logger.warning("langfuse_export_close_timeout")
+            return
+        thread.join(timeout or self._timeout)
+
+    def stats(self) -> dict[str, int]:
+        """送信の件数（破棄・失敗を含む）を取得"""
+        return {
+            "submitted": self._submitted,
+            "dropped": self._dropped,
+            "exported": self._exported,
+            "failed": self._failed,
+            "failed_batches": self._failed_batches,
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+        }
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(
+                    target=self._run, name="langfuse-exporter", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        """送信スレッド: バッチサイズまたは送信間隔ごとにまとめて送る"""
+        client = self._client or httpx.Client(timeout=self._timeout)
+        try:
+            stopping = False
+            while not stopping:
+                first = self._queue.get()
+                if first is None:
+                    break
+                batch = [first]
+                # 最初のトレースから送信間隔の間に届いたものをまとめる
+                deadline = time.monotonic() + self._flush_interval
+                while len(batch) < self._batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._send(client, batch)
+        finally:
+            if self._client is None:
+                client.close()
+
+    def _send(self, client: httpx.Client, batch: list[TraceRecord]) -> None:
+        """インジェスチョンAPIにまとめて送信（失敗しても再送しない）"""
+        try:
+            events = [
+                event for trace in batch for event in ingestion_events(trace)
+            ]
+            response = client.post(
+                self._url,
+                json={"batch": events},
+                auth=self._auth,
+                timeout=self._timeout,
+            )
+            response.raise_for_status()
+        except Exception as e:
+            self._failed += len(batch)
+            self._failed_batches += 1
+            logger.warning(
+                "langfuse_export_failed",
+                traces=len(batch),
+                error=str(e),
+            )
+            return
+        self._exported += len(batch)
+        logger.debug("langfuse_exported", traces=len(batch))
+
+
+def ingestion_events(trace: TraceRecord) -> list[dict[str, Any]]:
+    """トレースをLangFuseのインジェスチョンAPIのイベントに変換"""
+    root = trace.observations[0] if trace.observations else None
+    events = [
+        _event(
+            "trace-create",
+            {
+                "id": trace.id,
+                "name": trace.name,
+                "timestamp": _iso(trace.start_time),
+                "input": _jsonable(root.input) if root else None,
+                "output": _jsonable(root.output) if root else None,
+                "tags": list(trace.tags),
+                "metadata": {
+                    **_jsonable(dict(trace.metadata)),
+                    "sample_reason": trace.sample_reason,
+                    "duration_ms": round(trace.duration * 1000, 3),
+                },
+            },
+        )
+    ]
+    for observation in trace.observations:
+        body: dict[str, Any] = {
+            "id": observation.id,
+            "traceId": trace.id,
+            "parentObservationId": observation.parent_id,
+            "name": observation.name,
+            "startTime": _iso(observation.start_time),
+            "endTime": (
+                _iso(observation.end_time)
+                if observation.end_time is not None
+                else None
+            ),
+            "input": _jsonable(observation.input),
+            "output": _jsonable(observation.output),
+            "level": "ERROR" if observation.error else "DEFAULT",
+            "statusMessage": observation.error,
+        }
+        if observation.kind == "generation":
+            body["model"] = observation.model
+            if observation.completion_start_time is not None:
+                body["completionStartTime"] = _iso(
+                    observation.completion_start_time
+                )
+            usage = _usage(observation.output)
+            if usage:
+                body["usageDetails"] = usage
+        events.append(_event(f"{observation.kind}-create", body))
+    return events
+
+
+def _event(event_type: str, body: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "timestamp": _iso(time.time()),
+        "type": event_type,
+        "body": body,
+    }
+
+
+def _iso(timestamp: float) -> str:
+    return (
+        datetime.fromtimestamp(timestamp, UTC)
+        .isoformat(timespec="milliseconds")
+        .replace("+00:00", "Z")
+    )
+
+
+def _usage(output: Any) -> dict[str, int] | None:
+    """LLMの結果（LLMResult）のusage_metadataからトークン数を取得"""
+    generations = getattr(output, "generations", None)
+    if not generations:
+        return None
+    totals: dict[str, int] = {}
+    for generation in generations[0]:
+        message = getattr(generation, "message", None)
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            continue
+        for key, name in (
+            ("input_tokens", "input"),
+            ("output_tokens", "output"),
+        ):
+            totals[name] = totals.get(name, 0) + int(usage.get(key) or 0)
+    return totals or None
+
+
+def _jsonable(value: Any, depth: int = 0) -> Any:
+    """コールバックの入出力をJSONに変換できる値に変換"""
+    if depth > 8:
+        return _truncate(str(value))
+    if value is None or isinstance(value, bool | int | float):
+        return value
+    if isinstance(value, str):
+        return _truncate(value)
+    if isinstance(value, Mapping):
+        return {str(k): _jsonable(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, list | tuple | set | frozenset):
+        return [_jsonable(v, depth + 1) for v in value]
+    # LangChainのメッセージ（role・content）
+    if hasattr(value, "type") and hasattr(value, "content"):
+        return {
+            "role": value.type,
+            "content": _jsonable(value.content, depth + 1),
+        }
+    # LLMResult（各候補のメッセージまたはテキスト）
+    generations = getattr(value, "generations", None)
+    if isinstance(generations, list):
+        return [
+            _jsonable(getattr(g, "message", None) or g.text, depth + 1)
+            for candidates in generations
+            for g in candidates
+        ]
+    # Document
+    if hasattr(value, "page_content"):
+        return {
+            "page_content": _truncate(value.page_content),
+            "metadata": _jsonable(getattr(value, "metadata", {}), depth + 1),
+        }
+    model_dump = getattr(value, "model_dump", None)
+    if callable(model_dump):
+        try:
+            return _jsonable(model_dump(), depth + 1)
+        except Exception:
+            pass
+    return _truncate(str(value))
+
+
+def _truncate(text: str) -> str:
+    if len(text) <= _MAX_TEXT_LENGTH:
+        return text
+    return text[:_MAX_TEXT_LENGTH] + "…"
@@ -1,19 +1,518 @@
 """LangFuseコールバックハンドラーの設定"""
 
-from langfuse import get_client
-from langfuse.langchain import CallbackHandler
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+import random
+import threading
+import time
+from typing import Any
+from uuid import UUID, uuid4
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
 
 from app.infrastructure.config import settings
+from app.infrastructure.langfuse_exporter import (
+    LangfuseTraceExporter,
+    ObservationKind,
+    SampleReason,
+    TraceObservation,
+    TraceRecord,
+)
 from app.infrastructure.logging import get_logger
 
 logger = get_logger(__name__)
 
+# LangChain・LangGraphが内部の実行に付けるタグ（トレースに含めない）
+_HIDDEN_TAG = "langsmith:hidden"
+
+
+@dataclass(slots=True)
+class _OpenTrace:
+    """完了を待っているトレース"""
+
+    record: TraceRecord
+    root_run_id: UUID
+    head_sampled: bool
+    # サンプリングされる可能性がなければ入出力を記録しない
+    recording: bool
+    run_ids: list[UUID] = field(default_factory=list)
+
+
+# 実行ID → (トレース, 子の実行の親にする観測のID, 観測)
+_RunEntry = tuple[_OpenTrace, str | None, TraceObservation | None]
+
+
+class SampledLangfuseHandler(BaseCallbackHandler):
+    """
+    サンプリングしたリクエストのトレースだけをLangFuseに送るコールバック
+
+    ルートの実行（1回のリクエスト）の開始時にsample_rateの割合で
+    サンプリングし、サンプリングしなかった場合もエラーになった、または
+    slow_seconds以上かかったトレースは終了時に送る。
+
+    コールバックはイベントループ上でその場で実行し（スレッドに移さない）、
+    時刻と入出力の参照を記録するだけにする。JSONへの変換と送信は
+    LangfuseTraceExporterの送信スレッドで行う。
+    """
+
+    # 同期ハンドラーをrun_in_executorで呼ばせない
+    run_inline = True
+
+    def __init__(
+        self,
+        exporter: LangfuseTraceExporter,
+        *,
+        sample_rate: float | None = None,
+        sample_on_error: bool | None = None,
+        slow_seconds: float | None = None,
+        max_open_traces: int | None = None,
+        rng: Callable[[], float] = random.random,
+    ) -> None:
+        self._exporter = exporter
+        self._sample_rate = (
+            sample_rate
+            if sample_rate is not None
+            else settings.LANGFUSE_SAMPLE_RATE
+        )
+        self._sample_on_error = (
+            sample_on_error
+            if sample_on_error is not None
+            else settings.LANGFUSE_SAMPLE_ON_ERROR
+        )
+        self._slow_seconds = (
+            slow_seconds
+            if slow_seconds is not None
+            else settings.LANGFUSE_SLOW_TRACE_SECONDS
+        )
+        self._max_open_traces = (
+            max_open_traces or settings.LANGFUSE_MAX_OPEN_TRACES
+        )
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._traces: OrderedDict[UUID, _OpenTrace] = OrderedDict()
+        self._runs: dict[UUID, _RunEntry] = {}
+        self._started = 0
+        self._sampled: Counter[SampleReason] = Counter()
+        self._discarded = 0
+        self._evicted = 0
+
+    @property
+    def exporter(self) -> LangfuseTraceExporter:
+        return self._exporter
+
+    # --- チェーン（グラフ・ノード・プロンプト） ---
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any],
+        inputs: dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._start(
+            run_id,
+            parent_run_id,
+            "span",
+            _run_name(serialized, kwargs, "chain"),
+            inputs,
+            tags=tags,
+            metadata=metadata,
+        )
+
+    def on_chain_end(
+        self,
+        outputs: dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._end(run_id, output=outputs)
+
+    def on_chain_error(
+        self,
+        error: BaseException,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._end(run_id, error=error)
+
+    # --- LLM ---
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list[list[BaseMessage]],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._start(
+            run_id,
+            parent_run_id,
+            "generation",
+            _run_name(serialized, kwargs, "chat_model"),
+            messages[0] if len(messages) == 1 else messages,
+            tags=tags,
+            metadata=metadata,
+            model=_model_name(metadata, kwargs),
+        )
+
+    def on_llm_start(
+        self,
+        serialized: dict[str, Any],
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._start(
+            run_id,
+            parent_run_id,
+            "generation",
+            _run_name(serialized, kwargs, "llm"),
+            prompts,
+            tags=tags,
+            metadata=metadata,
+            model=_model_name(metadata, kwargs),
+        )
+
+    def on_llm_new_token(
+        self,
+        token: str | list[str | dict[str, Any]],
+        *,
+        chunk: Any = None,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        # チャンクごとに呼ばれるため、最初のチャンクの時刻だけを記録する
+        entry = self._runs.get(run_id)
+        if entry is None:
+            return
+        observation = entry[2]
+        if (
+            observation is not None
+            and observation.completion_start_time is None
+        ):
+            observation.completion_start_time = time.time()
+
+    def on_llm_end(
+        self,
+        response: LLMResult,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._end(run_id, output=response)
+
+    def on_llm_error(
+        self,
+        error: BaseException,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._end(run_id, error=error)
+
+    # --- ツール・検索 ---
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        metadata: dict[str, Any] | None = None,
+        inputs: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._start(
+            run_id,
+            parent_run_id,
+            "span",
+            _run_name(serialized, kwargs, "tool"),
+            inputs if inputs is not None else input_str,
+            tags=tags,
+            metadata=metadata,
+        )
+
+    def on_tool_end(
+        self,
+        output: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._end(run_id, output=output)
+
+    def on_tool_error(
+        self,
+        error: BaseException,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._end(run_id, error=error)
+
+    def on_retriever_start(
+        self,
+        serialized: dict[str, Any],
+        query: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._start(
+            run_id,
+            parent_run_id,
+            "span",
+            _run_name(serialized, kwargs, "retriever"),
+            query,
+            tags=tags,
+            metadata=metadata,
+        )
+
+    def on_retriever_end(
+        self,
+        documents: Sequence[Document],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._end(run_id, output=documents)
+
+    def on_retriever_error(
+        self,
+        error: BaseException,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        self._end(run_id, error=error)
+
+    # --- 記録 ---
+
+    def _start(
+        self,
+        run_id: UUID,
+        parent_run_id: UUID | None,
+        kind: ObservationKind,
+        name: str,
+        inputs: Any,
+        *,
+        tags: list[str] | None,
+        metadata: dict[str, Any] | None,
+        model: str | None = None,
+    ) -> None:
+        """実行の開始を記録（親がなければ新しいトレースを開始）"""
+        now = time.time()
+        with self._lock:
+            parent = (
+                self._runs.get(parent_run_id)
+                if parent_run_id is not None
+                else None
+            )
+            if parent is None:
+                trace = self._open_trace(run_id, name, now, tags, metadata)
+                parent_id = None
+            else:
+                trace, parent_id, _ = parent
+            observation = None
+            hidden = parent is not None and tags and _HIDDEN_TAG in tags
+            if trace.recording and not hidden:
+                observation = TraceObservation(
+                    id=str(run_id),
+                    parent_id=parent_id,
+                    kind=kind,
+                    name=name,
+                    start_time=now,
+                    input=inputs,
+                    model=model,
+                )
+                trace.record.observations.append(observation)
+            self._runs[run_id] = (
+                trace,
+                observation.id if observation is not None else parent_id,
+                observation,
+            )
+            trace.run_ids.append(run_id)
+
+    def _end(
+        self,
+        run_id: UUID,
+        *,
+        output: Any = None,
+        error: BaseException | None = None,
+    ) -> None:
+        """実行の終了を記録（ルートであればトレースを送るか判定）"""
+        now = time.time()
+        with self._lock:
+            entry = self._runs.get(run_id)
+            if entry is None:
+                return
+            trace, _, observation = entry
+            # キャンセル（クライアントの切断など）はエラーとして扱わない
+            failed = isinstance(error, Exception)
+            if observation is not None:
+                observation.end_time = now
+                observation.output = output
+                if failed:
+                    observation.error = f"{type(error).__name__}: {error}"
+            if failed:
+                trace.record.error = True
+            if run_id != trace.root_run_id:
+                return
+            trace.record.end_time = now
+            self._close_trace(trace)
+
+        reason = self._sample_reason(trace)
+        if reason is None:
+            self._discarded += 1
+            return
+        trace.record.sample_reason = reason
+        self._sampled[reason] += 1
+        self._exporter.submit(trace.record)
+
+    def _open_trace(
+        self,
+        run_id: UUID,
+        name: str,
+        now: float,
+        tags: list[str] | None,
+        metadata: dict[str, Any] | None,
+    ) -> _OpenTrace:
+        """トレースを開始してサンプリングを判定（ロック内で呼ぶ）"""
+        if len(self._traces) >= self._max_open_traces:
+            # 終了しなかった実行（コールバックの取りこぼし）のトレースを破棄
+            _, oldest = self._traces.popitem(last=False)
+            for stale in oldest.run_ids:
+                self._runs.pop(stale, None)
+            self._evicted += 1
+        head_sampled = self._rng() < self._sample_rate
+        trace = _OpenTrace(
+            record=TraceRecord(
+                id=str(uuid4()),
+                name=name,
+                start_time=now,
+                tags=tuple(tags or ()),
+                metadata=dict(metadata or {}),
+            ),
+            root_run_id=run_id,
+            head_sampled=head_sampled,
+            recording=(
+                head_sampled or self._sample_on_error or self._slow_seconds > 0
+            ),
+        )
+        self._traces[run_id] = trace
+        self._started += 1
+        return trace
+
+    def _close_trace(self, trace: _OpenTrace) -> None:
+        """完了したトレースの実行を破棄（ロック内で呼ぶ）"""
+        self._traces.pop(trace.root_run_id, None)
+        for run_id in trace.run_ids:
+            self._runs.pop(run_id, None)
+
+    def _sample_reason(self, trace: _OpenTrace) -> SampleReason | None:
+        """完了したトレースを送る理由（送らない場合はNone）"""
+        if trace.head_sampled:
+            return "head"
+        if trace.record.error and self._sample_on_error:
+            return "error"
+        if self._slow_seconds > 0 and trace.record.duration >= (
+            self._slow_seconds
+        ):
+            return "slow"
+        return None
+
+    def stats(self) -> dict[str, Any]:
+        """サンプリングと送信の件数を取得"""
+        return {
+            "sample_rate": self._sample_rate,
+            "traces": self._started,
+            "sampled": dict(self._sampled),
+            "discarded": self._discarded,
+            "evicted": self._evicted,
+            "open_traces": len(self._traces),
+            "export": self._exporter.stats(),
+        }
+
+    def close(self, timeout: float | None = None) -> None:
+        """送信待ちのトレースを送ってから終了"""
+        self._exporter.close(timeout)
+
+
+def _run_name(
+    serialized: dict[str, Any] | None, kwargs: dict[str, Any], default: str
+) -> str:
+    """実行の名前（LangGraphのノード名など）"""
+    name = kwargs.get("name")
+    if name:
+        return str(name)
+    if serialized:
+        if serialized.get("name"):
+            return str(serialized["name"])
+        ids = serialized.get("id")
+        if ids:
+            return str(ids[-1])
+    return default
 
-def create_langfuse_handler() -> CallbackHandler | None:
+
+def _model_name(
+    metadata: dict[str, Any] | None, kwargs: dict[str, Any]
+) -> str | None:
+    """LLMのモデル名（LangChainが付けるメタデータ・呼び出しパラメーター）"""
+    if metadata and metadata.get("ls_model_name"):
+        return str(metadata["ls_model_name"])
+    params = kwargs.get("invocation_params") or {}
+    model = params.get("model") or params.get("model_name")
+    return str(model) if model else None
+
+
+def create_langfuse_handler(
+    exporter: LangfuseTraceExporter | None = None,
+) -> SampledLangfuseHandler | None:
     """LangFuseコールバックハンドラーを作成
 
+    認証の確認は行わない（認証情報の誤りは送信スレッドで
+    langfuse_export_failedとして記録する）。
+
+    Args:
+        exporter: 共有する送信キュー（省略時は新しく作成）
+
     Returns:
-        LangFuseが有効な場合: CallbackHandlerインスタンス
+        LangFuseが有効な場合: SampledLangfuseHandlerインスタンス
         LangFuseが無効な場合: None
     """
     if not settings.LANGFUSE_ENABLED:
@@ -27,28 +526,12 @@ def create_langfuse_handler() -> CallbackHandler | None:
         )
         return None
 
-    try:
-        langfuse = get_client()
-
-        # Verify connection
-        if langfuse.auth_check():
-            print("Langfuse client is authenticated and ready!")
-        else:
-            print(
-                "Authentication failed. Please check your credentials and host."
-            )
-
-        handler = CallbackHandler()
-
-        logger.info(
-            "langfuse_handler_created",
-            host=settings.LANGFUSE_BASE_URL,
-        )
-        return handler
-    except Exception as e:
-        logger.error(
-            "langfuse_handler_creation_error",
-            error=str(e),
-            exc_info=True,
-        )
-        return None
+    handler = SampledLangfuseHandler(exporter or LangfuseTraceExporter())
+    logger.info(
+        "langfuse_handler_created",
+        host=settings.LANGFUSE_BASE_URL,
+        sample_rate=settings.LANGFUSE_SAMPLE_RATE,
+        sample_on_error=settings.LANGFUSE_SAMPLE_ON_ERROR,
+        slow_seconds=settings.LANGFUSE_SLOW_TRACE_SECONDS,
+    )
+    return handler
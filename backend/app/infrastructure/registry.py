@@ -0,0 +1,537 @@
+"""
+サービスレジストリ
+
+AIサービス・セッションリポジトリ・キャッシュクライアントを
+ワーカープロセスごとに一度だけ構築し、リクエスト間で共有する
+ライフサイクル（起動・終了）はFastAPIのlifespanから管理する
+"""
+
+import asyncio
+from pathlib import Path
+import threading
+
+import redis.asyncio as redis
+
+from app.domain.entities.conversation import Conversation
+from app.domain.repositories import ISessionRepository
+from app.domain.services import IAIService
+from app.infrastructure.config import settings
+from app.infrastructure.langfuse_handler import (
+    SampledLangfuseHandler,
+    create_langfuse_handler,
+)
+from app.infrastructure.logging import get_logger
+from app.infrastructure.repositories.dynamodb_repository import (
+    DynamoDBSessionRepository,
+)
+from app.infrastructure.repositories.postgres_repository import (
+    PostgresConversationRepository,
+)
+from app.infrastructure.services.cache_service import RedisCacheService
+from app.infrastructure.services.conversation_memory import (
+    RedisConversationMemory,
+    SummaryBufferConversationMemory,
+)
+from app.infrastructure.services.conversation_search import (
+    HybridConversationSearch,
+)
+from app.infrastructure.services.conversation_summarizer import (
+    ConversationSummarizer,
+)
+from app.infrastructure.services.embedding_service import (
+    EmbeddingService,
+    create_embedding_service,
+)
+from app.infrastructure.services.embedding_worker import (
+    BackfillCheckpoint,
+    EmbeddingIngestionWorker,
+)
+from app.infrastructure.services.fake_llm import FakeAIService
+from app.infrastructure.services.hedging import HedgedStreamer
+from app.infrastructure.services.interruption import (
+    GenerationInterruptionTracker,
+)
+from app.infrastructure.services.langgraph_ai_service import (
+    LangGraphAIService,
+)
+from app.infrastructure.services.model_router import ModelRouter
+from app.infrastructure.services.rate_limiter import RedisRateLimiter
+from app.infrastructure.services.resilience import (
+    ResilientAIService,
+    UpstreamGuard,
+)
+from app.infrastructure.services.response_cache import (
+    CachedAIService,
+    ModelResolver,
+)
+from app.infrastructure.services.retriever import InProcessRetriever
+from app.infrastructure.services.semantic_cache import SemanticCacheAIService
+from app.infrastructure.services.tools import (
+    ToolExecutor,
+    create_default_tools,
+)
+from app.infrastructure.services.vector_segments import SegmentStore
+
+logger = get_logger(__name__)
+
+# 会話のバックフィルで埋め込み済みの最後のID（会話検索の索引と同じ場所）
+_BACKFILL_CHECKPOINT_FILE = "backfill.json"
+
+
+class ServiceRegistry:
+    """プロセス共有のサービスレジストリ"""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._redis: redis.Redis | None = None
+        self._ai_service: IAIService | None = None
+        self._session_repository: DynamoDBSessionRepository | None = None
+        self._cache_service: RedisCacheService | None = None
+        self._conversation_memory: RedisConversationMemory | None = None
+        self._embedding_service: EmbeddingService | None = None
+        self._response_cache: CachedAIService | None = None
+        self._semantic_cache: SemanticCacheAIService | None = None
+        self._model_router: ModelRouter | None = None
+        self._hedger: HedgedStreamer | None = None
+        self._resilience: UpstreamGuard | None = None
+        self._rate_limiter: RedisRateLimiter | None = None
+        self._retriever: InProcessRetriever | None = None
+        self._rag_disabled = False
+        self._tool_executor: ToolExecutor | None = None
+        self._conversation_search: HybridConversationSearch | None = None
+        self._conversation_search_loader: asyncio.Task[None] | None = None
+        self._interruption_tracker: GenerationInterruptionTracker | None = None
+        self._langfuse_handler: SampledLangfuseHandler | None = None
+        self._langfuse_handler_built = False
+
+    @property
+    def redis(self) -> redis.Redis:
+        """共有Redisクライアント（コネクションプールを共有）"""
+        if self._redis is None:
+            with self._lock:
+                if self._redis is None:
+                    self._redis = redis.from_url(
+                        settings.REDIS_URL,
+                        decode_responses=True,
+                        encoding="utf-8",
+                    )
+        return self._redis
+
+    @property
+    def ai_service(self) -> IAIService:
+        """共有AIサービス"""
+        if self._ai_service is None:
+            with self._lock:
+                if self._ai_service is None:
+                    self._ai_service = self._build_ai_service()
+        return self._ai_service
+
+    @property
+    def response_cache(self) -> CachedAIService | None:
+        """完全一致レスポンスキャッシュ（無効な場合はNone）"""
+        _ = self.ai_service
+        return self._response_cache
+
+    @property
+    def semantic_cache(self) -> SemanticCacheAIService | None:
+        """セマンティックキャッシュ（無効な場合はNone）"""
+        _ = self.ai_service
+        return self._semantic_cache
+
+    @property
+    def model_router(self) -> ModelRouter | None:
+        """モデルルーター（無効な場合はNone）"""
+        _ = self.ai_service
+        return self._model_router
+
+    @property
+    def hedger(self) -> HedgedStreamer | None:
+        """ヘッジリクエスト（無効な場合はNone）"""
+        _ = self.ai_service
+        return self._hedger
+
+    @property
+    def resilience(self) -> UpstreamGuard | None:
+        """同時実行数制限・サーキットブレーカー（無効な場合はNone）"""
+        _ = self.ai_service
+        return self._resilience
+
+    def _build_ai_service(self) -> IAIService:
+        """
+        設定に応じてデコレーターを重ねたAIサービスを構築
+
+        外側から 完全一致キャッシュ → セマンティックキャッシュ →
+        同時実行数制限 → LLM の順（キャッシュヒットは制限しない）。
+        LangGraphではsingle-flightの先頭の上流呼び出しだけが実行枠を
+        取るよう、グラフ内のLLM呼び出しごとに制限する
+        """
+        service: IAIService
+        model_resolver: ModelResolver | None = None
+        if settings.AI_RESILIENCE_ENABLED:
+            self._resilience = UpstreamGuard()
+        if settings.AI_SERVICE_BACKEND == "fake":
+            # 負荷試験用（LangGraph・LLMを通さない）
+            service = FakeAIService()
+            if self._resilience is not None:
+                service = ResilientAIService(service, guard=self._resilience)
+        else:
+            if settings.MODEL_ROUTER_ENABLED:
+                self._model_router = ModelRouter()
+            if settings.HEDGING_ENABLED:
+                self._hedger = HedgedStreamer()
+            graph_service = LangGraphAIService(
+                model_router=self._model_router,
+                hedger=self._hedger,
+                upstream_guard=self._resilience,
+                retriever=self.retriever,
+                tool_executor=self.tool_executor,
+                langfuse_handler=self.langfuse_handler,
+            )
+            service = graph_service
+            # ルーティング後のモデルをキーにし、ツール・RAGの回答は除く
+            model_resolver = graph_service.cache_model
+        if settings.SEMANTIC_CACHE_ENABLED:
+            if self.embedding_service.semantic:
+                self._semantic_cache = SemanticCacheAIService(
+                    service, self.embedding_service
+                )
+                service = self._semantic_cache
+            else:
+                # ハッシュ埋め込みの類似度は字面の近さで、別の質問に
+                # 誤った回答を返すため有効にしない
+                logger.warning(
+                    "semantic_cache_disabled",
+                    reason="embedding_not_semantic",
+                    embedding_backend=settings.EMBEDDING_BACKEND,
+                )
+        if settings.RESPONSE_CACHE_ENABLED:
+            self._response_cache = CachedAIService(
+                service, self.cache_service, model_resolver=model_resolver
+            )
+            service = self._response_cache
+        return service
+
+    @property
+    def embedding_service(self) -> EmbeddingService:
+        """共有埋め込みサービス"""
+        if self._embedding_service is None:
+            with self._lock:
+                if self._embedding_service is None:
+                    self._embedding_service = create_embedding_service()
+        return self._embedding_service
+
+    @property
+    def retriever(self) -> InProcessRetriever | None:
+        """共有の文書検索（RAGが無効・埋め込みが字面のみの場合はNone）"""
+        if not settings.RAG_ENABLED or self._rag_disabled:
+            return None
+        if self._retriever is None:
+            with self._lock:
+                if self._retriever is None and not self._rag_disabled:
+                    if self.embedding_service.semantic:
+                        self._retriever = self._build_retriever()
+                    else:
+                        # ハッシュ埋め込みでは言い換えた質問に関係のない
+                        # チャンクを返すため有効にしない
+                        logger.warning(
+                            "rag_disabled",
+                            reason="embedding_not_semantic",
+                            embedding_backend=settings.EMBEDDING_BACKEND,
+                        )
+                        self._rag_disabled = True
+        return self._retriever
+
+    @property
+    def tool_executor(self) -> ToolExecutor | None:
+        """共有のツール実行（無効な場合はNone）"""
+        if not settings.TOOLS_ENABLED:
+            return None
+        if self._tool_executor is None:
+            with self._lock:
+                if self._tool_executor is None:
+                    self._tool_executor = ToolExecutor(
+                        create_default_tools(self.retriever)
+                    )
+        return self._tool_executor
+
+    @property
+    def conversation_search(self) -> HybridConversationSearch | None:
+        """共有の会話検索（無効な場合はNone）"""
+        if not settings.CONVERSATION_SEARCH_ENABLED:
+            return None
+        if self._conversation_search is None:
+            with self._lock:
+                if self._conversation_search is None:
+                    self._conversation_search = (
+                        self._build_conversation_search()
+                    )
+        return self._conversation_search
+
+    def _build_conversation_search(self) -> HybridConversationSearch:
+        """
+        会話検索を構築（埋め込みは取り込みワーカーで計算する）
+
+        CONVERSATION_SEARCH_INDEX_DIRが指定されていれば埋め込みを
+        セグメントに永続化し、再起動時は埋め込み済みの会話を飛ばす
+        """
+        if not self.embedding_service.semantic:
+            # ベクトル検索もキーワードの一致になり、言い換えを拾わない
+            logger.warning(
+                "conversation_search_lexical_embedding",
+                embedding_backend=settings.EMBEDDING_BACKEND,
+            )
+        directory = settings.CONVERSATION_SEARCH_INDEX_DIR
+        store = (
+            SegmentStore(
+                directory,
+                dimension=self.embedding_service.dimension,
+                dtype=settings.RAG_INDEX_DTYPE,
+                quantize=settings.RAG_INDEX_QUANTIZATION == "int8",
+            )
+            if directory
+            else None
+        )
+        retriever = InProcessRetriever(
+            self.embedding_service,
+            store=store,
+            min_score=settings.CONVERSATION_SEARCH_MIN_SIMILARITY,
+        )
+        return HybridConversationSearch(
+            retriever, worker=EmbeddingIngestionWorker(retriever.ingest_many)
+        )
+
+    def _build_retriever(self) -> InProcessRetriever:
+        """RAG_INDEX_DIRが指定されていればセグメントから索引を開く"""
+        store = (
+            SegmentStore(
+                settings.RAG_INDEX_DIR,
+                dimension=self.embedding_service.dimension,
+                dtype=settings.RAG_INDEX_DTYPE,
+                quantize=settings.RAG_INDEX_QUANTIZATION == "int8",
+            )
+            if settings.RAG_INDEX_DIR
+            else None
+        )
+        return InProcessRetriever(self.embedding_service, store=store)
+
+    @property
+    def session_repository(self) -> ISessionRepository:
+        """共有セッションリポジトリ"""
+        if self._session_repository is None:
+            with self._lock:
+                if self._session_repository is None:
+                    self._session_repository = DynamoDBSessionRepository()
+        return self._session_repository
+
+    @property
+    def cache_service(self) -> RedisCacheService:
+        """共有キャッシュサービス"""
+        if self._cache_service is None:
+            with self._lock:
+                if self._cache_service is None:
+                    self._cache_service = RedisCacheService(self.redis)
+        return self._cache_service
+
+    @property
+    def conversation_memory(self) -> RedisConversationMemory:
+        """共有会話履歴メモリ"""
+        if self._conversation_memory is None:
+            with self._lock:
+                if self._conversation_memory is None:
+                    self._conversation_memory = (
+                        self._build_conversation_memory()
+                    )
+        return self._conversation_memory
+
+    @property
+    def rate_limiter(self) -> RedisRateLimiter | None:
+        """共有レート制限（無効な場合はNone）"""
+        if not settings.RATE_LIMIT_ENABLED:
+            return None
+        if self._rate_limiter is None:
+            with self._lock:
+                if self._rate_limiter is None:
+                    self._rate_limiter = RedisRateLimiter(self.redis)
+        return self._rate_limiter
+
+    @property
+    def interruption_tracker(self) -> GenerationInterruptionTracker:
+        """切断による生成の打ち切りの記録（プロセス内で共有）"""
+        if self._interruption_tracker is None:
+            with self._lock:
+                if self._interruption_tracker is None:
+                    self._interruption_tracker = (
+                        GenerationInterruptionTracker()
+                    )
+        return self._interruption_tracker
+
+    @property
+    def langfuse_handler(self) -> SampledLangfuseHandler | None:
+        """LangFuseのトレース（無効な場合はNone）"""
+        if not self._langfuse_handler_built:
+            with self._lock:
+                if not self._langfuse_handler_built:
+                    self._langfuse_handler = create_langfuse_handler()
+                    self._langfuse_handler_built = True
+        return self._langfuse_handler
+
+    def _build_conversation_memory(self) -> RedisConversationMemory:
+        """
+        LANGCHAIN_MEMORY_TYPEに応じた会話履歴メモリを構築
+
+        buffer: 直近のターンのみ / summary_buffer: 古いターンを要約に畳み込む
+        / summary: 全ターンを要約に畳み込む
+        """
+        memory_type = settings.LANGCHAIN_MEMORY_TYPE
+        if memory_type in ("summary", "summary_buffer"):
+            return SummaryBufferConversationMemory(
+                self.redis,
+                ConversationSummarizer(),
+                buffer_turns=0 if memory_type == "summary" else None,
+            )
+        if memory_type != "buffer":
+            logger.warning("unknown_memory_type", memory_type=memory_type)
+        return RedisConversationMemory(self.redis)
+
+    async def startup(self) -> None:
+        """
+        起動時にサービスを事前構築
+
+        モデル初期化やDynamoDBのテーブル確認などブロッキング処理を含むため
+        スレッドで実行する。失敗したサービスは初回利用時に再構築を試みる
+        """
+        builders = {
+            "ai_service": lambda: self.ai_service,
+            "session_repository": lambda: self.session_repository,
+            "cache_service": lambda: self.cache_service,
+        }
+        for name, build in builders.items():
+            try:
+                await asyncio.to_thread(build)
+                logger.info("service_registry_built", service=name)
+            except Exception as e:
+                logger.warning(
+                    "service_registry_build_failed",
+                    service=name,
+                    error=str(e),
+                    exc_info=True,
+                )
+
+        if self.retriever is not None and settings.RAG_DOCUMENTS_DIR:
+            try:
+                documents = await self.retriever.ingest_directory(
+                    settings.RAG_DOCUMENTS_DIR
+                )
+                logger.info(
+                    "service_registry_documents_ingested",
+                    documents=documents,
+                )
+            except Exception as e:
+                logger.warning(
+                    "service_registry_documents_ingest_failed",
+                    path=settings.RAG_DOCUMENTS_DIR,
+                    error=str(e),
+                    exc_info=True,
+                )
+        if self._retriever is not None:
+            self._retriever.warm_up()
+        if self._tool_executor is not None:
+            # CPUを使うツールのワーカープロセスを先に起動しておく
+            self._tool_executor.warm_up()
+
+        if self.conversation_search is not None:
+            # 既存の会話の索引付けは起動を待たせずに裏で行う
+            self._conversation_search_loader = asyncio.create_task(
+                self._load_conversation_search(self.conversation_search)
+            )
+
+    async def _load_conversation_search(
+        self, search: HybridConversationSearch
+    ) -> None:
+        """保存済みの会話を読み込んで検索索引に追加（前回の続きから埋め込む）"""
+        from app.infrastructure.database import async_session
+
+        async def fetch_page(last_id: int, limit: int) -> list[Conversation]:
+            async with async_session() as session:
+                return await PostgresConversationRepository(
+                    session
+                ).get_after_id(last_id, limit)
+
+        directory = settings.CONVERSATION_SEARCH_INDEX_DIR
+        checkpoint = BackfillCheckpoint(
+            Path(directory) / _BACKFILL_CHECKPOINT_FILE if directory else None
+        )
+        try:
+            conversations = await search.backfill(fetch_page, checkpoint)
+            logger.info(
+                "service_registry_conversations_indexed",
+                conversations=conversations,
+            )
+        except Exception as e:
+            logger.warning(
+                "service_registry_conversations_index_failed",
+                error=str(e),
+                exc_info=True,
+            )
+
+    async def shutdown(self) -> None:
+        """終了時にクライアントをクローズ"""
+        if self._session_repository is not None:
+            await asyncio.to_thread(self._session_repository.close)
+            self._session_repository = None
+
+        if self._conversation_memory is not None:
+            # 実行中の要約タスクを待ってからRedisクライアントを閉じる
+            await self._conversation_memory.close()
+            self._conversation_memory = None
+
+        if self._conversation_search_loader is not None:
+            self._conversation_search_loader.cancel()
+            await asyncio.gather(
+                self._conversation_search_loader, return_exceptions=True
+            )
+            self._conversation_search_loader = None
+        if self._conversation_search is not None:
+            # 埋め込み待ちの会話を処理してから破棄する
+            await self._conversation_search.close()
+            self._conversation_search = None
+
+        if self._tool_executor is not None:
+            self._tool_executor.close()
+            self._tool_executor = None
+
+        if self._retriever is not None:
+            # 実行中の圧縮を待ってから破棄する
+            await self._retriever.close()
+            self._retriever = None
+
+        if self._langfuse_handler is not None:
+            # 送信待ちのトレースを送ってから破棄する
+            await asyncio.to_thread(self._langfuse_handler.close)
+            self._langfuse_handler = None
+        self._langfuse_handler_built = False
+
+        self._cache_service = None
+        self._ai_service = None
+        self._response_cache = None
+        self._semantic_cache = None
+        self._model_router = None
+        self._hedger = None
+        self._resilience = None
+        self._rate_limiter = None
+        self._interruption_tracker = None
+
+        if self._redis is not None:
+            try:
+                await self._redis.close()
+            except Exception as e:
+                logger.warning(
+                    "service_registry_redis_close_error", error=str(e)
+                )
+            self._redis = None
+
+        logger.info("service_registry_shutdown")
+
+
+# グローバルなサービスレジストリインスタンス
+service_registry = ServiceRegistry()
@@ -53,6 +53,10 @@ class DynamoDBSessionRepository(ISessionRepository):
             if e.response["Error"]["Code"] != "ResourceInUseException":
                 raise
 
+    def close(self) -> None:
+        """DynamoDBクライアントのコネクションを解放"""
+        self._dynamodb.meta.client.close()
+
     async def create(self, session: Session) -> Session:
         """セッションを作成（同期処理を非同期で実行）"""
         import asyncio
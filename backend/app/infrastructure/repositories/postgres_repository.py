@@ -5,14 +5,42 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.domain.entities.conversation import Conversation
 from app.domain.repositories import IConversationRepository
+from app.domain.services import IConversationSearchIndex
+from app.infrastructure.logging import get_logger
 from app.models.postgres import Conversation as ConversationModel
 
+logger = get_logger(__name__)
 
-class PostgresConversationRepository(IConversationRepository):
-    """PostgreSQL会話リポジトリ実装"""
 
-    def __init__(self, session: AsyncSession):
+def _to_entity(db_conversation: ConversationModel) -> Conversation:
+    """テーブルの行を会話エンティティに変換"""
+    return Conversation(
+        id=db_conversation.id,
+        user_id=db_conversation.user_id,
+        session_id=db_conversation.session_id,
+        message=db_conversation.message,
+        response=db_conversation.response,
+        metadata=db_conversation.metadata_json,
+        created_at=db_conversation.created_at,
+        updated_at=db_conversation.updated_at,
+    )
+
+
+class PostgresConversationRepository(IConversationRepository):
+    """
+    PostgreSQL会話リポジトリ実装
+
+    search_indexを指定した場合は、保存・削除した会話を検索索引にも
+    反映する（索引の失敗は保存の失敗にしない）
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        search_index: IConversationSearchIndex | None = None,
+    ):
         self._session = session
+        self._search_index = search_index
 
     async def create(self, conversation: Conversation) -> Conversation:
         """会話を作成"""
@@ -27,16 +55,9 @@ class PostgresConversationRepository(IConversationRepository):
         await self._session.commit()
         await self._session.refresh(db_conversation)
 
-        return Conversation(
-            id=db_conversation.id,
-            user_id=db_conversation.user_id,
-            session_id=db_conversation.session_id,
-            message=db_conversation.message,
-            response=db_conversation.response,
-            metadata=db_conversation.metadata_json,
-            created_at=db_conversation.created_at,
-            updated_at=db_conversation.updated_at,
-        )
+        created = _to_entity(db_conversation)
+        await self._index(created)
+        return created
 
     async def get_by_id(self, conversation_id: int) -> Conversation | None:
         """IDで会話を取得"""
@@ -50,16 +71,7 @@ class PostgresConversationRepository(IConversationRepository):
         if not db_conversation:
             return None
 
-        return Conversation(
-            id=db_conversation.id,
-            user_id=db_conversation.user_id,
-            session_id=db_conversation.session_id,
-            message=db_conversation.message,
-            response=db_conversation.response,
-            metadata=db_conversation.metadata_json,
-            created_at=db_conversation.created_at,
-            updated_at=db_conversation.updated_at,
-        )
+        return _to_entity(db_conversation)
 
     async def get_by_session_id(self, session_id: str) -> list[Conversation]:
         """セッションIDで会話を取得"""
@@ -70,19 +82,19 @@ class PostgresConversationRepository(IConversationRepository):
         )
         db_conversations = result.scalars().all()
 
-        return [
-            Conversation(
-                id=conv.id,
-                user_id=conv.user_id,
-                session_id=conv.session_id,
-                message=conv.message,
-                response=conv.response,
-                metadata=conv.metadata_json,
-                created_at=conv.created_at,
-                updated_at=conv.updated_at,
-            )
-            for conv in db_conversations
-        ]
+        return [_to_entity(conv) for conv in db_conversations]
+
+    async def get_after_id(
+        self, conversation_id: int, limit: int
+    ) -> list[Conversation]:
+        """指定したIDより後の会話をID順に最大limit件取得"""
+        result = await self._session.execute(
+            select(ConversationModel)
+            .where(ConversationModel.id > conversation_id)
+            .order_by(ConversationModel.id)
+            .limit(limit)
+        )
+        return [_to_entity(conv) for conv in result.scalars().all()]
 
     async def update(self, conversation: Conversation) -> Conversation:
         """会話を更新"""
@@ -104,16 +116,9 @@ class PostgresConversationRepository(IConversationRepository):
         await self._session.commit()
         await self._session.refresh(db_conversation)
 
-        return Conversation(
-            id=db_conversation.id,
-            user_id=db_conversation.user_id,
-            session_id=db_conversation.session_id,
-            message=db_conversation.message,
-            response=db_conversation.response,
-            metadata=db_conversation.metadata_json,
-            created_at=db_conversation.created_at,
-            updated_at=db_conversation.updated_at,
-        )
+        updated = _to_entity(db_conversation)
+        await self._index(updated)
+        return updated
 
     async def delete(self, conversation_id: int) -> None:
         """会話を削除"""
@@ -127,3 +132,18 @@ class PostgresConversationRepository(IConversationRepository):
         if db_conversation:
             await self._session.delete(db_conversation)
             await self._session.commit()
+            if self._search_index is not None:
+                await self._search_index.remove(conversation_id)
+
+    async def _index(self, conversation: Conversation) -> None:
+        """保存した会話を検索索引に反映"""
+        if self._search_index is None:
+            return
+        try:
+            await self._search_index.index([conversation])
+        except Exception as e:
+            logger.warning(
+                "conversation_search_index_failed",
+                conversation_id=conversation.id,
+                error=str(e),
+            )
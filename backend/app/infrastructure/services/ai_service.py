@@ -6,10 +6,19 @@ from langchain_core.messages import HumanMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 from app.domain.services import IAIService
+from app.domain.services.context_window import estimate_tokens, render_history
+from app.domain.value_objects.conversation_history import ConversationHistory
 from app.domain.value_objects.message import Message
 from app.infrastructure.config import settings
 from app.infrastructure.logging import get_logger
-from app.infrastructure.services.chunk_utils import normalize_chunk_content
+from app.infrastructure.services.chunk_utils import (
+    closing_stream,
+    normalize_chunk_content,
+)
+from app.infrastructure.services.llm_metrics import (
+    LLMMetricsRecorder,
+    llm_metrics,
+)
 
 logger = get_logger(__name__)
 
@@ -17,9 +26,11 @@ logger = get_logger(__name__)
 class GoogleAIService(IAIService):
     """Google AI Studioサービス実装（LangChain使用）"""
 
-    def __init__(self) -> None:
+    def __init__(self, metrics: LLMMetricsRecorder | None = None) -> None:
         # モデル名は設定から取得（デフォルト: gemini-flash-latest）
         model_name = settings.GOOGLE_AI_MODEL
+        self._model_name = model_name
+        self._metrics = metrics or llm_metrics
         logger.info("google_ai_model_initializing", model_name=model_name)
 
         # ChatGoogleGenerativeAIを初期化
@@ -33,13 +44,30 @@ class GoogleAIService(IAIService):
         logger.info("google_ai_service_initialized", model_name=model_name)
 
     async def generate_response(
-        self, message: Message, context: str = ""
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
     ) -> str:
         """AIレスポンスを生成"""
         try:
+            if history is not None:
+                context = render_history(history)
             prompt = self._build_prompt(message, context)
             messages = [HumanMessage(content=prompt)]
-            response = await self._llm.ainvoke(messages)
+            timer = self._metrics.start(self._model_name, streaming=False)
+            try:
+                response = await self._llm.ainvoke(messages)
+            except Exception:
+                timer.finish(status="error")
+                raise
+            timer.usage(response)
+            timer.finish(
+                prompt_tokens=estimate_tokens(prompt),
+                completion_tokens=estimate_tokens(
+                    normalize_chunk_content(response.content)
+                ),
+            )
             content = response.content
             if isinstance(content, str):
                 return content
@@ -48,22 +76,46 @@ class GoogleAIService(IAIService):
             raise RuntimeError(f"AIレスポンス生成エラー: {str(e)}")
 
     async def generate_stream(
-        self, message: Message, context: str = ""
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
     ) -> AsyncGenerator[str, None]:
         """AIレスポンスをストリームで生成"""
         try:
+            if history is not None:
+                context = render_history(history)
             prompt = self._build_prompt(message, context)
             messages = [HumanMessage(content=prompt)]
 
-            async for chunk in self._llm.astream(messages):
-                if chunk.content:
-                    content = normalize_chunk_content(chunk.content)
+            timer = self._metrics.start(self._model_name, streaming=True)
+            completion: list[str] = []
+            try:
+                async with closing_stream(
+                    self._llm.astream(messages)
+                ) as stream:
+                    async for chunk in stream:
+                        timer.usage(chunk)
+                        if chunk.content:
+                            content = normalize_chunk_content(chunk.content)
 
-                    # 空のコンテンツはスキップ
-                    if not content:
-                        continue
+                            # 空のコンテンツはスキップ
+                            if not content:
+                                continue
 
-                    yield content
+                            timer.chunk()
+                            completion.append(content)
+                            yield content
+            except Exception:
+                timer.finish(status="error")
+                raise
+            except BaseException:
+                timer.finish(status="cancelled")
+                raise
+            timer.finish(
+                prompt_tokens=estimate_tokens(prompt),
+                completion_tokens=estimate_tokens("".join(completion)),
+            )
         except Exception as e:
             error_msg = str(e)
             logger.error(
@@ -0,0 +1,236 @@
+"""文字n-gramによるBM25の転置索引"""
+
+from collections import Counter
+from collections.abc import Callable
+import math
+import re
+import unicodedata
+
+import numpy as np
+from numpy.typing import NDArray
+
+# ひらがな・カタカナ・CJK統合漢字・半角カナ（埋め込みの特徴量と同じ範囲）
+_CJK_RUN_RE = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f]+"
+)
+_WORD_RE = re.compile(r"[^\W_]+")
+
+_INITIAL_SLOTS = 1024
+
+# 削除済みの枠がこの数と生きている枠の数を超えたら詰め直す
+_MIN_COMPACT_SLOTS = 1024
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    テキストを検索語に分割
+
+    日本語は分かち書きをせず、連続する仮名・漢字を1文字と2文字の
+    n-gramに分ける（2文字で絞り込み、1文字の検索語にも一致させる）。
+    英数字は単語単位で扱う。NFKC正規化と大文字小文字の同一視を行う。
+    """
+    normalized = unicodedata.normalize("NFKC", text).casefold()
+    tokens: list[str] = []
+    for run in _CJK_RUN_RE.findall(normalized):
+        tokens.extend(run)
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD_RE.findall(_CJK_RUN_RE.sub(" ", normalized)))
+    return tokens
+
+
+class _Postings:
+    """
+    1つの検索語の出現箇所（文書の枠番号と出現回数の配列）
+
+    追加はリストに溜め、検索時にまとめて配列へ移す
+    """
+
+    def __init__(self) -> None:
+        self._slots: NDArray[np.int32] = np.zeros(0, dtype=np.int32)
+        self._counts: NDArray[np.float32] = np.zeros(0, dtype=np.float32)
+        self._pending_slots: list[int] = []
+        self._pending_counts: list[int] = []
+        # 削除済みを除いた出現文書数
+        self.frequency = 0
+
+    def append(self, slot: int, count: int) -> None:
+        self._pending_slots.append(slot)
+        self._pending_counts.append(count)
+        self.frequency += 1
+
+    def arrays(self) -> tuple[NDArray[np.int32], NDArray[np.float32]]:
+        """(枠番号, 出現回数) の配列を取得"""
+        if self._pending_slots:
+            self._slots = np.concatenate(
+                [self._slots, np.asarray(self._pending_slots, dtype=np.int32)]
+            )
+            self._counts = np.concatenate(
+                [
+                    self._counts,
+                    np.asarray(self._pending_counts, dtype=np.float32),
+                ]
+            )
+            self._pending_slots.clear()
+            self._pending_counts.clear()
+        return self._slots, self._counts
+
+    def remap(
+        self, alive: NDArray[np.bool_], mapping: NDArray[np.int32]
+    ) -> None:
+        """削除済みの枠を除き、枠番号を詰め直した番号に置き換える"""
+        slots, counts = self.arrays()
+        keep = alive[slots]
+        self._slots = mapping[slots[keep]]
+        self._counts = counts[keep]
+
+
+class BM25Index:
+    """
+    BM25でスコアを付けるプロセス内の転置索引
+
+    文書には追加順に枠番号を割り当て、検索語ごとに出現した枠番号と
+    出現回数をNumPy配列で持つ。スコアは検索語ごとに配列演算で
+    まとめて計算する。置き換え・削除は枠を削除済みにするだけで、
+    削除済みの枠が生きている枠より多くなった時点で詰め直す。
+    """
+
+    def __init__(self, *, k1: float = 1.2, b: float = 0.75) -> None:
+        self._k1 = k1
+        self._b = b
+        self._postings: dict[str, _Postings] = {}
+        self._slots: dict[int, int] = {}
+        self._slot_docs: list[int] = []
+        self._lengths: NDArray[np.float32] = np.zeros(
+            _INITIAL_SLOTS, dtype=np.float32
+        )
+        self._alive: NDArray[np.bool_] = np.zeros(
+            _INITIAL_SLOTS, dtype=np.bool_
+        )
+        self._doc_terms: dict[int, tuple[str, ...]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._slots
+
+    def add(self, doc_id: int, text: str) -> None:
+        """文書を追加（同じIDの文書は置き換える）"""
+        self.remove(doc_id)
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+
+        slot = len(self._slot_docs)
+        if slot == len(self._lengths):
+            self._lengths = np.resize(self._lengths, slot * 2)
+            self._alive = np.resize(self._alive, slot * 2)
+        self._slot_docs.append(doc_id)
+        self._slots[doc_id] = slot
+        self._lengths[slot] = len(tokens)
+        self._alive[slot] = True
+        for term, count in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = _Postings()
+            postings.append(slot, count)
+        self._doc_terms[doc_id] = tuple(counts)
+        self._total_length += len(tokens)
+
+    def remove(self, doc_id: int) -> bool:
+        """文書を削除（存在しなければFalse）"""
+        slot = self._slots.pop(doc_id, None)
+        if slot is None:
+            return False
+        self._alive[slot] = False
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            postings.frequency -= 1
+            if not postings.frequency:
+                del self._postings[term]
+        self._total_length -= int(self._lengths[slot])
+
+        dead = len(self._slot_docs) - len(self._slots)
+        if dead > max(len(self._slots), _MIN_COMPACT_SLOTS):
+            self._compact()
+        return True
+
+    def search(
+        self,
+        query: str,
+        *,
+        limit: int | None = None,
+        predicate: Callable[[int], bool] | None = None,
+    ) -> list[tuple[int, float]]:
+        """
+        スコアの高い順に (文書ID, スコア) を取得
+
+        Args:
+            query: 検索クエリ
+            limit: 最大件数（Noneは一致した全件）
+            predicate: 結果に含める文書の条件
+        """
+        if not self._slots:
+            return []
+        count = len(self._slots)
+        size = len(self._slot_docs)
+        # 文書長による正規化の分母（検索語によらないので先に求める）
+        average = self._total_length / count or 1.0
+        norms = self._k1 * (
+            1 - self._b + self._b * self._lengths[:size] / average
+        )
+        scores = np.zeros(size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            idf = math.log(
+                1
+                + (count - postings.frequency + 0.5)
+                / (postings.frequency + 0.5)
+            )
+            slots, tf = postings.arrays()
+            scores[slots] += idf * tf * (self._k1 + 1) / (tf + norms[slots])
+
+        scores[~self._alive[:size]] = 0
+        matched = np.flatnonzero(scores > 0)
+        ordered = matched[np.argsort(-scores[matched], kind="stable")]
+        results: list[tuple[int, float]] = []
+        for slot in ordered.tolist():
+            doc_id = self._slot_docs[slot]
+            if predicate is not None and not predicate(doc_id):
+                continue
+            results.append((doc_id, float(scores[slot])))
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def stats(self) -> dict[str, int]:
+        """文書数と検索語数を取得"""
+        return {"documents": len(self._slots), "terms": len(self._postings)}
+
+    def _compact(self) -> None:
+        """削除済みの枠を除いて枠番号を詰め直す"""
+        size = len(self._slot_docs)
+        alive = self._alive[:size]
+        mapping = np.cumsum(alive, dtype=np.int32) - 1
+        for postings in self._postings.values():
+            postings.remap(alive, mapping)
+
+        self._slot_docs = [
+            doc_id
+            for doc_id, live in zip(
+                self._slot_docs, alive.tolist(), strict=True
+            )
+            if live
+        ]
+        self._slots = {
+            doc_id: slot for slot, doc_id in enumerate(self._slot_docs)
+        }
+        live_count = len(self._slot_docs)
+        capacity = max(_INITIAL_SLOTS, live_count * 2)
+        lengths = np.zeros(capacity, dtype=np.float32)
+        lengths[:live_count] = self._lengths[:size][alive]
+        self._lengths = lengths
+        self._alive = np.zeros(capacity, dtype=np.bool_)
+        self._alive[:live_count] = True
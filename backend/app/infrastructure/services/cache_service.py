@@ -12,8 +12,10 @@ logger = get_logger(__name__)
 class RedisCacheService(ICacheService):
     """Redisキャッシュサービス実装"""
 
-    def __init__(self) -> None:
-        self._redis: redis.Redis | None = None
+    def __init__(self, client: redis.Redis | None = None) -> None:
+        # クライアントが渡された場合は共有クライアントとして使用（クローズしない）
+        self._redis: redis.Redis | None = client
+        self._owns_client = client is None
 
     async def _get_redis(self) -> redis.Redis:
         """Redisクライアントを取得"""
@@ -74,6 +76,6 @@ class RedisCacheService(ICacheService):
 
     async def close(self) -> None:
         """Redisクライアントをクローズ"""
-        if self._redis is not None:
+        if self._redis is not None and self._owns_client:
             await self._redis.close()
             self._redis = None
@@ -1,8 +1,29 @@
 """チャンクコンテンツ正規化ユーティリティ"""
 
+from collections.abc import AsyncGenerator, AsyncIterator
+import contextlib
 from typing import Any
 
 
+@contextlib.asynccontextmanager
+async def closing_stream(
+    stream: AsyncIterator[Any],
+) -> AsyncGenerator[AsyncIterator[Any], None]:
+    """
+    ブロックを抜けるときにストリームを閉じる
+
+    LangChainのastreamはAsyncIteratorとして型付けされているが実体は
+    非同期ジェネレーターのため、contextlib.aclosingの代わりに使う。
+    途中で読むのをやめた場合も上流のHTTP呼び出しまで閉じる。
+    """
+    try:
+        yield stream
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
 def normalize_chunk_content(content: Any) -> str:
     """
     LLMチャンクのコンテンツを文字列に正規化
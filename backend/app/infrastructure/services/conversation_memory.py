@@ -0,0 +1,397 @@
+"""Redisリストによる会話履歴メモリ実装"""
+
+import asyncio
+from collections.abc import Sequence
+import json
+import uuid
+
+import redis.asyncio as redis
+
+from app.domain.services import IConversationMemory
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.conversation_turn import ConversationTurn
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+from app.infrastructure.services.conversation_summarizer import (
+    ConversationSummarizer,
+)
+
+logger = get_logger(__name__)
+
+# キーの接頭辞（保存形式を変える場合はバージョンを上げる）
+MEMORY_KEY_PREFIX = "conversation_turns:v1:"
+SUMMARY_KEY_PREFIX = "conversation_summary:v1:"
+SUMMARY_LOCK_KEY_PREFIX = "conversation_summary_lock:v1:"
+
+# ロックを持ち、先頭のターンが要約したものから変わっていない場合のみ
+# 要約を保存して先頭から畳み込んだ件数を削除する。
+# KEYS: (ターンのリスト, 要約, ロック)
+# ARGV: (先頭のターン, 畳み込んだ件数, 要約, 有効期限秒, ロックのトークン)
+# 戻り値: 1なら保存、0なら先頭が変わった、-1ならロックを失った
+_FOLD_SCRIPT = """
+if redis.call('GET', KEYS[3]) ~= ARGV[5] then
+  return -1
+end
+if redis.call('LINDEX', KEYS[1], 0) ~= ARGV[1] then
+  return 0
+end
+redis.call('SET', KEYS[2], ARGV[3], 'EX', ARGV[4])
+redis.call('LTRIM', KEYS[1], ARGV[2], -1)
+return 1
+"""
+
+# 自分が取得したロックのみ解放する
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 要約中に先頭が変わった場合に要約し直す回数
+_FOLD_MAX_CONFLICTS = 3
+
+
+def serialize_turn(turn: ConversationTurn) -> str:
+    """ターンをコンパクトなJSON配列に変換"""
+    return json.dumps(
+        [turn.user_message, turn.ai_response],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+def deserialize_turn(raw: str | bytes) -> ConversationTurn:
+    """JSON配列からターンを復元"""
+    user_message, ai_response = json.loads(raw)
+    return ConversationTurn(
+        user_message=str(user_message), ai_response=str(ai_response)
+    )
+
+
+class RedisConversationMemory(IConversationMemory):
+    """
+    Redisリストによる会話履歴メモリ
+
+    1ターンを1要素として保存するため、追加はRPUSHの1回で済み、
+    既存の履歴を読み直して書き戻す必要がない。
+    LTRIMで直近max_turns件に制限し、最後の更新からttl秒で失効させる。
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        *,
+        max_turns: int | None = None,
+        ttl: int | None = None,
+    ) -> None:
+        self._redis = client
+        self._max_turns = max_turns or settings.CONVERSATION_MEMORY_MAX_TURNS
+        self._ttl = ttl or settings.CONVERSATION_MEMORY_TTL
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"{MEMORY_KEY_PREFIX}{session_id}"
+
+    async def load(self, session_id: str) -> ConversationHistory:
+        """会話履歴を古い順に取得"""
+        try:
+            raw_turns = await self._redis.lrange(
+                self._key(session_id), -self._max_turns, -1
+            )
+        except Exception as e:
+            # 履歴を取得できなくても会話は継続できるため例外は発生させない
+            logger.error(
+                "conversation_memory_load_error",
+                session_id=session_id,
+                error=str(e),
+                exc_info=True,
+            )
+            return ConversationHistory()
+
+        return ConversationHistory(
+            turns=self._deserialize_turns(session_id, raw_turns)
+        )
+
+    async def append(self, session_id: str, turn: ConversationTurn) -> None:
+        """会話履歴の末尾にターンを追加（上限を超えた古いターンは削除）"""
+        await self._push(session_id, turn)
+
+    async def clear(self, session_id: str) -> None:
+        """会話履歴を削除"""
+        try:
+            await self._redis.delete(self._key(session_id))
+        except Exception as e:
+            logger.error(
+                "conversation_memory_clear_error",
+                session_id=session_id,
+                error=str(e),
+                exc_info=True,
+            )
+
+    async def close(self) -> None:
+        """終了処理（共有クライアントはクローズしない）"""
+
+    async def _push(
+        self, session_id: str, turn: ConversationTurn, *touch_keys: str
+    ) -> int:
+        """
+        ターンを追加して追加後のリスト長を返す（失敗時は0）
+
+        touch_keysに指定したキーの有効期限も合わせて延長する
+        """
+        key = self._key(session_id)
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.rpush(key, serialize_turn(turn))
+                pipe.ltrim(key, -self._max_turns, -1)
+                pipe.expire(key, self._ttl)
+                for touch_key in touch_keys:
+                    pipe.expire(touch_key, self._ttl)
+                results = await pipe.execute()
+            return min(int(results[0]), self._max_turns)
+        except Exception as e:
+            logger.error(
+                "conversation_memory_append_error",
+                session_id=session_id,
+                error=str(e),
+                exc_info=True,
+            )
+            return 0
+
+    @staticmethod
+    def _deserialize_turns(
+        session_id: str, raw_turns: Sequence[str | bytes]
+    ) -> tuple[ConversationTurn, ...]:
+        """保存済みのターンを復元（壊れた要素は読み飛ばす）"""
+        turns: list[ConversationTurn] = []
+        for raw in raw_turns:
+            try:
+                turns.append(deserialize_turn(raw))
+            except (ValueError, TypeError) as e:
+                logger.warning(
+                    "conversation_memory_invalid_turn",
+                    session_id=session_id,
+                    error=str(e),
+                )
+        return tuple(turns)
+
+
+class SummaryBufferConversationMemory(RedisConversationMemory):
+    """
+    要約バッファ付きの会話履歴メモリ
+
+    直近buffer_turns件のターンはそのまま保持し、それより古いターンは
+    応答の返却後にバックグラウンドタスクでローリング要約に畳み込む。
+    要約はターンのリストと同じ有効期限で隣のキーに保存するため、
+    会話中は保存済みの要約と直近のターンを読むだけで済む。
+    畳み込みはRedisのセッションごとのロックで複数のワーカー間でも
+    1つに限り、削除は先頭のターンが変わっていない場合のみ行う。
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        summarizer: ConversationSummarizer,
+        *,
+        buffer_turns: int | None = None,
+        max_turns: int | None = None,
+        ttl: int | None = None,
+        lock_seconds: float | None = None,
+    ) -> None:
+        super().__init__(client, max_turns=max_turns, ttl=ttl)
+        self._summarizer = summarizer
+        self._buffer_turns = (
+            buffer_turns
+            if buffer_turns is not None
+            else settings.CONVERSATION_SUMMARY_BUFFER_TURNS
+        )
+        self._lock_ms = int(
+            (lock_seconds or settings.CONVERSATION_SUMMARY_LOCK_SECONDS) * 1000
+        )
+        self._fold_script = client.register_script(_FOLD_SCRIPT)
+        self._release_script = client.register_script(_RELEASE_SCRIPT)
+        # 実行中の要約タスク（終了時に待機する）
+        self._folding: set[asyncio.Task[None]] = set()
+
+    @staticmethod
+    def _summary_key(session_id: str) -> str:
+        return f"{SUMMARY_KEY_PREFIX}{session_id}"
+
+    @staticmethod
+    def _lock_key(session_id: str) -> str:
+        return f"{SUMMARY_LOCK_KEY_PREFIX}{session_id}"
+
+    async def load(self, session_id: str) -> ConversationHistory:
+        """要約と直近のターンを1往復で取得"""
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.get(self._summary_key(session_id))
+                pipe.lrange(self._key(session_id), -self._max_turns, -1)
+                summary, raw_turns = await pipe.execute()
+        except Exception as e:
+            logger.error(
+                "conversation_memory_load_error",
+                session_id=session_id,
+                error=str(e),
+                exc_info=True,
+            )
+            return ConversationHistory()
+
+        return ConversationHistory(
+            turns=self._deserialize_turns(session_id, raw_turns),
+            summary=summary or "",
+        )
+
+    async def append(self, session_id: str, turn: ConversationTurn) -> None:
+        """ターンを追加し、バッファを超えた分の要約をバックグラウンドで開始"""
+        length = await self._push(
+            session_id, turn, self._summary_key(session_id)
+        )
+        if length > self._buffer_turns:
+            self._schedule_fold(session_id)
+
+    async def clear(self, session_id: str) -> None:
+        """会話履歴と要約を削除"""
+        try:
+            await self._redis.delete(
+                self._key(session_id), self._summary_key(session_id)
+            )
+        except Exception as e:
+            logger.error(
+                "conversation_memory_clear_error",
+                session_id=session_id,
+                error=str(e),
+                exc_info=True,
+            )
+
+    async def close(self) -> None:
+        """実行中の要約タスクの完了を待機（タイムアウト後はキャンセル）"""
+        tasks = list(self._folding)
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(
+            tasks, timeout=settings.CONVERSATION_SUMMARY_DRAIN_TIMEOUT
+        )
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(
+                "conversation_summary_drain_timeout", cancelled=len(pending)
+            )
+
+    def _schedule_fold(self, session_id: str) -> None:
+        """要約タスクを開始（重複はRedisのロックで除く）"""
+        task = asyncio.create_task(self._fold(session_id))
+        self._folding.add(task)
+        task.add_done_callback(self._folding.discard)
+
+    async def _fold(self, session_id: str) -> None:
+        """
+        セッションのロックを取得して古いターンを要約に畳み込む
+
+        ほかのワーカーが要約中ならその要約に任せる（取り残したターンは
+        次の追加時に畳み込まれる）
+        """
+        lock_key = self._lock_key(session_id)
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self._redis.set(
+                lock_key, token, nx=True, px=self._lock_ms
+            )
+        except Exception as e:
+            logger.error(
+                "conversation_summary_lock_error",
+                session_id=session_id,
+                error=str(e),
+                exc_info=True,
+            )
+            return
+        if not acquired:
+            logger.debug("conversation_summary_locked", session_id=session_id)
+            return
+
+        try:
+            await self._fold_locked(session_id, token)
+        finally:
+            try:
+                await self._release_script(keys=[lock_key], args=[token])
+            except Exception as e:
+                # 解放できなくてもロックは有効期限で失効する
+                logger.warning(
+                    "conversation_summary_unlock_error",
+                    session_id=session_id,
+                    error=str(e),
+                )
+
+    async def _fold_locked(self, session_id: str, token: str) -> None:
+        """
+        バッファを超えた古いターンを要約に畳み込む
+
+        要約中に追加されたターンもバッファを超えていれば続けて畳み込む。
+        要約中に上限を超えて先頭が削除された場合は読み直して要約し直す。
+        """
+        conflicts = 0
+        while True:
+            history = await self.load(session_id)
+            overflow = len(history) - self._buffer_turns
+            if overflow <= 0:
+                return
+
+            try:
+                summary = await self._summarizer.summarize(
+                    history.summary, history.turns[:overflow]
+                )
+                if not summary:
+                    return
+
+                # 追加は末尾にのみ行われるため、先頭が同じなら
+                # 先頭から畳み込んだ件数を削除すればよい
+                saved = await self._fold_script(
+                    keys=[
+                        self._key(session_id),
+                        self._summary_key(session_id),
+                        self._lock_key(session_id),
+                    ],
+                    args=[
+                        serialize_turn(history.turns[0]),
+                        overflow,
+                        summary,
+                        self._ttl,
+                        token,
+                    ],
+                )
+            except Exception as e:
+                # 失敗してもターンは残るため、次回の追加時に再試行される
+                logger.error(
+                    "conversation_summary_fold_error",
+                    session_id=session_id,
+                    error=str(e),
+                    exc_info=True,
+                )
+                return
+
+            if saved == -1:
+                # ロックが失効し、ほかのワーカーが要約している
+                logger.warning(
+                    "conversation_summary_lock_lost", session_id=session_id
+                )
+                return
+            if saved == 0:
+                conflicts += 1
+                logger.info(
+                    "conversation_summary_fold_conflict",
+                    session_id=session_id,
+                    conflicts=conflicts,
+                )
+                if conflicts >= _FOLD_MAX_CONFLICTS:
+                    return
+                continue
+
+            logger.debug(
+                "conversation_summary_folded",
+                session_id=session_id,
+                folded_turns=overflow,
+                summary_length=len(summary),
+            )
@@ -0,0 +1,332 @@
+"""BM25とベクトル検索を順位融合する会話のハイブリッド検索"""
+
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+import time
+
+from app.domain.entities.conversation import Conversation
+from app.domain.services import IConversationSearchIndex
+from app.domain.value_objects.conversation_search import (
+    ConversationSearchHit,
+    ConversationSearchPage,
+)
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+from app.infrastructure.services.bm25_index import BM25Index
+from app.infrastructure.services.embedding_worker import (
+    BackfillCheckpoint,
+    EmbeddingIngestionWorker,
+    IngestionDocument,
+)
+from app.infrastructure.services.retriever import InProcessRetriever
+
+logger = get_logger(__name__)
+
+# ユーザー・セッションで絞り込む場合にベクトル検索で多めに取る倍率
+_FILTERED_SEARCH_FACTOR = 20
+
+# 指定したIDより後の会話をID順に最大limit件読む関数
+ConversationPageFetcher = Callable[[int, int], Awaitable[list[Conversation]]]
+
+
+@dataclass(frozen=True)
+class _Entry:
+    """絞り込みと同順位の並べ替えに使う会話の属性"""
+
+    user_id: str
+    session_id: str
+    created_at: float
+
+
+def conversation_text(conversation: Conversation) -> str:
+    """検索対象のテキスト（メッセージとレスポンス）"""
+    if conversation.response:
+        return f"{conversation.message}\n{conversation.response}"
+    return conversation.message
+
+
+class HybridConversationSearch(IConversationSearchIndex):
+    """
+    BM25（文字n-gram）とベクトル類似度を順位融合する会話検索
+
+    キーワード検索とベクトル検索それぞれの上位candidates件の順位から
+    Reciprocal Rank Fusion（1 / (rrf_k + 順位) の和）でスコアを付ける。
+    表記が一致する会話と言い換えの会話の両方を拾い、どちらか一方の
+    スコアの尺度に引きずられない。
+
+    検索結果は会話IDのみを返す
+    （表示する本文は呼び出し側がページ分だけデータベースから読む）。
+
+    ベクトルはretriever（文書IDは会話ID）に格納する。workerを指定した
+    場合、indexはBM25への追加のみを行って埋め込みをworkerに任せるため、
+    会話の保存が埋め込みの計算を待たない（埋め込み済みになるまでは
+    キーワード検索のみで見つかる）。
+
+    索引はプロセスごとに持つため、ほかのワーカーが保存した会話は含まない。
+    readyはbackfillが最後まで読み込んだ後にTrueになる。
+    """
+
+    def __init__(
+        self,
+        retriever: InProcessRetriever,
+        *,
+        worker: EmbeddingIngestionWorker | None = None,
+        candidates: int | None = None,
+        rrf_k: int | None = None,
+    ) -> None:
+        self._retriever = retriever
+        self._worker = worker
+        self._candidates = (
+            candidates or settings.CONVERSATION_SEARCH_CANDIDATES
+        )
+        self._rrf_k = rrf_k or settings.CONVERSATION_SEARCH_RRF_K
+
+        self._bm25 = BM25Index(
+            k1=settings.CONVERSATION_SEARCH_BM25_K1,
+            b=settings.CONVERSATION_SEARCH_BM25_B,
+        )
+        self._entries: dict[int, _Entry] = {}
+        self._ready = False
+
+        self._searches = 0
+        self._search_seconds = 0.0
+
+    @property
+    def ready(self) -> bool:
+        """保存済みの会話を読み込み終えたか"""
+        return self._ready
+
+    async def index(self, conversations: list[Conversation]) -> None:
+        """会話を索引に追加（同じIDの会話は置き換える）"""
+        documents = self._index_text(conversations)
+        if not documents:
+            return
+        if self._worker is None:
+            await self._retriever.ingest_many(documents)
+            return
+        for doc_id, text, metadata in documents:
+            self._worker.submit(doc_id, text, metadata)
+
+    async def backfill(
+        self,
+        fetch_page: ConversationPageFetcher,
+        checkpoint: BackfillCheckpoint,
+        *,
+        batch_size: int | None = None,
+    ) -> int:
+        """
+        保存済みの会話をID順に読み込んで索引に追加
+
+        BM25は全件に作り直し、埋め込みはチェックポイントより後の会話
+        のみ計算する。ページごとに埋め込みの書き込みを待ってから
+        チェックポイントを進めるため、途中で止まっても続きから再開できる。
+        書き込めなかった文書があるページからはチェックポイントを進めず、
+        次回のバックフィルでそのページから埋め込み直す。
+
+        Returns:
+            読み込んだ会話数
+        """
+        batch_size = batch_size or settings.CONVERSATION_SEARCH_LOAD_BATCH
+        embedded_until = checkpoint.load()
+        last_id = 0
+        loaded = 0
+        # 書き込めなかったページ以降はチェックポイントを進めない
+        stalled = False
+        while True:
+            conversations = await fetch_page(last_id, batch_size)
+            if not conversations:
+                break
+            documents = [
+                document
+                for document in self._index_text(conversations)
+                if int(document[0]) > embedded_until
+            ]
+            if documents:
+                if self._worker is None:
+                    await self._retriever.ingest_many(documents)
+                else:
+                    failed = self._worker.failed
+                    await self._worker.put(documents)
+                    await self._worker.drain()
+                    if self._worker.failed > failed and not stalled:
+                        stalled = True
+                        logger.warning(
+                            "conversation_search_backfill_page_failed",
+                            first_id=documents[0][0],
+                            last_id=documents[-1][0],
+                            checkpoint=embedded_until,
+                        )
+            last_id = conversations[-1].id or last_id
+            loaded += len(conversations)
+            if not stalled and last_id > embedded_until:
+                embedded_until = last_id
+                checkpoint.save(embedded_until)
+        # BM25は全件そろったため、埋め込みが遅れていても検索に使える
+        self._ready = True
+        logger.info(
+            "conversation_search_backfilled",
+            conversations=loaded,
+            checkpoint=embedded_until,
+            stalled=stalled,
+        )
+        return loaded
+
+    async def remove(self, conversation_id: int) -> None:
+        """会話を索引から削除"""
+        self._entries.pop(conversation_id, None)
+        self._bm25.remove(conversation_id)
+        await self._retriever.remove(str(conversation_id))
+
+    async def search(
+        self,
+        query: str,
+        *,
+        user_id: str | None = None,
+        session_id: str | None = None,
+        limit: int = 10,
+        offset: int = 0,
+    ) -> ConversationSearchPage:
+        """
+        クエリに関連する会話を関連度の高い順に取得
+
+        クエリが空の場合は新しい順に取得する
+        """
+        started = time.perf_counter()
+
+        def matches(conversation_id: int) -> bool:
+            entry = self._entries.get(conversation_id)
+            return (
+                entry is not None
+                and (user_id is None or entry.user_id == user_id)
+                and (session_id is None or entry.session_id == session_id)
+            )
+
+        if not query.strip():
+            ordered = sorted(
+                filter(matches, self._entries), key=self._recency, reverse=True
+            )
+            scores = dict.fromkeys(ordered, 0.0)
+        else:
+            depth = max(self._candidates, offset + limit)
+            keyword = [
+                conversation_id
+                for conversation_id, _ in self._bm25.search(
+                    query, limit=depth, predicate=matches
+                )
+            ]
+            semantic = await self._semantic_search(
+                query,
+                depth,
+                matches,
+                filtered=user_id is not None or session_id is not None,
+            )
+            # 埋め込みの計算中に削除された会話は除く
+            scores = {
+                c: score
+                for c, score in self._fuse([keyword, semantic]).items()
+                if c in self._entries
+            }
+            ordered = sorted(
+                scores,
+                key=lambda c: (scores[c], *self._recency(c)),
+                reverse=True,
+            )
+
+        hits = [
+            ConversationSearchHit(conversation_id=c, score=scores[c])
+            for c in ordered[offset : offset + limit]
+        ]
+        elapsed = time.perf_counter() - started
+        self._searches += 1
+        self._search_seconds += elapsed
+        logger.debug(
+            "conversation_search_searched",
+            results=len(hits),
+            total=len(ordered),
+            elapsed_ms=round(elapsed * 1000, 3),
+        )
+        return ConversationSearchPage(hits=hits, total=len(ordered))
+
+    async def close(self) -> None:
+        """埋め込み待ちの会話を処理してから停止"""
+        if self._worker is not None:
+            await self._worker.close()
+        await self._retriever.close()
+
+    def stats(self) -> dict[str, object]:
+        """索引の件数・平均検索時間・埋め込みの取り込み状況を取得"""
+        stats: dict[str, object] = {
+            "ready": self._ready,
+            "conversations": len(self._entries),
+            "terms": self._bm25.stats()["terms"],
+            "vectors": self._retriever.stats()["vectors"],
+            "searches": self._searches,
+            "avg_search_ms": (
+                round(self._search_seconds / self._searches * 1000, 3)
+                if self._searches
+                else 0.0
+            ),
+        }
+        if self._worker is not None:
+            stats["ingestion"] = self._worker.stats()
+        return stats
+
+    async def _semantic_search(
+        self,
+        query: str,
+        depth: int,
+        matches: Callable[[int], bool],
+        *,
+        filtered: bool,
+    ) -> list[int]:
+        """クエリの埋め込みに近い会話IDを類似度の高い順に取得"""
+        k = depth * _FILTERED_SEARCH_FACTOR if filtered else depth
+        results: list[int] = []
+        # 長い会話は複数のチャンクになるため、最も近いチャンクの順位を使う
+        seen: set[int] = set()
+        for passage in await self._retriever.search(query, k):
+            conversation_id = int(passage.doc_id)
+            if conversation_id in seen or not matches(conversation_id):
+                continue
+            seen.add(conversation_id)
+            results.append(conversation_id)
+            if len(results) >= depth:
+                break
+        return results
+
+    def _fuse(self, rankings: list[list[int]]) -> dict[int, float]:
+        """Reciprocal Rank Fusionで複数の順位を1つのスコアにまとめる"""
+        scores: dict[int, float] = {}
+        for ranking in rankings:
+            for rank, conversation_id in enumerate(ranking, start=1):
+                scores[conversation_id] = scores.get(
+                    conversation_id, 0.0
+                ) + 1 / (self._rrf_k + rank)
+        return scores
+
+    def _recency(self, conversation_id: int) -> tuple[float, int]:
+        """同じスコアの会話は新しい順（作成日時、ID）に並べる"""
+        return self._entries[conversation_id].created_at, conversation_id
+
+    def _index_text(
+        self, conversations: list[Conversation]
+    ) -> list[IngestionDocument]:
+        """BM25と絞り込み用の属性を更新し、埋め込む文書を返す"""
+        documents: list[IngestionDocument] = []
+        for conversation in conversations:
+            conversation_id = conversation.id
+            if conversation_id is None:
+                continue
+            text = conversation_text(conversation)
+            self._bm25.add(conversation_id, text)
+            self._entries[conversation_id] = _Entry(
+                user_id=conversation.user_id,
+                session_id=conversation.session_id,
+                created_at=(
+                    conversation.created_at.timestamp()
+                    if conversation.created_at
+                    else time.time()
+                ),
+            )
+            documents.append((str(conversation_id), text, None))
+        return documents
@@ -0,0 +1,65 @@
+"""会話要約サービス実装"""
+
+from collections.abc import Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.domain.services.context_window import render_context
+from app.domain.value_objects.conversation_turn import ConversationTurn
+from app.infrastructure.config import settings
+from app.infrastructure.services.chunk_utils import normalize_chunk_content
+from app.infrastructure.services.llm_factory import create_chat_model
+
+SUMMARY_SYSTEM_PROMPT = (
+    "あなたは会話の要約を作成するアシスタントです。"
+    "これまでの要約と新しい会話を統合し、以降の会話に必要な事実・"
+    "ユーザーの要望・決定事項を残した簡潔な要約を作成してください。"
+    "要約は{max_chars}文字以内とし、要約本文のみを出力してください。"
+)
+
+SUMMARY_HUMAN_PROMPT = (
+    "これまでの要約:\n{summary}\n\n新しい会話:\n{conversation}"
+)
+
+
+class ConversationSummarizer:
+    """古い会話ターンをローリング要約に畳み込むサマライザー"""
+
+    def __init__(
+        self,
+        llm: BaseChatModel | None = None,
+        *,
+        max_chars: int | None = None,
+    ) -> None:
+        self._llm = llm or create_chat_model(temperature=0.0)
+        self._max_chars = max_chars or settings.CONVERSATION_SUMMARY_MAX_CHARS
+        self._prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", SUMMARY_SYSTEM_PROMPT),
+                ("human", SUMMARY_HUMAN_PROMPT),
+            ]
+        )
+
+    async def summarize(
+        self, summary: str, turns: Sequence[ConversationTurn]
+    ) -> str:
+        """
+        既存の要約に会話ターンを畳み込んだ新しい要約を作成
+
+        Args:
+            summary: これまでの要約（初回は空文字列）
+            turns: 要約に畳み込む古い順のターン
+
+        Returns:
+            新しい要約
+        """
+        chain = self._prompt | self._llm
+        response = await chain.ainvoke(
+            {
+                "max_chars": self._max_chars,
+                "summary": summary or "（なし）",
+                "conversation": render_context(turns),
+            }
+        )
+        return normalize_chunk_content(response.content).strip()
@@ -0,0 +1,259 @@
+"""埋め込みサービス実装"""
+
+from abc import abstractmethod
+import asyncio
+from collections import OrderedDict
+import hashlib
+import re
+import unicodedata
+import zlib
+
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import numpy as np
+from numpy.typing import NDArray
+from pydantic import SecretStr
+
+from app.domain.services import IEmbeddingService
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+# ひらがな・カタカナ・CJK統合漢字・半角カナ
+_CJK_RUN_RE = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f]+"
+)
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# この文字数を超えるバッチはイベントループを塞がないようスレッドで計算
+_INLINE_CHARS_LIMIT = 2000
+
+
+def normalize_vectors(vectors: NDArray[np.float32]) -> NDArray[np.float32]:
+    """行ベクトルをL2正規化（ゼロベクトルはそのまま）"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return np.asarray(vectors / norms, dtype=np.float32)
+
+
+class EmbeddingService(IEmbeddingService):
+    """
+    埋め込みサービスの基底クラス
+
+    NumPy配列で埋め込みを扱う`embed_array`を提供する。
+    返すベクトルはL2正規化済みのため、内積がそのままコサイン類似度になる。
+    semanticがFalseの埋め込みは文字の特徴の一致を表すのみで、意味の
+    近さを表さない（検索の候補には使えるが、回答の再利用には使えない）。
+    """
+
+    @property
+    def semantic(self) -> bool:
+        """意味の類似度を表す埋め込みか"""
+        return True
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """テキストのリストを埋め込みベクトルのリストに変換"""
+        vectors = await self.embed_array(texts)
+        result: list[list[float]] = vectors.tolist()
+        return result
+
+    @abstractmethod
+    async def embed_array(self, texts: list[str]) -> NDArray[np.float32]:
+        """テキストのリストを正規化済みの埋め込み行列（N×次元）に変換"""
+        pass
+
+
+class HashingEmbeddingService(EmbeddingService):
+    """
+    ローカルCPUで動作するハッシュ埋め込み
+
+    文字n-gram（日本語）と単語・文字3-gram（英数字）を
+    feature hashingで固定次元に射影する。外部APIやモデルのダウンロードが
+    不要で、プロセス間で同じテキストから同じベクトルが得られる。
+    類似度は字面の近さのため、1語だけ違う別の質問も高い値になる。
+    """
+
+    def __init__(self, dimension: int | None = None) -> None:
+        self._dimension = dimension or settings.LOCAL_EMBEDDING_DIMENSION
+
+    @property
+    def dimension(self) -> int:
+        """埋め込みベクトルの次元数"""
+        return self._dimension
+
+    @property
+    def semantic(self) -> bool:
+        """字面の近さを表す埋め込み（意味の類似度ではない）"""
+        return False
+
+    async def embed_array(self, texts: list[str]) -> NDArray[np.float32]:
+        """テキストのリストを正規化済みの埋め込み行列に変換"""
+        if sum(len(text) for text in texts) <= _INLINE_CHARS_LIMIT:
+            return self.embed_sync(texts)
+        return await asyncio.to_thread(self.embed_sync, texts)
+
+    def embed_sync(self, texts: list[str]) -> NDArray[np.float32]:
+        """同期版の埋め込み計算"""
+        vectors = np.zeros((len(texts), self._dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vectors[row] = self._embed_one(text)
+        return normalize_vectors(vectors)
+
+    def _embed_one(self, text: str) -> NDArray[np.float32]:
+        """1件のテキストをハッシュ埋め込みに変換"""
+        hashes = [
+            zlib.crc32(feature.encode("utf-8"))
+            for feature in self._features(text)
+        ]
+        if not hashes:
+            return np.zeros(self._dimension, dtype=np.float32)
+
+        values = np.asarray(hashes, dtype=np.uint32)
+        indices = (values % self._dimension).astype(np.intp)
+        # 最上位ビットで符号を決め、ハッシュ衝突の偏りを打ち消す
+        signs = np.where(values >> 31, -1.0, 1.0)
+        counts = np.bincount(indices, weights=signs, minlength=self._dimension)
+        # 出現回数はサブリニアに効かせる
+        return np.asarray(
+            np.sign(counts) * np.log1p(np.abs(counts)), dtype=np.float32
+        )
+
+    @staticmethod
+    def _features(text: str) -> list[str]:
+        """テキストから特徴量（n-gram）を抽出"""
+        normalized = unicodedata.normalize("NFKC", text).casefold()
+        features: list[str] = []
+
+        for run in _CJK_RUN_RE.findall(normalized):
+            features.extend(f"u:{char}" for char in run)
+            features.extend(f"b:{run[i : i + 2]}" for i in range(len(run) - 1))
+
+        for word in _WORD_RE.findall(_CJK_RUN_RE.sub(" ", normalized)):
+            features.append(f"w:{word}")
+            padded = f"#{word}#"
+            features.extend(
+                f"t:{padded[i : i + 3]}" for i in range(len(padded) - 2)
+            )
+
+        return features
+
+
+class GoogleEmbeddingService(EmbeddingService):
+    """Google AI Studioの埋め込みモデルを使用する埋め込みサービス"""
+
+    def __init__(self) -> None:
+        self._model_name = settings.GOOGLE_EMBEDDING_MODEL
+        self._dimension = settings.GOOGLE_EMBEDDING_DIMENSION
+        self._embeddings = GoogleGenerativeAIEmbeddings(
+            model=self._model_name,
+            google_api_key=SecretStr(settings.GOOGLE_AI_API_KEY),
+        )
+        logger.info(
+            "google_embedding_service_initialized",
+            model_name=self._model_name,
+        )
+
+    @property
+    def dimension(self) -> int:
+        """埋め込みベクトルの次元数"""
+        return self._dimension
+
+    async def embed_array(self, texts: list[str]) -> NDArray[np.float32]:
+        """テキストのリストを正規化済みの埋め込み行列に変換"""
+        if not texts:
+            return np.zeros((0, self._dimension), dtype=np.float32)
+        vectors = await self._embeddings.aembed_documents(texts)
+        return normalize_vectors(np.asarray(vectors, dtype=np.float32))
+
+
+class CachedEmbeddingService(EmbeddingService):
+    """
+    内容のハッシュで埋め込みを再利用する埋め込みサービス
+
+    テキストのハッシュをキーにベクトルをプロセス内のLRUに保持し、
+    キャッシュにないテキストだけを重複を除いて内側のサービスに渡す。
+    同じ定型文や同じクエリを何度も埋め込む呼び出しを省く。
+    """
+
+    def __init__(
+        self, inner: EmbeddingService, max_entries: int | None = None
+    ) -> None:
+        self._inner = inner
+        self._max_entries = max_entries or settings.EMBEDDING_CACHE_MAX_ENTRIES
+        self._cache: OrderedDict[bytes, NDArray[np.float32]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._deduplicated = 0
+
+    @property
+    def dimension(self) -> int:
+        """埋め込みベクトルの次元数"""
+        return self._inner.dimension
+
+    @property
+    def semantic(self) -> bool:
+        """内側の埋め込みが意味の類似度を表すか"""
+        return self._inner.semantic
+
+    async def embed_array(self, texts: list[str]) -> NDArray[np.float32]:
+        """テキストのリストを正規化済みの埋め込み行列に変換"""
+        result = np.empty((len(texts), self.dimension), dtype=np.float32)
+        # キャッシュにないテキストのハッシュ -> 結果の行番号
+        missing: dict[bytes, list[int]] = {}
+        for row, text in enumerate(texts):
+            key = hashlib.blake2b(
+                text.encode("utf-8"), digest_size=16
+            ).digest()
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                result[row] = vector
+                self._hits += 1
+            else:
+                missing.setdefault(key, []).append(row)
+        if not missing:
+            return result
+
+        unique = [texts[rows[0]] for rows in missing.values()]
+        vectors = await self._inner.embed_array(unique)
+        for (key, rows), vector in zip(missing.items(), vectors, strict=True):
+            result[rows] = vector
+            self._cache[key] = vector.copy()
+            self._cache.move_to_end(key)
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+        self._misses += len(unique)
+        self._deduplicated += sum(len(rows) - 1 for rows in missing.values())
+        return result
+
+    def stats(self) -> dict[str, int | float]:
+        """キャッシュの件数とヒット率を取得"""
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._cache),
+            "max_entries": self._max_entries,
+            "hits": self._hits,
+            "misses": self._misses,
+            "deduplicated": self._deduplicated,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def create_embedding_service() -> EmbeddingService:
+    """
+    設定（EMBEDDING_BACKEND）に応じた埋め込みサービスを作成
+
+    EMBEDDING_CACHE_MAX_ENTRIESが正の場合は内容のハッシュによる
+    キャッシュを被せる
+    """
+    backend = settings.EMBEDDING_BACKEND
+    service: EmbeddingService
+    if backend == "google":
+        service = GoogleEmbeddingService()
+    else:
+        if backend != "local":
+            logger.warning("unknown_embedding_backend", backend=backend)
+        service = HashingEmbeddingService()
+    if settings.EMBEDDING_CACHE_MAX_ENTRIES > 0:
+        return CachedEmbeddingService(service)
+    return service
@@ -0,0 +1,294 @@
+"""チャットの処理の外で埋め込みを計算する取り込みワーカー"""
+
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable, Sequence
+import contextlib
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+import time
+from typing import Any
+
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 取り込む文書 (ID, 本文, メタデータ)
+IngestionDocument = tuple[str, str, dict[str, Any] | None]
+
+# 文書をまとめて索引に書き込む関数（InProcessRetriever.ingest_many）
+IngestionSink = Callable[[Sequence[IngestionDocument]], Awaitable[int]]
+
+# 再試行の待ち時間の初期値（試行ごとに倍にする）
+_RETRY_BACKOFF_SECONDS = 0.5
+
+
+@dataclass(frozen=True)
+class _Pending:
+    """キューに入っている文書"""
+
+    document: IngestionDocument
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class EmbeddingIngestionWorker:
+    """
+    文書をキューに溜め、まとめて埋め込んで索引に書き込むワーカー
+
+    submitはキューに積むだけで戻り、埋め込みの計算と索引への書き込みは
+    裏のタスクがbatch_size件ずつ（または最初の1件からmax_wait_ms経った
+    時点で）まとめて行う。失敗したバッチは間隔を倍にしながら再試行し、
+    それでも失敗した文書は捨てて件数を記録する。
+
+    チャットの処理を待たせないよう、submitはキューがmax_queueに達して
+    いれば文書を捨てて件数を記録する。バックフィルはputで空きを待つ。
+    """
+
+    def __init__(
+        self,
+        sink: IngestionSink,
+        *,
+        batch_size: int | None = None,
+        max_wait_ms: int | None = None,
+        max_queue: int | None = None,
+        max_retries: int | None = None,
+    ) -> None:
+        self._sink = sink
+        self._batch_size = batch_size or settings.EMBEDDING_WORKER_BATCH_SIZE
+        self._max_wait = (
+            max_wait_ms
+            if max_wait_ms is not None
+            else settings.EMBEDDING_WORKER_MAX_WAIT_MS
+        ) / 1000
+        self._max_queue = max_queue or settings.EMBEDDING_WORKER_MAX_QUEUE
+        self._max_retries = (
+            max_retries
+            if max_retries is not None
+            else settings.EMBEDDING_WORKER_MAX_RETRIES
+        )
+
+        self._queue: deque[_Pending] = deque()
+        self._wakeup = asyncio.Event()
+        # キューが空で処理中のバッチもない
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: asyncio.Task[None] | None = None
+
+        self._started_at = time.monotonic()
+        self._submitted = 0
+        self._processed = 0
+        self._embedded_chunks = 0
+        self._failed = 0
+        self._dropped = 0
+        self._batches = 0
+        self._busy_seconds = 0.0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def submit(
+        self,
+        doc_id: str,
+        text: str,
+        metadata: dict[str, Any] | None = None,
+    ) -> bool:
+        """文書をキューに積む（キューが一杯の場合は捨ててFalse）"""
+        if len(self._queue) >= self._max_queue:
+            self._dropped += 1
+            logger.warning(
+                "embedding_worker_dropped",
+                doc_id=doc_id,
+                queued=len(self._queue),
+                dropped=self._dropped,
+            )
+            return False
+        self._enqueue([(doc_id, text, metadata)])
+        return True
+
+    async def put(self, documents: Sequence[IngestionDocument]) -> None:
+        """文書をキューに積む（一杯の場合は空くまで待つ）"""
+        for start in range(0, len(documents), self._max_queue):
+            while len(self._queue) >= self._max_queue:
+                await self.drain()
+            self._enqueue(documents[start : start + self._max_queue])
+
+    @property
+    def failed(self) -> int:
+        """再試行しても書き込めずに捨てた文書の数"""
+        return self._failed
+
+    async def drain(self) -> None:
+        """キューに積んだ文書の処理が終わるまで待つ"""
+        await self._idle.wait()
+
+    def start(self) -> None:
+        """ワーカーのタスクを開始（開始済みであれば何もしない）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float | None = None) -> None:
+        """残りの文書をtimeout秒まで処理してから停止"""
+        if self._task is None:
+            return
+        timeout = (
+            timeout
+            if timeout is not None
+            else settings.EMBEDDING_WORKER_SHUTDOWN_TIMEOUT_SECONDS
+        )
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self.drain(), timeout)
+        if self._queue:
+            logger.warning(
+                "embedding_worker_closed_with_pending", queued=len(self._queue)
+            )
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> dict[str, int | float]:
+        """処理件数・スループット・遅延を取得"""
+        oldest = self._queue[0].enqueued_at if self._queue else None
+        return {
+            "queued": len(self._queue),
+            "submitted": self._submitted,
+            "processed": self._processed,
+            "embedded_chunks": self._embedded_chunks,
+            "failed": self._failed,
+            "dropped": self._dropped,
+            "batches": self._batches,
+            "avg_batch_size": (
+                round(self._processed / self._batches, 2)
+                if self._batches
+                else 0.0
+            ),
+            # 埋め込みと書き込みにかかった時間あたりの処理件数
+            "docs_per_second": (
+                round(self._processed / self._busy_seconds, 2)
+                if self._busy_seconds
+                else 0.0
+            ),
+            "uptime_docs_per_second": round(
+                self._processed / (time.monotonic() - self._started_at), 2
+            ),
+            # キューの先頭の文書が待っている時間
+            "lag_seconds": (
+                round(time.monotonic() - oldest, 3)
+                if oldest is not None
+                else 0.0
+            ),
+            # 積んでから索引に書き込むまでの時間（直近のバッチの最大値）
+            "last_lag_ms": round(self._last_lag * 1000, 3),
+            "max_lag_ms": round(self._max_lag * 1000, 3),
+        }
+
+    def _enqueue(self, documents: Sequence[IngestionDocument]) -> None:
+        if not documents:
+            return
+        self._queue.extend(_Pending(document) for document in documents)
+        self._submitted += len(documents)
+        self._idle.clear()
+        self._wakeup.set()
+        self.start()
+
+    async def _run(self) -> None:
+        while True:
+            if not self._queue:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # バッチが埋まらなければ最初の1件からmax_waitまで待って詰める
+            if len(self._queue) < self._batch_size:
+                delay = (
+                    self._queue[0].enqueued_at
+                    + self._max_wait
+                    - time.monotonic()
+                )
+                if delay > 0:
+                    self._wakeup.clear()
+                    with contextlib.suppress(TimeoutError):
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    continue
+
+            batch = [
+                self._queue.popleft()
+                for _ in range(min(self._batch_size, len(self._queue)))
+            ]
+            await self._process(batch)
+
+    async def _process(self, batch: list[_Pending]) -> None:
+        """バッチを索引に書き込む"""
+        started = time.monotonic()
+        chunks = await self._write([pending.document for pending in batch])
+        finished = time.monotonic()
+        self._busy_seconds += finished - started
+        if chunks is None:
+            self._failed += len(batch)
+            return
+
+        self._last_lag = finished - batch[0].enqueued_at
+        self._max_lag = max(self._max_lag, self._last_lag)
+        self._processed += len(batch)
+        self._embedded_chunks += chunks
+        self._batches += 1
+        logger.debug(
+            "embedding_worker_batch_processed",
+            documents=len(batch),
+            chunks=chunks,
+            lag_ms=round(self._last_lag * 1000, 3),
+        )
+
+    async def _write(self, documents: list[IngestionDocument]) -> int | None:
+        """失敗したら間隔を倍にしながら再試行（諦めた場合はNone）"""
+        for attempt in range(self._max_retries + 1):
+            try:
+                return await self._sink(documents)
+            except Exception as e:
+                if attempt == self._max_retries:
+                    logger.warning(
+                        "embedding_worker_batch_failed",
+                        documents=len(documents),
+                        attempts=attempt + 1,
+                        error=str(e),
+                        exc_info=True,
+                    )
+                    break
+                await asyncio.sleep(_RETRY_BACKOFF_SECONDS * 2**attempt)
+        return None
+
+
+class BackfillCheckpoint:
+    """
+    バックフィルで処理済みの最後の会話ID
+
+    pathを指定した場合はJSONファイルに保存し、再起動後はその続きから
+    処理する（書き込みは一時ファイルの置き換えで行う）
+    """
+
+    def __init__(self, path: Path | str | None = None) -> None:
+        self._path = Path(path) if path is not None else None
+        self._last_id = 0
+
+    def load(self) -> int:
+        """保存済みの最後の会話IDを読む（なければ0）"""
+        if self._path is not None and self._path.exists():
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+            self._last_id = int(data.get("last_id", 0))
+        return self._last_id
+
+    def save(self, last_id: int) -> None:
+        """最後の会話IDを保存"""
+        self._last_id = last_id
+        if self._path is None:
+            return
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        # 複数のワーカープロセスが同時に書いても壊れないよう置き換える
+        tmp = self._path.with_name(f".{self._path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"last_id": last_id}), encoding="utf-8")
+        os.replace(tmp, self._path)
@@ -0,0 +1,280 @@
+"""オフライン計測用の決定的なフェイクLLM"""
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator, Iterator
+from dataclasses import dataclass
+import random
+import time
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import (
+    ChatGeneration,
+    ChatGenerationChunk,
+    ChatResult,
+)
+from pydantic import ConfigDict, PrivateAttr
+
+from app.domain.services import IAIService
+from app.domain.services.context_window import render_history
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+from app.infrastructure.services.chunk_utils import normalize_chunk_content
+
+logger = get_logger(__name__)
+
+# フェイクの応答に使う語彙（1語を1トークンとして扱う）
+_VOCABULARY = (
+    "はい",
+    "それでは",
+    "ご質問",
+    "について",
+    "説明",
+    "します",
+    "。",
+    "まず",
+    "次に",
+    "最後に",
+    "、",
+    "ポイント",
+    "は",
+    "です",
+    "例えば",
+    "the",
+    "answer",
+    "is",
+)
+
+
+class FakeLLMError(RuntimeError):
+    """フェイクLLMが注入したエラー"""
+
+
+@dataclass(frozen=True)
+class FakeLLMProfile:
+    """
+    フェイクLLMのレイテンシ・出力のプロファイル
+
+    最初のチャンクまでttft_seconds待ち、以降はchunk_tokensトークンずつ
+    tokens_per_secondの速度で合計response_tokensトークンを返す。
+    error_rateの確率で最初のチャンクの前に失敗する。
+    """
+
+    ttft_seconds: float = 0.0
+    tokens_per_second: float = 0.0  # 0以下は待機なし
+    chunk_tokens: int = 4
+    response_tokens: int = 64
+    error_rate: float = 0.0
+    seed: int = 0
+
+    @classmethod
+    def from_settings(cls) -> "FakeLLMProfile":
+        """設定（FAKE_LLM_*）からプロファイルを作成"""
+        return cls(
+            ttft_seconds=settings.FAKE_LLM_TTFT_SECONDS,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+            chunk_tokens=settings.FAKE_LLM_CHUNK_TOKENS,
+            response_tokens=settings.FAKE_LLM_RESPONSE_TOKENS,
+            error_rate=settings.FAKE_LLM_ERROR_RATE,
+            seed=settings.FAKE_LLM_SEED,
+        )
+
+    @property
+    def chunk_interval(self) -> float:
+        """チャンク間の待機秒数"""
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return self.chunk_tokens / self.tokens_per_second
+
+    def chunks(self, prompt: str) -> list[str]:
+        """プロンプトから決定的に応答のチャンクを作成"""
+        rng = random.Random(f"{self.seed}:{prompt}")
+        tokens = [rng.choice(_VOCABULARY) for _ in range(self.response_tokens)]
+        size = max(self.chunk_tokens, 1)
+        return [
+            "".join(tokens[i : i + size]) for i in range(0, len(tokens), size)
+        ]
+
+
+class _FakeStream:
+    """プロファイルに従ってチャンクを返すストリーム（エラー注入の乱数を保持）"""
+
+    def __init__(self, profile: FakeLLMProfile) -> None:
+        self._profile = profile
+        # エラー注入は呼び出し順に対して決定的
+        self._rng = random.Random(profile.seed)
+
+    def _check_error(self) -> None:
+        if self._rng.random() < self._profile.error_rate:
+            raise FakeLLMError("フェイクLLMのエラー注入")
+
+    def iterate(self, prompt: str) -> Iterator[str]:
+        """同期でチャンクを返す"""
+        self._check_error()
+        time.sleep(self._profile.ttft_seconds)
+        for i, chunk in enumerate(self._profile.chunks(prompt)):
+            if i:
+                time.sleep(self._profile.chunk_interval)
+            yield chunk
+
+    async def aiterate(self, prompt: str) -> AsyncGenerator[str, None]:
+        """非同期でチャンクを返す"""
+        self._check_error()
+        await asyncio.sleep(self._profile.ttft_seconds)
+        for i, chunk in enumerate(self._profile.chunks(prompt)):
+            if i:
+                await asyncio.sleep(self._profile.chunk_interval)
+            yield chunk
+
+
+def _prompt_text(messages: list[BaseMessage]) -> str:
+    """応答を決めるプロンプト（全メッセージの内容を連結）"""
+    return "\n".join(normalize_chunk_content(m.content) for m in messages)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    ChatGoogleGenerativeAIの代わりに使うフェイクのチャットモデル
+
+    LangGraphやサマライザーの経路をそのまま通し、APIキーなしで
+    サーバー側のオーバーヘッドを計測するために使う
+    """
+
+    model_name: str = "fake"
+    latency_profile: FakeLLMProfile = FakeLLMProfile()
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    _stream_source: _FakeStream | None = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def _source(self) -> _FakeStream:
+        if self._stream_source is None:
+            self._stream_source = _FakeStream(self.latency_profile)
+        return self._stream_source
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = "".join(self._source.iterate(_prompt_text(messages)))
+        return ChatResult(
+            generations=[ChatGeneration(message=self._reply(text))]
+        )
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        chunks = [
+            chunk
+            async for chunk in self._source.aiterate(_prompt_text(messages))
+        ]
+        return ChatResult(
+            generations=[ChatGeneration(message=self._reply("".join(chunks)))]
+        )
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for chunk in self._source.iterate(_prompt_text(messages)):
+            generation = ChatGenerationChunk(
+                message=AIMessageChunk(content=chunk)
+            )
+            if run_manager:
+                run_manager.on_llm_new_token(chunk, chunk=generation)
+            yield generation
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in self._source.aiterate(_prompt_text(messages)):
+            generation = ChatGenerationChunk(
+                message=AIMessageChunk(content=chunk)
+            )
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk, chunk=generation)
+            yield generation
+
+    def _reply(self, text: str) -> AIMessage:
+        return AIMessage(
+            content=text,
+            response_metadata={
+                "finish_reason": "STOP",
+                "model_name": self.model_name,
+            },
+        )
+
+
+class FakeAIService(IAIService):
+    """
+    LLMを呼ばないフェイクのAIサービス
+
+    LangGraph・LangChainを通さず、プロファイルに従ったレイテンシで
+    決定的な応答を返す。キャッシュ・同時実行数制限やWebSocketハンドラーなど
+    サービスより外側のオーバーヘッドだけを計測するために使う。
+    """
+
+    def __init__(self, profile: FakeLLMProfile | None = None) -> None:
+        self._profile = profile or FakeLLMProfile.from_settings()
+        self._stream = _FakeStream(self._profile)
+        logger.info(
+            "fake_ai_service_initialized",
+            ttft_seconds=self._profile.ttft_seconds,
+            tokens_per_second=self._profile.tokens_per_second,
+        )
+
+    async def generate_response(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> str:
+        """AIレスポンスを生成"""
+        return "".join(
+            [
+                chunk
+                async for chunk in self.generate_stream(
+                    message, context, history
+                )
+            ]
+        )
+
+    async def generate_stream(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """AIレスポンスをストリームで生成"""
+        if history is not None:
+            context = render_history(history)
+        async for chunk in self._stream.aiterate(
+            f"{context}\n{message.content}"
+        ):
+            yield chunk
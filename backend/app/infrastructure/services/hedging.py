@@ -0,0 +1,209 @@
+"""ヘッジリクエストによるストリームのテールレイテンシ削減"""
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+import contextlib
+import math
+import time
+
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+# ヘッジ予算の上限（連続して使えるヘッジの回数）
+_MAX_BUDGET_TOKENS = 10.0
+
+
+async def _first_chunk(iterator: AsyncIterator[str]) -> str | None:
+    """最初のチャンクを取得（空のストリームはNone）"""
+    try:
+        return await anext(iterator)
+    except StopAsyncIteration:
+        return None
+
+
+class _Attempt:
+    """上流ストリームの1回の呼び出し"""
+
+    def __init__(self, iterator: AsyncIterator[str]) -> None:
+        self.iterator = iterator
+        self.started = time.perf_counter()
+        self.first: asyncio.Task[str | None] = asyncio.create_task(
+            _first_chunk(iterator)
+        )
+
+    async def close(self) -> None:
+        """最初のチャンクの待機をキャンセルしてストリームを閉じる"""
+        if not self.first.done():
+            self.first.cancel()
+        with contextlib.suppress(BaseException):
+            await self.first
+        aclose = getattr(self.iterator, "aclose", None)
+        if aclose is not None:
+            with contextlib.suppress(Exception):
+                await aclose()
+
+
+class HedgedStreamer:
+    """
+    ヘッジ付きで上流ストリームを開始する
+
+    最初のチャンクが直近のTTFTのpercentileパーセンタイル以内に届かなければ、
+    同じリクエストをもう1本発行し、先に最初のチャンクを返した方を採用して
+    もう一方はキャンセルする。
+
+    ヘッジの回数はトークンバケットで制限する。リクエストごとに
+    budget_ratio分のトークンを貯め、ヘッジ1回で1トークンを消費するため、
+    追加の呼び出しは長期的にリクエスト数のbudget_ratio倍を超えない。
+    TTFTの計測数がmin_samples未満の間はヘッジしない。
+    """
+
+    def __init__(
+        self,
+        *,
+        percentile: float | None = None,
+        budget_ratio: float | None = None,
+        window_size: int | None = None,
+        min_samples: int | None = None,
+        min_delay: float | None = None,
+    ) -> None:
+        self._percentile = percentile or settings.HEDGING_PERCENTILE
+        self._budget_ratio = (
+            budget_ratio
+            if budget_ratio is not None
+            else settings.HEDGING_BUDGET_RATIO
+        )
+        self._ttfts: deque[float] = deque(
+            maxlen=window_size or settings.HEDGING_WINDOW_SIZE
+        )
+        self._min_samples = (
+            min_samples
+            if min_samples is not None
+            else settings.HEDGING_MIN_SAMPLES
+        )
+        self._min_delay = (
+            min_delay
+            if min_delay is not None
+            else settings.HEDGING_MIN_DELAY_SECONDS
+        )
+        self._budget = 0.0
+
+        self._requests = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._budget_exhausted = 0
+
+    def hedge_delay(self) -> float | None:
+        """ヘッジを発行するまでの待機秒数（計測不足の場合はNone）"""
+        if len(self._ttfts) < max(self._min_samples, 1):
+            return None
+        ordered = sorted(self._ttfts)
+        index = math.ceil(self._percentile / 100 * len(ordered)) - 1
+        return max(
+            ordered[min(max(index, 0), len(ordered) - 1)], self._min_delay
+        )
+
+    async def stream(
+        self, factory: Callable[[], AsyncIterator[str]]
+    ) -> AsyncGenerator[str, None]:
+        """
+        ヘッジ付きで上流ストリームを購読
+
+        Args:
+            factory: 上流ストリームを生成する関数（ヘッジ時は2回呼ばれる）
+
+        Yields:
+            str: 採用したストリームのチャンク
+        """
+        self._requests += 1
+        self._budget = min(
+            _MAX_BUDGET_TOKENS, self._budget + self._budget_ratio
+        )
+
+        attempts = [_Attempt(factory())]
+        try:
+            delay = self.hedge_delay()
+            done, _ = await asyncio.wait({attempts[0].first}, timeout=delay)
+            if not done and self._try_consume_budget():
+                self._hedges += 1
+                logger.debug("hedge_request_started", delay=delay)
+                attempts.append(_Attempt(factory()))
+
+            winner = await self._first_successful(attempts)
+            first = winner.first.result()
+            if first is None:
+                return
+            ttft = time.perf_counter() - winner.started
+            self._ttfts.append(ttft)
+            if winner is not attempts[0]:
+                self._hedge_wins += 1
+                logger.debug("hedge_request_won", ttft=ttft)
+
+            # 採用しなかった呼び出しはキャンセル
+            for attempt in attempts:
+                if attempt is not winner:
+                    await attempt.close()
+
+            yield first
+            async for chunk in winner.iterator:
+                yield chunk
+        finally:
+            for attempt in attempts:
+                await attempt.close()
+
+    def stats(self) -> dict[str, float | int | None]:
+        """ヘッジの発行率・勝率などを取得"""
+        delay = self.hedge_delay()
+        return {
+            "requests": self._requests,
+            "hedges": self._hedges,
+            "hedge_wins": self._hedge_wins,
+            "budget_exhausted": self._budget_exhausted,
+            "hedge_rate": (
+                round(self._hedges / self._requests, 4)
+                if self._requests
+                else 0.0
+            ),
+            "win_rate": (
+                round(self._hedge_wins / self._hedges, 4)
+                if self._hedges
+                else 0.0
+            ),
+            "hedge_delay_ms": (
+                round(delay * 1000, 1) if delay is not None else None
+            ),
+        }
+
+    def _try_consume_budget(self) -> bool:
+        """ヘッジ予算を1回分消費（不足していればFalse）"""
+        if self._budget < 1.0:
+            self._budget_exhausted += 1
+            return False
+        self._budget -= 1.0
+        return True
+
+    @staticmethod
+    async def _first_successful(attempts: list[_Attempt]) -> _Attempt:
+        """
+        最初のチャンクを先に返した呼び出しを取得
+
+        一方が失敗した場合はもう一方を待ち、すべて失敗した場合は
+        最後の例外を送出する
+        """
+        pending = {attempt.first: attempt for attempt in attempts}
+        error: BaseException | None = None
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                attempt = pending.pop(task)
+                exception = task.exception()
+                if exception is None:
+                    return attempt
+                error = exception
+        if error is None:
+            raise RuntimeError("ヘッジ対象の呼び出しがありません")
+        raise error
@@ -0,0 +1,187 @@
+"""意図判定（LangGraphのルーティング）実装"""
+
+from collections import Counter
+from collections.abc import Mapping, Sequence
+from typing import cast
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.domain.services import IIntentClassifier
+from app.domain.value_objects.intent import (
+    INTENT_ROUTES,
+    IntentDecision,
+    IntentRoute,
+)
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+from app.infrastructure.services.embedding_service import (
+    HashingEmbeddingService,
+    normalize_vectors,
+)
+from app.infrastructure.services.keyword_matcher import KeywordMatcher
+
+logger = get_logger(__name__)
+
+# 判定結果に残すマッチしたキーワードの上限
+_MAX_MATCHED = 5
+
+
+def _known_routes(
+    table: Mapping[str, Sequence[str]], *, include_normal: bool
+) -> dict[str, Sequence[str]]:
+    """設定のうち既知のルートのみを取り出す（設定順を維持）"""
+    routes: dict[str, Sequence[str]] = {}
+    for name, values in table.items():
+        if name not in INTENT_ROUTES or (
+            name == "normal" and not include_normal
+        ):
+            logger.warning("intent_unknown_route_ignored", route=name)
+            continue
+        routes[name] = values
+    return routes
+
+
+class KeywordIntentClassifier(IIntentClassifier):
+    """
+    キーワードによる意図判定
+
+    ルートごとのキーワードをAho-Corasickのオートマトンに事前構築し、
+    メッセージを1回走査して出現回数の最も多いルートを選ぶ。
+    同数の場合は設定順で先のルートを優先し、確信度は全出現に対する割合。
+    """
+
+    SOURCE = "keyword"
+
+    def __init__(
+        self, keywords: Mapping[str, Sequence[str]] | None = None
+    ) -> None:
+        routes = _known_routes(
+            keywords if keywords is not None else settings.INTENT_KEYWORDS,
+            include_normal=False,
+        )
+        self._priority = {route: i for i, route in enumerate(routes)}
+        self._matcher = KeywordMatcher(routes)
+
+    def classify(self, text: str) -> IntentDecision:
+        """メッセージの意図を判定（キーワードがなければnormal）"""
+        matches = self._matcher.find(text)
+        if not matches:
+            return IntentDecision(
+                route="normal", confidence=1.0, source=self.SOURCE
+            )
+
+        counts = Counter(label for label, _ in matches)
+        route = min(counts, key=lambda r: (-counts[r], self._priority[r]))
+        matched = tuple(dict.fromkeys(w for r, w in matches if r == route))
+        return IntentDecision(
+            route=cast(IntentRoute, route),
+            confidence=counts[route] / len(matches),
+            source=self.SOURCE,
+            matched=matched[:_MAX_MATCHED],
+        )
+
+
+class PrototypeIntentClassifier(IIntentClassifier):
+    """
+    ローカル埋め込みのプロトタイプ類似度による意図判定
+
+    ルートごとの例文をハッシュ埋め込みで平均したベクトル（プロトタイプ）と
+    メッセージのコサイン類似度を比べる。埋め込みの計算量を抑えるため、
+    メッセージは先頭max_chars文字のみを使う。
+    """
+
+    SOURCE = "prototype"
+
+    def __init__(
+        self,
+        prototypes: Mapping[str, Sequence[str]] | None = None,
+        *,
+        embedding_service: HashingEmbeddingService | None = None,
+        threshold: float | None = None,
+        max_chars: int | None = None,
+    ) -> None:
+        self._embedding_service = (
+            embedding_service or HashingEmbeddingService()
+        )
+        self._threshold = (
+            threshold
+            if threshold is not None
+            else settings.INTENT_PROTOTYPE_THRESHOLD
+        )
+        self._max_chars = max_chars or settings.INTENT_PROTOTYPE_MAX_CHARS
+
+        routes = _known_routes(
+            prototypes
+            if prototypes is not None
+            else settings.INTENT_PROTOTYPES,
+            include_normal=True,
+        )
+        self._routes: list[IntentRoute] = []
+        centroids: list[NDArray[np.float32]] = []
+        for route, examples in routes.items():
+            if not examples:
+                continue
+            vectors = self._embedding_service.embed_sync(list(examples))
+            centroids.append(vectors.mean(axis=0))
+            self._routes.append(cast(IntentRoute, route))
+        dimension = self._embedding_service.dimension
+        self._centroids = normalize_vectors(
+            np.asarray(centroids, dtype=np.float32).reshape(-1, dimension)
+        )
+
+    def classify(self, text: str) -> IntentDecision:
+        """メッセージの意図を判定（しきい値未満はnormal）"""
+        if not self._routes:
+            return IntentDecision(
+                route="normal", confidence=0.0, source=self.SOURCE
+            )
+
+        query = self._embedding_service.embed_sync([text[: self._max_chars]])
+        scores = self._centroids @ query[0]
+        index = int(np.argmax(scores))
+        score = float(np.clip(scores[index], 0.0, 1.0))
+
+        if score < self._threshold:
+            return IntentDecision(
+                route="normal", confidence=1.0 - score, source=self.SOURCE
+            )
+        return IntentDecision(
+            route=self._routes[index], confidence=score, source=self.SOURCE
+        )
+
+
+class HybridIntentClassifier(IIntentClassifier):
+    """
+    キーワードとプロトタイプ類似度を組み合わせた意図判定
+
+    明示的なキーワードがあればその判定を採用し、
+    なければプロトタイプ類似度で判定する
+    """
+
+    def __init__(
+        self,
+        keyword: KeywordIntentClassifier,
+        prototype: PrototypeIntentClassifier,
+    ) -> None:
+        self._keyword = keyword
+        self._prototype = prototype
+
+    def classify(self, text: str) -> IntentDecision:
+        """メッセージの意図を判定"""
+        decision = self._keyword.classify(text)
+        if decision.matched:
+            return decision
+        return self._prototype.classify(text)
+
+
+def create_intent_classifier() -> IIntentClassifier:
+    """設定（INTENT_CLASSIFIER_BACKEND）に応じた意図判定器を作成"""
+    backend = settings.INTENT_CLASSIFIER_BACKEND
+    if backend == "hybrid":
+        return HybridIntentClassifier(
+            KeywordIntentClassifier(), PrototypeIntentClassifier()
+        )
+    if backend != "keyword":
+        logger.warning("unknown_intent_classifier_backend", backend=backend)
+    return KeywordIntentClassifier()
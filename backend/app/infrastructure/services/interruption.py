@@ -0,0 +1,82 @@
+"""クライアントの切断による生成の打ち切りの記録"""
+
+from collections import Counter
+
+from app.domain.services.context_window import estimate_tokens
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class GenerationInterruptionTracker:
+    """
+    切断で打ち切った生成の件数と節約したトークン数の推定
+
+    打ち切らなかった場合の回答の長さは、最後まで生成した回答の平均
+    トークン数で推定する（まだ1件もなければexpected_tokens）。
+    節約したトークン数は、その推定から打ち切るまでに生成した分を引いた値。
+    """
+
+    def __init__(self, expected_tokens: int | None = None) -> None:
+        self._default_expected = (
+            expected_tokens or settings.LANGCHAIN_RESPONSE_RESERVE_TOKENS
+        )
+        self._completed = 0
+        self._completed_tokens = 0
+        self._interrupted: Counter[str] = Counter()
+        self._generated_tokens = 0
+        self._saved_tokens = 0
+
+    @property
+    def expected_tokens(self) -> int:
+        """打ち切らなかった場合の回答のトークン数の推定"""
+        if not self._completed:
+            return self._default_expected
+        return round(self._completed_tokens / self._completed)
+
+    def record_completed(self, response: str) -> None:
+        """最後まで生成した回答を記録"""
+        self._completed += 1
+        self._completed_tokens += estimate_tokens(response)
+
+    def record_interrupted(self, response: str, *, channel: str) -> int:
+        """
+        打ち切った回答を記録
+
+        Args:
+            response: 打ち切るまでに生成した部分の回答
+            channel: 切断した経路（websocket・http）
+
+        Returns:
+            節約したトークン数の推定
+        """
+        generated = estimate_tokens(response)
+        saved = max(self.expected_tokens - generated, 0)
+        self._interrupted[channel] += 1
+        self._generated_tokens += generated
+        self._saved_tokens += saved
+        logger.info(
+            "generation_interrupted",
+            channel=channel,
+            generated_tokens=generated,
+            estimated_saved_tokens=saved,
+        )
+        return saved
+
+    def stats(self) -> dict[str, int | float | dict[str, int]]:
+        """打ち切りの件数と節約したトークン数を取得"""
+        interrupted = sum(self._interrupted.values())
+        total = self._completed + interrupted
+        return {
+            "completed": self._completed,
+            "interrupted": interrupted,
+            "interrupted_by_channel": dict(self._interrupted),
+            "interruption_rate": (
+                round(interrupted / total, 4) if total else 0.0
+            ),
+            "expected_response_tokens": self.expected_tokens,
+            # 打ち切るまでに生成したトークン数
+            "generated_tokens": self._generated_tokens,
+            "estimated_saved_tokens": self._saved_tokens,
+        }
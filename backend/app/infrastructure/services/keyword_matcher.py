@@ -0,0 +1,95 @@
+"""複数キーワードの一括照合（Aho-Corasick法）"""
+
+from collections import deque
+from collections.abc import Iterable, Mapping
+import unicodedata
+
+
+def normalize_text(text: str) -> str:
+    """照合用にテキストを正規化（全角/半角の揺れと大文字小文字を吸収）"""
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick法による複数キーワードの一括照合
+
+    ラベルごとのキーワード集合から構築時にオートマトンを作成し、
+    照合はテキストを1回走査するだけで済む（キーワード数に依存しない）。
+    キーワードとテキストはどちらも正規化してから照合する。
+    """
+
+    def __init__(self, keywords: Mapping[str, Iterable[str]]) -> None:
+        # ノードごとの遷移・失敗遷移・出力（パターン番号）
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._outputs: list[tuple[int, ...]] = [()]
+        # パターン番号 -> (ラベル, キーワード)
+        self._patterns: list[tuple[str, str]] = []
+
+        for label, words in keywords.items():
+            for word in words:
+                normalized = normalize_text(word).strip()
+                if normalized:
+                    self._insert(label, normalized)
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        """登録済みのキーワード数"""
+        return len(self._patterns)
+
+    def find(self, text: str) -> list[tuple[str, str]]:
+        """
+        テキスト中のキーワードの出現をすべて取得
+
+        Args:
+            text: 対象テキスト
+
+        Returns:
+            出現順の (ラベル, キーワード) のリスト（重なる出現も含む）
+        """
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        patterns = self._patterns
+
+        found: list[tuple[str, str]] = []
+        state = 0
+        for char in normalize_text(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in outputs[state]:
+                found.append(patterns[index])
+        return found
+
+    def _insert(self, label: str, word: str) -> None:
+        """キーワードをトライ木に追加"""
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(())
+            state = next_state
+        self._outputs[state] = (*self._outputs[state], len(self._patterns))
+        self._patterns.append((label, word))
+
+    def _build_failure_links(self) -> None:
+        """幅優先で失敗遷移を張り、出力を失敗先から引き継ぐ"""
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._outputs[next_state] = (
+                    *self._outputs[next_state],
+                    *self._outputs[self._fail[next_state]],
+                )
@@ -3,18 +3,30 @@
 from collections.abc import AsyncGenerator
 from typing import Any, cast
 
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnableConfig
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 from app.domain.services import IAIService
+from app.domain.services.context_window import estimate_tokens
+from app.domain.value_objects.conversation_history import ConversationHistory
 from app.domain.value_objects.message import Message
 from app.infrastructure.config import settings
 from app.infrastructure.langfuse_handler import create_langfuse_handler
 from app.infrastructure.logging import get_logger
-from app.infrastructure.services.chunk_utils import normalize_chunk_content
+from app.infrastructure.services.chunk_utils import (
+    closing_stream,
+    normalize_chunk_content,
+)
+from app.infrastructure.services.llm_metrics import (
+    LLMMetricsRecorder,
+    llm_metrics,
+)
+from app.infrastructure.services.message_utils import (
+    build_history_messages,
+    estimate_messages_tokens,
+)
 
 logger = get_logger(__name__)
 
@@ -22,9 +34,10 @@ logger = get_logger(__name__)
 class LangChainAIService(IAIService):
     """LangChainを使用したAIサービス実装"""
 
-    def __init__(self) -> None:
+    def __init__(self, metrics: LLMMetricsRecorder | None = None) -> None:
         """LangChain AIサービスを初期化"""
         model_name = settings.GOOGLE_AI_MODEL
+        self._model_name = model_name
         logger.info("langchain_ai_model_initializing", model_name=model_name)
 
         # ChatGoogleGenerativeAIを初期化
@@ -51,6 +64,9 @@ class LangChainAIService(IAIService):
         # LangFuseコールバックハンドラーを初期化
         self._langfuse_handler = create_langfuse_handler()
 
+        # LLM呼び出しのメトリクス
+        self._metrics = metrics or llm_metrics
+
         logger.info(
             "langchain_ai_service_initialized",
             model_name=model_name,
@@ -60,19 +76,19 @@ class LangChainAIService(IAIService):
         )
 
     async def generate_response(
-        self, message: Message, context: str = ""
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
     ) -> str:
         """AIレスポンスを生成"""
         try:
-            # コンテキストから会話履歴を構築
-            history = self._build_history_from_context(context)
+            # 会話履歴を構築
+            messages = build_history_messages(context, history)
 
             # プロンプトテンプレートを使用してチェーンを作成
             chain = self._prompt | self._llm
 
-            # メッセージ履歴を取得
-            messages = history.messages if hasattr(history, "messages") else []
-
             # LangFuseコールバックを設定
             config: dict[str, Any] = {}
             if self._langfuse_handler:
@@ -80,13 +96,23 @@ class LangChainAIService(IAIService):
 
             # チェーンを実行
             runnable_config: RunnableConfig = cast(RunnableConfig, config)
-            response = await chain.ainvoke(
-                {"input": message.content, "history": messages},
-                config=runnable_config,
+            timer = self._metrics.start(self._model_name, streaming=False)
+            try:
+                response = await chain.ainvoke(
+                    {"input": message.content, "history": messages},
+                    config=runnable_config,
+                )
+            except Exception:
+                timer.finish(status="error")
+                raise
+            timer.usage(response)
+            timer.finish(
+                prompt_tokens=self._prompt_tokens(message, messages),
+                completion_tokens=estimate_tokens(
+                    normalize_chunk_content(response.content)
+                ),
             )
 
-            # メモリに会話を保存
-            history.add_user_message(message.content)
             response_content = (
                 response.content
                 if hasattr(response, "content")
@@ -98,7 +124,6 @@ class LangChainAIService(IAIService):
                     str(item) if not isinstance(item, str) else item
                     for item in response_content
                 )
-            history.add_ai_message(str(response_content))
 
             return str(response_content)
         except Exception as e:
@@ -111,45 +136,57 @@ class LangChainAIService(IAIService):
             raise RuntimeError(f"AIレスポンス生成エラー: {str(e)}")
 
     async def generate_stream(
-        self, message: Message, context: str = ""
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
     ) -> AsyncGenerator[str, None]:
         """AIレスポンスをストリームで生成"""
         try:
-            # コンテキストから会話履歴を構築
-            history = self._build_history_from_context(context)
+            # 会話履歴を構築
+            messages = build_history_messages(context, history)
 
             # プロンプトテンプレートを使用してチェーンを作成
             chain = self._prompt | self._llm
 
-            # メッセージ履歴を取得
-            messages = history.messages if hasattr(history, "messages") else []
-
             # LangFuseコールバックを設定
             config: dict[str, Any] = {}
             if self._langfuse_handler:
                 config["callbacks"] = [self._langfuse_handler]
 
             # ストリーミングでレスポンスを取得
-            full_response = ""
             runnable_config: RunnableConfig = cast(RunnableConfig, config)
-            async for chunk in chain.astream(
-                {"input": message.content, "history": messages},
-                config=runnable_config,
-            ):
-                if hasattr(chunk, "content") and chunk.content:
-                    content = normalize_chunk_content(chunk.content)
-
-                    # 空のコンテンツはスキップ
-                    if not content:
-                        continue
-
-                    full_response += content
-                    yield content
-
-            # メモリに会話を保存
-            if full_response:
-                history.add_user_message(message.content)
-                history.add_ai_message(full_response)
+            timer = self._metrics.start(self._model_name, streaming=True)
+            completion: list[str] = []
+            try:
+                async with closing_stream(
+                    chain.astream(
+                        {"input": message.content, "history": messages},
+                        config=runnable_config,
+                    )
+                ) as stream:
+                    async for chunk in stream:
+                        timer.usage(chunk)
+                        if hasattr(chunk, "content") and chunk.content:
+                            content = normalize_chunk_content(chunk.content)
+
+                            # 空のコンテンツはスキップ
+                            if not content:
+                                continue
+
+                            timer.chunk()
+                            completion.append(content)
+                            yield content
+            except Exception:
+                timer.finish(status="error")
+                raise
+            except BaseException:
+                timer.finish(status="cancelled")
+                raise
+            timer.finish(
+                prompt_tokens=self._prompt_tokens(message, messages),
+                completion_tokens=estimate_tokens("".join(completion)),
+            )
         except Exception as e:
             error_msg = str(e)
             logger.error(
@@ -160,54 +197,10 @@ class LangChainAIService(IAIService):
             )
             raise RuntimeError(f"AIストリーム生成エラー: {error_msg}")
 
-    def _build_history_from_context(
-        self, context: str
-    ) -> BaseChatMessageHistory:
-        """
-        コンテキスト文字列から会話履歴を構築してメッセージ履歴を作成
-
-        Args:
-            context: 会話履歴を含むコンテキスト文字列
-                "User: ...\nAI: ...\nUser: ...\nAI: ..." の形式
-
-        Returns:
-            コンテキストから解析された会話履歴を含むメッセージ履歴。
-            contextが空の場合は空の履歴を返す。
-            history.messagesでメッセージリストにアクセス可能。
-        """
-        # ChatMessageHistoryを作成
-        history = ChatMessageHistory()
-
-        if not context:
-            return history
-
-        # コンテキストを解析して会話履歴を構築
-        # 形式: "User: ...\nAI: ...\nUser: ...\nAI: ..."
-        lines = context.strip().split("\n")
-        current_user_message = None
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            if line.startswith("User:"):
-                # 前のユーザーメッセージがあれば保存
-                if current_user_message:
-                    history.add_user_message(current_user_message)
-                current_user_message = line.replace("User:", "").strip()
-            elif line.startswith("AI:"):
-                ai_message = line.replace("AI:", "").strip()
-                if current_user_message:
-                    history.add_user_message(current_user_message)
-                    history.add_ai_message(ai_message)
-                    current_user_message = None
-                else:
-                    # ユーザーメッセージがない場合はAIメッセージのみ追加
-                    history.add_ai_message(ai_message)
-
-        # 最後のユーザーメッセージがあれば保存
-        if current_user_message:
-            history.add_user_message(current_user_message)
-
-        return history
+    @staticmethod
+    def _prompt_tokens(message: Message, history: list[Any]) -> int:
+        """システムプロンプト・会話履歴・入力の推定トークン数"""
+        return estimate_messages_tokens(
+            [*history, HumanMessage(content=message.content)],
+            settings.LANGCHAIN_SYSTEM_PROMPT,
+        )
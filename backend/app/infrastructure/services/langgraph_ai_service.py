@@ -1,22 +1,59 @@
 """LangGraph AIサービス実装"""
 
 from collections.abc import AsyncGenerator
+import contextlib
+from dataclasses import dataclass
+import hashlib
+import json
+import time
 from typing import Annotated, Any, Literal, TypedDict, cast
 
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import RunnableConfig
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.runnables import Runnable, RunnableConfig
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, StateGraph
 from langgraph.graph.message import add_messages
 from langgraph.graph.state import CompiledStateGraph
 
-from app.domain.services import IAIService
+from app.domain.exceptions import AIServiceUnavailableError
+from app.domain.services import IAIService, IIntentClassifier, IRetriever
+from app.domain.services.context_window import estimate_tokens
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.intent import IntentDecision
 from app.domain.value_objects.message import Message
+from app.domain.value_objects.tool_call import ToolCall
 from app.infrastructure.config import settings
-from app.infrastructure.langfuse_handler import create_langfuse_handler
+from app.infrastructure.langfuse_handler import (
+    SampledLangfuseHandler,
+    create_langfuse_handler,
+)
 from app.infrastructure.logging import get_logger
-from app.infrastructure.services.chunk_utils import normalize_chunk_content
+from app.infrastructure.services.chunk_utils import (
+    closing_stream,
+    normalize_chunk_content,
+)
+from app.infrastructure.services.hedging import HedgedStreamer
+from app.infrastructure.services.intent_classifier import (
+    create_intent_classifier,
+)
+from app.infrastructure.services.llm_factory import create_chat_model
+from app.infrastructure.services.llm_metrics import (
+    LLMMetricsRecorder,
+    llm_call_labels,
+    llm_metrics,
+)
+from app.infrastructure.services.message_utils import (
+    build_history_messages,
+    estimate_messages_tokens,
+    insert_passages,
+    insert_tool_results,
+)
+from app.infrastructure.services.model_router import ModelRouter
+from app.infrastructure.services.resilience import UpstreamGuard
+from app.infrastructure.services.single_flight import StreamSingleFlight
+from app.infrastructure.services.tools import ToolExecutor
 
 logger = get_logger(__name__)
 
@@ -30,22 +67,75 @@ class GraphState(TypedDict):
     context: str
     metadata: dict
     next_action: Literal["normal", "rag", "tool", "end"] | None
+    intent: IntentDecision | None  # 判定済みの意図（メッセージごとに1回）
+    model: str | None  # 選択済みのモデル
+    stream: bool  # 回答をチャンクごとにストリームへ書き出す
+
+
+@dataclass(frozen=True)
+class GraphStreamEvent:
+    """
+    グラフのストリームのイベント
+
+    kindが"token"の場合はcontentに回答のチャンク、"node"の場合は
+    nodeに完了したノード名とelapsed_msにストリーム開始からの経過時間を持つ
+    """
+
+    kind: Literal["token", "node"]
+    content: str = ""
+    node: str = ""
+    elapsed_ms: float = 0.0
 
 
 class LangGraphAIService(IAIService):
     """LangGraphを使用したAIサービス実装"""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        intent_classifier: IIntentClassifier | None = None,
+        model_router: ModelRouter | None = None,
+        hedger: HedgedStreamer | None = None,
+        upstream_guard: UpstreamGuard | None = None,
+        retriever: IRetriever | None = None,
+        tool_executor: ToolExecutor | None = None,
+        fast_path: bool | None = None,
+        metrics: LLMMetricsRecorder | None = None,
+        langfuse_handler: SampledLangfuseHandler | None = None,
+    ) -> None:
         """LangGraph AIサービスを初期化"""
         model_name = settings.GOOGLE_AI_MODEL
         logger.info("langgraph_ai_model_initializing", model_name=model_name)
 
-        # ChatGoogleGenerativeAIを初期化
-        self._llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            google_api_key=settings.GOOGLE_AI_API_KEY,
-            temperature=settings.LANGCHAIN_TEMPERATURE,
-            convert_system_message_to_human=True,
+        # チャットモデルを初期化（ルーターが選ぶ他のモデルは初回利用時に作成）
+        self._model_name = model_name
+        self._llm = create_chat_model(model_name)
+        self._llms: dict[str, BaseChatModel] = {model_name: self._llm}
+
+        # モデルルーター（未指定の場合は常にGOOGLE_AI_MODELを使用）
+        self._router = model_router
+
+        # ヘッジリクエスト（未指定の場合は常に1本だけ呼び出す）
+        self._hedger = hedger
+
+        # 上流の呼び出しごとの同時実行数制限（未指定の場合は制限しない）
+        # single-flightの購読者は上流を呼ばないため実行枠を取らない
+        self._upstream_guard = upstream_guard
+
+        # RAGの検索（未指定の場合はRAGでも検索せずに回答する）
+        self._retriever = retriever
+
+        # ツールの実行（未指定の場合はツールを使わずに回答する）
+        self._tools = tool_executor
+        self._tool_llms: dict[str, Runnable[Any, BaseMessage] | None] = {}
+
+        # LLM呼び出しのメトリクス（未指定の場合はプロセス共有の集計）
+        self._metrics = metrics or llm_metrics
+
+        # 通常会話の非ストリーミング生成はグラフを通さずに実行する
+        self._fast_path = (
+            fast_path
+            if fast_path is not None
+            else settings.LANGGRAPH_FAST_PATH_ENABLED
         )
 
         # プロンプトテンプレートを作成
@@ -56,15 +146,30 @@ class LangGraphAIService(IAIService):
             ]
         )
 
+        # 意図判定器（キーワードのオートマトン等は構築時に一度だけ作成）
+        self._intent = intent_classifier or create_intent_classifier()
+
         # グラフを構築
         self._graph = self._build_graph()
 
-        # LangFuseコールバックハンドラーを初期化
-        self._langfuse_handler = create_langfuse_handler()
+        # 同一プロンプトの同時ストリームを1本の上流呼び出しに集約
+        self._single_flight = (
+            StreamSingleFlight() if settings.SINGLE_FLIGHT_ENABLED else None
+        )
+
+        # LangFuseコールバックハンドラー（未指定の場合は設定から作成）
+        self._langfuse_handler = (
+            langfuse_handler
+            if langfuse_handler is not None
+            else create_langfuse_handler()
+        )
 
         logger.info(
             "langgraph_ai_service_initialized",
             model_name=model_name,
+            routed_models=self._router.models if self._router else None,
+            rag_enabled=self._retriever is not None,
+            tools=self._tools.names if self._tools else None,
             langfuse_enabled=settings.LANGFUSE_ENABLED,
         )
 
@@ -76,8 +181,8 @@ class LangGraphAIService(IAIService):
         graph.add_node("input_node", self._input_node)
         graph.add_node("intent_classifier", self._intent_classifier)
         graph.add_node("normal_chat", self._normal_chat)
-        graph.add_node("rag_chat", self._rag_chat)  # 将来の実装用
-        graph.add_node("tool_execution", self._tool_execution)  # 将来の実装用
+        graph.add_node("rag_chat", self._rag_chat)
+        graph.add_node("tool_execution", self._tool_execution)
         graph.add_node("output_node", self._output_node)
 
         # エッジを追加
@@ -105,61 +210,80 @@ class LangGraphAIService(IAIService):
         return state
 
     async def _intent_classifier(self, state: GraphState) -> GraphState:
-        """意図判定ノード: ユーザーの意図を判定"""
-        messages = state["messages"]
-        if not messages:
-            state["next_action"] = "normal"
-            return state
-
-        last_message = messages[-1]
-        if isinstance(last_message, HumanMessage):
-            raw_content = last_message.content
-            content = (
-                str(raw_content).lower()
-                if not isinstance(raw_content, str)
-                else raw_content.lower()
+        """意図判定ノード: ユーザーの意図を判定（判定済みなら再利用）"""
+        decision = state.get("intent")
+        if decision is None:
+            decision = self._classify(state["messages"])
+            state["intent"] = decision
+            logger.debug(
+                "intent_classification",
+                next_action=decision.route,
+                confidence=decision.confidence,
+                source=decision.source,
+                matched=decision.matched,
             )
 
-            # 簡単な意図判定（将来はより高度な判定を実装）
-            # TODO: nodeを分ける,システムプロンプトで分岐する
-            if any(
-                keyword in content
-                for keyword in ["検索", "調べて", "情報", "データ"]
-            ):
-                state["next_action"] = "rag"
-            elif any(
-                keyword in content for keyword in ["計算", "実行", "ツール"]
-            ):
-                state["next_action"] = "tool"
-            else:
-                state["next_action"] = "normal"
-        else:
-            state["next_action"] = "normal"
-
-        logger.debug("intent_classification", next_action=state["next_action"])
+        state["next_action"] = decision.route
         return state
 
+    def _classify(self, messages: list[BaseMessage]) -> IntentDecision:
+        """最後のユーザーメッセージから意図を判定"""
+        if not messages or not isinstance(messages[-1], HumanMessage):
+            return IntentDecision(
+                route="normal", confidence=1.0, source="default"
+            )
+        content = messages[-1].content
+        text = content if isinstance(content, str) else str(content)
+        return self._intent.classify(text)
+
     def _route_after_intent(self, state: GraphState) -> str:
         """意図判定後のルーティング"""
         next_action = state.get("next_action")
         return next_action if next_action is not None else "normal"
 
-    async def _normal_chat(self, state: GraphState) -> GraphState:
+    async def _normal_chat(
+        self, state: GraphState, config: RunnableConfig
+    ) -> GraphState:
         """通常会話ノード: 標準的な会話処理"""
+        with self._call_labels(state, "normal_chat"):
+            return await self._respond(state, state["messages"], config)
+
+    @staticmethod
+    def _call_labels(
+        state: GraphState, route: str
+    ) -> contextlib.AbstractContextManager[None]:
+        """ブロック内のLLM呼び出しのメトリクスにルート・意図を付ける"""
+        decision = state.get("intent")
+        return llm_call_labels(
+            route=route, intent=decision.route if decision else None
+        )
+
+    async def _respond(
+        self,
+        state: GraphState,
+        messages: list[BaseMessage],
+        config: RunnableConfig | None = None,
+    ) -> GraphState:
+        """LLMで回答を生成し、ステートのメッセージに追加"""
+        model = self._select_model(state)
+        if state.get("stream"):
+            return await self._stream_respond(state, messages, model, config)
         try:
-            # プロンプトテンプレートを使用してチェーンを作成
-            chain = self._prompt | self._llm
+            response = await self._invoke_llm(model, messages, config)
 
-            # チェーンを実行
-            response = await chain.ainvoke({"messages": state["messages"]})
+            # 高速モデルの回答が低確信であれば高性能モデルで再生成
+            escalated = self._escalation_model(model, response)
+            if escalated is not None:
+                response = await self._escalate(
+                    state, messages, model, escalated, response, config
+                )
 
             # レスポンスをメッセージに追加
-            if hasattr(response, "content"):
-                state["messages"].append(AIMessage(content=response.content))
-            else:
-                state["messages"].append(AIMessage(content=str(response)))
+            state["messages"].append(AIMessage(content=response.content))
 
             logger.debug("通常会話ノード: レスポンス生成完了")
+        except AIServiceUnavailableError:
+            raise
         except Exception as e:
             logger.error("normal_chat_node_error", error=str(e), exc_info=True)
             state["messages"].append(
@@ -168,17 +292,294 @@ class LangGraphAIService(IAIService):
 
         return state
 
-    async def _rag_chat(self, state: GraphState) -> GraphState:
-        """RAGノード: ベクトル検索を使用した情報検索（将来の実装）"""
-        # 現在は通常会話と同じ処理
-        logger.info("rag_node_placeholder", message="将来の実装予定")
-        return await self._normal_chat(state)
+    async def _stream_respond(
+        self,
+        state: GraphState,
+        messages: list[BaseMessage],
+        model: str,
+        config: RunnableConfig | None,
+    ) -> GraphState:
+        """
+        回答をストリーミングで生成し、チャンクをグラフのストリームに書き出す
+
+        エラーはストリームの呼び出し元に伝える（途中までのチャンクは
+        送信済みのため、エラーメッセージを回答にしない）
+        """
+        writer = get_stream_writer()
+        formatted_messages = await self._prompt.ainvoke({"messages": messages})
+        chunks: list[str] = []
+        async with contextlib.aclosing(
+            self._stream_with_formatted_messages(
+                formatted_messages, dict(config or {}), model
+            )
+        ) as stream:
+            async for content in stream:
+                chunks.append(content)
+                writer(content)
+        state["messages"].append(AIMessage(content="".join(chunks)))
+        return state
+
+    async def _invoke_llm(
+        self,
+        model: str,
+        messages: list[BaseMessage],
+        config: RunnableConfig | None = None,
+    ) -> BaseMessage:
+        """モデルを呼び出し、成否をルーターに記録"""
+        try:
+            response = await self._ainvoke_measured(
+                model, self._get_llm(model), messages, config
+            )
+        except Exception:
+            if self._router is not None:
+                self._router.record_outcome(model, ok=False)
+            raise
+        if self._router is not None:
+            self._router.record_outcome(model, ok=True)
+        return response
+
+    async def _ainvoke_measured(
+        self,
+        model: str,
+        llm: Runnable[Any, BaseMessage],
+        messages: list[BaseMessage],
+        config: RunnableConfig | None = None,
+    ) -> BaseMessage:
+        """
+        プロンプト|モデルを呼び出し、所要時間とトークン数を記録
+
+        同時実行数制限が有効な場合は実行枠を取ってから呼び出す
+        （実行枠を待った時間は所要時間に含めない）
+        """
+        if self._upstream_guard is None:
+            return await self._ainvoke_timed(model, llm, messages, config)
+        return await self._upstream_guard.call(
+            lambda: self._ainvoke_timed(model, llm, messages, config)
+        )
 
-    async def _tool_execution(self, state: GraphState) -> GraphState:
-        """ツール実行ノード: 外部ツールの実行（将来の実装）"""
-        # 現在は通常会話と同じ処理
-        logger.info("tool_node_placeholder", message="将来の実装予定")
-        return await self._normal_chat(state)
+    async def _ainvoke_timed(
+        self,
+        model: str,
+        llm: Runnable[Any, BaseMessage],
+        messages: list[BaseMessage],
+        config: RunnableConfig | None = None,
+    ) -> BaseMessage:
+        """プロンプト|モデルを呼び出し、所要時間とトークン数を記録"""
+        timer = self._metrics.start(model, streaming=False)
+        try:
+            response = await (self._prompt | llm).ainvoke(
+                {"messages": messages}, config
+            )
+        except Exception:
+            timer.finish(status="error")
+            raise
+        except BaseException:
+            timer.finish(status="cancelled")
+            raise
+        timer.usage(response)
+        timer.finish(
+            prompt_tokens=estimate_messages_tokens(
+                messages, settings.LANGCHAIN_SYSTEM_PROMPT
+            ),
+            completion_tokens=estimate_tokens(
+                normalize_chunk_content(response.content)
+            ),
+        )
+        return response
+
+    async def _escalate(
+        self,
+        state: GraphState,
+        messages: list[BaseMessage],
+        model: str,
+        escalated: str,
+        response: BaseMessage,
+        config: RunnableConfig | None = None,
+    ) -> BaseMessage:
+        """高性能モデルで再生成（失敗時は元の回答を使う）"""
+        logger.info("model_escalated", from_model=model, to_model=escalated)
+        try:
+            escalated_response = await self._invoke_llm(
+                escalated, messages, config
+            )
+        except Exception as e:
+            logger.warning(
+                "model_escalation_failed", to_model=escalated, error=str(e)
+            )
+            return response
+        state["model"] = escalated
+        return escalated_response
+
+    def _escalation_model(
+        self, model: str, response: BaseMessage
+    ) -> str | None:
+        """回答が低確信であれば再生成に使うモデルを返す"""
+        if (
+            self._router is None
+            or not settings.MODEL_ROUTER_ESCALATION_ENABLED
+        ):
+            return None
+        content = normalize_chunk_content(response.content)
+        finish_reason = response.response_metadata.get("finish_reason")
+        if not self._router.is_low_confidence(content, finish_reason):
+            return None
+        return self._router.escalation_model(model)
+
+    def cache_model(self, message: Message) -> str | None:
+        """
+        完全一致キャッシュのキーに使うモデル（キャッシュしない場合はNone）
+
+        意図がnormal以外（RAG・ツール）の回答は検索結果や実行時の
+        ツールの結果に依存するためキャッシュしない。normalの場合は
+        グラフと同じ意図判定とルーターでモデルを選ぶ
+        """
+        decision = self._intent.classify(message.content)
+        if decision.route != "normal":
+            return None
+        if self._router is None:
+            return self._model_name
+        return self._router.choose(
+            intent=decision,
+            message_tokens=estimate_tokens(message.content),
+            preference=(message.metadata or {}).get("model_preference"),
+        )
+
+    def _select_model(self, state: GraphState) -> str:
+        """リクエストに使うモデルを選択（選択済みなら再利用）"""
+        model = state.get("model")
+        if model is not None:
+            return model
+        if self._router is None:
+            model = self._model_name
+        else:
+            last = state["messages"][-1] if state["messages"] else None
+            model = self._router.choose(
+                intent=state.get("intent"),
+                message_tokens=estimate_tokens(
+                    normalize_chunk_content(last.content) if last else ""
+                ),
+                preference=state["metadata"].get("model_preference"),
+            )
+            logger.debug("model_selected", model=model)
+        state["model"] = model
+        return model
+
+    def _get_llm(self, model: str) -> BaseChatModel:
+        """モデル名に対応するチャットモデルを取得（初回のみ作成）"""
+        llm = self._llms.get(model)
+        if llm is None:
+            llm = create_chat_model(model)
+            self._llms[model] = llm
+        return llm
+
+    async def _rag_chat(
+        self, state: GraphState, config: RunnableConfig
+    ) -> GraphState:
+        """RAGノード: 検索結果をプロンプトに挿入して回答を生成"""
+        messages = await self._with_passages(state["messages"])
+        with self._call_labels(state, "rag_chat"):
+            return await self._respond(state, messages, config)
+
+    async def _with_passages(
+        self, messages: list[BaseMessage]
+    ) -> list[BaseMessage]:
+        """
+        最後のユーザーメッセージで検索し、結果をメッセージ列に挿入
+
+        検索に失敗した場合は検索結果なしで回答する
+        """
+        if (
+            self._retriever is None
+            or not messages
+            or not isinstance(messages[-1], HumanMessage)
+        ):
+            return messages
+        query = normalize_chunk_content(messages[-1].content)
+        try:
+            passages = await self._retriever.search(query)
+        except Exception as e:
+            logger.warning("rag_retrieval_failed", error=str(e))
+            return messages
+        logger.debug(
+            "rag_passages_retrieved",
+            count=len(passages),
+            top_score=passages[0].score if passages else None,
+        )
+        return insert_passages(
+            messages, passages, settings.RAG_CONTEXT_MAX_TOKENS
+        )
+
+    async def _tool_execution(
+        self, state: GraphState, config: RunnableConfig
+    ) -> GraphState:
+        """ツール実行ノード: ツールを並列に実行し、結果を踏まえて回答"""
+        with self._call_labels(state, "tool_execution"):
+            messages = await self._with_tool_results(state, state["messages"])
+            return await self._respond(state, messages, config)
+
+    async def _with_tool_results(
+        self, state: GraphState, messages: list[BaseMessage]
+    ) -> list[BaseMessage]:
+        """
+        ツールを実行し、結果をメッセージ列に挿入
+
+        メッセージから組み立てた呼び出しがあればそれを、なければ
+        モデルが要求した呼び出しを実行する（複数の呼び出しは並列）。
+        呼び出しがない・要求に失敗した場合は元のメッセージを返す
+        """
+        if (
+            self._tools is None
+            or not messages
+            or not isinstance(messages[-1], HumanMessage)
+        ):
+            return messages
+        calls = self._tools.plan(normalize_chunk_content(messages[-1].content))
+        if not calls:
+            calls = await self._request_tool_calls(
+                self._select_model(state), messages
+            )
+        if not calls:
+            return messages
+        results = await self._tools.execute(calls)
+        return insert_tool_results(
+            messages, results, settings.TOOL_CONTEXT_MAX_TOKENS
+        )
+
+    async def _request_tool_calls(
+        self, model: str, messages: list[BaseMessage]
+    ) -> list[ToolCall]:
+        """モデルにツールの呼び出しを要求（ツール呼び出し非対応ならなし）"""
+        llm = self._get_tool_llm(model)
+        if llm is None:
+            return []
+        try:
+            response = await self._ainvoke_measured(model, llm, messages)
+        except Exception as e:
+            logger.warning("tool_call_request_failed", error=str(e))
+            return []
+        tool_calls = getattr(response, "tool_calls", None) or []
+        return [
+            ToolCall(
+                name=call["name"],
+                arguments=call.get("args") or {},
+                call_id=call.get("id") or "",
+            )
+            for call in tool_calls
+        ]
+
+    def _get_tool_llm(self, model: str) -> Runnable[Any, BaseMessage] | None:
+        """ツールを紐付けたチャットモデルを取得（初回のみ作成）"""
+        if model not in self._tool_llms:
+            assert self._tools is not None
+            try:
+                llm: Runnable[Any, BaseMessage] | None = self._get_llm(
+                    model
+                ).bind_tools(self._tools.specs())
+            except NotImplementedError:
+                logger.info("tool_calling_unsupported", model=model)
+                llm = None
+            self._tool_llms[model] = llm
+        return self._tool_llms[model]
 
     async def _output_node(self, state: GraphState) -> GraphState:
         """出力ノード: レスポンスの最終処理"""
@@ -186,83 +587,226 @@ class LangGraphAIService(IAIService):
         return state
 
     async def _stream_with_formatted_messages(
-        self, formatted_messages: Any, config: dict[str, Any]
+        self,
+        formatted_messages: Any,
+        config: dict[str, Any],
+        model: str | None = None,
     ) -> AsyncGenerator[str, None]:
         """
         共通のストリーミング処理
 
+        同一プロンプトのストリームが実行中であれば、新たにLLMを呼ばずに
+        そのストリームを購読する（single-flight）。ヘッジが有効な場合は
+        上流の呼び出しごとにヘッジする。
+
         Args:
             formatted_messages: フォーマット済みメッセージ（ChatPromptValueまたはlist[BaseMessage]）
             config: LangChain設定（コールバック等を含む）
+            model: 使用するモデル名（省略時はGOOGLE_AI_MODEL）
 
         Yields:
             str: ストリーミングチャンクのコンテンツ
         """
-        chunk_count = 0
-        runnable_config: RunnableConfig = cast(RunnableConfig, config)
-        async for chunk in self._llm.astream(
-            formatted_messages, config=runnable_config
-        ):
-            if hasattr(chunk, "content") and chunk.content:
-                chunk_count += 1
-                content = normalize_chunk_content(chunk.content)
+        model = model or self._model_name
+        if self._single_flight is None:
+            async with contextlib.aclosing(
+                self._upstream(formatted_messages, config, model)
+            ) as stream:
+                async for content in stream:
+                    yield content
+            return
+
+        key = self._single_flight_key(formatted_messages, model)
+        async with contextlib.aclosing(
+            self._single_flight.stream(
+                key,
+                lambda: self._upstream(formatted_messages, config, model),
+            )
+        ) as stream:
+            async for content in stream:
+                yield content
 
-                # 空のコンテンツはスキップ
-                if not content:
-                    continue
+    def _upstream(
+        self, formatted_messages: Any, config: dict[str, Any], model: str
+    ) -> AsyncGenerator[str, None]:
+        """
+        上流のストリームを開始（ヘッジが有効な場合はヘッジ付き）
+
+        同時実行数制限が有効な場合は、ヘッジを含めて1つの実行枠で読む
+        """
 
-                logger.debug(
-                    "langgraph_chunk_yielding",
-                    chunk_length=len(content),
+        def start() -> AsyncGenerator[str, None]:
+            if self._hedger is None:
+                return self._astream_llm(formatted_messages, config, model)
+            return self._hedger.stream(
+                lambda: self._astream_llm(formatted_messages, config, model)
+            )
+
+        if self._upstream_guard is None:
+            return start()
+        return self._upstream_guard.stream(start)
+
+    def _single_flight_key(self, formatted_messages: Any, model: str) -> str:
+        """モデル設定とプロンプト全体からsingle-flightのキーを作成"""
+        messages = _to_messages(formatted_messages)
+        material = json.dumps(
+            [
+                model,
+                settings.LANGCHAIN_TEMPERATURE,
+                [[msg.type, msg.content] for msg in messages],
+            ],
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def _astream_llm(
+        self, formatted_messages: Any, config: dict[str, Any], model: str
+    ) -> AsyncGenerator[str, None]:
+        """
+        LLMのストリーミング呼び出し
+
+        TTFTと成否をルーターに、TTFT・チャンク間隔・トークン数を
+        メトリクスに記録する
+        """
+        chunk_count = 0
+        started = time.perf_counter()
+        first_chunk = True
+        completion: list[str] = []
+        timer = self._metrics.start(model, streaming=True)
+        runnable_config: RunnableConfig = cast(RunnableConfig, config)
+        try:
+            async with closing_stream(
+                self._get_llm(model).astream(
+                    formatted_messages, config=runnable_config
                 )
-                yield content
+            ) as stream:
+                async for chunk in stream:
+                    # 最後のチャンクは内容が空でトークン数だけを持つ場合がある
+                    timer.usage(chunk)
+                    if hasattr(chunk, "content") and chunk.content:
+                        chunk_count += 1
+                        content = normalize_chunk_content(chunk.content)
+
+                        # 空のコンテンツはスキップ
+                        if not content:
+                            continue
+
+                        if first_chunk and self._router is not None:
+                            self._router.record_ttft(
+                                model, time.perf_counter() - started
+                            )
+                        first_chunk = False
+                        timer.chunk()
+                        completion.append(content)
+
+                        logger.debug(
+                            "langgraph_chunk_yielding",
+                            chunk_length=len(content),
+                        )
+                        yield content
+        except Exception:
+            timer.finish(status="error")
+            if self._router is not None:
+                self._router.record_outcome(model, ok=False)
+            raise
+        except BaseException:
+            # クライアントの切断・ヘッジで採用されなかった場合
+            timer.finish(status="cancelled")
+            raise
+
+        if self._router is not None:
+            self._router.record_outcome(model, ok=True)
+        call = timer.finish(
+            prompt_tokens=estimate_messages_tokens(
+                _to_messages(formatted_messages)
+            ),
+            completion_tokens=estimate_tokens("".join(completion)),
+        )
+        logger.info(
+            "langgraph_streaming_completed",
+            model=model,
+            chunk_count=chunk_count,
+            ttft_ms=call.ttft_ms if call else None,
+            gap_p95_ms=call.gap_p95_ms if call else None,
+            duration_ms=call.duration_ms if call else None,
+        )
+
+    def _initial_state(
+        self,
+        message: Message,
+        context: str,
+        history: ConversationHistory | None,
+        *,
+        stream: bool,
+    ) -> GraphState:
+        """会話履歴とユーザーメッセージからグラフの初期ステートを作成"""
+        state: GraphState = {
+            "messages": [],
+            "session_id": message.metadata.get("session_id", "")
+            if message.metadata
+            else "",
+            "user_id": message.sender,
+            "context": context,
+            "metadata": message.metadata or {},
+            "next_action": None,
+            "intent": None,
+            "model": None,
+            "stream": stream,
+        }
+
+        # 会話履歴を構築
+        state["messages"].extend(build_history_messages(context, history))
+
+        # ユーザーメッセージを追加
+        state["messages"].append(HumanMessage(content=message.content))
+        return state
 
-        logger.info("langgraph_streaming_completed", chunk_count=chunk_count)
+    def _run_config(self) -> RunnableConfig:
+        """LangFuseコールバックを設定した実行設定"""
+        config: dict[str, Any] = {}
+        if self._langfuse_handler:
+            config["callbacks"] = [self._langfuse_handler]
+        return cast(RunnableConfig, config)
 
     async def generate_response(
-        self, message: Message, context: str = ""
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
     ) -> str:
-        """AIレスポンスを生成"""
+        """
+        AIレスポンスを生成
+
+        fast_pathが有効で意図がnormalの場合は、グラフを通さずに
+        通常会話ノードと同じ処理（プロンプト|LLM）を直接呼ぶ。
+        ノードごとのステートのコピーやコールバックを省くだけで、
+        モデルの選択・エスカレーション・結果は同じになる
+        """
         try:
-            # ステートを初期化
-            state: GraphState = {
-                "messages": [],
-                "session_id": message.metadata.get("session_id", "")
-                if message.metadata
-                else "",
-                "user_id": message.sender,
-                "context": context,
-                "metadata": message.metadata or {},
-                "next_action": None,
-            }
-
-            # コンテキストから会話履歴を構築
-            if context:
-                self._build_messages_from_context(state, context)
-
-            # ユーザーメッセージを追加
-            state["messages"].append(HumanMessage(content=message.content))
-
-            # LangFuseコールバックを設定
-            config: dict[str, Any] = {}
-            if self._langfuse_handler:
-                config["callbacks"] = [self._langfuse_handler]
+            state = self._initial_state(
+                message, context, history, stream=False
+            )
+            config = self._run_config()
+
+            if self._fast_path:
+                # 判定した意図はステートに残し、グラフでも再判定しない
+                decision = self._classify(state["messages"])
+                state["intent"] = decision
+                state["next_action"] = decision.route
+                if decision.route == "normal":
+                    with self._call_labels(state, "fast_path"):
+                        state = await self._respond(
+                            state, state["messages"], config
+                        )
+                    return self._last_ai_content(state["messages"])
 
             # グラフを実行
-            runnable_config: RunnableConfig = cast(RunnableConfig, config)
-            result = await self._graph.ainvoke(state, config=runnable_config)
-
-            # 最後のAIメッセージを取得
-            ai_messages = [
-                msg for msg in result["messages"] if isinstance(msg, AIMessage)
-            ]
-            if ai_messages:
-                content = ai_messages[-1].content
-                if isinstance(content, str):
-                    return content
-                return str(content)
-
-            return "レスポンスを生成できませんでした。"
+            result = await self._graph.ainvoke(state, config=config)
+            return self._last_ai_content(result["messages"])
+        except AIServiceUnavailableError:
+            # 過負荷・遮断中は呼び出し元で503として返す
+            raise
         except Exception as e:
             logger.error(
                 "langgraph_ai_response_generation_error",
@@ -271,70 +815,81 @@ class LangGraphAIService(IAIService):
             )
             raise RuntimeError(f"AIレスポンス生成エラー: {str(e)}")
 
+    @staticmethod
+    def _last_ai_content(messages: list[BaseMessage]) -> str:
+        """最後のAIメッセージの内容を取得"""
+        ai_messages = [msg for msg in messages if isinstance(msg, AIMessage)]
+        if ai_messages:
+            content = ai_messages[-1].content
+            if isinstance(content, str):
+                return content
+            return str(content)
+
+        return "レスポンスを生成できませんでした。"
+
     async def generate_stream(
-        self, message: Message, context: str = ""
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
     ) -> AsyncGenerator[str, None]:
         """AIレスポンスをストリームで生成"""
-        try:
-            # ステートを初期化
-            state: GraphState = {
-                "messages": [],
-                "session_id": message.metadata.get("session_id", "")
-                if message.metadata
-                else "",
-                "user_id": message.sender,
-                "context": context,
-                "metadata": message.metadata or {},
-                "next_action": None,
-            }
-
-            # コンテキストから会話履歴を構築
-            if context:
-                self._build_messages_from_context(state, context)
-
-            # ユーザーメッセージを追加
-            state["messages"].append(HumanMessage(content=message.content))
-
-            # LangFuseコールバックを設定
-            config = {}
-            if self._langfuse_handler:
-                config["callbacks"] = [self._langfuse_handler]
-
-            # 意図を判定（通常の会話フローを決定）
-            await self._intent_classifier(state)
-            next_action = state.get("next_action", "normal")
+        async with contextlib.aclosing(
+            self.stream_events(message, context, history)
+        ) as events:
+            async for event in events:
+                if event.kind == "token":
+                    yield event.content
+
+    async def stream_events(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> AsyncGenerator[GraphStreamEvent, None]:
+        """
+        グラフを実行し、回答のチャンクとノードの完了をイベントで取得
 
+        回答を生成するノードはチャンクをカスタムストリームに書き出すため、
+        どのルート（通常・RAG・ツール）でも最初のチャンクはLLMから
+        届いた時点で流れる（グラフの完了を待たない）
+        """
+        started = time.perf_counter()
+        try:
+            state = self._initial_state(message, context, history, stream=True)
             logger.debug(
                 "langgraph_streaming_started",
-                next_action=next_action,
                 message_length=len(message.content),
                 messages_count=len(state["messages"]),
             )
-
-            # プロンプトテンプレートを使用してメッセージを構築
-            formatted_messages = await self._prompt.ainvoke(
-                {"messages": state["messages"]}
-            )
-
-            # 通常の会話の場合は、直接LLMをストリーミング実行
-            if next_action == "normal":
-                # 共通のストリーミング処理を使用
-                async for content in self._stream_with_formatted_messages(
-                    formatted_messages, config
-                ):
-                    yield content
-            else:
-                # RAGやツール実行の場合は、グラフをストリーミング実行
-                # ただし、現在は実装されていないため、通常の会話と同じ処理
-                # 将来的にRAG/ツール実装時は、ここで専用のストリーミング処理を実装
-                logger.debug(
-                    "langgraph_streaming_using_fallback",
-                    action=next_action,
+            async with closing_stream(
+                self._graph.astream(
+                    state,
+                    config=self._run_config(),
+                    stream_mode=["custom", "updates"],
                 )
-                async for content in self._stream_with_formatted_messages(
-                    formatted_messages, config
-                ):
-                    yield content
+            ) as stream:
+                async for mode, payload in stream:
+                    if mode == "custom":
+                        yield GraphStreamEvent(
+                            kind="token", content=str(payload)
+                        )
+                        continue
+                    elapsed_ms = round(
+                        (time.perf_counter() - started) * 1000, 3
+                    )
+                    for node, update in cast(dict[str, Any], payload).items():
+                        logger.debug(
+                            "langgraph_node_completed",
+                            node=node,
+                            next_action=(update or {}).get("next_action"),
+                            elapsed_ms=elapsed_ms,
+                        )
+                        yield GraphStreamEvent(
+                            kind="node", node=node, elapsed_ms=elapsed_ms
+                        )
+        except AIServiceUnavailableError:
+            raise
         except Exception as e:
             error_msg = str(e)
             logger.error(
@@ -344,50 +899,9 @@ class LangGraphAIService(IAIService):
             )
             raise RuntimeError(f"AIストリーム生成エラー: {error_msg}")
 
-    def _build_messages_from_context(
-        self, state: GraphState, context: str
-    ) -> None:
-        """
-        コンテキスト文字列から会話履歴を構築してメッセージに追加
-
-        Args:
-            state: グラフのステート
-            context: 会話履歴を含むコンテキスト文字列
-        """
-        if not context:
-            return
 
-        # コンテキストを解析して会話履歴を構築
-        # 形式: "User: ...\nAI: ...\nUser: ...\nAI: ..."
-        lines = context.strip().split("\n")
-        current_user_message = None
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            if line.startswith("User:"):
-                # 前のユーザーメッセージがあれば保存
-                if current_user_message:
-                    state["messages"].append(
-                        HumanMessage(content=current_user_message)
-                    )
-                current_user_message = line.replace("User:", "").strip()
-            elif line.startswith("AI:"):
-                ai_message = line.replace("AI:", "").strip()
-                if current_user_message:
-                    state["messages"].append(
-                        HumanMessage(content=current_user_message)
-                    )
-                    state["messages"].append(AIMessage(content=ai_message))
-                    current_user_message = None
-                else:
-                    # ユーザーメッセージがない場合はAIメッセージのみ追加
-                    state["messages"].append(AIMessage(content=ai_message))
-
-        # 最後のユーザーメッセージがあれば保存
-        if current_user_message:
-            state["messages"].append(
-                HumanMessage(content=current_user_message)
-            )
+def _to_messages(formatted_messages: Any) -> list[BaseMessage]:
+    """フォーマット済みのプロンプトをメッセージのリストに変換"""
+    if hasattr(formatted_messages, "to_messages"):
+        return cast(list[BaseMessage], formatted_messages.to_messages())
+    return cast(list[BaseMessage], formatted_messages)
@@ -0,0 +1,43 @@
+"""チャットモデルの生成"""
+
+from langchain_core.language_models import BaseChatModel
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+from app.infrastructure.services.fake_llm import FakeChatModel, FakeLLMProfile
+
+logger = get_logger(__name__)
+
+
+def create_chat_model(
+    model_name: str | None = None, *, temperature: float | None = None
+) -> BaseChatModel:
+    """
+    設定に応じたチャットモデルを作成
+
+    Args:
+        model_name: モデル名（省略時はGOOGLE_AI_MODEL）
+        temperature: 温度（省略時はLANGCHAIN_TEMPERATURE）
+
+    Returns:
+        チャットモデル（LLM_BACKENDがfakeの場合はフェイク）
+    """
+    backend = settings.LLM_BACKEND
+    if backend == "fake":
+        return FakeChatModel(
+            model_name=model_name or settings.GOOGLE_AI_MODEL,
+            latency_profile=FakeLLMProfile.from_settings(),
+        )
+    if backend != "google":
+        logger.warning("unknown_llm_backend", backend=backend)
+    return ChatGoogleGenerativeAI(
+        model=model_name or settings.GOOGLE_AI_MODEL,
+        google_api_key=settings.GOOGLE_AI_API_KEY,
+        temperature=(
+            temperature
+            if temperature is not None
+            else settings.LANGCHAIN_TEMPERATURE
+        ),
+        convert_system_message_to_human=True,
+    )
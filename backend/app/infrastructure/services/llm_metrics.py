@@ -0,0 +1,501 @@
+"""LLM呼び出しのメトリクス（キュー待ち・TTFT・チャンク間隔・トークン数）"""
+
+from bisect import bisect_left
+from collections.abc import Iterator, Mapping, Sequence
+import contextlib
+from contextvars import ContextVar
+from dataclasses import dataclass
+import math
+import threading
+import time
+from typing import Any, Literal
+
+from app.infrastructure.config import settings
+
+LLMCallStatus = Literal["ok", "error", "cancelled"]
+
+# ルート・意図を指定せずに呼ばれた場合のラベル
+DEFAULT_ROUTE = "direct"
+DEFAULT_INTENT = "unclassified"
+
+# 秒のヒストグラムの上限（キュー待ち・TTFT・所要時間）
+_SECONDS_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+# チャンク間隔のヒストグラムの上限（秒）
+_GAP_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+_TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+_CHUNK_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+# (名前, 説明, 上限) のヒストグラム
+_HISTOGRAMS: tuple[tuple[str, str, Sequence[float]], ...] = (
+    (
+        "llm_queue_wait_seconds",
+        "同時実行数制限の実行枠を待った時間",
+        _SECONDS_BUCKETS,
+    ),
+    (
+        "llm_time_to_first_token_seconds",
+        "呼び出しから最初のチャンクまでの時間",
+        _SECONDS_BUCKETS,
+    ),
+    (
+        "llm_inter_chunk_gap_seconds",
+        "ストリームのチャンクの間隔",
+        _GAP_BUCKETS,
+    ),
+    (
+        "llm_request_duration_seconds",
+        "呼び出しから最後のチャンク（応答）までの時間",
+        _SECONDS_BUCKETS,
+    ),
+    ("llm_prompt_tokens", "プロンプトのトークン数", _TOKEN_BUCKETS),
+    ("llm_completion_tokens", "回答のトークン数", _TOKEN_BUCKETS),
+    ("llm_chunks", "ストリームのチャンク数", _CHUNK_BUCKETS),
+)
+
+# ラベル (model, route, intent)
+_Labels = tuple[str, str, str]
+_LABEL_NAMES = ("model", "route", "intent")
+
+# 呼び出しに付けるルート・意図（llm_call_labelsで設定）
+_call_labels: ContextVar[tuple[str, str] | None] = ContextVar(
+    "llm_call_labels", default=None
+)
+# リクエスト単位の集計（llm_request_metricsで設定）
+_request_metrics: ContextVar["LLMRequestMetrics | None"] = ContextVar(
+    "llm_request_metrics", default=None
+)
+
+
+class Histogram:
+    """累積しない件数を上限ごとに持つヒストグラム"""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self._bounds = tuple(buckets)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """値を記録"""
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """(上限, その上限以下の件数) のリスト（最後は+Inf）"""
+        result: list[tuple[float, int]] = []
+        total = 0
+        for bound, count in zip(
+            (*self._bounds, math.inf), self._counts, strict=True
+        ):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float) -> float | None:
+        """バケット内を線形補間したパーセンタイル（histogram_quantileと同じ）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower = 0.0
+        previous = 0
+        for bound, total in self.cumulative():
+            if total >= rank:
+                if math.isinf(bound):
+                    return self._bounds[-1] if self._bounds else None
+                count = total - previous
+                fraction = (rank - previous) / count if count else 0.0
+                return lower + (bound - lower) * fraction
+            lower, previous = bound, total
+        return None
+
+
+def _percentile(values: Sequence[float], q: float) -> float | None:
+    """ソート済みの値のパーセンタイル（最近傍順位）"""
+    if not values:
+        return None
+    index = max(math.ceil(q * len(values)) - 1, 0)
+    return values[index]
+
+
+def _ms(seconds: float | None) -> float | None:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+@dataclass(frozen=True)
+class LLMCallMetrics:
+    """1回のLLM呼び出しの計測結果（時間はミリ秒）"""
+
+    model: str
+    route: str
+    intent: str
+    status: LLMCallStatus
+    streaming: bool
+    duration_ms: float
+    queue_wait_ms: float | None = None
+    ttft_ms: float | None = None
+    gap_p50_ms: float | None = None
+    gap_p95_ms: float | None = None
+    gap_p99_ms: float | None = None
+    gap_max_ms: float | None = None
+    chunks: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def labels(self) -> _Labels:
+        return (self.model, self.route, self.intent)
+
+
+class LLMRequestMetrics:
+    """
+    1つのリクエスト（ユーザーのメッセージ）で行ったLLM呼び出しの集計
+
+    キュー待ちは同時実行数制限の実行枠を得たときに記録し、
+    リクエストの最初のLLM呼び出しに含める
+    """
+
+    def __init__(self) -> None:
+        self.calls: list[LLMCallMetrics] = []
+        self._queue_wait: float | None = None
+
+    def set_queue_wait(self, seconds: float) -> None:
+        """実行枠を待った時間を記録"""
+        self._queue_wait = seconds
+
+    def take_queue_wait(self) -> float | None:
+        """未割り当てのキュー待ちを取り出す（2回目以降はNone）"""
+        queue_wait, self._queue_wait = self._queue_wait, None
+        return queue_wait
+
+    def summary(self) -> dict[str, Any]:
+        """
+        WebSocketのdoneフレームに載せる集計
+
+        TTFT・チャンク間隔・ルートは回答を返した呼び出し（最後に成功した
+        呼び出し）の値、時間・トークン数・チャンク数は全呼び出しの合計
+        """
+        answer = next(
+            (call for call in reversed(self.calls) if call.status == "ok"),
+            self.calls[-1] if self.calls else None,
+        )
+        queue_waits = [
+            call.queue_wait_ms
+            for call in self.calls
+            if call.queue_wait_ms is not None
+        ]
+        return {
+            "llm_calls": len(self.calls),
+            "model": answer.model if answer else None,
+            "route": answer.route if answer else None,
+            "intent": answer.intent if answer else None,
+            "queue_wait_ms": (
+                round(sum(queue_waits), 3) if queue_waits else None
+            ),
+            "ttft_ms": answer.ttft_ms if answer else None,
+            "inter_chunk_gap_ms": {
+                "p50": answer.gap_p50_ms if answer else None,
+                "p95": answer.gap_p95_ms if answer else None,
+                "p99": answer.gap_p99_ms if answer else None,
+                "max": answer.gap_max_ms if answer else None,
+            },
+            "duration_ms": round(
+                sum(call.duration_ms for call in self.calls), 3
+            ),
+            "prompt_tokens": sum(call.prompt_tokens for call in self.calls),
+            "completion_tokens": sum(
+                call.completion_tokens for call in self.calls
+            ),
+            "chunks": sum(call.chunks for call in self.calls),
+        }
+
+
+@contextlib.contextmanager
+def llm_call_labels(*, route: str, intent: str | None) -> Iterator[None]:
+    """ブロック内のLLM呼び出しにルート・意図のラベルを付ける"""
+    token = _call_labels.set((route, intent or DEFAULT_INTENT))
+    try:
+        yield
+    finally:
+        _call_labels.reset(token)
+
+
+@contextlib.contextmanager
+def llm_request_metrics() -> Iterator[LLMRequestMetrics]:
+    """ブロック内（子タスクを含む）のLLM呼び出しを1リクエストとして集計"""
+    request = LLMRequestMetrics()
+    token = _request_metrics.set(request)
+    try:
+        yield request
+    finally:
+        _request_metrics.reset(token)
+
+
+def current_llm_request() -> LLMRequestMetrics | None:
+    """集計中のリクエスト（llm_request_metricsの外ではNone）"""
+    return _request_metrics.get()
+
+
+class LLMCallTimer:
+    """
+    1回のLLM呼び出しの計測
+
+    作成時点を呼び出しの開始とし、チャンクごとにchunk()、
+    終了時にfinish()を呼ぶ。トークン数は応答のusage_metadataがあれば
+    その値、なければ推定値を使う。
+    """
+
+    def __init__(
+        self, recorder: "LLMMetricsRecorder", model: str, *, streaming: bool
+    ) -> None:
+        self._recorder = recorder
+        self._model = model
+        self._streaming = streaming
+        self._route, self._intent = _call_labels.get() or (
+            DEFAULT_ROUTE,
+            DEFAULT_INTENT,
+        )
+        request = current_llm_request()
+        self._queue_wait = (
+            request.take_queue_wait() if request is not None else None
+        )
+        self._started = time.perf_counter()
+        self._first: float | None = None
+        self._last: float | None = None
+        self._gaps: list[float] = []
+        self._chunks = 0
+        self._input_tokens = 0
+        self._output_tokens = 0
+        self._finished = False
+
+    def chunk(self) -> None:
+        """チャンクの到着を記録"""
+        now = time.perf_counter()
+        if self._last is None:
+            self._first = now
+        else:
+            self._gaps.append(now - self._last)
+        self._last = now
+        self._chunks += 1
+
+    def usage(self, message: Any) -> None:
+        """応答（チャンク）のusage_metadataのトークン数を加算"""
+        usage: Mapping[str, Any] | None = getattr(
+            message, "usage_metadata", None
+        )
+        if usage:
+            self._input_tokens += int(usage.get("input_tokens") or 0)
+            self._output_tokens += int(usage.get("output_tokens") or 0)
+
+    def finish(
+        self,
+        *,
+        status: LLMCallStatus = "ok",
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+    ) -> LLMCallMetrics | None:
+        """
+        計測を終えて記録（2回目以降は何もしない）
+
+        Args:
+            status: 呼び出しの結果
+            prompt_tokens: usage_metadataがない場合のプロンプトの推定値
+            completion_tokens: usage_metadataがない場合の回答の推定値
+        """
+        if self._finished:
+            return None
+        self._finished = True
+        end = self._last if self._last is not None else time.perf_counter()
+        gaps = sorted(self._gaps)
+        call = LLMCallMetrics(
+            model=self._model,
+            route=self._route,
+            intent=self._intent,
+            status=status,
+            streaming=self._streaming,
+            duration_ms=round((end - self._started) * 1000, 3),
+            queue_wait_ms=_ms(self._queue_wait),
+            ttft_ms=(
+                _ms(self._first - self._started)
+                if self._streaming and self._first is not None
+                else None
+            ),
+            gap_p50_ms=_ms(_percentile(gaps, 0.5)),
+            gap_p95_ms=_ms(_percentile(gaps, 0.95)),
+            gap_p99_ms=_ms(_percentile(gaps, 0.99)),
+            gap_max_ms=_ms(gaps[-1] if gaps else None),
+            chunks=self._chunks,
+            prompt_tokens=self._input_tokens or prompt_tokens,
+            completion_tokens=self._output_tokens or completion_tokens,
+        )
+        self._recorder.record(call, self._gaps)
+        return call
+
+
+class LLMMetricsRecorder:
+    """
+    LLM呼び出しのメトリクスをラベル (model, route, intent) ごとに集計
+
+    Prometheusのテキスト形式でヒストグラムを出力する。
+    リクエストの集計中（llm_request_metrics）であれば、呼び出しの
+    計測結果をそのリクエストにも追加する。
+    """
+
+    def __init__(self, enabled: bool | None = None) -> None:
+        self._enabled = (
+            enabled if enabled is not None else settings.LLM_METRICS_ENABLED
+        )
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple[str, _Labels], Histogram] = {}
+        self._calls: dict[tuple[_Labels, str], int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def start(self, model: str, *, streaming: bool) -> LLMCallTimer:
+        """LLM呼び出しの計測を開始"""
+        return LLMCallTimer(self, model, streaming=streaming)
+
+    def record(self, call: LLMCallMetrics, gaps: Sequence[float] = ()) -> None:
+        """呼び出しの計測結果を記録"""
+        if not self._enabled:
+            return
+        request = current_llm_request()
+        if request is not None:
+            request.calls.append(call)
+
+        labels = call.labels
+        with self._lock:
+            key = (labels, call.status)
+            self._calls[key] = self._calls.get(key, 0) + 1
+            if call.status != "ok":
+                return
+            if call.queue_wait_ms is not None:
+                self._observe(
+                    "llm_queue_wait_seconds", labels, call.queue_wait_ms / 1000
+                )
+            if call.ttft_ms is not None:
+                self._observe(
+                    "llm_time_to_first_token_seconds",
+                    labels,
+                    call.ttft_ms / 1000,
+                )
+            for gap in gaps:
+                self._observe("llm_inter_chunk_gap_seconds", labels, gap)
+            self._observe(
+                "llm_request_duration_seconds", labels, call.duration_ms / 1000
+            )
+            self._observe("llm_prompt_tokens", labels, call.prompt_tokens)
+            self._observe(
+                "llm_completion_tokens", labels, call.completion_tokens
+            )
+            if call.streaming:
+                self._observe("llm_chunks", labels, call.chunks)
+
+    def render_prometheus(self) -> str:
+        """Prometheusのテキスト形式で出力"""
+        lines: list[str] = [
+            "# HELP llm_calls_total LLM呼び出しの回数（結果別）",
+            "# TYPE llm_calls_total counter",
+        ]
+        with self._lock:
+            for (labels, status), count in sorted(self._calls.items()):
+                lines.append(
+                    f"llm_calls_total{_render_labels(labels, status=status)}"
+                    f" {count}"
+                )
+            for name, help_text, _ in _HISTOGRAMS:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(
+                    self._histograms.items()
+                ):
+                    if metric != name:
+                        continue
+                    for bound, total in histogram.cumulative():
+                        le = "+Inf" if math.isinf(bound) else f"{bound:g}"
+                        lines.append(
+                            f"{name}_bucket{_render_labels(labels, le=le)}"
+                            f" {total}"
+                        )
+                    rendered = _render_labels(labels)
+                    lines.append(f"{name}_sum{rendered} {histogram.sum:g}")
+                    lines.append(f"{name}_count{rendered} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> list[dict[str, Any]]:
+        """ラベルごとの呼び出し数とパーセンタイル（p50・p95・p99）"""
+        with self._lock:
+            label_sets = sorted({labels for labels, _ in self._calls})
+            result: list[dict[str, Any]] = []
+            for labels in label_sets:
+                entry: dict[str, Any] = dict(
+                    zip(_LABEL_NAMES, labels, strict=True)
+                )
+                entry["calls"] = {
+                    status: count
+                    for (call_labels, status), count in self._calls.items()
+                    if call_labels == labels
+                }
+                for name, _, _ in _HISTOGRAMS:
+                    histogram = self._histograms.get((name, labels))
+                    if histogram is None:
+                        continue
+                    entry[name] = {
+                        f"p{round(q * 100)}": _round(histogram.quantile(q))
+                        for q in (0.5, 0.95, 0.99)
+                    }
+                result.append(entry)
+        return result
+
+    def _observe(self, name: str, labels: _Labels, value: float) -> None:
+        histogram = self._histograms.get((name, labels))
+        if histogram is None:
+            buckets = next(b for n, _, b in _HISTOGRAMS if n == name)
+            histogram = Histogram(buckets)
+            self._histograms[(name, labels)] = histogram
+        histogram.observe(value)
+
+
+def _round(value: float | None) -> float | None:
+    return round(value, 6) if value is not None else None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_labels(labels: _Labels, **extra: str) -> str:
+    pairs = [*zip(_LABEL_NAMES, labels, strict=True), *extra.items()]
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+# プロセス共有のメトリクス（/metricsで出力）
+llm_metrics = LLMMetricsRecorder()
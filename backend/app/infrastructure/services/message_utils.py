@@ -0,0 +1,166 @@
+"""会話履歴のLangChainメッセージ変換ユーティリティ"""
+
+from collections.abc import Sequence
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+)
+
+from app.domain.services.context_window import (
+    estimate_tokens,
+    parse_context,
+    render_passages,
+)
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.conversation_turn import ConversationTurn
+from app.domain.value_objects.retrieved_passage import RetrievedPassage
+from app.domain.value_objects.tool_call import ToolResult
+from app.infrastructure.services.chunk_utils import normalize_chunk_content
+
+# 要約はシステムメッセージとして会話履歴の先頭に置く
+SUMMARY_MESSAGE_TEMPLATE = "これまでの会話の要約:\n{summary}"
+
+# 検索結果はシステムメッセージとして最後のユーザーメッセージの直前に置く
+PASSAGES_MESSAGE_TEMPLATE = (
+    "以下の参考情報を踏まえて回答してください。"
+    "参考情報に答えがない場合は、その旨を伝えてください。\n\n{passages}"
+)
+
+# ツールの実行結果も検索結果と同じく最後のユーザーメッセージの直前に置く
+TOOL_RESULTS_MESSAGE_TEMPLATE = (
+    "以下のツールの実行結果を踏まえて回答してください。"
+    "失敗したツールの結果は使わず、必要であればその旨を伝えてください。"
+    "\n\n{results}"
+)
+
+
+def estimate_messages_tokens(
+    messages: Sequence[BaseMessage], system_prompt: str = ""
+) -> int:
+    """メッセージ列（とシステムプロンプト）の推定トークン数"""
+    return estimate_tokens(system_prompt) + sum(
+        estimate_tokens(normalize_chunk_content(message.content))
+        for message in messages
+    )
+
+
+def turns_to_messages(turns: Sequence[ConversationTurn]) -> list[BaseMessage]:
+    """
+    会話ターンをLangChainのメッセージに変換
+
+    Args:
+        turns: 古い順の会話ターン
+
+    Returns:
+        HumanMessage/AIMessageを交互に並べたメッセージのリスト
+        （空の発話は含めない）
+    """
+    messages: list[BaseMessage] = []
+    for turn in turns:
+        if turn.user_message:
+            messages.append(HumanMessage(content=turn.user_message))
+        if turn.ai_response:
+            messages.append(AIMessage(content=turn.ai_response))
+    return messages
+
+
+def build_history_messages(
+    context: str = "",
+    history: ConversationHistory | None = None,
+) -> list[BaseMessage]:
+    """
+    会話履歴のメッセージを構築
+
+    Args:
+        context: "User: ...\\nAI: ..." 形式のコンテキスト文字列
+        history: 構造化された会話履歴（指定時はcontextより優先）
+
+    Returns:
+        会話履歴のメッセージのリスト（要約があれば先頭にSystemMessage）
+    """
+    if history is not None:
+        messages = turns_to_messages(history.turns)
+        if history.summary:
+            summary = SUMMARY_MESSAGE_TEMPLATE.format(summary=history.summary)
+            messages.insert(0, SystemMessage(content=summary))
+        return messages
+    if not context:
+        return []
+    return turns_to_messages(parse_context(context))
+
+
+def insert_passages(
+    messages: Sequence[BaseMessage],
+    passages: Sequence[RetrievedPassage],
+    max_tokens: int,
+) -> list[BaseMessage]:
+    """
+    検索結果をシステムメッセージとしてメッセージ列に挿入
+
+    Args:
+        messages: 会話履歴と最後のユーザーメッセージ
+        passages: 類似度の高い順のパッセージ
+        max_tokens: 検索結果に使えるトークン数
+
+    Returns:
+        最後のHumanMessageの直前に検索結果を挿入した新しいリスト
+        （予算内に収まるパッセージがなければ元のメッセージのコピー）
+    """
+    rendered = render_passages(passages, max_tokens)
+    if not rendered:
+        return list(messages)
+    return _insert_before_last_human(
+        messages, PASSAGES_MESSAGE_TEMPLATE.format(passages=rendered)
+    )
+
+
+def insert_tool_results(
+    messages: Sequence[BaseMessage],
+    results: Sequence[ToolResult],
+    max_tokens: int,
+) -> list[BaseMessage]:
+    """
+    ツールの実行結果をシステムメッセージとしてメッセージ列に挿入
+
+    Args:
+        messages: 会話履歴と最後のユーザーメッセージ
+        results: 要求した順のツールの結果
+        max_tokens: 実行結果に使えるトークン数
+
+    Returns:
+        最後のHumanMessageの直前に実行結果を挿入した新しいリスト
+        （予算内に収まる結果がなければ元のメッセージのコピー）
+    """
+    blocks: list[str] = []
+    budget = max_tokens
+    for result in results:
+        status = "" if result.ok else f"（{result.status}）"
+        block = f"[{result.name}]{status}\n{result.content}"
+        cost = estimate_tokens(block)
+        if cost > budget:
+            continue
+        blocks.append(block)
+        budget -= cost
+    if not blocks:
+        return list(messages)
+    return _insert_before_last_human(
+        messages,
+        TOOL_RESULTS_MESSAGE_TEMPLATE.format(results="\n\n".join(blocks)),
+    )
+
+
+def _insert_before_last_human(
+    messages: Sequence[BaseMessage], content: str
+) -> list[BaseMessage]:
+    """最後のHumanMessageの直前にシステムメッセージを挿入"""
+    result = list(messages)
+    position = len(result)
+    for i in range(len(result) - 1, -1, -1):
+        if isinstance(result[i], HumanMessage):
+            position = i
+            break
+    result.insert(position, SystemMessage(content=content))
+    return result
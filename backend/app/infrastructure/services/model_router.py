@@ -0,0 +1,214 @@
+"""レイテンシを考慮したモデルルーター"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+import time
+
+from app.domain.value_objects.intent import IntentDecision
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 回答を打ち切った・ブロックしたことを示すfinish_reason
+_UNRELIABLE_FINISH_REASONS = frozenset({"SAFETY", "RECITATION", "OTHER"})
+
+# 低確信の目印を探す回答の先頭文字数
+_MARKER_SCAN_CHARS = 200
+
+
+@dataclass
+class ModelStats:
+    """モデルごとの観測値（指数移動平均）"""
+
+    ttft_seconds: float | None = None
+    error_rate: float = 0.0
+    requests: int = 0
+    errors: int = 0
+    last_error_at: float = 0.0
+
+
+class ModelRouter:
+    """
+    リクエストごとにモデルを選択するルーター
+
+    高速モデル群と高性能モデル群を持ち、次の順で選択する。
+
+    1. メタデータのmodel_preferenceが設定済みのモデルであればそれを使う
+    2. 意図がnormalで確信度が高く、メッセージが短ければ高速モデル群、
+       それ以外は高性能モデル群を候補とする
+    3. 候補のうちエラー率が上限以下のモデルから、TTFTの移動平均が
+       最も小さいモデルを選ぶ（未計測のモデルは優先して試す）
+
+    エラー率が上限を超えたモデルは、最後のエラーから一定時間が経つまで
+    候補から外す。
+    """
+
+    def __init__(
+        self,
+        fast_models: Sequence[str] | None = None,
+        strong_models: Sequence[str] | None = None,
+        *,
+        short_message_tokens: int | None = None,
+        min_intent_confidence: float | None = None,
+        alpha: float | None = None,
+        max_error_rate: float | None = None,
+        recovery_seconds: float | None = None,
+        uncertain_markers: Sequence[str] | None = None,
+    ) -> None:
+        self._fast = list(fast_models or settings.MODEL_ROUTER_FAST_MODELS)
+        self._strong = list(
+            strong_models
+            or settings.MODEL_ROUTER_STRONG_MODELS
+            or [settings.GOOGLE_AI_MODEL]
+        )
+        self._short_message_tokens = (
+            short_message_tokens or settings.MODEL_ROUTER_SHORT_MESSAGE_TOKENS
+        )
+        self._min_intent_confidence = (
+            min_intent_confidence
+            if min_intent_confidence is not None
+            else settings.MODEL_ROUTER_MIN_INTENT_CONFIDENCE
+        )
+        self._alpha = alpha or settings.MODEL_ROUTER_EWMA_ALPHA
+        self._max_error_rate = (
+            max_error_rate
+            if max_error_rate is not None
+            else settings.MODEL_ROUTER_MAX_ERROR_RATE
+        )
+        self._recovery_seconds = (
+            recovery_seconds
+            if recovery_seconds is not None
+            else settings.MODEL_ROUTER_RECOVERY_SECONDS
+        )
+        self._uncertain_markers = tuple(
+            marker.casefold()
+            for marker in (
+                uncertain_markers
+                if uncertain_markers is not None
+                else settings.MODEL_ROUTER_UNCERTAIN_MARKERS
+            )
+        )
+        self._stats: dict[str, ModelStats] = {
+            model: ModelStats() for model in (*self._fast, *self._strong)
+        }
+
+    @property
+    def models(self) -> list[str]:
+        """ルーティング対象の全モデル"""
+        return list(self._stats)
+
+    def choose(
+        self,
+        *,
+        intent: IntentDecision | None,
+        message_tokens: int,
+        preference: str | None = None,
+    ) -> str:
+        """
+        リクエストに使うモデルを選択
+
+        Args:
+            intent: 意図判定の結果
+            message_tokens: ユーザーメッセージの推定トークン数
+            preference: ユーザーが希望するモデル
+
+        Returns:
+            モデル名
+        """
+        if preference and preference in self._stats:
+            return preference
+
+        use_fast = (
+            bool(self._fast)
+            and (intent is None or intent.route == "normal")
+            and (
+                intent is None
+                or intent.confidence >= self._min_intent_confidence
+            )
+            and message_tokens <= self._short_message_tokens
+        )
+        primary, secondary = (
+            (self._fast, self._strong) if use_fast else (self._strong, [])
+        )
+        model = self._fastest_healthy(primary) or self._fastest_healthy(
+            secondary
+        )
+        # 全モデルが除外中の場合は本来の候補の先頭を使う
+        return model or primary[0]
+
+    def escalation_model(self, model: str) -> str | None:
+        """高速モデルの回答を再生成する高性能モデル（対象外ならNone）"""
+        if model not in self._fast:
+            return None
+        return self._fastest_healthy(self._strong)
+
+    def is_low_confidence(
+        self, content: str, finish_reason: str | None = None
+    ) -> bool:
+        """回答が低確信（空・ブロック・わからない旨の回答）か判定"""
+        if not content.strip():
+            return True
+        if finish_reason and finish_reason.upper() in (
+            _UNRELIABLE_FINISH_REASONS
+        ):
+            return True
+        head = content[:_MARKER_SCAN_CHARS].casefold()
+        return any(marker in head for marker in self._uncertain_markers)
+
+    def record_ttft(self, model: str, seconds: float) -> None:
+        """最初のチャンクまでの時間を記録"""
+        stats = self._stats.setdefault(model, ModelStats())
+        stats.ttft_seconds = (
+            seconds
+            if stats.ttft_seconds is None
+            else self._alpha * seconds + (1 - self._alpha) * stats.ttft_seconds
+        )
+
+    def record_outcome(self, model: str, ok: bool) -> None:
+        """呼び出しの成否を記録"""
+        stats = self._stats.setdefault(model, ModelStats())
+        stats.requests += 1
+        stats.error_rate = self._alpha * (0.0 if ok else 1.0) + (
+            1 - self._alpha
+        ) * (stats.error_rate)
+        if not ok:
+            stats.errors += 1
+            stats.last_error_at = time.monotonic()
+
+    def stats(self) -> dict[str, dict[str, float | int | None]]:
+        """モデルごとの観測値を取得"""
+        return {
+            model: {
+                "ttft_ms": (
+                    round(stats.ttft_seconds * 1000, 1)
+                    if stats.ttft_seconds is not None
+                    else None
+                ),
+                "error_rate": round(stats.error_rate, 4),
+                "requests": stats.requests,
+                "errors": stats.errors,
+            }
+            for model, stats in self._stats.items()
+        }
+
+    def _is_healthy(self, stats: ModelStats) -> bool:
+        """エラー率が上限以下か（超えていても一定時間後は再試行）"""
+        if stats.error_rate <= self._max_error_rate:
+            return True
+        elapsed = time.monotonic() - stats.last_error_at
+        return elapsed >= self._recovery_seconds
+
+    def _fastest_healthy(self, models: Sequence[str]) -> str | None:
+        """候補のうちTTFTの移動平均が最小の正常なモデル"""
+        best: str | None = None
+        best_ttft = float("inf")
+        for model in models:
+            stats = self._stats[model]
+            if not self._is_healthy(stats):
+                continue
+            # 未計測のモデルは計測のため優先する
+            ttft = stats.ttft_seconds if stats.ttft_seconds is not None else 0
+            if ttft < best_ttft:
+                best, best_ttft = model, ttft
+        return best
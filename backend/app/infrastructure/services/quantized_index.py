@@ -0,0 +1,272 @@
+"""int8量子化とIVF（転置リスト）によるベクトル索引"""
+
+import time
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+from app.infrastructure.services.vector_index import (
+    QuantizedRows,
+    RowBlocks,
+    StackedRows,
+    VectorIndex,
+)
+
+logger = get_logger(__name__)
+
+# k-meansの学習に使う1リストあたりの標本数と反復回数
+_TRAIN_SAMPLES_PER_LIST = 64
+_TRAIN_ITERATIONS = 10
+
+# リストへの振り分けはこの行数ずつ行う
+_ASSIGN_ROWS = 4096
+
+
+def quantize_int8(vectors: NDArray[np.floating]) -> QuantizedRows:
+    """
+    ベクトルを行ごとのスケールでint8に量子化
+
+    各行を絶対値の最大が127になるよう縮めて丸める。
+    元のベクトルとの内積は (符号 @ クエリ) * スケール で近似できる。
+    """
+    values = np.asarray(vectors, dtype=np.float32)
+    peak = np.abs(values).max(axis=1)
+    scales = np.where(peak > 0, peak / 127, 1.0).astype(np.float32)
+    codes = np.rint(values / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def _nearest_centroids(
+    codes: StackedRows, start: int, end: int, centroids: NDArray[np.float32]
+) -> NDArray[np.int32]:
+    """行ごとに内積が最大のセントロイドの番号を取得"""
+    # スケールは正の定数倍なので最大となるセントロイドは変わらない
+    assignments = np.empty(end - start, dtype=np.int32)
+    for i in range(start, end, _ASSIGN_ROWS):
+        rows = np.arange(i, min(i + _ASSIGN_ROWS, end))
+        scores = codes[rows] @ centroids.T
+        assignments[i - start : i - start + len(rows)] = scores.argmax(axis=1)
+    return assignments
+
+
+def _train_centroids(
+    codes: StackedRows, size: int, lists: int, rng: np.random.Generator
+) -> NDArray[np.float32]:
+    """標本の球面k-meansでセントロイドを学習"""
+    sample_size = min(size, lists * _TRAIN_SAMPLES_PER_LIST)
+    sample = codes[np.sort(rng.choice(size, sample_size, replace=False))]
+    sample /= np.maximum(np.linalg.norm(sample, axis=1, keepdims=True), 1e-12)
+
+    centroids = sample[rng.choice(sample_size, lists, replace=False)]
+    for _ in range(_TRAIN_ITERATIONS):
+        assignments = (sample @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=lists)
+        # 空になったリストは標本から選び直す
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = sample[rng.choice(sample_size, len(empty))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+class QuantizedVectorIndex(VectorIndex):
+    """
+    int8に量子化した符号で候補を絞り、元のベクトルで再順位付けする索引
+
+    件数がivf_thresholdに達した後にensure_annで符号からk-meansでリストを学習し、
+    以降の検索はクエリに近いprobes個のリストの行だけを符号で採点する。
+    上位rerank件は元のベクトルとの内積で並べ直して返す。
+
+    常駐するのは1行あたり次元数バイトの符号とスケール・リスト番号のみで、
+    元のベクトルは再順位付けで読む行にしか触れない。セグメント
+    （メモリマップ）から開いた場合は元のベクトルのページはOSに任せられる。
+    メモリ上に追加した行は元のベクトルも常駐する。
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        *,
+        ivf_threshold: int | None = None,
+        lists: int | None = None,
+        probes: int | None = None,
+        rerank: int | None = None,
+        seed: int = 0,
+    ) -> None:
+        # 近似探索はIVFで行うためHNSWグラフは作らない
+        super().__init__(dimension, hnsw_threshold=0)
+        self._ivf_threshold = (
+            ivf_threshold
+            if ivf_threshold is not None
+            else settings.RAG_IVF_THRESHOLD
+        )
+        self._lists_count = lists or settings.RAG_IVF_LISTS
+        self._probes = probes or settings.RAG_IVF_PROBES
+        self._rerank = rerank or settings.RAG_IVF_RERANK
+        self._rng = np.random.default_rng(seed)
+
+        self._codes = RowBlocks(dimension, np.int8)
+        self._scales: NDArray[np.float32] = np.zeros(
+            len(self._deleted), dtype=np.float32
+        )
+        self._centroids: NDArray[np.float32] | None = None
+        # リスト番号 -> 行番号。1件ずつの追加は検索時にまとめて配列へ移す
+        self._lists: list[NDArray[np.int32]] = []
+        self._pending: dict[int, list[int]] = {}
+        self._list_rows = 0
+        self._training = False
+
+    def add_block(
+        self,
+        block: NDArray[np.floating],
+        quantized: QuantizedRows | None = None,
+    ) -> int:
+        """
+        読み取り専用の行列をコピーせずに追加し、先頭の行番号を返す
+
+        quantizedを省略した場合はここで量子化する
+        """
+        codes, scales = (
+            quantized if quantized is not None else quantize_int8(block)
+        )
+        with self._lock:
+            start = super().add_block(block)
+            self._codes.add_block(codes)
+            self._scales[start : start + len(scales)] = scales
+            if self._centroids is not None:
+                self._assign(
+                    start,
+                    _nearest_centroids(
+                        self._codes.view(), start, self._size, self._centroids
+                    ),
+                )
+        return start
+
+    def search(
+        self, query: NDArray[np.float32], k: int
+    ) -> list[tuple[int, float]]:
+        """類似度の高い順に最大k件の(ID, 類似度)を取得"""
+        with self._lock:
+            if k <= 0 or len(self) == 0:
+                return []
+            if self._centroids is None:
+                return self._brute_force(query, k)
+
+            probes = min(self._probes, len(self._centroids))
+            nearest = np.argpartition(-(self._centroids @ query), probes - 1)
+            ids = np.concatenate(
+                [self._list_array(int(c)) for c in nearest[:probes]]
+            )
+            ids = ids[~self._deleted[ids]]
+            if not len(ids):
+                return []
+
+            approximate = (self._codes.view()[ids] @ query) * self._scales[ids]
+            count = min(max(self._rerank, k), len(ids))
+            candidates = ids[np.argpartition(-approximate, count - 1)[:count]]
+            exact = self._rows()[candidates] @ query
+            order = np.argsort(-exact)[:k]
+            return [(int(candidates[i]), float(exact[i])) for i in order]
+
+    def stats(self) -> dict[str, int | str]:
+        """件数と検索方式、常駐する符号と元のベクトルのバイト数を取得"""
+        return {
+            "vectors": len(self),
+            "deleted": self._deleted_count,
+            "backend": (
+                "ivf_int8" if self._centroids is not None else "brute_force"
+            ),
+            "bytes": self._codes.nbytes
+            + self._size * self._scales.itemsize
+            + self._list_rows * 4
+            + (self._centroids.nbytes if self._centroids is not None else 0),
+            "exact_bytes": self._vectors.nbytes,
+        }
+
+    def ensure_ann(self) -> None:
+        """件数がしきい値に達していればIVFのリストを学習"""
+        with self._lock:
+            if (
+                self._centroids is not None
+                or self._training
+                or not 0 < self._ivf_threshold <= self._size
+            ):
+                return
+            self._training = True
+            codes, size = self._codes.view(), self._size
+            lists = min(self._lists_count, size)
+
+        started = time.perf_counter()
+        try:
+            centroids = _train_centroids(codes, size, lists, self._rng)
+            assignments = _nearest_centroids(codes, 0, size, centroids)
+            with self._lock:
+                # 学習中に追加された行も同じセントロイドで振り分ける
+                self._centroids = centroids
+                order = np.argsort(assignments, kind="stable")
+                bounds = np.searchsorted(
+                    assignments[order], np.arange(lists + 1)
+                )
+                self._lists = [
+                    order[bounds[i] : bounds[i + 1]].astype(np.int32)
+                    for i in range(lists)
+                ]
+                self._list_rows = size
+                self._assign(
+                    size,
+                    _nearest_centroids(
+                        self._codes.view(), size, self._size, centroids
+                    ),
+                )
+        finally:
+            with self._lock:
+                self._training = False
+        logger.info(
+            "vector_index_ivf_trained",
+            vectors=size,
+            lists=lists,
+            elapsed_seconds=round(time.perf_counter() - started, 3),
+        )
+
+    def _append(self, vector: NDArray[np.float32]) -> int:
+        """1件追加して行番号を返す（学習済みであればリストにも振り分ける）"""
+        row = super()._append(vector)
+        codes, scales = quantize_int8(vector[None, :])
+        self._codes.append(codes[0])
+        self._scales[row] = scales[0]
+        if self._centroids is not None:
+            self._assign(
+                row,
+                _nearest_centroids(
+                    self._codes.view(), row, row + 1, self._centroids
+                ),
+            )
+        return row
+
+    def _reserve_deleted(self, size: int) -> None:
+        """削除済みの印とスケールの配列をsize行以上に拡張"""
+        super()._reserve_deleted(size)
+        if size <= len(self._scales):
+            return
+        scales = np.zeros(len(self._deleted), dtype=np.float32)
+        scales[: len(self._scales)] = self._scales
+        self._scales = scales
+
+    def _assign(self, start: int, assignments: NDArray[np.int32]) -> None:
+        """start行目からの各行をリストに追加"""
+        for offset, number in enumerate(assignments.tolist()):
+            self._pending.setdefault(number, []).append(start + offset)
+        self._list_rows += len(assignments)
+
+    def _list_array(self, number: int) -> NDArray[np.int32]:
+        """リストの行番号の配列"""
+        pending = self._pending.pop(number, None)
+        if pending:
+            self._lists[number] = np.concatenate(
+                [self._lists[number], np.asarray(pending, dtype=np.int32)]
+            )
+        return self._lists[number]
@@ -0,0 +1,276 @@
+"""トークンバケットによるユーザー・セッション単位のレート制限"""
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+import time
+
+import redis.asyncio as redis
+
+from app.domain.exceptions import RateLimitExceededError
+from app.domain.services import IRateLimiter
+from app.domain.services.context_window import estimate_tokens
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+# バケットのキーの接頭辞（キー形式を変える場合はバージョンを上げる）
+RATE_LIMIT_KEY_PREFIX = "rate_limit:v1:"
+
+# 全バケットを1回の往復で確認し、すべて足りる場合のみ消費する。
+# 時刻はRedisサーバーのものを使い、APIノード間の時計のずれを避ける。
+# KEYS: バケットのキー / ARGV: (容量, 1ミリ秒あたりの補充量, 消費量) × キー数
+# 戻り値: {待機ミリ秒（0なら許可）, 不足したバケットの番号}
+_TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+local levels = {}
+local wait, blocked = 0, 0
+for i = 1, #KEYS do
+  local capacity = tonumber(ARGV[i * 3 - 2])
+  local rate = tonumber(ARGV[i * 3 - 1])
+  local cost = tonumber(ARGV[i * 3])
+  local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local tokens = tonumber(state[1]) or capacity
+  local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+  tokens = math.min(capacity, tokens + elapsed * rate)
+  levels[i] = tokens
+  if tokens < cost then
+    local needed = math.ceil((cost - tokens) / rate)
+    if needed > wait then
+      wait, blocked = needed, i
+    end
+  end
+end
+if wait > 0 then
+  return {wait, blocked}
+end
+for i = 1, #KEYS do
+  local capacity = tonumber(ARGV[i * 3 - 2])
+  local rate = tonumber(ARGV[i * 3 - 1])
+  local remaining = levels[i] - tonumber(ARGV[i * 3])
+  redis.call('HSET', KEYS[i], 'tokens', remaining, 'ts', now)
+  redis.call('PEXPIRE', KEYS[i], math.ceil((capacity - remaining) / rate) + 1000)
+end
+return {0, 0}
+"""
+
+
+@dataclass(frozen=True)
+class BucketLimit:
+    """トークンバケット1つ分の制限"""
+
+    scope: str
+    capacity: float
+    refill_per_second: float
+
+    @property
+    def enabled(self) -> bool:
+        """容量・補充量が正の場合のみ制限する"""
+        return self.capacity > 0 and self.refill_per_second > 0
+
+
+def default_limits() -> tuple[BucketLimit, ...]:
+    """設定から制限の一覧を作成（ユーザー/セッション × 件数/トークン数）"""
+    return (
+        BucketLimit(
+            "user_requests",
+            settings.RATE_LIMIT_USER_BURST,
+            settings.RATE_LIMIT_USER_RPS,
+        ),
+        BucketLimit(
+            "user_tokens",
+            settings.RATE_LIMIT_USER_TPM,
+            settings.RATE_LIMIT_USER_TPM / 60,
+        ),
+        BucketLimit(
+            "session_requests",
+            settings.RATE_LIMIT_SESSION_BURST,
+            settings.RATE_LIMIT_SESSION_RPS,
+        ),
+        BucketLimit(
+            "session_tokens",
+            settings.RATE_LIMIT_SESSION_TPM,
+            settings.RATE_LIMIT_SESSION_TPM / 60,
+        ),
+    )
+
+
+class LocalTokenBucketLimiter:
+    """
+    プロセス内のトークンバケット（Redisが利用できない場合のフォールバック）
+
+    バケットはLRUで最大max_keys個まで保持する。制限はプロセスごとに
+    かかるため、複数ノードでは全体の上限がノード数倍になる。
+    """
+
+    def __init__(self, *, max_keys: int | None = None) -> None:
+        self._max_keys = max_keys or settings.RATE_LIMIT_LOCAL_MAX_KEYS
+        # キー -> (残りトークン数, 最終更新時刻)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def consume(
+        self, requests: list[tuple[str, BucketLimit, float]]
+    ) -> tuple[float, int]:
+        """
+        全バケットが足りる場合のみ消費
+
+        Args:
+            requests: (キー, 制限, 消費量) のリスト
+
+        Returns:
+            (待機秒数（0なら許可）, 不足したバケットの番号)
+        """
+        now = time.monotonic()
+        levels: list[float] = []
+        wait, blocked = 0.0, -1
+        for index, (key, limit, cost) in enumerate(requests):
+            tokens, updated = self._buckets.get(key, (limit.capacity, now))
+            tokens = min(
+                limit.capacity,
+                tokens + (now - updated) * limit.refill_per_second,
+            )
+            levels.append(tokens)
+            if tokens < cost:
+                needed = (cost - tokens) / limit.refill_per_second
+                if needed > wait:
+                    wait, blocked = needed, index
+        if blocked >= 0:
+            return wait, blocked
+
+        for (key, _, cost), tokens in zip(requests, levels, strict=True):
+            self._buckets[key] = (tokens - cost, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self._max_keys:
+            self._buckets.popitem(last=False)
+        return 0.0, -1
+
+
+class RedisRateLimiter(IRateLimiter):
+    """
+    Redisのトークンバケットによる分散レート制限
+
+    ユーザーとセッションそれぞれについて、リクエスト件数（毎秒）と
+    推定トークン数（毎分）のバケットを持ち、Luaスクリプトで全バケットを
+    アトミックに確認・消費する（1回の往復で完結する）。
+    Redisでエラーが起きた場合は一定時間プロセス内のバケットで制限する。
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        *,
+        limits: tuple[BucketLimit, ...] | None = None,
+        response_tokens: int | None = None,
+        timeout: float | None = None,
+        retry_seconds: float | None = None,
+        fallback: LocalTokenBucketLimiter | None = None,
+    ) -> None:
+        self._client = client
+        self._script = client.register_script(_TOKEN_BUCKET_SCRIPT)
+        self._limits = tuple(
+            limit
+            for limit in (limits if limits is not None else default_limits())
+            if limit.enabled
+        )
+        self._response_tokens = (
+            response_tokens
+            if response_tokens is not None
+            else settings.LANGCHAIN_RESPONSE_RESERVE_TOKENS
+        )
+        self._timeout = timeout or settings.RATE_LIMIT_REDIS_TIMEOUT_SECONDS
+        self._retry_seconds = (
+            retry_seconds
+            if retry_seconds is not None
+            else settings.RATE_LIMIT_REDIS_RETRY_SECONDS
+        )
+        self._fallback = fallback or LocalTokenBucketLimiter()
+        self._redis_retry_at = 0.0
+
+        self._allowed = 0
+        self._rejected = 0
+        self._fallbacks = 0
+
+    async def acquire(
+        self, *, user_id: str, session_id: str, message: str
+    ) -> None:
+        """リクエスト1件とメッセージの推定トークン数を消費"""
+        if not self._limits:
+            return
+
+        tokens = estimate_tokens(message) + self._response_tokens
+        requests = [
+            (
+                self._key(limit.scope, user_id, session_id),
+                limit,
+                # 容量を超える消費は満杯のバケットをすべて使うものとして扱う
+                min(
+                    1.0 if limit.scope.endswith("_requests") else tokens,
+                    limit.capacity,
+                ),
+            )
+            for limit in self._limits
+        ]
+
+        wait, blocked = await self._consume(requests)
+        if blocked < 0:
+            self._allowed += 1
+            return
+
+        self._rejected += 1
+        scope = requests[blocked][1].scope
+        logger.info(
+            "rate_limit_exceeded",
+            scope=scope,
+            user_id=user_id,
+            session_id=session_id,
+            retry_after=round(wait, 3),
+        )
+        raise RateLimitExceededError(
+            "リクエストが多すぎます。しばらくしてから再試行してください",
+            scope=scope,
+            retry_after=wait,
+        )
+
+    def stats(self) -> dict[str, int | bool]:
+        """許可・拒否・フォールバックの回数を取得"""
+        return {
+            "allowed": self._allowed,
+            "rejected": self._rejected,
+            "fallbacks": self._fallbacks,
+            "redis_available": time.monotonic() >= self._redis_retry_at,
+        }
+
+    async def _consume(
+        self, requests: list[tuple[str, BucketLimit, float]]
+    ) -> tuple[float, int]:
+        """Redisで消費（利用できない場合はプロセス内のバケット）"""
+        if time.monotonic() >= self._redis_retry_at:
+            args: list[float] = []
+            for _, limit, cost in requests:
+                args.extend(
+                    (limit.capacity, limit.refill_per_second / 1000, cost)
+                )
+            try:
+                async with asyncio.timeout(self._timeout):
+                    wait_ms, blocked = await self._script(
+                        keys=[key for key, _, _ in requests], args=args
+                    )
+                return int(wait_ms) / 1000, int(blocked) - 1
+            except (redis.RedisError, OSError, TimeoutError) as e:
+                self._redis_retry_at = time.monotonic() + self._retry_seconds
+                logger.warning(
+                    "rate_limit_redis_unavailable",
+                    error=str(e) or type(e).__name__,
+                    retry_seconds=self._retry_seconds,
+                )
+
+        self._fallbacks += 1
+        return self._fallback.consume(requests)
+
+    @staticmethod
+    def _key(scope: str, user_id: str, session_id: str) -> str:
+        """バケットのキーを作成"""
+        subject = user_id if scope.startswith("user_") else session_id
+        return f"{RATE_LIMIT_KEY_PREFIX}{scope}:{subject}"
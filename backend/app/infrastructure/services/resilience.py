@@ -0,0 +1,482 @@
+"""LLM呼び出しの適応的な同時実行数制限とサーキットブレーカー"""
+
+import asyncio
+from collections import deque
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Mapping,
+)
+import contextlib
+import time
+from typing import TypeVar
+
+from app.domain.exceptions import AIServiceUnavailableError
+from app.domain.services import IAIService
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+from app.infrastructure.services.chunk_utils import closing_stream
+from app.infrastructure.services.llm_metrics import current_llm_request
+
+logger = get_logger(__name__)
+
+_T = TypeVar("_T")
+
+# AIサービスが上流のエラーを回答として返す場合の定型文
+_ERROR_RESPONSE_PREFIX = "エラーが発生しました"
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD方式で同時実行数の上限を調整するリミッター
+
+    呼び出しが成功し、レイテンシがしきい値以下であれば上限を加算的に増やし
+    （上限分の呼び出しが成功するごとに+1）、失敗またはしきい値超過であれば
+    backoff倍に乗算的に減らす。上限を超えた呼び出しは最大max_queue件まで
+    最大max_wait秒待機させ、それを超える場合は即座に失敗させる。
+    """
+
+    def __init__(
+        self,
+        *,
+        initial_limit: int | None = None,
+        min_limit: int | None = None,
+        max_limit: int | None = None,
+        backoff: float | None = None,
+        latency_threshold: float | None = None,
+        max_queue: int | None = None,
+        max_wait: float | None = None,
+    ) -> None:
+        self._min_limit = min_limit or settings.AI_LIMITER_MIN_LIMIT
+        self._max_limit = max_limit or settings.AI_LIMITER_MAX_LIMIT
+        self._limit = float(initial_limit or settings.AI_LIMITER_INITIAL_LIMIT)
+        self._backoff = backoff or settings.AI_LIMITER_BACKOFF
+        self._latency_threshold = (
+            latency_threshold or settings.AI_LIMITER_LATENCY_THRESHOLD_SECONDS
+        )
+        self._max_queue = (
+            max_queue
+            if max_queue is not None
+            else settings.AI_LIMITER_MAX_QUEUE
+        )
+        self._max_wait = (
+            max_wait
+            if max_wait is not None
+            else settings.AI_LIMITER_MAX_WAIT_SECONDS
+        )
+
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+        self._acquired = 0
+        self._queued = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        self._limit_increases = 0
+        self._limit_decreases = 0
+        self._max_queue_depth = 0
+
+    @property
+    def limit(self) -> int:
+        """現在の同時実行数の上限"""
+        return int(self._limit)
+
+    async def acquire(self) -> None:
+        """
+        実行枠を取得（空きがなければ待機）
+
+        Raises:
+            AIServiceUnavailableError: 待機列が満杯、または待機がタイムアウト
+        """
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            self._acquired += 1
+            return
+
+        if len(self._waiters) >= self._max_queue:
+            self._rejected_queue_full += 1
+            logger.warning(
+                "ai_limiter_queue_full",
+                limit=self.limit,
+                queue_depth=len(self._waiters),
+            )
+            raise AIServiceUnavailableError(
+                "AIサービスが混み合っています", retry_after=self._max_wait
+            )
+
+        waiter: asyncio.Future[None] = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._waiters.append(waiter)
+        self._queued += 1
+        self._max_queue_depth = max(self._max_queue_depth, len(self._waiters))
+        try:
+            await asyncio.wait({waiter}, timeout=self._max_wait)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+        if not waiter.done():
+            self._abandon(waiter)
+            self._rejected_timeout += 1
+            logger.warning(
+                "ai_limiter_wait_timeout",
+                limit=self.limit,
+                queue_depth=len(self._waiters),
+            )
+            raise AIServiceUnavailableError(
+                "AIサービスが混み合っています", retry_after=self._max_wait
+            )
+        self._acquired += 1
+
+    def release(
+        self, *, latency: float | None = None, failed: bool = False
+    ) -> None:
+        """
+        実行枠を返却し、結果に応じて上限を調整
+
+        Args:
+            latency: レイテンシ（秒）。Noneの場合は上限を調整しない
+            failed: 呼び出しが失敗したか
+        """
+        self._in_flight -= 1
+        if failed or (
+            latency is not None and latency > self._latency_threshold
+        ):
+            self._set_limit(self._limit * self._backoff)
+        elif latency is not None:
+            self._set_limit(self._limit + 1 / self._limit)
+        self._wake()
+
+    def stats(self) -> dict[str, int]:
+        """上限・実行中・待機列などの統計を取得"""
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue_depth": self._max_queue_depth,
+            "acquired": self._acquired,
+            "queued": self._queued,
+            "rejected_queue_full": self._rejected_queue_full,
+            "rejected_timeout": self._rejected_timeout,
+            "limit_increases": self._limit_increases,
+            "limit_decreases": self._limit_decreases,
+        }
+
+    def _set_limit(self, value: float) -> None:
+        """上限を範囲内に収めて更新（整数部が変わった場合に記録）"""
+        previous = self.limit
+        self._limit = min(max(value, self._min_limit), self._max_limit)
+        if self.limit > previous:
+            self._limit_increases += 1
+        elif self.limit < previous:
+            self._limit_decreases += 1
+            logger.info(
+                "ai_limiter_limit_decreased",
+                previous=previous,
+                limit=self.limit,
+            )
+
+    def _wake(self) -> None:
+        """空いた枠を待機中の呼び出しに先着順で割り当てる"""
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def _abandon(self, waiter: asyncio.Future[None]) -> None:
+        """待機をやめる（直前に枠を割り当てられていれば返却）"""
+        if waiter.done() and not waiter.cancelled():
+            self._in_flight -= 1
+            self._wake()
+            return
+        waiter.cancel()
+        with contextlib.suppress(ValueError):
+            self._waiters.remove(waiter)
+
+
+class CircuitBreaker:
+    """
+    連続失敗で上流への呼び出しを遮断するサーキットブレーカー
+
+    failure_threshold回連続で失敗するとopenになり、reset_seconds秒の間は
+    呼び出しを即座に失敗させる。経過後はhalf_openとして1件だけ試行し、
+    成功すればclosedに戻り、失敗すれば再びopenにする。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int | None = None,
+        reset_seconds: float | None = None,
+    ) -> None:
+        self._failure_threshold = (
+            failure_threshold or settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD
+        )
+        self._reset_seconds = (
+            reset_seconds
+            if reset_seconds is not None
+            else settings.CIRCUIT_BREAKER_RESET_SECONDS
+        )
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        self._opens = 0
+        self._short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        """現在の状態（closed / open / half_open）"""
+        if (
+            self._state == self.OPEN
+            and time.monotonic() - self._opened_at >= self._reset_seconds
+        ):
+            return self.HALF_OPEN
+        return self._state
+
+    def before_call(self) -> None:
+        """
+        呼び出し前の確認
+
+        Raises:
+            AIServiceUnavailableError: 遮断中、または試行中の呼び出しがある
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            logger.info("circuit_breaker_half_open")
+            return
+
+        self._short_circuited += 1
+        retry_after = max(
+            self._reset_seconds - (time.monotonic() - self._opened_at), 0.0
+        )
+        raise AIServiceUnavailableError(
+            "AIサービスが一時的に利用できません", retry_after=retry_after
+        )
+
+    def record_success(self) -> None:
+        """呼び出しの成功を記録"""
+        if self._state != self.CLOSED:
+            logger.info("circuit_breaker_closed")
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        """呼び出しの失敗を記録"""
+        self._failures += 1
+        if self._probing or (
+            self._state == self.CLOSED
+            and self._failures >= self._failure_threshold
+        ):
+            self._opens += 1
+            logger.warning("circuit_breaker_opened", failures=self._failures)
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def record_abort(self) -> None:
+        """結果が得られずに終わった呼び出しを記録（キャンセル等）"""
+        self._probing = False
+
+    def stats(self) -> dict[str, str | int]:
+        """状態・遮断回数などの統計を取得"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opens": self._opens,
+            "short_circuited": self._short_circuited,
+        }
+
+
+class UpstreamGuard:
+    """
+    上流（LLM）呼び出しの同時実行数制限とサーキットブレーカー
+
+    1回の上流呼び出しごとに実行枠を1つ取る。ストリームは最初のチャンク
+    までの時間、通常の呼び出しは完了までの時間をレイテンシとして
+    リミッターに渡す。
+    """
+
+    def __init__(
+        self,
+        *,
+        limiter: AdaptiveConcurrencyLimiter | None = None,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
+        self._limiter = limiter or AdaptiveConcurrencyLimiter()
+        self._breaker = breaker or CircuitBreaker()
+
+    async def call(
+        self,
+        factory: Callable[[], Awaitable[_T]],
+        *,
+        failed: Callable[[_T], bool] | None = None,
+    ) -> _T:
+        """
+        実行枠を取って呼び出す（過負荷・遮断中は即座に失敗）
+
+        Args:
+            factory: 上流を呼び出すコルーチンを作る関数
+            failed: 戻り値が失敗を表すかを判定する関数
+
+        Raises:
+            AIServiceUnavailableError: 遮断中、または実行枠を取れない
+        """
+        await self._enter()
+        started = time.perf_counter()
+        try:
+            result = await factory()
+        except Exception:
+            self._exit(failed=True)
+            raise
+        except BaseException:
+            self._exit(aborted=True)
+            raise
+
+        self._exit(
+            latency=time.perf_counter() - started,
+            failed=failed is not None and failed(result),
+        )
+        return result
+
+    async def stream(
+        self, factory: Callable[[], AsyncIterator[str]]
+    ) -> AsyncGenerator[str, None]:
+        """
+        実行枠を取ってストリームを読む（過負荷・遮断中は即座に失敗）
+
+        Raises:
+            AIServiceUnavailableError: 遮断中、または実行枠を取れない
+        """
+        await self._enter()
+        started = time.perf_counter()
+        ttft: float | None = None
+        try:
+            async with closing_stream(factory()) as stream:
+                async for chunk in stream:
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    yield chunk
+        except Exception:
+            self._exit(failed=True)
+            raise
+        except BaseException:
+            # クライアントの切断等で途中終了した場合は上限を調整しない
+            self._exit(aborted=True)
+            raise
+
+        self._exit(latency=ttft or time.perf_counter() - started)
+
+    def stats(self) -> dict[str, Mapping[str, str | int]]:
+        """リミッターとサーキットブレーカーの統計を取得"""
+        return {
+            "limiter": self._limiter.stats(),
+            "breaker": self._breaker.stats(),
+        }
+
+    async def _enter(self) -> None:
+        """サーキットブレーカーを確認して実行枠を取得"""
+        self._breaker.before_call()
+        started = time.perf_counter()
+        try:
+            await self._limiter.acquire()
+        except BaseException:
+            self._breaker.record_abort()
+            raise
+        # 待った時間は直後のLLM呼び出しのメトリクスに含める
+        request = current_llm_request()
+        if request is not None:
+            request.set_queue_wait(time.perf_counter() - started)
+
+    def _exit(
+        self,
+        *,
+        latency: float | None = None,
+        failed: bool = False,
+        aborted: bool = False,
+    ) -> None:
+        """結果を記録して実行枠を返却"""
+        if aborted:
+            self._breaker.record_abort()
+            self._limiter.release()
+            return
+        if failed:
+            self._breaker.record_failure()
+        else:
+            self._breaker.record_success()
+        self._limiter.release(latency=latency, failed=failed)
+
+
+class ResilientAIService(IAIService):
+    """
+    同時実行数制限とサーキットブレーカー付きAIサービス（デコレーター）
+
+    上流（LLM）の直前に置き、キャッシュヒットは制限の対象にしない。
+    内部で上流の呼び出しを集約するサービス（LangGraphAIService）には
+    使わず、UpstreamGuardを渡して上流の呼び出しごとに制限する。
+    """
+
+    def __init__(
+        self,
+        inner: IAIService,
+        *,
+        limiter: AdaptiveConcurrencyLimiter | None = None,
+        breaker: CircuitBreaker | None = None,
+        guard: UpstreamGuard | None = None,
+    ) -> None:
+        self._inner = inner
+        self._guard = guard or UpstreamGuard(limiter=limiter, breaker=breaker)
+
+    @property
+    def guard(self) -> UpstreamGuard:
+        """同時実行数制限とサーキットブレーカー"""
+        return self._guard
+
+    async def generate_response(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> str:
+        """AIレスポンスを生成（過負荷・遮断中は即座に失敗）"""
+        return await self._guard.call(
+            lambda: self._inner.generate_response(message, context, history),
+            failed=lambda response: response.startswith(
+                _ERROR_RESPONSE_PREFIX
+            ),
+        )
+
+    async def generate_stream(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """AIレスポンスをストリームで生成（過負荷・遮断中は即座に失敗）"""
+        async with contextlib.aclosing(
+            self._guard.stream(
+                lambda: self._inner.generate_stream(message, context, history)
+            )
+        ) as stream:
+            async for chunk in stream:
+                yield chunk
+
+    def stats(self) -> dict[str, Mapping[str, str | int]]:
+        """リミッターとサーキットブレーカーの統計を取得"""
+        return self._guard.stats()
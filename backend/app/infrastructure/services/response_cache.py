@@ -0,0 +1,252 @@
+"""LLMレスポンスキャッシュ（完全一致）"""
+
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, Callable
+import contextlib
+import hashlib
+import json
+import unicodedata
+
+from app.domain.services import IAIService, ICacheService
+from app.domain.services.context_window import render_history
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+# キャッシュキーの接頭辞（キー形式を変える場合はバージョンを上げる）
+CACHE_KEY_PREFIX = "llm_response:v1:"
+
+# エラー時にAIサービスが返す定型文はキャッシュしない
+UNCACHEABLE_PREFIXES = (
+    "エラーが発生しました",
+    "レスポンスを生成できませんでした",
+)
+
+# メッセージの回答に使うモデルを返す関数
+# （ツール・RAGなど実行時の結果に依存する回答はNoneでキャッシュしない）
+ModelResolver = Callable[[Message], str | None]
+
+
+def is_cacheable_response(response: str) -> bool:
+    """キャッシュに保存できる回答か（空・エラーの定型文は保存しない）"""
+    return bool(response) and not response.startswith(UNCACHEABLE_PREFIXES)
+
+
+def normalize_message(content: str) -> str:
+    """
+    キャッシュキー用にメッセージを正規化
+
+    全角/半角の揺れ（NFKC）、大文字小文字、連続空白を吸収する
+    """
+    normalized = unicodedata.normalize("NFKC", content).casefold()
+    return " ".join(normalized.split())
+
+
+class CachedAIService(IAIService):
+    """
+    完全一致レスポンスキャッシュ付きAIサービス（デコレーター）
+
+    正規化したメッセージ・コンテキスト・モデル名・温度・システムプロンプトの
+    ハッシュをキーとしてICacheServiceに保存する。
+    model_resolverを指定した場合はルーティング後のモデルをキーに使い、
+    Noneを返したメッセージ（ツール・RAGの回答）はキャッシュを通さない。
+    キャッシュヒット時もストリームとして再生するため、
+    WebSocketハンドラーは通常どおりchunkフレームを送信できる。
+    """
+
+    def __init__(
+        self,
+        inner: IAIService,
+        cache: ICacheService,
+        *,
+        model_name: str | None = None,
+        model_resolver: ModelResolver | None = None,
+        temperature: float | None = None,
+        system_prompt: str | None = None,
+        ttl: int | None = None,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        max_value_bytes: int | None = None,
+        replay_chunk_size: int = 32,
+    ) -> None:
+        self._inner = inner
+        self._cache = cache
+        self._model_name = model_name or settings.GOOGLE_AI_MODEL
+        self._model_resolver = model_resolver
+        self._temperature = (
+            temperature
+            if temperature is not None
+            else settings.LANGCHAIN_TEMPERATURE
+        )
+        self._system_prompt = (
+            system_prompt
+            if system_prompt is not None
+            else settings.LANGCHAIN_SYSTEM_PROMPT
+        )
+        self._ttl = ttl or settings.RESPONSE_CACHE_TTL
+        self._max_entries = max_entries or settings.RESPONSE_CACHE_MAX_ENTRIES
+        self._max_bytes = max_bytes or settings.RESPONSE_CACHE_MAX_BYTES
+        self._max_value_bytes = (
+            max_value_bytes or settings.RESPONSE_CACHE_MAX_VALUE_BYTES
+        )
+        self._replay_chunk_size = replay_chunk_size
+
+        # 保存済みキーとサイズ（挿入・参照順）。サイズベースの追い出しに使用
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._bypassed = 0
+
+    def build_key(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> str | None:
+        """キャッシュキーを構築（キャッシュしないメッセージはNone）"""
+        model = (
+            self._model_resolver(message)
+            if self._model_resolver is not None
+            else self._model_name
+        )
+        if model is None:
+            return None
+        if history is not None:
+            context = render_history(history)
+        preference = (message.metadata or {}).get("model_preference")
+        material = json.dumps(
+            [
+                normalize_message(message.content),
+                context,
+                preference,
+                model,
+                self._temperature,
+                self._system_prompt,
+            ],
+            ensure_ascii=False,
+        )
+        digest = hashlib.sha256(material.encode("utf-8")).hexdigest()
+        return f"{CACHE_KEY_PREFIX}{digest}"
+
+    async def generate_response(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> str:
+        """AIレスポンスを生成（キャッシュヒット時はLLMを呼ばない）"""
+        key = self.build_key(message, context, history)
+        if key is None:
+            self._bypassed += 1
+            return await self._inner.generate_response(
+                message, context, history
+            )
+        cached = await self._lookup(key)
+        if cached is not None:
+            return cached
+
+        response = await self._inner.generate_response(
+            message, context, history
+        )
+        await self._store(key, response)
+        return response
+
+    async def generate_stream(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """AIレスポンスをストリームで生成（キャッシュヒット時は再生）"""
+        key = self.build_key(message, context, history)
+        if key is None:
+            self._bypassed += 1
+            async with contextlib.aclosing(
+                self._inner.generate_stream(message, context, history)
+            ) as stream:
+                async for chunk in stream:
+                    yield chunk
+            return
+        cached = await self._lookup(key)
+        if cached is not None:
+            for i in range(0, len(cached), self._replay_chunk_size):
+                yield cached[i : i + self._replay_chunk_size]
+            return
+
+        chunks: list[str] = []
+        async with contextlib.aclosing(
+            self._inner.generate_stream(message, context, history)
+        ) as stream:
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+
+        # 最後まで生成できた場合のみ保存（途中キャンセル時は保存しない）
+        await self._store(key, "".join(chunks))
+
+    def stats(self) -> dict[str, int]:
+        """ヒット/ミス等のカウンターを取得"""
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "stores": self._stores,
+            "evictions": self._evictions,
+            "bypassed": self._bypassed,
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+        }
+
+    async def _lookup(self, key: str) -> str | None:
+        """キャッシュを参照してカウンターを更新"""
+        cached = await self._cache.get(key)
+        if cached is None:
+            self._misses += 1
+            self._entries.pop(key, None)
+            return None
+
+        self._hits += 1
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            # 他のワーカーが保存したエントリも追い出し対象として管理
+            await self._track(key, len(cached.encode("utf-8")))
+        logger.debug("response_cache_hit", key=key)
+        return cached
+
+    async def _store(self, key: str, response: str) -> None:
+        """レスポンスをキャッシュに保存"""
+        if not is_cacheable_response(response):
+            return
+
+        size = len(response.encode("utf-8"))
+        if size > self._max_value_bytes:
+            logger.debug("response_cache_value_too_large", size=size)
+            return
+
+        await self._cache.set(key, response, ttl=self._ttl)
+        self._stores += 1
+        await self._track(key, size)
+
+    async def _track(self, key: str, size: int) -> None:
+        """エントリを登録し、上限を超えた分を古い順に追い出す"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._total_bytes -= previous
+        self._entries[key] = size
+        self._total_bytes += size
+
+        while self._entries and (
+            len(self._entries) > self._max_entries
+            or self._total_bytes > self._max_bytes
+        ):
+            evicted_key, evicted_size = self._entries.popitem(last=False)
+            self._total_bytes -= evicted_size
+            self._evictions += 1
+            await self._cache.delete(evicted_key)
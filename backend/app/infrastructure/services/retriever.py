@@ -0,0 +1,562 @@
+"""プロセス内のベクトル索引による文書検索（RAG）"""
+
+import asyncio
+from bisect import bisect_right
+from collections.abc import Coroutine, Sequence
+from dataclasses import dataclass
+import hashlib
+import json
+from pathlib import Path
+import time
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.domain.services import IRetriever
+from app.domain.value_objects.retrieved_passage import RetrievedPassage
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+from app.infrastructure.services.embedding_service import EmbeddingService
+from app.infrastructure.services.quantized_index import QuantizedVectorIndex
+from app.infrastructure.services.text_chunker import split_text
+from app.infrastructure.services.vector_index import VectorIndex
+from app.infrastructure.services.vector_segments import (
+    Segment,
+    SegmentDocument,
+    SegmentStore,
+)
+
+logger = get_logger(__name__)
+
+# 起動時に取り込む文書の拡張子
+_DOCUMENT_SUFFIXES = (".md", ".txt")
+
+# ディレクトリの取り込みで1回の埋め込みにまとめる文書数
+_DIRECTORY_BATCH = 32
+
+
+def _content_hash(text: str, metadata: dict[str, Any]) -> str:
+    """文書の内容のハッシュ（変更のない文書の再取り込みを省く）"""
+    material = json.dumps(
+        [text, metadata], ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class _Chunk:
+    """索引の1行に対応するチャンク"""
+
+    doc_id: str
+    text: str
+    metadata: dict[str, Any]
+
+
+class _IndexState:
+    """
+    ベクトル索引と行番号 -> チャンクの対応
+
+    セグメントの行は本文をセグメントから都度読み出し、メモリ上で
+    追加した行のみチャンクを保持する。圧縮時は新しい状態を作って
+    丸ごと差し替える（検索中の呼び出しは古い状態を最後まで使う）。
+    """
+
+    def __init__(self, index: VectorIndex) -> None:
+        self.index = index
+        self.segment_names: list[str] = []
+        self.documents: dict[str, SegmentDocument] = {}
+        self.doc_rows: dict[str, list[int]] = {}
+        self._segments: list[Segment] = []
+        self._segment_starts: list[int] = []
+        self._chunks: dict[int, _Chunk] = {}
+
+    def chunk(self, row: int) -> _Chunk | None:
+        """行に対応するチャンクを取得"""
+        chunk = self._chunks.get(row)
+        if chunk is not None:
+            return chunk
+        index = bisect_right(self._segment_starts, row) - 1
+        if index < 0:
+            return None
+        segment = self._segments[index]
+        local = row - self._segment_starts[index]
+        if local >= len(segment):
+            return None
+        document = segment.document(local)
+        return _Chunk(document.doc_id, segment.text(local), document.metadata)
+
+    def add(
+        self,
+        document: SegmentDocument,
+        texts: list[str],
+        vectors: NDArray[np.float32],
+    ) -> list[int]:
+        """文書のチャンクをメモリ上の行として追加（同じIDは置き換え）"""
+        self.remove(document.doc_id)
+        rows = self.index.add(vectors)
+        for row, text in zip(rows, texts, strict=True):
+            self._chunks[row] = _Chunk(
+                document.doc_id, text, document.metadata
+            )
+        self.documents[document.doc_id] = document
+        self.doc_rows[document.doc_id] = rows
+        return rows
+
+    def add_segment(self, segment: Segment) -> None:
+        """セグメントを追加（含まれる文書・削除した文書の古い行は削除）"""
+        for doc_id in segment.removed:
+            self.remove(doc_id)
+        for document in segment.documents:
+            self.remove(document.doc_id)
+
+        start = self.index.add_block(segment.vectors, segment.quantized)
+        self.segment_names.append(segment.name)
+        self._segments.append(segment)
+        self._segment_starts.append(start)
+        for document in segment.documents:
+            self.documents[document.doc_id] = document
+        self.doc_rows.update(segment.document_rows(start))
+
+    def remove(self, doc_id: str) -> list[int]:
+        """文書の行を削除"""
+        self.documents.pop(doc_id, None)
+        rows = self.doc_rows.pop(doc_id, [])
+        if rows:
+            self.index.remove(rows)
+            for row in rows:
+                self._chunks.pop(row, None)
+        return rows
+
+    def export(
+        self,
+    ) -> tuple[list[SegmentDocument], list[int], list[str], NDArray[Any]]:
+        """削除済みを除いた全文書を (文書, 行の文書番号, 本文, ベクトル) で取得"""
+        documents = list(self.documents.values())
+        row_docs: list[int] = []
+        texts: list[str] = []
+        rows: list[int] = []
+        for number, document in enumerate(documents):
+            for row in self.doc_rows.get(document.doc_id, []):
+                chunk = self.chunk(row)
+                row_docs.append(number)
+                texts.append(chunk.text if chunk is not None else "")
+                rows.append(row)
+        return documents, row_docs, texts, self.index.vectors(rows)
+
+
+class InProcessRetriever(IRetriever):
+    """
+    プロセス内のベクトル索引による文書検索
+
+    取り込んだ文書をトークン数の上限でチャンクに分割して埋め込み、
+    VectorIndexに格納する。検索はクエリの埋め込みと索引の検索のみで
+    完結し、外部ストアへの往復を伴わない（ローカル埋め込みなら数ミリ秒）。
+
+    storeを指定した場合は取り込みごとに追記セグメントを書き、起動時は
+    セグメントをメモリマップで開くだけで再埋め込みや再読み込みをしない。
+    他のワーカーが書いたセグメントは次の書き込み時に取り込み、
+    セグメント数や削除済みの割合が増えたら裏で1つに圧縮する。
+
+    quantizationに"int8"を指定した場合はQuantizedVectorIndexを使い、
+    常駐するベクトルのメモリを約1/4にする。
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        *,
+        store: SegmentStore | None = None,
+        chunk_tokens: int | None = None,
+        chunk_overlap_tokens: int | None = None,
+        top_k: int | None = None,
+        min_score: float | None = None,
+        max_segments: int | None = None,
+        compact_deleted_ratio: float | None = None,
+        quantization: str | None = None,
+    ) -> None:
+        self._embedding_service = embedding_service
+        self._store = store
+        self._quantization = quantization or settings.RAG_INDEX_QUANTIZATION
+        if self._quantization not in ("none", "int8"):
+            raise ValueError(f"未対応の量子化方式です: {self._quantization}")
+        self._chunk_tokens = chunk_tokens or settings.RAG_CHUNK_TOKENS
+        self._chunk_overlap_tokens = (
+            chunk_overlap_tokens
+            if chunk_overlap_tokens is not None
+            else settings.RAG_CHUNK_OVERLAP_TOKENS
+        )
+        self._top_k = top_k or settings.RAG_TOP_K
+        self._min_score = (
+            min_score if min_score is not None else settings.RAG_MIN_SCORE
+        )
+        self._max_segments = max_segments or settings.RAG_INDEX_MAX_SEGMENTS
+        self._compact_deleted_ratio = (
+            compact_deleted_ratio
+            if compact_deleted_ratio is not None
+            else settings.RAG_INDEX_COMPACT_DELETED_RATIO
+        )
+
+        self._state = self._new_state()
+        # 書き込みは1件ずつ順番に行う（行番号とチャンクの対応を保つ）
+        self._write_lock = asyncio.Lock()
+        self._background: set[asyncio.Task[None]] = set()
+        self._compacting = False
+
+        self._searches = 0
+        self._search_seconds = 0.0
+        self._compactions = 0
+
+        if store is not None:
+            started = time.perf_counter()
+            with store.lock(exclusive=False):
+                self._sync()
+            logger.info(
+                "retriever_segments_loaded",
+                segments=len(self._state.segment_names),
+                documents=len(self._state.documents),
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 3),
+            )
+
+    async def ingest(
+        self,
+        doc_id: str,
+        text: str,
+        metadata: dict[str, Any] | None = None,
+    ) -> int:
+        """文書をチャンクに分割して索引に追加（同じIDの文書は置き換える）"""
+        await self.ingest_many([(doc_id, text, metadata)])
+        return len(self._state.doc_rows.get(doc_id, []))
+
+    async def ingest_many(
+        self, documents: Sequence[tuple[str, str, dict[str, Any] | None]]
+    ) -> int:
+        """
+        複数の文書 (ID, 本文, メタデータ) をまとめて取り込む
+
+        内容の変わらない文書は埋め込まずに飛ばし、残りの全チャンクを
+        1回の埋め込み呼び出しと1つのセグメントにまとめる。
+        同じIDが複数ある場合は後のものを使う。
+
+        Returns:
+            新たに埋め込んだチャンク数
+        """
+        latest = {
+            doc_id: (text, metadata or {})
+            for doc_id, text, metadata in documents
+        }
+        pending: list[tuple[SegmentDocument, list[str]]] = []
+        for doc_id, (text, metadata) in latest.items():
+            document = SegmentDocument(
+                doc_id, _content_hash(text, metadata), metadata
+            )
+            if self._is_unchanged(document):
+                continue
+            chunks = split_text(
+                text, self._chunk_tokens, self._chunk_overlap_tokens
+            )
+            pending.append((document, chunks))
+        if not pending:
+            return 0
+
+        texts = [chunk for _, chunks in pending for chunk in chunks]
+        vectors = (
+            await self._embedding_service.embed_array(texts)
+            if texts
+            else self._empty_vectors()
+        )
+        async with self._write_lock:
+            # HNSWへの挿入やファイルの書き込みを伴うため、スレッドで行う
+            await asyncio.to_thread(self._write, pending, vectors)
+        # しきい値に達した場合のグラフの構築は書き込みロックの外で行う
+        self.warm_up()
+
+        logger.info(
+            "retriever_documents_ingested",
+            documents=len(pending),
+            chunks=len(texts),
+        )
+        self._schedule_compaction()
+        return len(texts)
+
+    async def remove(self, doc_id: str) -> int:
+        """文書を索引から削除し、削除したチャンク数を返す"""
+        async with self._write_lock:
+            removed = await asyncio.to_thread(self._delete, doc_id)
+        self._schedule_compaction()
+        return removed
+
+    async def search(
+        self, query: str, k: int | None = None
+    ) -> list[RetrievedPassage]:
+        """クエリに近いチャンクを類似度の高い順に取得"""
+        state = self._state
+        if not query.strip() or not state.doc_rows:
+            return []
+
+        started = time.perf_counter()
+        vectors = await self._embedding_service.embed_array([query])
+        passages: list[RetrievedPassage] = []
+        for row, score in state.index.search(vectors[0], k or self._top_k):
+            chunk = state.chunk(row)
+            if chunk is None or score < self._min_score:
+                continue
+            passages.append(
+                RetrievedPassage(
+                    doc_id=chunk.doc_id,
+                    text=chunk.text,
+                    score=score,
+                    metadata=chunk.metadata,
+                )
+            )
+
+        elapsed = time.perf_counter() - started
+        self._searches += 1
+        self._search_seconds += elapsed
+        logger.debug(
+            "retriever_searched",
+            results=len(passages),
+            elapsed_ms=round(elapsed * 1000, 3),
+        )
+        return passages
+
+    async def ingest_directory(self, path: str) -> int:
+        """ディレクトリ内の文書（.md/.txt）を取り込み、文書数を返す"""
+        directory = Path(path)
+        files = sorted(
+            file
+            for file in directory.rglob("*")
+            if file.is_file() and file.suffix in _DOCUMENT_SUFFIXES
+        )
+        for start in range(0, len(files), _DIRECTORY_BATCH):
+            batch = files[start : start + _DIRECTORY_BATCH]
+            documents: list[tuple[str, str, dict[str, Any] | None]] = []
+            for file in batch:
+                text = await asyncio.to_thread(
+                    file.read_text, encoding="utf-8"
+                )
+                doc_id = file.relative_to(directory).as_posix()
+                documents.append((doc_id, text, {"title": file.stem}))
+            await self.ingest_many(documents)
+        return len(files)
+
+    async def compact(self) -> None:
+        """全セグメントを削除済みを除いた1つのセグメントに圧縮"""
+        if self._store is None:
+            return
+        started = time.perf_counter()
+        async with self._write_lock:
+            segment, known = await asyncio.to_thread(self._write_compacted)
+        # グラフの構築は書き込みロックの外で行い、その間の書き込みは
+        # 古い状態に反映する
+        state = await asyncio.to_thread(self._build_state, segment)
+        async with self._write_lock:
+            pruned = await asyncio.to_thread(
+                self._commit_compacted, state, known
+            )
+        if pruned is None:
+            logger.info(
+                "retriever_compaction_superseded", segment=segment.name
+            )
+            return
+        self._compactions += 1
+        logger.info(
+            "retriever_segments_compacted",
+            segments=len(known),
+            pruned=len(pruned),
+            vectors=len(segment),
+            elapsed_seconds=round(time.perf_counter() - started, 3),
+        )
+
+    def warm_up(self) -> None:
+        """件数がしきい値以上であれば近似探索の索引を裏で構築"""
+        self._spawn(asyncio.to_thread(self._state.index.ensure_ann))
+
+    async def close(self) -> None:
+        """実行中の圧縮・グラフ構築を待つ"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> dict[str, int | float | str]:
+        """文書数・チャンク数・平均検索時間を取得"""
+        state = self._state
+        return {
+            "documents": len(state.documents),
+            "segments": len(state.segment_names),
+            "compactions": self._compactions,
+            "searches": self._searches,
+            "avg_search_ms": (
+                round(self._search_seconds / self._searches * 1000, 3)
+                if self._searches
+                else 0.0
+            ),
+            **state.index.stats(),
+        }
+
+    def _new_state(self) -> _IndexState:
+        dimension = self._embedding_service.dimension
+        if self._quantization == "int8":
+            return _IndexState(QuantizedVectorIndex(dimension))
+        return _IndexState(VectorIndex(dimension))
+
+    def _empty_vectors(self) -> NDArray[np.float32]:
+        return np.zeros(
+            (0, self._embedding_service.dimension), dtype=np.float32
+        )
+
+    def _is_unchanged(self, document: SegmentDocument) -> bool:
+        """同じ内容の文書が取り込み済みか"""
+        existing = self._state.documents.get(document.doc_id)
+        return (
+            existing is not None
+            and existing.content_hash == document.content_hash
+        )
+
+    def _sync(self) -> None:
+        """
+        マニフェストに追加されたセグメントを取り込む（ロックの下で呼ぶ）
+
+        他のワーカーが圧縮して既知のセグメントがなくなった場合は読み直す
+        """
+        assert self._store is not None
+        names = self._store.read_manifest()
+        known = self._state.segment_names
+        if names[: len(known)] != known:
+            state = self._new_state()
+            for name in names:
+                state.add_segment(self._store.open(name))
+            self._state = state
+            return
+        for name in names[len(known) :]:
+            self._state.add_segment(self._store.open(name))
+
+    def _write(
+        self,
+        pending: list[tuple[SegmentDocument, list[str]]],
+        vectors: NDArray[np.float32],
+    ) -> None:
+        """文書を索引に追加（永続化する場合は1つの追記セグメントを書く）"""
+        offsets = np.cumsum([0, *(len(chunks) for _, chunks in pending)])
+        if self._store is None:
+            for (document, chunks), start, end in zip(
+                pending, offsets[:-1], offsets[1:], strict=True
+            ):
+                self._state.add(document, chunks, vectors[start:end])
+            return
+
+        with self._store.lock():
+            self._sync()
+            # 他のワーカーが同じ内容を書き込み済みの文書は除く
+            documents: list[SegmentDocument] = []
+            row_docs: list[int] = []
+            texts: list[str] = []
+            keep: list[NDArray[np.float32]] = []
+            for (document, chunks), start, end in zip(
+                pending, offsets[:-1], offsets[1:], strict=True
+            ):
+                if self._is_unchanged(document):
+                    continue
+                row_docs.extend([len(documents)] * len(chunks))
+                documents.append(document)
+                texts.extend(chunks)
+                keep.append(vectors[start:end])
+            if not documents:
+                return
+            segment = self._store.write(
+                documents,
+                row_docs,
+                texts,
+                np.concatenate(keep) if keep else self._empty_vectors(),
+            )
+            self._store.commit([*self._state.segment_names, segment.name])
+            self._state.add_segment(segment)
+
+    def _delete(self, doc_id: str) -> int:
+        """文書を削除（永続化する場合は削除のみのセグメントを書く）"""
+        if self._store is None:
+            return len(self._state.remove(doc_id))
+
+        with self._store.lock():
+            self._sync()
+            rows = self._state.doc_rows.get(doc_id)
+            if rows is None:
+                return 0
+            segment = self._store.write(
+                [], [], [], self._empty_vectors(), removed=[doc_id]
+            )
+            self._store.commit([*self._state.segment_names, segment.name])
+            self._state.add_segment(segment)
+        return len(rows)
+
+    def _write_compacted(self) -> tuple[Segment, list[str]]:
+        """
+        削除済みを除いた全文書で1つのセグメントを書く
+
+        マニフェストはまだ書き換えず、書いたセグメントと
+        その時点のセグメント名の一覧を返す
+        """
+        assert self._store is not None
+        with self._store.lock():
+            self._sync()
+            segment = self._store.write(*self._state.export())
+            return segment, list(self._state.segment_names)
+
+    def _build_state(self, segment: Segment) -> _IndexState:
+        """圧縮したセグメントから新しい状態を作り、近似探索の索引を構築"""
+        state = self._new_state()
+        state.add_segment(segment)
+        state.index.ensure_ann()
+        return state
+
+    def _commit_compacted(
+        self, state: _IndexState, known: list[str]
+    ) -> list[str] | None:
+        """
+        圧縮した状態を確定して差し替え、削除したセグメント名を返す
+
+        構築中に追記されたセグメントは新しい状態にも追加する。
+        他のワーカーが先に圧縮していた場合は確定せずにNoneを返す
+        （書いたセグメントは次の圧縮で削除される）。
+        """
+        assert self._store is not None
+        with self._store.lock():
+            names = self._store.read_manifest()
+            if names[: len(known)] != known:
+                return None
+            for name in names[len(known) :]:
+                state.add_segment(self._store.open(name))
+            self._store.commit(list(state.segment_names))
+            pruned = self._store.prune(state.segment_names)
+        self._state = state
+        return pruned
+
+    def _schedule_compaction(self) -> None:
+        """セグメント数・削除済みの割合が上限を超えたら裏で圧縮"""
+        state = self._state
+        if (
+            self._store is None
+            or self._compacting
+            or (
+                len(state.segment_names) <= self._max_segments
+                and state.index.deleted_ratio < self._compact_deleted_ratio
+            )
+        ):
+            return
+        self._compacting = True
+        self._spawn(self._run_compaction())
+
+    async def _run_compaction(self) -> None:
+        try:
+            await self.compact()
+        except Exception as e:
+            logger.warning(
+                "retriever_compaction_failed", error=str(e), exc_info=True
+            )
+        finally:
+            self._compacting = False
+
+    def _spawn(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        """バックグラウンドタスクを開始（終了時にcloseで待つ）"""
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
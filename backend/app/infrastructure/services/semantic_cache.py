@@ -0,0 +1,275 @@
+"""セマンティックレスポンスキャッシュ（埋め込みの類似度による再利用）"""
+
+from collections import OrderedDict
+from collections.abc import AsyncGenerator
+import contextlib
+from datetime import datetime
+import hashlib
+import json
+from typing import Any
+import uuid
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.domain.services import IAIService
+from app.domain.services.context_window import render_history
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+from app.infrastructure.services.embedding_service import EmbeddingService
+from app.infrastructure.services.response_cache import is_cacheable_response
+from app.models.dynamodb import VectorEmbedding
+
+logger = get_logger(__name__)
+
+
+def _scope_fingerprint(context: str, model_preference: Any = None) -> int:
+    """
+    コンテキストとモデルの希望を比較用の64bit整数に変換
+
+    完全一致キャッシュのキーと同じく、model_preferenceが異なる
+    リクエストの回答は再利用しない
+    """
+    material = json.dumps([context, model_preference], ensure_ascii=False)
+    digest = hashlib.blake2b(material.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class SemanticCacheAIService(IAIService):
+    """
+    セマンティックキャッシュ付きAIサービス（デコレーター）
+
+    ユーザーメッセージを埋め込み、過去のプロンプトとのコサイン類似度が
+    しきい値以上であれば保存済みの回答を返す。文脈に依存する回答を
+    誤って返さないよう、コンテキストが空または短い場合のみ対象とし、
+    コンテキストとmodel_preferenceが一致するエントリだけを検索する。
+
+    意味の類似度を表さない埋め込み（ハッシュ埋め込み）では、1語だけ
+    違う別の質問にも誤った回答を返すため使えない（ValueError）。
+
+    エントリはVectorEmbeddingとして保持し、ベクトルは事前確保した
+    NumPy行列の行に格納する（検索は行列とクエリの内積1回）。
+    上限を超えた場合は最も長く参照されていないエントリから追い出す。
+    """
+
+    def __init__(
+        self,
+        inner: IAIService,
+        embedding_service: EmbeddingService,
+        *,
+        threshold: float | None = None,
+        max_entries: int | None = None,
+        max_context_chars: int | None = None,
+        replay_chunk_size: int = 32,
+    ) -> None:
+        if not embedding_service.semantic:
+            raise ValueError(
+                "セマンティックキャッシュには意味の類似度を表す埋め込みが"
+                "必要です（EMBEDDING_BACKEND=google）"
+            )
+        self._inner = inner
+        self._embedding_service = embedding_service
+        self._threshold = (
+            threshold
+            if threshold is not None
+            else settings.SEMANTIC_CACHE_THRESHOLD
+        )
+        self._max_entries = max_entries or settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self._max_context_chars = (
+            max_context_chars
+            if max_context_chars is not None
+            else settings.SEMANTIC_CACHE_MAX_CONTEXT_CHARS
+        )
+        self._replay_chunk_size = replay_chunk_size
+
+        dimension = embedding_service.dimension
+        self._vectors: NDArray[np.float32] = np.zeros(
+            (self._max_entries, dimension), dtype=np.float32
+        )
+        self._contexts: NDArray[np.int64] = np.zeros(
+            self._max_entries, dtype=np.int64
+        )
+        self._occupied: NDArray[np.bool_] = np.zeros(
+            self._max_entries, dtype=np.bool_
+        )
+        # エントリID -> 行番号（参照順、先頭が最も古い）
+        self._rows: OrderedDict[str, int] = OrderedDict()
+        self._entries: dict[str, VectorEmbedding] = {}
+        self._row_ids: list[str | None] = [None] * self._max_entries
+        self._free_rows = list(range(self._max_entries - 1, -1, -1))
+        # 使用済みの行数（空き行は先頭から割り当てるため、ここまでを検索）
+        self._high_water = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._skips = 0
+        self._evictions = 0
+
+    async def generate_response(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> str:
+        """AIレスポンスを生成（類似プロンプトがあればLLMを呼ばない）"""
+        scope = render_history(history) if history is not None else context
+        preference = _model_preference(message)
+        if not self._is_eligible(scope):
+            self._skips += 1
+            return await self._inner.generate_response(
+                message, context, history
+            )
+
+        query = await self._embed(message.content)
+        cached = self._search(query, scope, preference)
+        if cached is not None:
+            return cached
+
+        response = await self._inner.generate_response(
+            message, context, history
+        )
+        self._store(message.content, query, scope, preference, response)
+        return response
+
+    async def generate_stream(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """AIレスポンスをストリームで生成（ヒット時は保存済みの回答を再生）"""
+        scope = render_history(history) if history is not None else context
+        preference = _model_preference(message)
+        if not self._is_eligible(scope):
+            self._skips += 1
+            async with contextlib.aclosing(
+                self._inner.generate_stream(message, context, history)
+            ) as stream:
+                async for chunk in stream:
+                    yield chunk
+            return
+
+        query = await self._embed(message.content)
+        cached = self._search(query, scope, preference)
+        if cached is not None:
+            for i in range(0, len(cached), self._replay_chunk_size):
+                yield cached[i : i + self._replay_chunk_size]
+            return
+
+        chunks: list[str] = []
+        async with contextlib.aclosing(
+            self._inner.generate_stream(message, context, history)
+        ) as stream:
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+
+        self._store(message.content, query, scope, preference, "".join(chunks))
+
+    def stats(self) -> dict[str, int]:
+        """ヒット/ミス等のカウンターを取得"""
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "skips": self._skips,
+            "evictions": self._evictions,
+            "entries": len(self._rows),
+        }
+
+    def export_entries(self) -> list[VectorEmbedding]:
+        """保存済みエントリを埋め込みベクトル付きで取得"""
+        return [
+            self._entries[entry_id].model_copy(
+                update={"embedding": self._vectors[row].tolist()}
+            )
+            for entry_id, row in self._rows.items()
+        ]
+
+    def _is_eligible(self, context: str) -> bool:
+        """セマンティックキャッシュの対象か（コンテキストが空または短い）"""
+        return len(context) <= self._max_context_chars
+
+    async def _embed(self, text: str) -> NDArray[np.float32]:
+        """メッセージを埋め込みベクトルに変換"""
+        vectors = await self._embedding_service.embed_array([text])
+        return np.asarray(vectors[0], dtype=np.float32)
+
+    def _search(
+        self,
+        query: NDArray[np.float32],
+        context: str,
+        model_preference: Any = None,
+    ) -> str | None:
+        """類似度がしきい値以上の最も近いエントリの回答を取得"""
+        if not self._rows:
+            self._misses += 1
+            return None
+
+        used = self._high_water
+        scores = self._vectors[:used] @ query
+        mask = self._occupied[:used] & (
+            self._contexts[:used]
+            == _scope_fingerprint(context, model_preference)
+        )
+        scores = np.where(mask, scores, -np.inf)
+        row = int(np.argmax(scores))
+        score = float(scores[row])
+
+        if score < self._threshold:
+            self._misses += 1
+            return None
+
+        entry_id = self._row_ids[row]
+        if entry_id is None:
+            self._misses += 1
+            return None
+
+        self._rows.move_to_end(entry_id)
+        self._hits += 1
+        logger.debug("semantic_cache_hit", entry_id=entry_id, similarity=score)
+        response = (self._entries[entry_id].metadata or {}).get("response")
+        return str(response) if response is not None else None
+
+    def _store(
+        self,
+        text: str,
+        vector: NDArray[np.float32],
+        context: str,
+        model_preference: Any,
+        response: str,
+    ) -> None:
+        """回答をエントリとして保存（上限超過時はLRUで追い出し）"""
+        if not is_cacheable_response(response):
+            return
+
+        if not self._free_rows:
+            evicted_id, evicted_row = self._rows.popitem(last=False)
+            del self._entries[evicted_id]
+            self._occupied[evicted_row] = False
+            self._row_ids[evicted_row] = None
+            self._free_rows.append(evicted_row)
+            self._evictions += 1
+
+        row = self._free_rows.pop()
+        self._high_water = max(self._high_water, row + 1)
+        entry_id = f"emb_{uuid.uuid4().hex[:12]}"
+        self._vectors[row] = vector
+        self._contexts[row] = _scope_fingerprint(context, model_preference)
+        self._occupied[row] = True
+        self._rows[entry_id] = row
+        self._row_ids[row] = entry_id
+        # ベクトル本体は行列側に保持し、エントリには重複して持たない
+        self._entries[entry_id] = VectorEmbedding(
+            id=entry_id,
+            text=text,
+            embedding=[],
+            metadata={"response": response, "row": row},
+            created_at=datetime.now(),
+        )
+
+
+def _model_preference(message: Message) -> Any:
+    """メッセージのメタデータのモデルの希望（完全一致キャッシュと同じ）"""
+    return (message.metadata or {}).get("model_preference")
@@ -0,0 +1,138 @@
+"""同一リクエストの同時実行を1本の上流ストリームに集約（single-flight）"""
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+import contextlib
+
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Flight:
+    """実行中の上流ストリーム"""
+
+    def __init__(self) -> None:
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task[None] | None = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str) -> None:
+        """チャンクを追加して待機中の購読者を起こす"""
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: BaseException | None = None) -> None:
+        """ストリームの終了（またはエラー）を通知"""
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def wait(self) -> None:
+        """次のチャンクまたは終了を待機"""
+        await self._changed.wait()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class StreamSingleFlight:
+    """
+    同一キーの同時ストリームを1本の上流呼び出しにまとめる
+
+    最初のリクエストが上流ストリームを開始し、実行中に同じキーで来た
+    リクエストは同じストリームを購読する。各購読者は独立した非同期
+    イテレーターを受け取り、途中から参加しても先頭からチャンクを受け取る。
+    購読者のキャンセルは自身の購読のみを解除し、全購読者がいなくなった
+    時点で上流ストリームもキャンセルする。
+    完了したストリームはテーブルから外すため、結果のキャッシュは行わない。
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[str, _Flight] = {}
+        self._leaders = 0
+        self._followers = 0
+
+    async def stream(
+        self,
+        key: str,
+        factory: Callable[[], AsyncIterator[str]],
+    ) -> AsyncGenerator[str, None]:
+        """
+        キーに対応する上流ストリームを購読
+
+        Args:
+            key: リクエストを同一とみなすためのキー
+            factory: 上流ストリームを生成する関数（先頭の購読者のみ呼ばれる）
+
+        Yields:
+            str: 上流ストリームのチャンク
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, factory))
+            self._leaders += 1
+        else:
+            self._followers += 1
+            logger.debug(
+                "single_flight_joined",
+                key=key,
+                subscribers=flight.subscribers + 1,
+            )
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task:
+                # 誰も購読していない上流ストリームは打ち切る
+                # （以降のリクエストが打ち切り中のストリームに参加しないよう先に外す）
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await flight.task
+
+    def stats(self) -> dict[str, int]:
+        """集約状況のカウンターを取得"""
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self._leaders,
+            "followers": self._followers,
+        }
+
+    async def _run(
+        self,
+        key: str,
+        flight: _Flight,
+        factory: Callable[[], AsyncIterator[str]],
+    ) -> None:
+        """上流ストリームを読み進めて購読者に配信"""
+        try:
+            async for chunk in factory():
+                flight.publish(chunk)
+            flight.finish()
+        except asyncio.CancelledError:
+            flight.finish(asyncio.CancelledError())
+            raise
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
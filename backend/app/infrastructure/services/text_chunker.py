@@ -0,0 +1,82 @@
+"""検索用の文書チャンク分割"""
+
+import re
+
+from app.domain.services.context_window import estimate_tokens
+
+# 文末（句点・感嘆符・疑問符）と改行の直後で区切る
+_SENTENCE_END_RE = re.compile(r"(?<=[。．！？!?])|(?<=\.)\s+|\n+")
+
+
+def split_sentences(text: str) -> list[str]:
+    """テキストを文単位に分割（空の文は除く）"""
+    return [
+        sentence.strip()
+        for sentence in _SENTENCE_END_RE.split(text)
+        if sentence and sentence.strip()
+    ]
+
+
+def _split_long(sentence: str, max_tokens: int) -> list[str]:
+    """1文で上限を超える場合は文字数で等分する"""
+    tokens = estimate_tokens(sentence)
+    parts = -(-tokens // max_tokens)
+    size = -(-len(sentence) // parts)
+    return [sentence[i : i + size] for i in range(0, len(sentence), size)]
+
+
+def split_text(
+    text: str, max_tokens: int, overlap_tokens: int = 0
+) -> list[str]:
+    """
+    テキストをトークン数の上限に収まるチャンクに分割
+
+    文の途中で切らないよう文単位で詰め、前のチャンクの末尾の文を
+    overlap_tokensまで次のチャンクの先頭に重ねる（文脈の切れ目で
+    検索に漏れるのを防ぐ）。上限を超える1文のみ文字数で分割する。
+
+    Args:
+        text: 対象テキスト
+        max_tokens: 1チャンクの推定トークン数の上限
+        overlap_tokens: 前のチャンクと重ねるトークン数
+
+    Returns:
+        チャンクのリスト
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokensは正の整数である必要があります")
+
+    sentences: list[tuple[str, int]] = []
+    for sentence in split_sentences(text):
+        tokens = estimate_tokens(sentence)
+        if tokens <= max_tokens:
+            sentences.append((sentence, tokens))
+        else:
+            sentences.extend(
+                (part, estimate_tokens(part))
+                for part in _split_long(sentence, max_tokens)
+            )
+
+    chunks: list[str] = []
+    current: list[tuple[str, int]] = []
+    current_tokens = 0
+    for sentence, tokens in sentences:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(s for s, _ in current))
+            # 末尾の文を重なり分だけ残す（新しい文が入る余地は必ず残す）
+            kept: list[tuple[str, int]] = []
+            kept_tokens = 0
+            for previous, previous_tokens in reversed(current):
+                if (
+                    kept_tokens + previous_tokens > overlap_tokens
+                    or kept_tokens + previous_tokens + tokens > max_tokens
+                ):
+                    break
+                kept.insert(0, (previous, previous_tokens))
+                kept_tokens += previous_tokens
+            current, current_tokens = kept, kept_tokens
+        current.append((sentence, tokens))
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(s for s, _ in current))
+    return chunks
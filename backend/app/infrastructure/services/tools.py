@@ -0,0 +1,571 @@
+"""ツールの定義と並列実行"""
+
+import ast
+import asyncio
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+import functools
+import hashlib
+import inspect
+import json
+import math
+import multiprocessing
+import operator
+import re
+import time
+from typing import Any
+import unicodedata
+from zoneinfo import ZoneInfo
+
+from app.domain.services import IRetriever
+from app.domain.services.context_window import render_passages
+from app.domain.value_objects.tool_call import ToolCall, ToolResult
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 切り詰めた結果の末尾に付ける印
+_TRUNCATED_MARKER = "…（以下省略）"
+
+
+@dataclass(frozen=True)
+class Tool:
+    """
+    実行できるツールの定義
+
+    funcは引数をキーワードで受け取り、文字列またはJSONに変換できる値を
+    返す。cpu_boundのツールはプロセスプールで実行するため、funcは
+    モジュールのトップレベルの関数（pickleできるもの）にする。
+    plannerはメッセージから呼び出しの引数のリストを抽出する
+    （Noneのツールはモデルが要求した場合のみ呼ばれる）。
+    timeout・max_result_charsを省略した場合はToolExecutorの既定値を使う。
+    """
+
+    name: str
+    description: str
+    func: Callable[..., Any]
+    parameters: dict[str, Any] = field(
+        default_factory=lambda: {"type": "object", "properties": {}}
+    )
+    timeout: float | None = None
+    max_result_chars: int | None = None
+    cpu_bound: bool = False
+    cacheable: bool = True
+    planner: Callable[[str], list[dict[str, Any]]] | None = None
+
+    def spec(self) -> dict[str, Any]:
+        """モデルに渡すツールの定義（bind_toolsに渡すOpenAI形式）"""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+            },
+        }
+
+
+# 計算ツールで使える演算子
+_BINARY_OPERATORS: dict[type[ast.operator], Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPERATORS: dict[type[ast.unaryop], Callable[[Any], Any]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+# べき乗の指数の上限（巨大な整数の計算でワーカーを占有しない）
+_MAX_EXPONENT = 1000
+# 計算結果（途中の値を含む）の整数のビット数の上限
+# （べき乗を入れ子にしても、結果の桁数でワーカーを占有しない）
+_MAX_RESULT_BITS = 10000
+
+# メッセージ中の数式の候補（数字・演算子・括弧の並び）
+_EXPRESSION_RE = re.compile(r"[\d.()+\-*/%^ ]{3,}")
+_OPERATOR_RE = re.compile(r"[\d)]\s*(?:[-+*/%^]|\*\*)\s*[\d(.]")
+# 日付・範囲と区別できない数式（2024-1-15・14-16・1/15など）
+_DATE_OR_RANGE_RE = re.compile(r"\d+(?:-\d+)+|\d+(?:/\d+)+")
+# 計算を求めていることが明らかな語（日付・範囲に見える数式も計算する）
+_CALCULATION_CUES = ("計算", "いくつ", "いくら", "答え", "=")
+
+# 日時ツールを呼ぶキーワード
+_TIME_KEYWORDS = ("今日", "日付", "時刻", "何時", "何日", "曜日")
+
+
+def _normalize_expression(text: str) -> str:
+    """全角の数字・記号と×÷^をPythonの式に揃える"""
+    normalized = unicodedata.normalize("NFKC", text)
+    return (
+        normalized.replace("×", "*")
+        .replace("÷", "/")
+        .replace("^", "**")
+        .strip()
+    )
+
+
+def _evaluate(node: ast.AST) -> int | float:
+    """四則演算・剰余・べき乗のみを評価（名前や呼び出しは使えない）"""
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, int | float):
+        if isinstance(node.value, bool):
+            raise ValueError("真偽値は計算できません")
+        return node.value
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        result: int | float = _UNARY_OPERATORS[type(node.op)](
+            _evaluate(node.operand)
+        )
+        return result
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        left = _evaluate(node.left)
+        right = _evaluate(node.right)
+        if isinstance(node.op, ast.Pow):
+            _check_power(left, right)
+        result = _BINARY_OPERATORS[type(node.op)](left, right)
+        if isinstance(result, int) and result.bit_length() > _MAX_RESULT_BITS:
+            raise ValueError("計算結果が大きすぎます")
+        return result
+    raise ValueError(f"計算できない式です: {ast.dump(node)}")
+
+
+def _check_power(base: int | float, exponent: int | float) -> None:
+    """べき乗の指数と、計算する前に見積もった結果の大きさを確認"""
+    if abs(exponent) > _MAX_EXPONENT:
+        raise ValueError(f"指数が大きすぎます: {exponent}")
+    magnitude = abs(base)
+    # 底が1以下または指数が負の場合、結果の絶対値は大きくならない
+    if magnitude <= 1 or exponent <= 0:
+        return
+    if exponent * math.log2(magnitude) > _MAX_RESULT_BITS:
+        raise ValueError("計算結果が大きすぎます")
+
+
+def calculate(expression: str) -> str:
+    """数式を計算して結果を文字列で返す（プロセスプールで実行する）"""
+    tree = ast.parse(_normalize_expression(expression), mode="eval")
+    result = _evaluate(tree)
+    if isinstance(result, float):
+        return format(result, ".12g")
+    return str(result)
+
+
+def plan_calculations(text: str) -> list[dict[str, Any]]:
+    """
+    メッセージ中の数式ごとに計算ツールの引数を作る
+
+    日付（2024-1-15）や範囲（14-16時）と区別できない数式は、
+    計算を求める語がメッセージにある場合のみ計算する
+    """
+    normalized = _normalize_expression(text)
+    explicit = any(cue in normalized for cue in _CALCULATION_CUES)
+    expressions: list[dict[str, Any]] = []
+    for match in _EXPRESSION_RE.finditer(normalized):
+        expression = match.group().strip()
+        if not _OPERATOR_RE.search(expression):
+            continue
+        if not explicit and _DATE_OR_RANGE_RE.fullmatch(expression):
+            continue
+        try:
+            ast.parse(expression, mode="eval")
+        except SyntaxError:
+            continue
+        expressions.append({"expression": expression})
+    return expressions
+
+
+def current_time(timezone: str = "Asia/Tokyo") -> str:
+    """現在の日時をISO 8601形式（曜日付き）で返す"""
+    now = datetime.now(ZoneInfo(timezone))
+    return f"{now.isoformat(timespec='seconds')} ({now:%A})"
+
+
+def plan_current_time(text: str) -> list[dict[str, Any]]:
+    """日時を尋ねるメッセージであれば日時ツールを呼ぶ"""
+    return [{}] if any(word in text for word in _TIME_KEYWORDS) else []
+
+
+def _warm_up_worker() -> None:
+    """プロセスプールのワーカーにこのモジュールを読み込ませる"""
+
+
+def create_default_tools(retriever: IRetriever | None = None) -> list[Tool]:
+    """
+    組み込みのツールを作成
+
+    Args:
+        retriever: 文書検索（指定した場合は文書検索ツールを含める）
+    """
+    tools = [
+        Tool(
+            name="calculate",
+            description="四則演算・剰余・べき乗の数式を計算する",
+            func=calculate,
+            parameters={
+                "type": "object",
+                "properties": {
+                    "expression": {
+                        "type": "string",
+                        "description": "計算する数式（例: (3 + 4) * 2）",
+                    }
+                },
+                "required": ["expression"],
+            },
+            cpu_bound=True,
+            planner=plan_calculations,
+        ),
+        Tool(
+            name="current_time",
+            description="現在の日時と曜日を取得する",
+            func=current_time,
+            parameters={
+                "type": "object",
+                "properties": {
+                    "timezone": {
+                        "type": "string",
+                        "description": "IANAのタイムゾーン名",
+                    }
+                },
+            },
+            cacheable=False,
+            planner=plan_current_time,
+        ),
+    ]
+    if retriever is not None:
+
+        async def search_documents(query: str) -> str:
+            passages = await retriever.search(query)
+            return render_passages(passages, settings.RAG_CONTEXT_MAX_TOKENS)
+
+        tools.append(
+            Tool(
+                name="search_documents",
+                description="社内文書から質問に関連する箇所を検索する",
+                func=search_documents,
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "query": {"type": "string", "description": "検索語"}
+                    },
+                    "required": ["query"],
+                },
+            )
+        )
+    return tools
+
+
+@dataclass(frozen=True)
+class _CachedResult:
+    """引数のハッシュでキャッシュしたツールの結果"""
+
+    content: str
+    truncated: bool
+    expires_at: float
+
+
+class ToolExecutor:
+    """
+    1ターンで要求された複数のツールを並列に実行する
+
+    呼び出しはTaskGroupで同時に実行するため、ターンの所要時間は
+    各ツールの所要時間の和ではなく最大値になる。ツールごとに
+    タイムアウトと結果の文字数の上限を設け、失敗・タイムアウトは
+    例外にせずToolResultとして返す（他のツールの結果は使える）。
+
+    cpu_boundのツールはプロセスプールで実行し、イベントループと
+    GILを塞がない（タイムアウトした場合は計算中のワーカーを止めて
+    プールを作り直す。同じプールで実行中の他の呼び出しは失敗する）。
+    成功した結果はツール名と引数のハッシュでキャッシュし、同じターン
+    内の同じ呼び出しは1回だけ実行する。
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[Tool],
+        *,
+        timeout: float | None = None,
+        max_result_chars: int | None = None,
+        max_calls: int | None = None,
+        process_workers: int | None = None,
+        cache_max_entries: int | None = None,
+        cache_ttl: float | None = None,
+    ) -> None:
+        self._tools = {tool.name: tool for tool in tools}
+        self._timeout = timeout or settings.TOOL_TIMEOUT_SECONDS
+        self._max_result_chars = (
+            max_result_chars or settings.TOOL_MAX_RESULT_CHARS
+        )
+        self._max_calls = max_calls or settings.TOOL_MAX_CALLS
+        self._process_workers = (
+            process_workers or settings.TOOL_PROCESS_WORKERS
+        )
+        self._cache_max_entries = (
+            cache_max_entries
+            if cache_max_entries is not None
+            else settings.TOOL_CACHE_MAX_ENTRIES
+        )
+        self._cache_ttl = (
+            cache_ttl
+            if cache_ttl is not None
+            else settings.TOOL_CACHE_TTL_SECONDS
+        )
+        self._cache: OrderedDict[str, _CachedResult] = OrderedDict()
+        self._pool: ProcessPoolExecutor | None = None
+        self._pools_terminated = 0
+
+        self._calls = 0
+        self._executed = 0
+        self._cache_hits = 0
+        self._deduplicated = 0
+        self._errors = 0
+        self._timeouts = 0
+        self._truncated = 0
+        self._turns = 0
+        self._turn_seconds = 0.0
+
+    @property
+    def names(self) -> list[str]:
+        """登録済みのツール名"""
+        return list(self._tools)
+
+    def specs(self) -> list[dict[str, Any]]:
+        """モデルに渡すツールの定義"""
+        return [tool.spec() for tool in self._tools.values()]
+
+    def plan(self, text: str) -> list[ToolCall]:
+        """メッセージから各ツールのplannerで呼び出しを組み立てる"""
+        calls: list[ToolCall] = []
+        for tool in self._tools.values():
+            if tool.planner is None:
+                continue
+            calls.extend(
+                ToolCall(name=tool.name, arguments=arguments)
+                for arguments in tool.planner(text)
+            )
+        return calls
+
+    async def execute(self, calls: Sequence[ToolCall]) -> list[ToolResult]:
+        """
+        呼び出しを並列に実行し、要求と同じ順で結果を返す
+
+        max_callsを超えた呼び出しは実行しない
+        """
+        if len(calls) > self._max_calls:
+            logger.warning(
+                "tool_calls_truncated",
+                requested=len(calls),
+                max_calls=self._max_calls,
+            )
+            calls = calls[: self._max_calls]
+        if not calls:
+            return []
+
+        started = time.perf_counter()
+        keys = [self._cache_key(call) for call in calls]
+        tasks: dict[str, asyncio.Task[ToolResult]] = {}
+        async with asyncio.TaskGroup() as group:
+            for call, key in zip(calls, keys, strict=True):
+                if key not in tasks:
+                    tasks[key] = group.create_task(self._run(call, key))
+        results = [
+            replace(tasks[key].result(), call_id=call.call_id)
+            for call, key in zip(calls, keys, strict=True)
+        ]
+
+        elapsed = time.perf_counter() - started
+        self._calls += len(calls)
+        self._deduplicated += len(calls) - len(tasks)
+        self._turns += 1
+        self._turn_seconds += elapsed
+        logger.info(
+            "tools_executed",
+            tools=[result.name for result in results],
+            statuses=[result.status for result in results],
+            elapsed_ms=round(elapsed * 1000, 3),
+            slowest_ms=max(result.elapsed_ms for result in results),
+        )
+        return results
+
+    def warm_up(self) -> None:
+        """プロセスプールのワーカーを起動（最初の呼び出しを待たせない）"""
+        if any(tool.cpu_bound for tool in self._tools.values()):
+            pool = self._get_pool()
+            for _ in range(self._process_workers):
+                pool.submit(_warm_up_worker)
+
+    def close(self) -> None:
+        """プロセスプールを停止"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict[str, Any]:
+        """呼び出し数・キャッシュヒット・失敗の件数とターンの平均時間"""
+        return {
+            "tools": self.names,
+            "calls": self._calls,
+            "executed": self._executed,
+            "cache_hits": self._cache_hits,
+            "deduplicated": self._deduplicated,
+            "errors": self._errors,
+            "timeouts": self._timeouts,
+            "truncated": self._truncated,
+            "pools_terminated": self._pools_terminated,
+            "cache_entries": len(self._cache),
+            "avg_turn_ms": (
+                round(self._turn_seconds / self._turns * 1000, 3)
+                if self._turns
+                else 0.0
+            ),
+        }
+
+    async def _run(self, call: ToolCall, key: str) -> ToolResult:
+        """1件の呼び出しを実行（例外は結果に変換する）"""
+        tool = self._tools.get(call.name)
+        if tool is None:
+            self._errors += 1
+            return ToolResult(
+                name=call.name,
+                content=f"不明なツールです: {call.name}",
+                status="error",
+            )
+
+        cached = self._cache_get(key) if tool.cacheable else None
+        if cached is not None:
+            self._cache_hits += 1
+            return ToolResult(
+                name=tool.name,
+                content=cached.content,
+                truncated=cached.truncated,
+                cached=True,
+            )
+
+        timeout = tool.timeout or self._timeout
+        started = time.perf_counter()
+        self._executed += 1
+        try:
+            async with asyncio.timeout(timeout):
+                value = await self._invoke(tool, call.arguments)
+        except TimeoutError:
+            self._timeouts += 1
+            logger.warning("tool_timed_out", tool=tool.name, timeout=timeout)
+            if tool.cpu_bound:
+                # 結果を捨てるだけではワーカーが計算を続けて枠を占有する
+                self._terminate_pool()
+            return ToolResult(
+                name=tool.name,
+                content=f"{timeout}秒以内に完了しませんでした",
+                status="timeout",
+                elapsed_ms=self._elapsed_ms(started),
+            )
+        except Exception as e:
+            self._errors += 1
+            logger.warning("tool_failed", tool=tool.name, error=str(e))
+            return ToolResult(
+                name=tool.name,
+                content=f"{type(e).__name__}: {e}",
+                status="error",
+                elapsed_ms=self._elapsed_ms(started),
+            )
+
+        content = (
+            value
+            if isinstance(value, str)
+            else json.dumps(value, ensure_ascii=False, default=str)
+        )
+        limit = tool.max_result_chars or self._max_result_chars
+        truncated = len(content) > limit
+        if truncated:
+            self._truncated += 1
+            content = content[:limit] + _TRUNCATED_MARKER
+        if tool.cacheable:
+            self._cache_put(key, content, truncated)
+        return ToolResult(
+            name=tool.name,
+            content=content,
+            elapsed_ms=self._elapsed_ms(started),
+            truncated=truncated,
+        )
+
+    async def _invoke(self, tool: Tool, arguments: dict[str, Any]) -> Any:
+        """ツールの種類に応じてプロセスプール・スレッド・ループで実行"""
+        if tool.cpu_bound:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(
+                    self._get_pool(), functools.partial(tool.func, **arguments)
+                )
+            except BrokenProcessPool:
+                # ワーカーが異常終了したプールは次の呼び出しで作り直す
+                self.close()
+                raise
+        if inspect.iscoroutinefunction(tool.func):
+            return await tool.func(**arguments)
+        return await asyncio.to_thread(tool.func, **arguments)
+
+    def _terminate_pool(self) -> None:
+        """ワーカープロセスを強制終了してプールを破棄（次の呼び出しで作り直す）"""
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        # shutdownは実行中のワーカーを止めないため、プロセスを直接終了する
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        self._pools_terminated += 1
+        logger.warning("tool_pool_terminated", workers=len(processes))
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # スレッドを持つプロセスのforkを避けてspawnで起動する
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    @staticmethod
+    def _cache_key(call: ToolCall) -> str:
+        """ツール名と引数のハッシュ"""
+        material = json.dumps(
+            [call.name, call.arguments],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str) -> _CachedResult | None:
+        cached = self._cache.get(key)
+        if cached is None:
+            return None
+        if cached.expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return cached
+
+    def _cache_put(self, key: str, content: str, truncated: bool) -> None:
+        if self._cache_max_entries <= 0:
+            return
+        self._cache[key] = _CachedResult(
+            content, truncated, time.monotonic() + self._cache_ttl
+        )
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_max_entries:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 3)
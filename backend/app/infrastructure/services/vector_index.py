@@ -0,0 +1,525 @@
+"""プロセス内のベクトル索引（総当たり・HNSW）"""
+
+from bisect import bisect_right
+import heapq
+import math
+import random
+import threading
+import time
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.infrastructure.config import settings
+from app.infrastructure.logging import get_logger
+
+logger = get_logger(__name__)
+
+# ベクトル行列の初期確保行数（以降は倍々で拡張）
+_INITIAL_CAPACITY = 1024
+
+# float32以外のブロックはキャッシュに収まるようこの行数ずつ変換して計算
+_SCAN_ROWS = 2048
+
+# 量子化した行の (int8の符号, 行ごとのスケール)
+QuantizedRows = tuple[NDArray[np.int8], NDArray[np.float32]]
+
+
+class StackedRows:
+    """
+    複数の行列を行方向に連結した1つの行列として参照するビュー
+
+    メモリマップしたセグメントと追記用の行列をコピーせずに扱う。
+    取り出した行はfloat32に変換して返す（float16のブロックも同様）。
+    """
+
+    def __init__(
+        self, blocks: list[NDArray[np.floating]], starts: list[int]
+    ) -> None:
+        self._blocks = blocks
+        self._starts = starts
+
+    @property
+    def blocks(self) -> list[tuple[int, NDArray[np.floating]]]:
+        """(先頭の行番号, 行列) のリスト"""
+        return list(zip(self._starts, self._blocks, strict=True))
+
+    def __getitem__(
+        self, rows: int | list[int] | NDArray[np.int64]
+    ) -> NDArray[np.float32]:
+        if isinstance(rows, int):
+            index = bisect_right(self._starts, rows) - 1
+            row = self._blocks[index][rows - self._starts[index]]
+            return np.asarray(row, dtype=np.float32)
+
+        ids = np.asarray(rows, dtype=np.int64)
+        if len(self._blocks) == 1:
+            return self._blocks[0][ids].astype(np.float32, copy=False)
+        which = np.searchsorted(self._starts, ids, side="right") - 1
+        result = np.empty(
+            (len(ids), self._blocks[0].shape[1]), dtype=np.float32
+        )
+        for index in np.unique(which).tolist():
+            mask = which == index
+            result[mask] = self._blocks[index][ids[mask] - self._starts[index]]
+        return result
+
+
+class RowBlocks:
+    """
+    読み取り専用のブロックと、その後ろに追記する行列からなる行の集合
+
+    追記用の行列は倍々で拡張し、ブロックを追加する時点で確定させて
+    ブロックの後ろから追記を再開する。既存の行は書き換えないため、
+    viewで取得したビューはその後の追加中も参照し続けられる。
+    """
+
+    def __init__(self, dimension: int, dtype: type[np.generic]) -> None:
+        self._dimension = dimension
+        self._dtype = dtype
+        self._blocks: list[NDArray[Any]] = []
+        self._starts: list[int] = []
+        self._tail: NDArray[Any] = np.zeros(
+            (_INITIAL_CAPACITY, dimension), dtype=dtype
+        )
+        self._tail_start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """格納している行のバイト数（メモリマップしたブロックを含む）"""
+        tail_rows = self._size - self._tail_start
+        return (
+            sum(block.nbytes for block in self._blocks)
+            + tail_rows * self._tail.strides[0]
+        )
+
+    def append(self, row: NDArray[Any]) -> None:
+        """追記用の行列に1行追加（必要に応じて拡張）"""
+        tail_rows = self._size - self._tail_start
+        if tail_rows == len(self._tail):
+            tail = np.zeros(
+                (len(self._tail) * 2, self._dimension), dtype=self._dtype
+            )
+            tail[:tail_rows] = self._tail[:tail_rows]
+            self._tail = tail
+        self._tail[tail_rows] = row
+        self._size += 1
+
+    def add_block(self, block: NDArray[Any]) -> None:
+        """行列をコピーせずに末尾に追加"""
+        tail_rows = self._size - self._tail_start
+        if tail_rows:
+            self._blocks.append(self._tail[:tail_rows])
+            self._starts.append(self._tail_start)
+            self._tail = np.zeros(
+                (_INITIAL_CAPACITY, self._dimension), dtype=self._dtype
+            )
+        if len(block):
+            self._blocks.append(block)
+            self._starts.append(self._size)
+        self._size += len(block)
+        self._tail_start = self._size
+
+    def view(self) -> StackedRows:
+        """全ブロックと追記中の行列を連結したビュー"""
+        tail_rows = self._size - self._tail_start
+        if not tail_rows:
+            return StackedRows(self._blocks, self._starts)
+        return StackedRows(
+            [*self._blocks, self._tail[:tail_rows]],
+            [*self._starts, self._tail_start],
+        )
+
+
+class HNSWGraph:
+    """
+    HNSW（階層的な近傍グラフ）による近似最近傍探索
+
+    各ノードは確率的に決まる階層までの各層で最大m本（第0層は2m本）の
+    近傍リンクを持つ。探索は最上層の入口から貪欲に降り、第0層で
+    ef件の候補を保ちながら近傍をたどる。ベクトルはL2正規化済みとし、
+    内積（コサイン類似度）が大きいほど近いものとして扱う。
+    ベクトル本体は持たず、呼び出し側の行列を行番号（ノードID）で参照する。
+    """
+
+    def __init__(
+        self, *, m: int = 16, ef_construction: int = 100, seed: int = 0
+    ) -> None:
+        self._m = m
+        self._m0 = 2 * m
+        self._ef_construction = max(ef_construction, m)
+        self._level_mult = 1 / math.log(max(m, 2))
+        self._rng = random.Random(seed)
+        # ノードID -> 層ごとの近傍ノードIDのリスト
+        self._links: list[list[list[int]]] = []
+        self._entry = -1
+        self._max_level = -1
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    def insert(self, vectors: StackedRows) -> None:
+        """行列の次の行（ノードID = 現在のノード数）をグラフに追加"""
+        node = len(self._links)
+        query = vectors[node]
+        level = int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+        self._links.append([[] for _ in range(level + 1)])
+
+        if self._entry < 0:
+            self._entry, self._max_level = node, level
+            return
+
+        entry = [self._entry]
+        for layer in range(self._max_level, level, -1):
+            entry = [self._search_layer(vectors, query, entry, 1, layer)[0][1]]
+
+        for layer in range(min(level, self._max_level), -1, -1):
+            found = self._search_layer(
+                vectors, query, entry, self._ef_construction, layer
+            )
+            limit = self._m0 if layer == 0 else self._m
+            neighbors = self._select_neighbors(vectors, found, self._m)
+            self._links[node][layer] = neighbors
+            for neighbor in neighbors:
+                links = self._links[neighbor][layer]
+                links.append(node)
+                if len(links) > limit:
+                    scores = vectors[links] @ vectors[neighbor]
+                    self._links[neighbor][layer] = self._select_neighbors(
+                        vectors,
+                        sorted(zip(scores.tolist(), links), reverse=True),
+                        limit,
+                    )
+            entry = [n for _, n in found]
+
+        if level > self._max_level:
+            self._entry, self._max_level = node, level
+
+    def search(
+        self,
+        vectors: StackedRows,
+        query: NDArray[np.float32],
+        k: int,
+        ef: int,
+    ) -> list[tuple[float, int]]:
+        """類似度の高い順に最大k件の(類似度, ノードID)を取得"""
+        if self._entry < 0:
+            return []
+        entry = [self._entry]
+        for layer in range(self._max_level, 0, -1):
+            entry = [self._search_layer(vectors, query, entry, 1, layer)[0][1]]
+        return self._search_layer(vectors, query, entry, max(ef, k), 0)[:k]
+
+    def _search_layer(
+        self,
+        vectors: StackedRows,
+        query: NDArray[np.float32],
+        entry: list[int],
+        ef: int,
+        layer: int,
+    ) -> list[tuple[float, int]]:
+        """1つの層で類似度の高い順にef件の(類似度, ノードID)を取得"""
+        visited = set(entry)
+        scores = (vectors[entry] @ query).tolist()
+        # 候補は類似度の高い順、結果は低い順に取り出すヒープ
+        candidates = [(-s, n) for s, n in zip(scores, entry, strict=True)]
+        results = [(s, n) for s, n in zip(scores, entry, strict=True)]
+        heapq.heapify(candidates)
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative, node = heapq.heappop(candidates)
+            if -negative < results[0][0] and len(results) >= ef:
+                break
+            neighbors = [
+                n for n in self._links[node][layer] if n not in visited
+            ]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            # 近傍の類似度はまとめて1回の行列積で計算し、結果の最下位に
+            # 届かないものはPythonのループに入る前に除く
+            neighbor_scores = vectors[neighbors] @ query
+            if len(results) >= ef:
+                keep = np.flatnonzero(neighbor_scores > results[0][0])
+                if not len(keep):
+                    continue
+                neighbors = [neighbors[i] for i in keep.tolist()]
+                neighbor_scores = neighbor_scores[keep]
+            for score, neighbor in zip(
+                neighbor_scores.tolist(), neighbors, strict=True
+            ):
+                if len(results) < ef or score > results[0][0]:
+                    heapq.heappush(candidates, (-score, neighbor))
+                    heapq.heappush(results, (score, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted(results, reverse=True)
+
+    @staticmethod
+    def _select_neighbors(
+        vectors: StackedRows,
+        candidates: list[tuple[float, int]],
+        limit: int,
+    ) -> list[int]:
+        """
+        候補（類似度の高い順）から多様性を保って近傍を選ぶ
+
+        既に選んだ近傍の方が基準ノードより近い候補は飛ばし、
+        グラフが局所的な塊に閉じないようにする。足りない分は
+        飛ばした候補から類似度の高い順に補う。
+        """
+        if len(candidates) <= limit:
+            return [n for _, n in candidates]
+        nodes = [n for _, n in candidates]
+        pairwise = vectors[nodes] @ vectors[nodes].T
+        # 各候補と選択済みの近傍との類似度の最大値
+        closest = np.full(len(nodes), -np.inf, dtype=np.float32)
+        selected: list[int] = []
+        skipped: list[int] = []
+        for i, (score, _) in enumerate(candidates):
+            if len(selected) >= limit:
+                break
+            if closest[i] > score:
+                skipped.append(i)
+                continue
+            selected.append(i)
+            np.maximum(closest, pairwise[i], out=closest)
+        selected.extend(skipped[: limit - len(selected)])
+        return [nodes[i] for i in selected]
+
+
+class VectorIndex:
+    """
+    L2正規化済みベクトルのプロセス内索引
+
+    ベクトルは事前確保したNumPy行列の行に格納し、件数が少ないうちは
+    行列とクエリの内積1回で総当たり検索する。件数がhnsw_thresholdに
+    達した後にensure_annでHNSWグラフを構築し、以降の検索はグラフで行う。
+    削除は行を再利用せず、削除済みの印を付けて検索結果から除く。
+
+    永続化したセグメントは読み取り専用のブロック（メモリマップ）として
+    コピーせずに追加できる。行番号は追加した順に連続して割り当てる。
+
+    追加はベクトル1件ごとにロックを取るため、別スレッドで追加中でも
+    検索が待つのは高々1件分の挿入時間に収まる。グラフの構築は
+    ロックの外で行い、構築中に追加された分だけ最後に反映する。
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        *,
+        hnsw_threshold: int | None = None,
+        hnsw_m: int | None = None,
+        ef_construction: int | None = None,
+        ef_search: int | None = None,
+    ) -> None:
+        self._dimension = dimension
+        self._hnsw_threshold = (
+            hnsw_threshold
+            if hnsw_threshold is not None
+            else settings.RAG_HNSW_THRESHOLD
+        )
+        self._hnsw_m = hnsw_m or settings.RAG_HNSW_M
+        self._ef_construction = (
+            ef_construction or settings.RAG_HNSW_EF_CONSTRUCTION
+        )
+        self._ef_search = ef_search or settings.RAG_HNSW_EF_SEARCH
+
+        self._lock = threading.RLock()
+        self._vectors = RowBlocks(dimension, np.float32)
+        self._deleted: NDArray[np.bool_] = np.zeros(
+            _INITIAL_CAPACITY, dtype=np.bool_
+        )
+        self._size = 0
+        self._deleted_count = 0
+        self._graph: HNSWGraph | None = None
+        self._building = False
+
+    @property
+    def dimension(self) -> int:
+        """ベクトルの次元数"""
+        return self._dimension
+
+    @property
+    def deleted_ratio(self) -> float:
+        """削除済みの行の割合"""
+        return self._deleted_count / self._size if self._size else 0.0
+
+    def __len__(self) -> int:
+        """削除済みを除いた件数"""
+        return self._size - self._deleted_count
+
+    def add(self, vectors: NDArray[np.float32]) -> list[int]:
+        """
+        ベクトルを追加し、割り当てたID（行番号）を返す
+
+        グラフが構築済みであれば各行をグラフにも挿入する。
+        グラフの新規構築は行わない（ensure_annで別途行う）。
+        """
+        ids: list[int] = []
+        for vector in vectors:
+            with self._lock:
+                ids.append(self._append(vector))
+                if self._graph is not None:
+                    self._graph.insert(self._rows())
+        return ids
+
+    def add_block(
+        self,
+        block: NDArray[np.floating],
+        quantized: QuantizedRows | None = None,
+    ) -> int:
+        """
+        読み取り専用の行列をコピーせずに追加し、先頭の行番号を返す
+
+        グラフが構築済みであれば各行をグラフにも挿入する。
+        グラフの新規構築は行わない（ensure_annで別途行う）。
+
+        Args:
+            block: 追加するベクトルの行列
+            quantized: 量子化済みの (符号, スケール)。量子化する索引のみ使う
+        """
+        with self._lock:
+            start = self._size
+            self._vectors.add_block(block)
+            self._size += len(block)
+            self._reserve_deleted(self._size)
+
+        while True:
+            with self._lock:
+                if self._graph is None or len(self._graph) >= self._size:
+                    break
+                self._graph.insert(self._rows())
+        return start
+
+    def remove(self, ids: list[int]) -> None:
+        """ベクトルを削除済みにする"""
+        with self._lock:
+            for row in ids:
+                if 0 <= row < self._size and not self._deleted[row]:
+                    self._deleted[row] = True
+                    self._deleted_count += 1
+
+    def vectors(self, ids: list[int]) -> NDArray[np.float32]:
+        """指定した行のベクトルを取得（float32）"""
+        with self._lock:
+            if not ids:
+                return np.zeros((0, self._dimension), dtype=np.float32)
+            return self._rows()[ids]
+
+    def search(
+        self, query: NDArray[np.float32], k: int
+    ) -> list[tuple[int, float]]:
+        """類似度の高い順に最大k件の(ID, 類似度)を取得"""
+        with self._lock:
+            if k <= 0 or len(self) == 0:
+                return []
+            if self._graph is None:
+                return self._brute_force(query, k)
+            # 削除済みを除いた後にk件残るよう多めに取る
+            extra = min(self._deleted_count, k * 4)
+            found = self._graph.search(
+                self._rows(), query, k + extra, self._ef_search + extra
+            )
+            return [
+                (node, score)
+                for score, node in found
+                if not self._deleted[node]
+            ][:k]
+
+    def stats(self) -> dict[str, int | str]:
+        """件数と検索方式を取得"""
+        return {
+            "vectors": len(self),
+            "deleted": self._deleted_count,
+            "backend": "hnsw" if self._graph is not None else "brute_force",
+            "bytes": self._vectors.nbytes,
+        }
+
+    def ensure_ann(self) -> None:
+        """件数がしきい値に達していれば近似探索用のHNSWグラフを構築"""
+        with self._lock:
+            if (
+                self._graph is not None
+                or self._building
+                or not 0 < self._hnsw_threshold <= self._size
+            ):
+                return
+            self._building = True
+            # 既存の行は書き換えないため、構築中も同じビューを参照できる
+            rows, size = self._rows(), self._size
+
+        started = time.perf_counter()
+        graph = HNSWGraph(
+            m=self._hnsw_m, ef_construction=self._ef_construction
+        )
+        try:
+            for _ in range(size):
+                graph.insert(rows)
+        finally:
+            with self._lock:
+                self._building = False
+                if len(graph) == size:
+                    while len(graph) < self._size:
+                        graph.insert(self._rows())
+                    self._graph = graph
+        logger.info(
+            "vector_index_hnsw_built",
+            vectors=len(graph),
+            elapsed_seconds=round(time.perf_counter() - started, 3),
+        )
+
+    def _rows(self) -> StackedRows:
+        """全ブロックと追記中の行列を連結したビュー"""
+        return self._vectors.view()
+
+    def _append(self, vector: NDArray[np.float32]) -> int:
+        """1件追加して行番号を返す"""
+        self._vectors.append(vector)
+        row = self._size
+        self._size += 1
+        self._reserve_deleted(self._size)
+        return row
+
+    def _reserve_deleted(self, size: int) -> None:
+        """削除済みの印の配列をsize行以上に拡張"""
+        if size <= len(self._deleted):
+            return
+        deleted = np.zeros(max(size, len(self._deleted) * 2), dtype=np.bool_)
+        deleted[: len(self._deleted)] = self._deleted
+        self._deleted = deleted
+
+    def _brute_force(
+        self, query: NDArray[np.float32], k: int
+    ) -> list[tuple[int, float]]:
+        """全ベクトルとの内積から上位k件を取得"""
+        parts: list[NDArray[np.float32]] = []
+        for _, block in self._rows().blocks:
+            if block.dtype == np.float32:
+                parts.append(np.asarray(block @ query, dtype=np.float32))
+                continue
+            buffer = np.empty(
+                (min(_SCAN_ROWS, len(block)), self._dimension),
+                dtype=np.float32,
+            )
+            for i in range(0, len(block), _SCAN_ROWS):
+                chunk = buffer[: len(block[i : i + _SCAN_ROWS])]
+                chunk[...] = block[i : i + _SCAN_ROWS]
+                parts.append(chunk @ query)
+        scores = np.concatenate(parts)
+        if self._deleted_count:
+            scores[self._deleted[: self._size]] = -np.inf
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
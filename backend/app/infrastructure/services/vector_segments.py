@@ -0,0 +1,259 @@
+"""メモリマップしたセグメントによるベクトル索引の永続化"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+import fcntl
+import json
+import os
+from pathlib import Path
+import shutil
+import time
+from typing import Any
+import uuid
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.infrastructure.logging import get_logger
+from app.infrastructure.services.quantized_index import quantize_int8
+from app.infrastructure.services.vector_index import QuantizedRows
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+_LOCK_FILE = ".lock"
+_FORMAT_VERSION = 1
+
+# セグメント内のファイル
+_VECTORS_FILE = "vectors.npy"  # (行数, 次元) float16/float32
+_ROW_DOCS_FILE = "row_docs.npy"  # 行 -> 文書の番号（ID対応表）
+_OFFSETS_FILE = "offsets.npy"  # 行 -> 本文のバイト位置（行数+1）
+_TEXTS_FILE = "texts.bin"  # 本文（UTF-8）を連結したもの
+_DOCUMENTS_FILE = "documents.json"  # 文書の一覧と削除した文書ID
+_CODES_FILE = "codes.npy"  # int8に量子化した符号（量子化する場合のみ）
+_SCALES_FILE = "scales.npy"  # 符号の行ごとのスケール
+
+
+@dataclass(frozen=True)
+class SegmentDocument:
+    """セグメントに含まれる文書"""
+
+    doc_id: str
+    content_hash: str
+    metadata: dict[str, Any]
+
+
+def _load_array(path: Path) -> NDArray[Any]:
+    """npyファイルをメモリマップで読み込む（空の配列は通常の読み込み）"""
+    array: NDArray[Any] = np.load(path, mmap_mode="r")
+    return array if array.size else np.asarray(np.load(path))
+
+
+class Segment:
+    """
+    不変のセグメント（ベクトル・ID対応表・本文のオフセット表）
+
+    配列はメモリマップで開くため読み込みはほぼ一瞬で終わり、
+    ページはOSのページキャッシュとして全ワーカーで共有される。
+    本文は検索結果に使う行だけをオフセット表から切り出してデコードする。
+    """
+
+    def __init__(self, name: str, path: Path) -> None:
+        self.name = name
+        self.vectors: NDArray[np.floating] = _load_array(path / _VECTORS_FILE)
+        self._row_docs: NDArray[np.int32] = _load_array(path / _ROW_DOCS_FILE)
+        self._offsets: NDArray[np.int64] = _load_array(path / _OFFSETS_FILE)
+        texts_path = path / _TEXTS_FILE
+        self._texts: NDArray[np.uint8] = (
+            np.memmap(texts_path, dtype=np.uint8, mode="r")
+            if texts_path.stat().st_size
+            else np.zeros(0, dtype=np.uint8)
+        )
+        self.quantized: QuantizedRows | None = (
+            (_load_array(path / _CODES_FILE), np.load(path / _SCALES_FILE))
+            if (path / _CODES_FILE).exists()
+            else None
+        )
+        with (path / _DOCUMENTS_FILE).open(encoding="utf-8") as f:
+            documents = json.load(f)
+        self.documents = [
+            SegmentDocument(d["doc_id"], d["content_hash"], d["metadata"])
+            for d in documents["documents"]
+        ]
+        self.removed: list[str] = documents["removed"]
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def text(self, row: int) -> str:
+        """行の本文を取得"""
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return self._texts[start:end].tobytes().decode("utf-8")
+
+    def document(self, row: int) -> SegmentDocument:
+        """行が属する文書を取得"""
+        return self.documents[int(self._row_docs[row])]
+
+    def document_rows(self, start: int = 0) -> dict[str, list[int]]:
+        """文書IDごとの行番号（セグメント内の行番号 + start）を取得"""
+        row_docs = np.asarray(self._row_docs)
+        order = np.argsort(row_docs, kind="stable")
+        bounds = np.searchsorted(
+            row_docs[order], np.arange(len(self.documents) + 1)
+        ).tolist()
+        rows = (order + start).tolist()
+        return {
+            document.doc_id: rows[bounds[i] : bounds[i + 1]]
+            for i, document in enumerate(self.documents)
+        }
+
+
+class SegmentStore:
+    """
+    ディレクトリ上のセグメントの集合
+
+    追加は新しいセグメントを一時ディレクトリに書いてから名前を変え、
+    マニフェスト（セグメントの順序）を置き換えて確定する。
+    同じディレクトリを複数のワーカーが共有するため、マニフェストの
+    読み書きとセグメントの削除はファイルロックの下で行う。
+
+    quantizeを指定した場合はint8の符号も書き、開くときに
+    元のベクトルを読まずに量子化した索引を作れるようにする。
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        *,
+        dimension: int,
+        dtype: str,
+        quantize: bool = False,
+    ) -> None:
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._dimension = dimension
+        self._quantize = quantize
+        self._dtype = np.dtype(dtype)
+        if self._dtype not in (np.float16, np.float32):
+            raise ValueError(f"未対応のdtypeです: {dtype}")
+
+    @contextmanager
+    def lock(self, *, exclusive: bool = True) -> Iterator[None]:
+        """ワーカー間のファイルロック（読み込みは共有ロック）"""
+        with (self._directory / _LOCK_FILE).open("a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read_manifest(self) -> list[str]:
+        """確定済みのセグメント名を古い順に取得"""
+        path = self._directory / MANIFEST_FILE
+        if not path.exists():
+            return []
+        with path.open(encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("dimension") != self._dimension:
+            # 埋め込みの次元が変わった索引は使わない（次の書き込みで置き換わる）
+            logger.warning(
+                "vector_segments_dimension_mismatch",
+                expected=self._dimension,
+                actual=manifest.get("dimension"),
+            )
+            return []
+        names: list[str] = manifest["segments"]
+        return names
+
+    def open(self, name: str) -> Segment:
+        """セグメントを開く（メモリマップ）"""
+        return Segment(name, self._directory / name)
+
+    def write(
+        self,
+        documents: list[SegmentDocument],
+        row_docs: list[int],
+        texts: list[str],
+        vectors: NDArray[np.float32],
+        removed: list[str] | None = None,
+    ) -> Segment:
+        """
+        セグメントを書き込む（マニフェストへの反映はcommitで行う）
+
+        Args:
+            documents: 文書のリスト
+            row_docs: 行ごとの文書の番号（documentsの添字）
+            texts: 行ごとの本文
+            vectors: 行ごとのベクトル
+            removed: このセグメントで削除する文書ID
+        """
+        name = f"seg-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        tmp = self._directory / f".tmp-{name}"
+        tmp.mkdir()
+
+        encoded = [text.encode("utf-8") for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        np.save(tmp / _VECTORS_FILE, vectors.astype(self._dtype))
+        np.save(tmp / _ROW_DOCS_FILE, np.asarray(row_docs, dtype=np.int32))
+        np.save(tmp / _OFFSETS_FILE, offsets)
+        if self._quantize:
+            codes, scales = quantize_int8(vectors)
+            np.save(tmp / _CODES_FILE, codes)
+            np.save(tmp / _SCALES_FILE, scales)
+        with (tmp / _TEXTS_FILE).open("wb") as f:
+            f.write(b"".join(encoded))
+        with (tmp / _DOCUMENTS_FILE).open("w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "documents": [
+                        {
+                            "doc_id": d.doc_id,
+                            "content_hash": d.content_hash,
+                            "metadata": d.metadata,
+                        }
+                        for d in documents
+                    ],
+                    "removed": removed or [],
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.rename(tmp, self._directory / name)
+        return self.open(name)
+
+    def commit(self, names: list[str]) -> None:
+        """マニフェストをアトミックに置き換える"""
+        path = self._directory / MANIFEST_FILE
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": _FORMAT_VERSION,
+                    "dimension": self._dimension,
+                    "segments": names,
+                },
+                f,
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def prune(self, keep: list[str]) -> list[str]:
+        """
+        keep以外のセグメント（圧縮済み・未確定のもの）を削除
+
+        書き込みと同じ排他ロックの下で呼ぶこと。他のワーカーが
+        メモリマップ中でも、開いているマップはアンマップされるまで有効
+        """
+        removed: list[str] = []
+        for path in self._directory.iterdir():
+            if (
+                path.is_dir()
+                and path.name.startswith(("seg-", ".tmp-seg-"))
+                and path.name not in keep
+            ):
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path.name)
+        return removed
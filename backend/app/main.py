@@ -14,6 +14,7 @@ from app.infrastructure.config import settings
 from app.infrastructure.database import init_db
 from app.infrastructure.langchain_logging import configure_langchain_logging
 from app.infrastructure.logging import configure_logging, get_logger
+from app.infrastructure.registry import service_registry
 from app.mcp import mcp
 from app.presentation.middleware.error_handler import (
     AppError,
@@ -23,7 +24,7 @@ from app.presentation.middleware.error_handler import (
     validation_exception_handler,
 )
 from app.presentation.middleware.request_id import RequestIDMiddleware
-from app.presentation.routers import chat, health, sse
+from app.presentation.routers import chat, health, metrics, sse
 
 # ログ設定
 configure_logging(log_level=settings.LOG_LEVEL, json_logs=settings.JSON_LOGS)
@@ -48,9 +49,12 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
             exc_info=True,
         )
         raise
+    # AIサービス・リポジトリ・キャッシュクライアントを事前構築
+    await service_registry.startup()
     yield
     # シャットダウン時の処理
     logger.info("shutdown", message="AI Chatbot API is shutting down")
+    await service_registry.shutdown()
 
 
 app = FastAPI(
@@ -86,6 +90,7 @@ app.add_exception_handler(Exception, generic_exception_handler)
 app.include_router(health.router, prefix="/api/health", tags=["health"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(sse.router, prefix="/api/sse", tags=["sse"])
+app.include_router(metrics.router, tags=["metrics"])
 
 # MCPサーバーのマウント（有効な場合のみ）
 # Claude Desktop、VS Code等のMCPクライアントから /mcp エンドポイントで接続可能
@@ -26,10 +26,11 @@ mcp = FastMCP(
     このMCPサーバーはAIチャットボットの機能を提供します。
 
     利用可能なツール:
-    - search_conversations: 会話履歴をキーワードで検索
+    - search_conversations: 会話履歴をキーワードで関連度順に検索（ページング可）
     - get_session_history: 特定セッションの会話履歴を取得
     - get_session_info: セッション情報を取得
     - chat: AIとチャット（新しいメッセージを送信）
+    - chat_batch: 複数のメッセージのAIレスポンスをまとめて生成
     - list_sessions: ユーザーのセッション一覧を取得
     """,
 )
@@ -49,6 +50,16 @@ class ConversationResult(BaseModel):
     message: str
     response: str | None
     created_at: str | None
+    score: float | None = None  # 関連度（部分一致での検索時はNone）
+
+
+class ConversationSearchResults(BaseModel):
+    """会話検索結果の1ページ分"""
+
+    results: list[ConversationResult]
+    total: int
+    offset: int
+    next_offset: int | None  # 次のページのoffset（最後のページはNone）
 
 
 class ConversationHistoryItem(BaseModel):
@@ -88,6 +99,14 @@ class ChatResponse(BaseModel):
     response: str
 
 
+class BatchChatItem(BaseModel):
+    """バッチ生成の1項目の結果"""
+
+    index: int
+    response: str | None
+    error: str | None
+
+
 # ============================================================
 # 会話履歴ツール
 # ============================================================
@@ -105,70 +124,113 @@ async def search_conversations(
     limit: int = Field(
         default=10, description="取得する最大件数", ge=1, le=100
     ),
+    offset: int = Field(
+        default=0, description="読み飛ばす件数（ページング）", ge=0
+    ),
     ctx: Context | None = None,
-) -> list[ConversationResult]:
+) -> ConversationSearchResults:
     """
     会話履歴をキーワードで検索します。
 
-    PostgreSQLに保存された会話履歴から、メッセージまたはレスポンスに
-    指定したキーワードを含む会話を検索します。
+    メッセージとレスポンスを対象に、キーワードの一致（BM25）と
+    意味の近さ（ベクトル検索）を融合した関連度の高い順に返します。
+    キーワードが空の場合は新しい順に返します。
+    検索索引が無効または読み込み中の場合は部分一致で新しい順に返します。
+    次のページはnext_offsetをoffsetに指定して取得します。
     """
-    from sqlalchemy import or_, select
+    from sqlalchemy import func, or_, select
 
     from app.infrastructure.database import async_session
+    from app.infrastructure.dependencies import get_conversation_search
     from app.models.postgres import Conversation
 
     if ctx:
-        await ctx.info(f"会話履歴を検索中: query='{query}', limit={limit}")
-
-    results: list[ConversationResult] = []
+        await ctx.info(
+            f"会話履歴を検索中: query='{query}', limit={limit}, offset={offset}"
+        )
 
     try:
+        search = get_conversation_search()
+        scores: dict[int, float] = {}
         async with async_session() as session:
-            stmt = select(Conversation)
-
-            # キーワード検索
-            if query:
-                stmt = stmt.where(
-                    or_(
-                        Conversation.message.ilike(f"%{query}%"),
-                        Conversation.response.ilike(f"%{query}%"),
-                    )
+            if search is not None and search.ready:
+                page = await search.search(
+                    query,
+                    user_id=user_id,
+                    session_id=session_id,
+                    limit=limit,
+                    offset=offset,
                 )
-
-            # フィルタ
-            if user_id:
-                stmt = stmt.where(Conversation.user_id == user_id)
-            if session_id:
-                stmt = stmt.where(Conversation.session_id == session_id)
-
-            # ソートと制限
-            stmt = stmt.order_by(Conversation.created_at.desc()).limit(limit)
-
-            result = await session.execute(stmt)
-            conversations = result.scalars().all()
-
-            for conv in conversations:
-                results.append(
-                    ConversationResult(
-                        id=conv.id,
-                        session_id=conv.session_id,
-                        user_id=conv.user_id,
-                        message=conv.message,
-                        response=conv.response,
-                        created_at=conv.created_at.isoformat()
-                        if conv.created_at
-                        else None,
+                scores = {hit.conversation_id: hit.score for hit in page.hits}
+                total = page.total
+                conversations: list[Conversation] = []
+                if scores:
+                    result = await session.execute(
+                        select(Conversation).where(
+                            Conversation.id.in_(list(scores))
+                        )
+                    )
+                    # 索引の順位の順に並べる（索引にあり削除済みのものは除く）
+                    rows = {conv.id: conv for conv in result.scalars().all()}
+                    conversations = [
+                        rows[conversation_id]
+                        for conversation_id in scores
+                        if conversation_id in rows
+                    ]
+            else:
+                # 検索索引が無効または読み込み中（結果が欠ける）の場合は
+                # 部分一致で新しい順に検索する
+                stmt = select(Conversation)
+                if query:
+                    stmt = stmt.where(
+                        or_(
+                            Conversation.message.ilike(f"%{query}%"),
+                            Conversation.response.ilike(f"%{query}%"),
+                        )
                     )
+                if user_id:
+                    stmt = stmt.where(Conversation.user_id == user_id)
+                if session_id:
+                    stmt = stmt.where(Conversation.session_id == session_id)
+
+                total = (
+                    await session.execute(
+                        select(func.count()).select_from(stmt.subquery())
+                    )
+                ).scalar_one()
+                result = await session.execute(
+                    stmt.order_by(Conversation.created_at.desc())
+                    .offset(offset)
+                    .limit(limit)
                 )
+                conversations = list(result.scalars().all())
+
+        results = [
+            ConversationResult(
+                id=conv.id,
+                session_id=conv.session_id,
+                user_id=conv.user_id,
+                message=conv.message,
+                response=conv.response,
+                created_at=conv.created_at.isoformat()
+                if conv.created_at
+                else None,
+                score=scores.get(conv.id),
+            )
+            for conv in conversations
+        ]
+        next_offset = offset + limit if offset + limit < total else None
 
         if ctx:
-            await ctx.info(f"検索完了: {len(results)}件の結果")
+            await ctx.info(f"検索完了: {len(results)}件 / 全{total}件")
 
         logger.info(
             "mcp_search_conversations",
             query=query,
             results_count=len(results),
+            total=total,
+            offset=offset,
+            hybrid=search is not None,
         )
 
     except Exception as e:
@@ -179,7 +241,9 @@ async def search_conversations(
             await ctx.error(f"検索エラー: {str(e)}")
         raise
 
-    return results
+    return ConversationSearchResults(
+        results=results, total=total, offset=offset, next_offset=next_offset
+    )
 
 
 @mcp.tool
@@ -377,10 +441,16 @@ async def chat(
     import uuid
 
     from app.domain.entities.conversation import Conversation
+    from app.domain.value_objects.conversation_history import (
+        ConversationHistory,
+    )
+    from app.domain.value_objects.conversation_turn import ConversationTurn
     from app.domain.value_objects.message import Message
     from app.infrastructure.dependencies import (
         get_ai_service,
+        get_context_window_builder,
         get_conversation_repository,
+        get_rate_limiter,
     )
 
     # セッションIDの生成または使用
@@ -392,6 +462,13 @@ async def chat(
         )
 
     try:
+        # レート制限（LLMを呼ぶ前に確認）
+        rate_limiter = get_rate_limiter()
+        if rate_limiter is not None:
+            await rate_limiter.acquire(
+                user_id=user_id, session_id=actual_session_id, message=message
+            )
+
         # AIサービスとリポジトリを取得
         ai_service = get_ai_service()
         repo = await get_conversation_repository()
@@ -403,19 +480,23 @@ async def chat(
             metadata={"session_id": actual_session_id},
         )
 
-        # コンテキスト取得（既存セッションの場合）
-        context = ""
+        # 会話履歴取得（既存セッションの場合、トークン予算内の直近ターン）
+        history = ConversationHistory()
         if session_id:
             conversations = await repo.get_by_session_id(session_id)
-            context_parts = []
-            for conv in conversations[-5:]:  # 直近5件
-                context_parts.append(f"User: {conv.message}")
-                if conv.response:
-                    context_parts.append(f"AI: {conv.response}")
-            context = "\n".join(context_parts)
+            turns = tuple(
+                ConversationTurn(
+                    user_message=conv.message,
+                    ai_response=conv.response or "",
+                )
+                for conv in conversations
+            )
+            history = get_context_window_builder().fit(
+                ConversationHistory(turns=turns), message
+            )
 
         # AIレスポンス生成
-        response = await ai_service.generate_response(msg, context)
+        response = await ai_service.generate_response(msg, history=history)
 
         # 会話履歴を保存
         conversation = Conversation(
@@ -453,6 +534,70 @@ async def chat(
         raise
 
 
+@mcp.tool
+async def chat_batch(
+    messages: list[str] = Field(description="送信するメッセージのリスト"),
+    concurrency: int | None = Field(
+        default=None,
+        description="同時に生成する件数（省略時は設定値）",
+    ),
+    user_id: str = Field(
+        default="mcp-user",
+        description="ユーザーID",
+    ),
+    ctx: Context | None = None,
+) -> list[BatchChatItem]:
+    """
+    複数のメッセージのAIレスポンスをまとめて生成します。
+
+    オフライン評価・バックフィル用で、会話履歴は保存しません。
+    失敗した項目はerrorを返し、他の項目の結果は返します。
+    """
+    import uuid
+
+    from app.infrastructure.dependencies import get_generate_batch_use_case
+
+    batch_id = f"mcp-batch-{uuid.uuid4().hex[:8]}"
+
+    if ctx:
+        await ctx.info(f"バッチ生成開始: items={len(messages)}")
+
+    try:
+        results = await get_generate_batch_use_case().execute(
+            user_id=user_id,
+            batch_id=batch_id,
+            items=[(message, "") for message in messages],
+            concurrency=concurrency,
+        )
+
+        succeeded = sum(result.ok for result in results)
+        if ctx:
+            await ctx.info(
+                f"バッチ生成完了: succeeded={succeeded}, "
+                f"failed={len(results) - succeeded}"
+            )
+
+        logger.info(
+            "mcp_chat_batch",
+            batch_id=batch_id,
+            items=len(messages),
+            succeeded=succeeded,
+        )
+
+        return [
+            BatchChatItem(
+                index=index, response=result.response, error=result.error
+            )
+            for index, result in enumerate(results)
+        ]
+
+    except Exception as e:
+        logger.error("mcp_chat_batch_error", error=str(e), exc_info=True)
+        if ctx:
+            await ctx.error(f"バッチ生成エラー: {str(e)}")
+        raise
+
+
 # ============================================================
 # リソース定義
 # ============================================================
@@ -5,17 +5,30 @@ import uuid
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.domain.exceptions import (
+    AIServiceUnavailableError,
+    RateLimitExceededError,
+)
+from app.domain.services.interruptible_stream import DisconnectWaiter
 from app.infrastructure.database import get_db
 from app.infrastructure.dependencies import (
     get_ai_service,
-    get_cache_service,
+    get_context_window_builder,
+    get_conversation_memory,
     get_conversation_repository,
+    get_generate_batch_use_case,
+    get_interruption_tracker,
+    get_rate_limiter,
     get_session_repository,
 )
 from app.infrastructure.logging import get_logger
+from app.infrastructure.services.llm_metrics import llm_request_metrics
 from app.presentation.middleware.error_handler import AppError
 from app.presentation.models.error import ErrorCode
 from app.usecase.dto.chat import (
+    BatchGenerateRequest,
+    BatchGenerateResponse,
+    BatchItemResult,
     ConversationHistoryResponse,
     CreateSessionRequest,
     CreateSessionResponse,
@@ -39,6 +52,7 @@ class ChatController:
         request: SendMessageRequest,
         user_id: str = "default_user",  # TODO: 認証機能実装後に置き換え
         db: AsyncSession = Depends(get_db),
+        disconnected: DisconnectWaiter | None = None,
     ) -> SendMessageResponse:
         """
         メッセージを送信
@@ -47,6 +61,8 @@ class ChatController:
             request: メッセージ送信リクエスト
             user_id: ユーザーID（現在はデフォルト）
             db: データベースセッション
+            disconnected: クライアントが切断するまで待つ関数
+                （渡した場合は切断時に生成を打ち切る）
 
         Returns:
             メッセージ送信レスポンス
@@ -59,33 +75,62 @@ class ChatController:
         )
 
         try:
+            # レート制限（LLMを呼ぶ前に確認）
+            rate_limiter = get_rate_limiter()
+            if rate_limiter is not None:
+                await rate_limiter.acquire(
+                    user_id=user_id,
+                    session_id=request.session_id,
+                    message=request.message,
+                )
+
             # 依存性を注入
             conversation_repo = await get_conversation_repository(db)
             session_repo = get_session_repository()
             ai_service = get_ai_service()
-            cache_service = get_cache_service()
+            conversation_memory = get_conversation_memory()
 
             # ユースケースを実行
             use_case = SendMessageUseCase(
                 conversation_repository=conversation_repo,
                 session_repository=session_repo,
                 ai_service=ai_service,
-                cache_service=cache_service,
+                conversation_memory=conversation_memory,
+                context_window_builder=get_context_window_builder(),
             )
 
-            conversation = await use_case.execute(
-                user_id=user_id,
-                session_id=request.session_id,
-                message_content=request.message,
-                metadata=request.metadata,
-            )
+            with llm_request_metrics() as request_metrics:
+                conversation = await use_case.execute(
+                    user_id=user_id,
+                    session_id=request.session_id,
+                    message_content=request.message,
+                    metadata=request.metadata,
+                    disconnected=disconnected,
+                )
 
-            logger.info(
-                "send_message_completed",
-                user_id=user_id,
-                session_id=request.session_id,
-                conversation_id=conversation.id,
-            )
+            tracker = get_interruption_tracker()
+            if conversation.is_interrupted():
+                # クライアントは切断済みのためレスポンスは届かない
+                saved_tokens = tracker.record_interrupted(
+                    conversation.response or "", channel="http"
+                )
+                logger.info(
+                    "send_message_interrupted",
+                    user_id=user_id,
+                    session_id=request.session_id,
+                    conversation_id=conversation.id,
+                    response_length=len(conversation.response or ""),
+                    estimated_saved_tokens=saved_tokens,
+                )
+            else:
+                tracker.record_completed(conversation.response or "")
+                logger.info(
+                    "send_message_completed",
+                    user_id=user_id,
+                    session_id=request.session_id,
+                    conversation_id=conversation.id,
+                    llm_metrics=request_metrics.summary(),
+                )
 
             return SendMessageResponse(
                 conversation_id=conversation.id,
@@ -106,6 +151,24 @@ class ChatController:
                 message=str(e),
                 details={"user_id": user_id, "session_id": request.session_id},
             )
+        except RateLimitExceededError as e:
+            raise AppError(
+                error_code=ErrorCode.RATE_LIMITED,
+                message=str(e),
+                details={"scope": e.scope, "retry_after": e.retry_after},
+            )
+        except AIServiceUnavailableError as e:
+            logger.warning(
+                "send_message_ai_unavailable",
+                user_id=user_id,
+                session_id=request.session_id,
+                error=str(e),
+            )
+            raise AppError(
+                error_code=ErrorCode.AI_SERVICE_UNAVAILABLE,
+                message=str(e),
+                details={"retry_after": e.retry_after},
+            )
         except RuntimeError as e:
             logger.warning(
                 "send_message_not_found",
@@ -132,6 +195,83 @@ class ChatController:
                 details={"user_id": user_id, "session_id": request.session_id},
             )
 
+    @staticmethod
+    async def generate_batch(
+        request: BatchGenerateRequest,
+        user_id: str = "default_user",  # TODO: 認証機能実装後に置き換え
+    ) -> BatchGenerateResponse:
+        """
+        複数のメッセージのAIレスポンスをまとめて生成（会話は保存しない）
+
+        Args:
+            request: バッチ生成リクエスト
+            user_id: ユーザーID（現在はデフォルト）
+
+        Returns:
+            入力と同じ順の結果を含むバッチ生成レスポンス
+        """
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        logger.info(
+            "generate_batch_started",
+            user_id=user_id,
+            batch_id=batch_id,
+            items=len(request.items),
+        )
+
+        try:
+            results = await get_generate_batch_use_case().execute(
+                user_id=user_id,
+                batch_id=batch_id,
+                items=[(item.message, item.context) for item in request.items],
+                concurrency=request.concurrency,
+                timeout=request.timeout_seconds,
+            )
+        except ValueError as e:
+            raise AppError(
+                error_code=ErrorCode.VALIDATION_ERROR,
+                message=str(e),
+                details={"items": len(request.items)},
+            )
+        except RateLimitExceededError as e:
+            raise AppError(
+                error_code=ErrorCode.RATE_LIMITED,
+                message=str(e),
+                details={"scope": e.scope, "retry_after": e.retry_after},
+            )
+        except Exception as e:
+            logger.error(
+                "generate_batch_error",
+                user_id=user_id,
+                batch_id=batch_id,
+                error=str(e),
+                exc_info=True,
+            )
+            raise AppError(
+                error_code=ErrorCode.INTERNAL_ERROR,
+                message="バッチ生成に失敗しました",
+                details={"batch_id": batch_id},
+            )
+
+        succeeded = sum(result.ok for result in results)
+        logger.info(
+            "generate_batch_completed",
+            user_id=user_id,
+            batch_id=batch_id,
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+        )
+        return BatchGenerateResponse(
+            batch_id=batch_id,
+            results=[
+                BatchItemResult(
+                    index=index, response=result.response, error=result.error
+                )
+                for index, result in enumerate(results)
+            ],
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+        )
+
     @staticmethod
     async def create_session(
         request: CreateSessionRequest,
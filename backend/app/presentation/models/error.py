@@ -26,6 +26,7 @@ class ErrorCode(str, Enum):
     # AI サービスのエラー
     AI_SERVICE_ERROR = "AI_SERVICE_ERROR"
     AI_RESPONSE_TIMEOUT = "AI_RESPONSE_TIMEOUT"
+    AI_SERVICE_UNAVAILABLE = "AI_SERVICE_UNAVAILABLE"
 
     # データベースエラー
     DATABASE_ERROR = "DATABASE_ERROR"
@@ -38,6 +39,9 @@ class ErrorCode(str, Enum):
     UNAUTHORIZED = "UNAUTHORIZED"
     FORBIDDEN = "FORBIDDEN"
 
+    # レート制限
+    RATE_LIMITED = "RATE_LIMITED"
+
     # その他の内部エラー
     INTERNAL_ERROR = "INTERNAL_ERROR"
 
@@ -67,10 +71,12 @@ ERROR_CODE_TO_HTTP_STATUS = {
     ErrorCode.SESSION_EXPIRED: 401,
     ErrorCode.AI_SERVICE_ERROR: 500,
     ErrorCode.AI_RESPONSE_TIMEOUT: 504,
+    ErrorCode.AI_SERVICE_UNAVAILABLE: 503,
     ErrorCode.DATABASE_ERROR: 500,
     ErrorCode.DATABASE_CONNECTION_ERROR: 503,
     ErrorCode.CACHE_ERROR: 500,
     ErrorCode.UNAUTHORIZED: 401,
     ErrorCode.FORBIDDEN: 403,
+    ErrorCode.RATE_LIMITED: 429,
     ErrorCode.INTERNAL_ERROR: 500,
 }
@@ -1,12 +1,17 @@
 """チャットAPIルーター"""
 
-from fastapi import APIRouter, Depends, Query, WebSocket
+import asyncio
+
+from fastapi import APIRouter, Depends, Query, Request, WebSocket
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.infrastructure.config import settings
 from app.infrastructure.database import AsyncSessionLocal, get_db
 from app.presentation.controllers.chat_controller import ChatController
 from app.presentation.websocket.chat_handler import handle_websocket_chat
 from app.usecase.dto.chat import (
+    BatchGenerateRequest,
+    BatchGenerateResponse,
     ConversationHistoryResponse,
     CreateSessionRequest,
     CreateSessionResponse,
@@ -17,19 +22,54 @@ from app.usecase.dto.chat import (
 router = APIRouter()
 
 
+async def _wait_for_disconnect(http_request: Request) -> None:
+    """クライアントが切断するまで待機（一定間隔で確認）"""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(settings.CHAT_DISCONNECT_POLL_SECONDS)
+
+
 @router.post("/send", response_model=SendMessageResponse)
 async def send_message(
     request: SendMessageRequest,
+    http_request: Request,
     db: AsyncSession = Depends(get_db),
 ) -> SendMessageResponse:
     """
     メッセージを送信してAIレスポンスを取得
 
+    クライアントが応答を待たずに切断した場合は生成を打ち切り、
+    会話を状態interruptedとして保存する。
+
     - **message**: メッセージ内容（1-10000文字）
     - **session_id**: セッションID
     - **metadata**: メタデータ（オプション）
     """
-    return await ChatController.send_message(request, db=db)
+    return await ChatController.send_message(
+        request,
+        db=db,
+        disconnected=(
+            (lambda: _wait_for_disconnect(http_request))
+            if settings.CHAT_CANCEL_ON_DISCONNECT
+            else None
+        ),
+    )
+
+
+@router.post("/batch", response_model=BatchGenerateResponse)
+async def generate_batch(
+    request: BatchGenerateRequest,
+) -> BatchGenerateResponse:
+    """
+    複数のメッセージのAIレスポンスをまとめて生成（会話は保存しない）
+
+    オフライン評価・バックフィル用。失敗した項目はerrorを返し、
+    バッチ全体は失敗させない。
+
+    - **items**: メッセージとコンテキストのリスト
+    - **concurrency**: 同時に生成する件数（オプション）
+    - **timeout_seconds**: 1件あたりのタイムアウト秒数（オプション）
+    """
+    return await ChatController.generate_batch(request)
 
 
 @router.post("/sessions", response_model=CreateSessionResponse)
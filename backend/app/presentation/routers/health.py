@@ -1,7 +1,23 @@
 """ヘルスチェックAPIルーター"""
 
+from typing import Any
+
 from fastapi import APIRouter
 
+from app.infrastructure.dependencies import (
+    get_conversation_search_stats,
+    get_embedding_cache_stats,
+    get_hedging_stats,
+    get_interruption_stats,
+    get_llm_metrics_stats,
+    get_model_router_stats,
+    get_rate_limit_stats,
+    get_resilience_stats,
+    get_response_cache_stats,
+    get_retrieval_stats,
+    get_tool_stats,
+    get_tracing_stats,
+)
 from app.infrastructure.logging import get_logger
 
 router = APIRouter()
@@ -20,3 +36,75 @@ async def readiness_check() -> dict[str, str]:
     """レディネスチェック（本番環境での確認用）"""
     logger.debug("readiness_check")
     return {"status": "ready"}
+
+
+@router.get("/cache")
+async def response_cache_stats() -> dict[str, Any]:
+    """LLMレスポンスキャッシュ（完全一致・セマンティック）のヒット/ミス統計"""
+    return get_response_cache_stats()
+
+
+@router.get("/models")
+async def model_router_stats() -> dict[str, Any]:
+    """モデルルーターが観測したモデルごとのTTFT・エラー率"""
+    return {"models": get_model_router_stats()}
+
+
+@router.get("/hedging")
+async def hedging_stats() -> dict[str, Any]:
+    """ヘッジリクエストの発行率・勝率"""
+    return {"hedging": get_hedging_stats()}
+
+
+@router.get("/limiter")
+async def resilience_stats() -> dict[str, Any]:
+    """LLM呼び出しの同時実行数の上限・待機列・サーキットブレーカーの状態"""
+    return {"resilience": get_resilience_stats()}
+
+
+@router.get("/rate-limit")
+async def rate_limit_stats() -> dict[str, Any]:
+    """ユーザー・セッション単位のレート制限の許可・拒否の回数"""
+    return {"rate_limit": get_rate_limit_stats()}
+
+
+@router.get("/retrieval")
+async def retrieval_stats() -> dict[str, Any]:
+    """RAGの文書検索の件数・平均検索時間"""
+    return {"retrieval": get_retrieval_stats()}
+
+
+@router.get("/conversation-search")
+async def conversation_search_stats() -> dict[str, Any]:
+    """会話検索（MCP）の索引の件数・平均検索時間・埋め込みの取り込みの遅延"""
+    return {"conversation_search": get_conversation_search_stats()}
+
+
+@router.get("/embeddings")
+async def embedding_cache_stats() -> dict[str, Any]:
+    """内容のハッシュによる埋め込みキャッシュのヒット率"""
+    return {"embedding_cache": get_embedding_cache_stats()}
+
+
+@router.get("/tools")
+async def tool_stats() -> dict[str, Any]:
+    """ツールの呼び出し数・キャッシュヒット・タイムアウトの件数"""
+    return {"tools": get_tool_stats()}
+
+
+@router.get("/interruptions")
+async def interruption_stats() -> dict[str, Any]:
+    """クライアントの切断で打ち切った生成の件数と節約したトークン数"""
+    return {"interruptions": get_interruption_stats()}
+
+
+@router.get("/llm")
+async def llm_metrics_stats() -> dict[str, Any]:
+    """LLM呼び出しのキュー待ち・TTFT・チャンク間隔などのパーセンタイル"""
+    return {"llm": get_llm_metrics_stats()}
+
+
+@router.get("/tracing")
+async def tracing_stats() -> dict[str, Any]:
+    """LangFuseに送ったトレースの件数（サンプリングの理由別・破棄を含む）"""
+    return {"tracing": get_tracing_stats()}
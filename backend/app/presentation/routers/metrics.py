@@ -0,0 +1,20 @@
+"""Prometheus形式のメトリクスエンドポイント"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.infrastructure.dependencies import get_llm_metrics
+
+router = APIRouter()
+
+# Prometheusのテキスト形式
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    """LLM呼び出しのヒストグラム（キュー待ち・TTFT・チャンク間隔など）"""
+    return PlainTextResponse(
+        get_llm_metrics().render_prometheus(),
+        media_type=PROMETHEUS_CONTENT_TYPE,
+    )
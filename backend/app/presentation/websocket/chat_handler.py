@@ -1,21 +1,37 @@
 """WebSocketチャットハンドラー"""
 
 import asyncio
+from collections import deque
+from collections.abc import Mapping
 from datetime import datetime
 import json
 from typing import Any
 
 from fastapi import WebSocket, WebSocketDisconnect, status
+from fastapi.websockets import WebSocketState
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.domain.exceptions import (
+    AIServiceUnavailableError,
+    RateLimitExceededError,
+)
+from app.domain.services.context_window import ContextWindowBuilder
+from app.domain.services.interruptible_stream import consume_stream
+from app.domain.value_objects.conversation_turn import ConversationTurn
 from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
 from app.infrastructure.dependencies import (
     get_ai_service,
-    get_cache_service,
+    get_context_window_builder,
+    get_conversation_memory,
     get_conversation_repository,
+    get_interruption_tracker,
+    get_llm_metrics,
+    get_rate_limiter,
     get_session_repository,
 )
 from app.infrastructure.logging import get_logger
+from app.infrastructure.services.llm_metrics import llm_request_metrics
 from app.presentation.websocket.connection_manager import connection_manager
 
 # ロガーの設定
@@ -115,7 +131,8 @@ async def handle_websocket_chat(
         logger.debug("websocket_dependencies_injected", session_id=session_id)
         conversation_repo = await get_conversation_repository(db)
         ai_service = get_ai_service()
-        cache_service = get_cache_service()
+        conversation_memory = get_conversation_memory()
+        context_window_builder = get_context_window_builder()
 
         # 接続成功を通知
         await connection_manager.send_personal_message(
@@ -130,10 +147,15 @@ async def handle_websocket_chat(
 
         # メインループ（FastAPI公式ドキュメントに従って、try-except WebSocketDisconnectで囲む）
         logger.info("websocket_message_loop_started", session_id=session_id)
+        # 回答の生成中に届いたメッセージ（生成の完了後に順に処理する）
+        pending: deque[Mapping[str, Any]] = deque()
         try:
             while True:
                 # クライアントからのメッセージを受信
-                data = await websocket.receive_json()
+                if pending:
+                    data = _decode_json(pending.popleft())
+                else:
+                    data = await websocket.receive_json()
 
                 # メッセージタイプに応じて処理
                 message_type = data.get("type", "message")
@@ -147,8 +169,13 @@ async def handle_websocket_chat(
                         conversation_repo=conversation_repo,
                         session_repo=session_repo,
                         ai_service=ai_service,
-                        cache_service=cache_service,
+                        conversation_memory=conversation_memory,
+                        context_window_builder=context_window_builder,
+                        pending=pending,
                     )
+                    if websocket.client_state != WebSocketState.CONNECTED:
+                        # 回答の生成中に切断された
+                        raise WebSocketDisconnect()
                 elif message_type == "ping":
                     # ハートビート（接続維持）
                     await connection_manager.send_personal_message(
@@ -239,11 +266,16 @@ async def _handle_message(
     conversation_repo: Any,
     session_repo: Any,
     ai_service: Any,
-    cache_service: Any,
+    conversation_memory: Any,
+    context_window_builder: ContextWindowBuilder,
+    pending: deque[Mapping[str, Any]] | None = None,
 ) -> None:
     """
     メッセージを処理してストリーミングレスポンスを送信
 
+    回答の生成中にクライアントが切断した場合は生成を打ち切り、
+    それまでの回答を状態interruptedとして保存する。
+
     Args:
         websocket: WebSocket接続
         data: 受信したデータ
@@ -252,7 +284,9 @@ async def _handle_message(
         conversation_repo: 会話リポジトリ
         session_repo: セッションリポジトリ
         ai_service: AIサービス
-        cache_service: キャッシュサービス
+        conversation_memory: 会話履歴メモリ
+        context_window_builder: コンテキストウィンドウビルダー
+        pending: 生成中に届いたメッセージの退避先
     """
     message_content = data.get("message", "").strip()
     metadata = data.get("metadata")
@@ -279,6 +313,13 @@ async def _handle_message(
         return
 
     try:
+        # レート制限（LLMを呼ぶ前に確認）
+        rate_limiter = get_rate_limiter()
+        if rate_limiter is not None:
+            await rate_limiter.acquire(
+                user_id=user_id, session_id=session_id, message=message_content
+            )
+
         # 処理開始を通知
         await connection_manager.send_personal_message(
             {
@@ -288,9 +329,8 @@ async def _handle_message(
             websocket,
         )
 
-        # キャッシュから会話履歴を取得（コンテキスト用）
-        cache_key = f"conversation:{session_id}"
-        context = await cache_service.get(cache_key) or ""
+        # 会話履歴を取得（コンテキスト用）
+        stored_history = await conversation_memory.load(session_id)
 
         # メッセージ値オブジェクトを作成
         message = Message(
@@ -300,25 +340,56 @@ async def _handle_message(
             metadata=metadata,
         )
 
-        # ストリーミングでAIレスポンスを生成
-        full_response = ""
-        async for chunk in ai_service.generate_stream(message, context):
-            if chunk:
-                full_response += chunk
-                await connection_manager.send_personal_message(
-                    {"type": "chunk", "content": chunk}, websocket
-                )
+        # トークン予算内に収まるようターン単位で会話履歴を切り詰める
+        history = context_window_builder.fit(stored_history, message.content)
 
-        # ストリーミング完了を通知
-        await connection_manager.send_personal_message(
-            {
+        # ストリーミングでAIレスポンスを生成（切断した時点で打ち切る）
+        cancel_on_disconnect = settings.CHAT_CANCEL_ON_DISCONNECT
+
+        async def send_chunk(chunk: str) -> bool:
+            delivered = await connection_manager.send_personal_message(
+                {"type": "chunk", "content": chunk}, websocket
+            )
+            return delivered or not cancel_on_disconnect
+
+        # このメッセージで行ったLLM呼び出しを集計してdoneフレームに載せる
+        with llm_request_metrics() as request_metrics:
+            result = await consume_stream(
+                ai_service.generate_stream(message, history=history),
+                on_chunk=send_chunk,
+                disconnected=(
+                    (lambda: _wait_for_disconnect(websocket, pending))
+                    if cancel_on_disconnect and pending is not None
+                    else None
+                ),
+            )
+
+        tracker = get_interruption_tracker()
+        if result.interrupted:
+            saved_tokens = tracker.record_interrupted(
+                result.response, channel="websocket"
+            )
+            logger.info(
+                "websocket_generation_interrupted",
+                session_id=session_id,
+                user_id=user_id,
+                response_length=len(result.response),
+                chunks=result.chunks,
+                elapsed_ms=result.elapsed_ms,
+                estimated_saved_tokens=saved_tokens,
+            )
+        else:
+            tracker.record_completed(result.response)
+            # ストリーミング完了を通知
+            done: dict[str, Any] = {
                 "type": "done",
                 "message": "回答の生成が完了しました",
-            },
-            websocket,
-        )
+            }
+            if get_llm_metrics().enabled:
+                done["metrics"] = request_metrics.summary()
+            await connection_manager.send_personal_message(done, websocket)
 
-        # 会話を保存
+        # 会話を保存（打ち切った場合は部分の回答を状態interruptedで保存）
         from app.domain.entities.conversation import Conversation
 
         conversation = Conversation(
@@ -326,22 +397,24 @@ async def _handle_message(
             user_id=user_id,
             session_id=session_id,
             message=message.content,
-            response=full_response,
-            metadata=metadata,
+            response=result.response,
+            metadata=result.conversation_metadata(metadata),
             created_at=datetime.now(),
             updated_at=None,
         )
 
         saved_conversation = await conversation_repo.create(conversation)
 
-        # キャッシュに会話履歴を更新
-        updated_context = (
-            f"{context}\nUser: {message.content}\nAI: {full_response}"
-        )
-        await cache_service.set(
-            cache_key,
-            updated_context[-5000:],  # 最新5000文字のみ保持
-            ttl=3600,
+        # 切断済みのため、途中の回答は会話履歴に入れず保存の通知も送らない
+        if result.interrupted:
+            return
+
+        # 会話履歴にターンを追加
+        await conversation_memory.append(
+            session_id,
+            ConversationTurn(
+                user_message=message.content, ai_response=result.response
+            ),
         )
 
         # 保存完了を通知
@@ -354,6 +427,33 @@ async def _handle_message(
             websocket,
         )
 
+    except RateLimitExceededError as e:
+        await connection_manager.send_personal_message(
+            {
+                "type": "error",
+                "message": str(e),
+                "error_code": "RATE_LIMITED",
+                "retry_after": e.retry_after,
+            },
+            websocket,
+        )
+    except AIServiceUnavailableError as e:
+        # 過負荷・遮断中は上流を待たずに即座に返す
+        logger.warning(
+            "websocket_ai_unavailable",
+            session_id=session_id,
+            user_id=user_id,
+            error=str(e),
+        )
+        await connection_manager.send_personal_message(
+            {
+                "type": "error",
+                "message": "AIサービスが混み合っています。しばらくしてから再試行してください。",
+                "error_code": "AI_SERVICE_UNAVAILABLE",
+                "retry_after": e.retry_after,
+            },
+            websocket,
+        )
     except Exception as e:
         error_message = str(e)
 
@@ -381,3 +481,27 @@ async def _handle_message(
             },
             websocket,
         )
+
+
+async def _wait_for_disconnect(
+    websocket: WebSocket, pending: deque[Mapping[str, Any]]
+) -> None:
+    """
+    クライアントが切断するまで待機
+
+    待機中に届いたメッセージはpendingに退避し、回答の生成後に
+    メインループで処理する
+    """
+    while True:
+        received = await websocket.receive()
+        if received["type"] == "websocket.disconnect":
+            return
+        pending.append(received)
+
+
+def _decode_json(received: Mapping[str, Any]) -> Any:
+    """退避したメッセージをJSONとして読む（receive_jsonと同じ扱い）"""
+    text = received.get("text")
+    if text is None:
+        text = received["bytes"].decode("utf-8")
+    return json.loads(text)
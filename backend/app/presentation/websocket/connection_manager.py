@@ -63,7 +63,7 @@ class ConnectionManager:
 
     async def send_personal_message(
         self, message: dict, websocket: WebSocket
-    ) -> None:
+    ) -> bool:
         """
         特定のWebSocket接続にメッセージを送信
 
@@ -71,6 +71,9 @@ class ConnectionManager:
             message: 送信するメッセージ（辞書形式）
             websocket: 送信先のWebSocket接続
 
+        Returns:
+            送信できたか（接続が閉じられていた場合はFalse）
+
         Raises:
             RuntimeError: 送信に失敗した場合
         """
@@ -78,14 +81,15 @@ class ConnectionManager:
             # 接続が閉じられているかチェック
             if websocket.client_state.name != "CONNECTED":
                 logger.debug("WebSocket接続が既に閉じられています")
-                return
+                return False
             await websocket.send_json(message)
+            return True
         except WebSocketDisconnect:
             # WebSocket接続が切断された場合は無視
             logger.debug(
                 "WebSocket接続が切断されたため、メッセージ送信をスキップ"
             )
-            return
+            return False
         except Exception as e:
             # その他の接続関連エラーも無視
             error_type = type(e).__name__
@@ -97,7 +101,7 @@ class ConnectionManager:
                 logger.debug(
                     f"WebSocket接続が閉じられているため、メッセージ送信をスキップ: {error_type}"
                 )
-                return
+                return False
             logger.error(f"メッセージ送信エラー: {str(e)}")
             raise RuntimeError(f"メッセージ送信に失敗しました: {str(e)}")
 
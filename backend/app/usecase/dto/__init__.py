@@ -1,6 +1,10 @@
 """データ転送オブジェクト（DTO）"""
 
 from app.usecase.dto.chat import (
+    BatchGenerateRequest,
+    BatchGenerateResponse,
+    BatchItemRequest,
+    BatchItemResult,
     ConversationHistoryResponse,
     CreateSessionRequest,
     CreateSessionResponse,
@@ -14,4 +18,8 @@ __all__ = [
     "CreateSessionRequest",
     "CreateSessionResponse",
     "ConversationHistoryResponse",
+    "BatchItemRequest",
+    "BatchGenerateRequest",
+    "BatchItemResult",
+    "BatchGenerateResponse",
 ]
@@ -127,3 +127,77 @@ class ConversationHistoryResponse(BaseModel):
             }
         }
     )
+
+
+class BatchItemRequest(BaseModel):
+    """バッチ生成の1項目DTO"""
+
+    message: str = Field(
+        ..., min_length=1, max_length=10000, description="メッセージ内容"
+    )
+    context: str = Field("", description="会話コンテキスト（任意）")
+
+
+class BatchGenerateRequest(BaseModel):
+    """バッチ生成リクエストDTO"""
+
+    items: list[BatchItemRequest] = Field(
+        ..., min_length=1, description="生成する項目"
+    )
+    concurrency: int | None = Field(
+        None, ge=1, description="同時に生成する件数（省略時は設定値）"
+    )
+    timeout_seconds: float | None = Field(
+        None, gt=0, description="1件あたりのタイムアウト秒数"
+    )
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "items": [
+                    {"message": "こんにちは"},
+                    {
+                        "message": "続きを教えて",
+                        "context": "User: 質問\nAI: 回答",
+                    },
+                ],
+                "concurrency": 4,
+                "timeout_seconds": 30,
+            }
+        }
+    )
+
+
+class BatchItemResult(BaseModel):
+    """バッチ生成の1項目の結果DTO"""
+
+    index: int
+    response: str | None
+    error: str | None
+
+
+class BatchGenerateResponse(BaseModel):
+    """バッチ生成レスポンスDTO"""
+
+    batch_id: str
+    results: list[BatchItemResult]
+    succeeded: int
+    failed: int
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "batch_id": "batch_1a2b3c4d",
+                "results": [
+                    {"index": 0, "response": "こんにちは！", "error": None},
+                    {
+                        "index": 1,
+                        "response": None,
+                        "error": "タイムアウトしました",
+                    },
+                ],
+                "succeeded": 1,
+                "failed": 1,
+            }
+        }
+    )
@@ -1,11 +1,23 @@
 """チャットユースケース"""
 
+import asyncio
 from datetime import datetime
 
 from app.domain.entities.conversation import Conversation
 from app.domain.entities.session import Session
 from app.domain.repositories import IConversationRepository, ISessionRepository
-from app.domain.services import IAIService, ICacheService
+from app.domain.services import (
+    IAIService,
+    IConversationMemory,
+    IRateLimiter,
+)
+from app.domain.services.context_window import ContextWindowBuilder
+from app.domain.services.interruptible_stream import (
+    DisconnectWaiter,
+    await_response,
+)
+from app.domain.value_objects.batch_result import BatchResult
+from app.domain.value_objects.conversation_turn import ConversationTurn
 from app.domain.value_objects.message import Message
 
 
@@ -17,12 +29,14 @@ class SendMessageUseCase:
         conversation_repository: IConversationRepository,
         session_repository: ISessionRepository,
         ai_service: IAIService,
-        cache_service: ICacheService,
+        conversation_memory: IConversationMemory,
+        context_window_builder: ContextWindowBuilder,
     ):
         self._conversation_repo = conversation_repository
         self._session_repo = session_repository
         self._ai_service = ai_service
-        self._cache_service = cache_service
+        self._conversation_memory = conversation_memory
+        self._context_window_builder = context_window_builder
 
     async def execute(
         self,
@@ -30,15 +44,21 @@ class SendMessageUseCase:
         session_id: str,
         message_content: str,
         metadata: dict | None = None,
+        disconnected: DisconnectWaiter | None = None,
     ) -> Conversation:
         """
         メッセージを送信し、AIレスポンスを取得
 
+        disconnectedを渡した場合はクライアントが切断した時点で生成を
+        打ち切る。打ち切った会話は空の回答のまま状態をinterruptedとして
+        保存し、会話履歴には追加しない。
+
         Args:
             user_id: ユーザーID
             session_id: セッションID
             message_content: メッセージ内容
             metadata: メタデータ
+            disconnected: クライアントが切断するまで待つ関数
 
         Returns:
             作成されたConversationエンティティ
@@ -57,9 +77,8 @@ class SendMessageUseCase:
                 f"セッションがアクティブではありません: {session_id}"
             )
 
-        # キャッシュから会話履歴を取得（コンテキスト用）
-        cache_key = f"conversation:{session_id}"
-        context = await self._cache_service.get(cache_key) or ""
+        # 会話履歴を取得（コンテキスト用）
+        stored_history = await self._conversation_memory.load(session_id)
 
         # メッセージ値オブジェクトを作成
         message = Message(
@@ -69,9 +88,15 @@ class SendMessageUseCase:
             metadata=metadata,
         )
 
+        # トークン予算内に収まるようターン単位で会話履歴を切り詰める
+        history = self._context_window_builder.fit(
+            stored_history, message.content
+        )
+
         # AIレスポンスを生成
-        ai_response = await self._ai_service.generate_response(
-            message, context
+        result = await await_response(
+            self._ai_service.generate_response(message, history=history),
+            disconnected=disconnected,
         )
 
         # Conversationエンティティを作成
@@ -80,8 +105,8 @@ class SendMessageUseCase:
             user_id=user_id,
             session_id=session_id,
             message=message.content,
-            response=ai_response,
-            metadata=metadata,
+            response=result.response,
+            metadata=result.conversation_metadata(metadata),
             created_at=datetime.now(),
             updated_at=None,
         )
@@ -89,15 +114,14 @@ class SendMessageUseCase:
         # 会話を保存
         saved_conversation = await self._conversation_repo.create(conversation)
 
-        # キャッシュに会話履歴を更新
-        updated_context = (
-            f"{context}\nUser: {message.content}\nAI: {ai_response}"
-        )
-        await self._cache_service.set(
-            cache_key,
-            updated_context[-5000:],  # 最新5000文字のみ保持
-            ttl=3600,
-        )
+        # 途中で打ち切った回答は次のターンの文脈に入れない
+        if not result.interrupted:
+            await self._conversation_memory.append(
+                session_id,
+                ConversationTurn(
+                    user_message=message.content, ai_response=result.response
+                ),
+            )
 
         return saved_conversation
 
@@ -157,3 +181,98 @@ class GetConversationHistoryUseCase:
             会話履歴のリスト
         """
         return await self._conversation_repo.get_by_session_id(session_id)
+
+
+class GenerateBatchUseCase:
+    """バッチ生成ユースケース（オフライン評価・バックフィル用、保存しない）"""
+
+    def __init__(
+        self,
+        ai_service: IAIService,
+        rate_limiter: IRateLimiter | None = None,
+        *,
+        max_items: int,
+        default_concurrency: int,
+        max_concurrency: int,
+        item_timeout: float,
+    ):
+        self._ai_service = ai_service
+        self._rate_limiter = rate_limiter
+        self._max_items = max_items
+        self._default_concurrency = default_concurrency
+        self._max_concurrency = max_concurrency
+        self._item_timeout = item_timeout
+
+    async def execute(
+        self,
+        user_id: str,
+        batch_id: str,
+        items: list[tuple[str, str]],
+        concurrency: int | None = None,
+        timeout: float | None = None,
+    ) -> list[BatchResult]:
+        """
+        複数のメッセージのAIレスポンスをまとめて生成
+
+        Args:
+            user_id: ユーザーID
+            batch_id: バッチID（レート制限ではセッションIDとして扱う）
+            items: (メッセージ内容, コンテキスト) のリスト
+            concurrency: 同時に生成する件数（上限で切り詰める）
+            timeout: 1件あたりのタイムアウト秒数（上限で切り詰める）
+
+        Returns:
+            入力と同じ順の結果（失敗した項目はerrorを持つ）
+
+        Raises:
+            ValueError: 項目数が上限を超える場合
+            RateLimitExceededError: バッチの実行がレート制限を超える場合
+        """
+        if len(items) > self._max_items:
+            raise ValueError(
+                f"バッチの項目数は{self._max_items}件以下である必要があります"
+            )
+        concurrency = min(
+            concurrency or self._default_concurrency, self._max_concurrency
+        )
+        timeout = min(timeout or self._item_timeout, self._item_timeout)
+
+        # バッチ全体を1件のリクエストとして開始前に1回だけ消費する
+        # （項目ごとに消費するとバーストを超えた項目が一斉に失敗する）
+        if self._rate_limiter is not None:
+            await self._rate_limiter.acquire(
+                user_id=user_id,
+                session_id=batch_id,
+                message="\n".join(content for content, _ in items),
+            )
+
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def run(content: str, context: str) -> BatchResult:
+            try:
+                message = Message(
+                    content=content,
+                    timestamp=datetime.now(),
+                    sender=user_id,
+                    metadata={"session_id": batch_id, "source": "batch"},
+                )
+            except ValueError as e:
+                return BatchResult(error=str(e))
+            async with semaphore:
+                try:
+                    # タイムアウトは実行枠の待機時間を含めない
+                    async with asyncio.timeout(timeout):
+                        response = await self._ai_service.generate_response(
+                            message, context
+                        )
+                except TimeoutError:
+                    return BatchResult(error="タイムアウトしました")
+                except Exception as e:
+                    return BatchResult(error=str(e) or type(e).__name__)
+            return BatchResult(response=response)
+
+        return list(
+            await asyncio.gather(
+                *(run(content, context) for content, context in items)
+            )
+        )
@@ -0,0 +1,101 @@
+"""
+LangGraphのグラフ実行とファストパスのリクエストあたりのオーバーヘッド
+
+待ち時間のないフェイクLLMで、通常会話のgenerate_responseをグラフ経由
+（6ノードのStateGraph）とファストパス（プロンプト|LLMを直接呼ぶ）で
+それぞれ実行し、1リクエストあたりの所要時間を比較する。
+LLMの待ち時間を除いた差がグラフのオーバーヘッドになる。
+
+    cd backend && uv run python -m benchmarks.langgraph_overhead --requests 2000
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+import statistics
+import time
+
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.services.langgraph_ai_service import (
+    LangGraphAIService,
+)
+
+
+async def measure(
+    service: LangGraphAIService, requests: int, warmup: int
+) -> list[float]:
+    """1リクエストずつ順に実行し、所要時間（秒）のリストを返す"""
+    messages = [
+        Message(
+            content=f"こんにちは、今日の予定について相談させてください{i}",
+            timestamp=datetime.now(),
+            sender="bench",
+        )
+        for i in range(warmup + requests)
+    ]
+    for message in messages[:warmup]:
+        await service.generate_response(message)
+
+    durations: list[float] = []
+    for message in messages[warmup:]:
+        started = time.perf_counter()
+        await service.generate_response(message)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def summarize(durations: list[float]) -> dict[str, float]:
+    """平均・中央値・p99（マイクロ秒）"""
+    ordered = sorted(durations)
+    return {
+        "mean_us": statistics.fmean(ordered) * 1e6,
+        "p50_us": ordered[len(ordered) // 2] * 1e6,
+        "p99_us": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        * 1e6,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    # LLMの待ち時間をなくし、LLM以外の処理の時間のみを計測する
+    settings.LLM_BACKEND = "fake"
+    settings.LANGFUSE_ENABLED = False
+    settings.FAKE_LLM_TTFT_SECONDS = 0.0
+    settings.FAKE_LLM_TOKENS_PER_SECOND = 0.0
+    settings.FAKE_LLM_RESPONSE_TOKENS = args.response_tokens
+
+    results = {
+        name: summarize(
+            await measure(
+                LangGraphAIService(fast_path=fast_path),
+                args.requests,
+                args.warmup,
+            )
+        )
+        for name, fast_path in (("graph", False), ("fast_path", True))
+    }
+
+    print(f"requests={args.requests} response_tokens={args.response_tokens}")
+    print(f"{'mode':<10} {'mean_us':>10} {'p50_us':>10} {'p99_us':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:<10} {result['mean_us']:>10.1f} "
+            f"{result['p50_us']:>10.1f} {result['p99_us']:>10.1f}"
+        )
+    saved = results["graph"]["mean_us"] - results["fast_path"]["mean_us"]
+    print(
+        f"saved per request: {saved:.1f} us "
+        f"({saved / results['graph']['mean_us']:.0%})"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--response-tokens", type=int, default=16)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+ベクトル索引のベンチマーク（再現率・スループット・1ベクトルあたりのバイト数）
+
+合成したコーパス（クラスタを持つ正規化済みベクトル）で、総当たり検索の
+結果を正解として各索引のrecall@k、1秒あたりのクエリ数、常駐する
+1ベクトルあたりのバイト数を比較する。
+
+    cd backend && uv run python -m benchmarks.vector_index --vectors 100000
+"""
+
+import argparse
+from collections.abc import Callable
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.infrastructure.services.embedding_service import normalize_vectors
+from app.infrastructure.services.quantized_index import (
+    QuantizedVectorIndex,
+    quantize_int8,
+)
+from app.infrastructure.services.vector_index import VectorIndex
+
+
+def make_corpus(
+    count: int, dimension: int, clusters: int, seed: int
+) -> NDArray[np.float32]:
+    """クラスタの中心の周りに散らばった正規化済みベクトルを生成"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, count)
+    noise = rng.standard_normal((count, dimension)).astype(np.float32)
+    return normalize_vectors(centers[labels] + noise * 0.8)
+
+
+def measure(
+    name: str,
+    index: VectorIndex,
+    queries: NDArray[np.float32],
+    expected: list[set[int]],
+    k: int,
+) -> dict[str, str | float]:
+    """recall@k・QPS・1ベクトルあたりのバイト数を計測"""
+    started = time.perf_counter()
+    results = [index.search(query, k) for query in queries]
+    elapsed = time.perf_counter() - started
+
+    hits = sum(
+        len(truth & {row for row, _ in found})
+        for truth, found in zip(expected, results, strict=True)
+    )
+    stats = index.stats()
+    return {
+        "index": name,
+        "backend": str(stats["backend"]),
+        "recall": hits / (len(queries) * k),
+        "qps": len(queries) / elapsed,
+        "bytes_per_vector": int(stats["bytes"]) / len(index),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=256)
+    parser.add_argument("--probes", type=int, default=16)
+    parser.add_argument("--rerank", type=int, default=64)
+    parser.add_argument(
+        "--hnsw",
+        action="store_true",
+        help="HNSWも計測する（構築に時間がかかる）",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_corpus(
+        args.vectors + args.queries, args.dimension, args.clusters, args.seed
+    )
+    vectors, queries = corpus[: args.vectors], corpus[args.vectors :]
+
+    with tempfile.TemporaryDirectory() as directory:
+        # 元のベクトルはセグメントと同じくメモリマップで参照する
+        path = Path(directory) / "vectors.npy"
+        np.save(path, vectors)
+        mapped = np.load(path, mmap_mode="r")
+
+        def brute_force() -> VectorIndex:
+            index = VectorIndex(args.dimension, hnsw_threshold=0)
+            index.add_block(vectors)
+            return index
+
+        def hnsw() -> VectorIndex:
+            index = VectorIndex(args.dimension, hnsw_threshold=1)
+            index.add_block(vectors)
+            index.ensure_ann()
+            return index
+
+        def ivf_int8() -> VectorIndex:
+            index = QuantizedVectorIndex(
+                args.dimension,
+                ivf_threshold=1,
+                lists=args.lists,
+                probes=args.probes,
+                rerank=args.rerank,
+            )
+            index.add_block(mapped, quantize_int8(vectors))
+            index.ensure_ann()
+            return index
+
+        builders: list[tuple[str, Callable[[], VectorIndex]]] = [
+            ("brute_force", brute_force),
+            ("ivf_int8", ivf_int8),
+        ]
+        if args.hnsw:
+            builders.append(("hnsw", hnsw))
+
+        exact = brute_force()
+        expected = [
+            {row for row, _ in exact.search(query, args.k)}
+            for query in queries
+        ]
+
+        print(
+            f"vectors={args.vectors} dimension={args.dimension} "
+            f"queries={args.queries} k={args.k}"
+        )
+        print(
+            f"{'index':<12} {'build_s':>8} {'recall@k':>9} "
+            f"{'qps':>9} {'bytes/vector':>13}"
+        )
+        for name, build in builders:
+            started = time.perf_counter()
+            index = build()
+            build_seconds = time.perf_counter() - started
+            result = measure(name, index, queries, expected, args.k)
+            print(
+                f"{name:<12} {build_seconds:>8.2f} {result['recall']:>9.3f} "
+                f"{result['qps']:>9.0f} {result['bytes_per_vector']:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
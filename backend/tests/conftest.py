@@ -0,0 +1,180 @@
+"""テストで共有するフェイクとフィクスチャ"""
+
+import asyncio
+from collections.abc import AsyncGenerator, Callable
+from datetime import datetime
+from typing import Any
+
+import pytest
+
+from app.domain.services import IAIService, ICacheService
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.message import Message
+
+
+class ScriptedAIService(IAIService):
+    """
+    決められた回答を順に返し、呼び出し回数を数えるAIサービス
+
+    回答を指定しない場合は呼び出しごとに異なる回答（answer-1, answer-2, ...）
+    を返す。ストリームは回答を2文字ずつのチャンクに分けて返す。
+    """
+
+    def __init__(self, *responses: str) -> None:
+        self.calls = 0
+        self._responses = responses
+
+    async def generate_response(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> str:
+        self.calls += 1
+        if not self._responses:
+            return f"answer-{self.calls}"
+        return self._responses[min(self.calls, len(self._responses)) - 1]
+
+    async def generate_stream(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> AsyncGenerator[str, None]:
+        response = await self.generate_response(message, context, history)
+        for i in range(0, len(response), 2):
+            yield response[i : i + 2]
+
+
+class EchoAIService(IAIService):
+    """
+    「文脈:内容」を返し、同時に実行中の呼び出し数の最大を記録するAIサービス
+
+    内容が"fail"なら失敗し、"slow"なら1秒待つ
+    """
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_response(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> str:
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if message.content == "fail":
+                raise RuntimeError("upstream failed")
+            await asyncio.sleep(1.0 if message.content == "slow" else 0.01)
+            return f"{context}:{message.content}"
+        finally:
+            self.active -= 1
+
+    async def generate_stream(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> AsyncGenerator[str, None]:
+        yield await self.generate_response(message, context, history)
+
+
+class SlowStreamAIService(IAIService):
+    """
+    一定間隔でチャンク（c0, c1, ...）を返し、閉じられたかを記録するAIサービス
+
+    内容が"fail"なら3つ目のチャンクの前に失敗する
+    """
+
+    def __init__(self, chunks: int = 20, interval: float = 0.01) -> None:
+        self.chunks = chunks
+        self.interval = interval
+        self.produced = 0
+        self.closed = False
+
+    async def generate_response(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> str:
+        return "".join(
+            [c async for c in self.generate_stream(message, context, history)]
+        )
+
+    async def generate_stream(
+        self,
+        message: Message,
+        context: str = "",
+        history: ConversationHistory | None = None,
+    ) -> AsyncGenerator[str, None]:
+        try:
+            for i in range(self.chunks):
+                await asyncio.sleep(self.interval)
+                if message.content == "fail" and i == 2:
+                    raise RuntimeError("upstream failed")
+                self.produced += 1
+                yield f"c{i} "
+        finally:
+            self.closed = True
+
+
+class MemoryCache(ICacheService):
+    """プロセス内の辞書によるキャッシュ"""
+
+    def __init__(self) -> None:
+        self.values: dict[str, str] = {}
+
+    async def get(self, key: str) -> str | None:
+        return self.values.get(key)
+
+    async def set(self, key: str, value: str, ttl: int = 3600) -> None:
+        self.values[key] = value
+
+    async def delete(self, key: str) -> None:
+        self.values.pop(key, None)
+
+    async def exists(self, key: str) -> bool:
+        return key in self.values
+
+
+@pytest.fixture
+def make_message() -> Callable[..., Message]:
+    """内容とメタデータからユーザーのメッセージを作る関数"""
+
+    def make(content: str = "こんにちは", **metadata: Any) -> Message:
+        return Message(
+            content=content,
+            timestamp=datetime.now(),
+            sender="u",
+            metadata=metadata or None,
+        )
+
+    return make
+
+
+@pytest.fixture
+def scripted_ai_service() -> type[ScriptedAIService]:
+    """回答を指定して作るScriptedAIService"""
+    return ScriptedAIService
+
+
+@pytest.fixture
+def echo_ai_service() -> EchoAIService:
+    """テストごとに新しいEchoAIService"""
+    return EchoAIService()
+
+
+@pytest.fixture
+def slow_stream_ai_service() -> type[SlowStreamAIService]:
+    """チャンク数と間隔を指定して作るSlowStreamAIService"""
+    return SlowStreamAIService
+
+
+@pytest.fixture
+def memory_cache() -> MemoryCache:
+    """テストごとに空のMemoryCache"""
+    return MemoryCache()
@@ -0,0 +1,94 @@
+"""バッチ生成のユニットテスト"""
+
+import asyncio
+from typing import Any
+
+import pytest
+import redis.asyncio as redis
+
+from app.domain.services import IAIService, IRateLimiter
+from app.domain.value_objects.batch_result import BatchResult
+from app.infrastructure.config import settings
+from app.infrastructure.services.rate_limiter import RedisRateLimiter
+from app.usecase.use_cases.chat import GenerateBatchUseCase
+
+
+def _use_case(
+    service: IAIService,
+    rate_limiter: IRateLimiter | None = None,
+    *,
+    max_items: int = 100,
+    concurrency: int = 4,
+) -> GenerateBatchUseCase:
+    return GenerateBatchUseCase(
+        service,
+        rate_limiter,
+        max_items=max_items,
+        default_concurrency=concurrency,
+        max_concurrency=concurrency,
+        item_timeout=1.0,
+    )
+
+
+def test_generate_batch_keeps_order_and_isolates_errors(echo_ai_service: Any):
+    """結果は入力順で、失敗・タイムアウトはその項目だけのエラーになる"""
+    use_case = _use_case(echo_ai_service)
+    items = [("a", "c1"), ("fail", ""), ("slow", ""), ("b", "c2")]
+
+    results = asyncio.run(use_case.execute("u", "batch", items, timeout=0.2))
+
+    assert [r.response for r in results] == ["c1:a", None, None, "c2:b"]
+    assert results[1].error == "upstream failed"
+    assert results[2].error == "タイムアウトしました"
+    assert [r.ok for r in results] == [True, False, False, True]
+
+
+def test_generate_batch_bounds_concurrency(echo_ai_service: Any):
+    """同時に生成する件数はconcurrency以下に抑える"""
+    use_case = _use_case(echo_ai_service, concurrency=3)
+    items = [(str(i), "") for i in range(10)]
+
+    results = asyncio.run(use_case.execute("u", "batch", items))
+
+    assert all(r.ok for r in results)
+    assert echo_ai_service.max_active == 3
+
+
+def test_batch_larger_than_burst_is_charged_once(
+    monkeypatch: pytest.MonkeyPatch,
+    echo_ai_service: Any,
+):
+    """セッションのバーストを超える件数でも、バッチ全体で1回だけ消費する"""
+    monkeypatch.setattr(settings, "RATE_LIMIT_SESSION_BURST", 5)
+    monkeypatch.setattr(settings, "RATE_LIMIT_SESSION_RPS", 1.0)
+    client = redis.Redis(host="127.0.0.1", port=1)
+    # Redisに接続できないためプロセス内のバケット（既定の制限）で数える
+    limiter = RedisRateLimiter(client, timeout=0.5)
+    use_case = _use_case(echo_ai_service, limiter)
+    items = [(str(i), "") for i in range(20)]
+
+    async def run() -> list[BatchResult]:
+        results = await use_case.execute("u", "batch", items)
+        await client.aclose()
+        return results
+
+    results = asyncio.run(run())
+
+    assert all(r.ok for r in results)
+    assert limiter.stats()["allowed"] == 1
+
+
+def test_use_case_rejects_oversized_batch_and_invalid_items(
+    echo_ai_service: Any,
+):
+    """項目数の上限を検証し、不正なメッセージはその項目のみ失敗させる"""
+    use_case = _use_case(echo_ai_service, max_items=3, concurrency=2)
+
+    with pytest.raises(ValueError):
+        asyncio.run(use_case.execute("u", "batch", [("a", "")] * 4))
+
+    results = asyncio.run(
+        use_case.execute("u", "batch", [("a", ""), ("   ", ""), ("b", "")])
+    )
+    assert [r.response for r in results] == [":a", None, ":b"]
+    assert results[1].error is not None
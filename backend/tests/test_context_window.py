@@ -0,0 +1,58 @@
+"""コンテキストウィンドウ構築のユニットテスト"""
+
+from app.domain.services.context_window import (
+    ContextWindowBuilder,
+    estimate_tokens,
+    estimate_turn_tokens,
+    parse_context,
+    render_context,
+    render_history,
+)
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.conversation_turn import ConversationTurn
+
+
+def test_estimate_tokens_counts_japanese_per_char():
+    """日本語は1文字1トークン、英数字は4文字1トークンで数える"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("こんにちは") == 5
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("hello 世界!") == 2 + 2 + 1
+
+
+def test_parse_and_render_round_trip_multiline():
+    """複数行の発話を含むコンテキストをターン単位で往復できる"""
+    context = "User: 質問1\nAI: 回答1\n続き\nUser: 質問2\nAI: 回答2"
+    turns = parse_context(context)
+    assert turns == [
+        ConversationTurn("質問1", "回答1\n続き"),
+        ConversationTurn("質問2", "回答2"),
+    ]
+    assert render_context(turns) == context
+
+
+def test_select_keeps_newest_whole_turns_within_budget():
+    """新しいターンから順に、予算内に収まるターンだけを採用する"""
+    turns = [ConversationTurn(f"質問{i}", "回答" * 10) for i in range(10)]
+    cost = estimate_turn_tokens(turns[0])
+    builder = ContextWindowBuilder(
+        max_tokens=cost * 3 + 50,
+        system_prompt_tokens=30,
+        response_reserve_tokens=20,
+    )
+
+    selected = builder.select(turns)
+
+    assert selected == turns[-3:]
+
+
+def test_fit_keeps_summary_and_charges_it_to_budget():
+    """要約は常に残し、その分を差し引いた予算でターンを選ぶ"""
+    turns = (ConversationTurn("質問一", "回答一"), ConversationTurn("a", "b"))
+    builder = ContextWindowBuilder(max_tokens=20)
+
+    fitted = builder.fit(ConversationHistory(turns=turns, summary="要約" * 5))
+
+    assert fitted.summary == "要約" * 5
+    assert fitted.turns == turns[-1:]
+    assert render_history(fitted) == f"Summary: {'要約' * 5}\nUser: a\nAI: b"
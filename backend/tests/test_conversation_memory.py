@@ -0,0 +1,154 @@
+"""会話履歴メモリのユニットテスト"""
+
+import asyncio
+from collections.abc import Sequence
+
+import fakeredis
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.conversation_turn import ConversationTurn
+from app.infrastructure.services.conversation_memory import (
+    RedisConversationMemory,
+    SummaryBufferConversationMemory,
+    deserialize_turn,
+    serialize_turn,
+)
+from app.infrastructure.services.conversation_summarizer import (
+    ConversationSummarizer,
+)
+from app.infrastructure.services.message_utils import build_history_messages
+
+
+def test_serialize_turn_round_trip_multiline():
+    """改行や引用符を含むターンもそのまま復元できる"""
+    turn = ConversationTurn("1行目\n2行目", 'AI: "引用"\nUser: 偽の行')
+    raw = serialize_turn(turn)
+
+    assert "\n" not in raw
+    assert deserialize_turn(raw) == turn
+
+
+def test_build_history_messages_prefers_structured_history():
+    """構造化された履歴があればコンテキスト文字列より優先する"""
+    history = ConversationHistory(
+        turns=(ConversationTurn("質問\n続き", "回答"),)
+    )
+
+    messages = build_history_messages("User: 古い\nAI: 古い", history)
+
+    assert messages == [
+        HumanMessage(content="質問\n続き"),
+        AIMessage(content="回答"),
+    ]
+
+
+def test_build_history_messages_puts_summary_first():
+    """要約はシステムメッセージとして先頭に置く"""
+    history = ConversationHistory(
+        turns=(ConversationTurn("質問", "回答"),), summary="以前の要約"
+    )
+
+    messages = build_history_messages(history=history)
+
+    assert isinstance(messages[0], SystemMessage)
+    assert "以前の要約" in str(messages[0].content)
+    assert messages[1:] == [
+        HumanMessage(content="質問"),
+        AIMessage(content="回答"),
+    ]
+
+
+def test_build_history_messages_from_context():
+    """コンテキスト文字列のみの場合は解析して変換する"""
+    messages = build_history_messages("User: 質問\nAI: 回答\n続き")
+
+    assert messages == [
+        HumanMessage(content="質問"),
+        AIMessage(content="回答\n続き"),
+    ]
+    assert build_history_messages() == []
+
+
+class _ScriptedSummarizer(ConversationSummarizer):
+    """要約の呼び出しを記録し、要約中に任意の処理を差し込む"""
+
+    def __init__(self, during=None) -> None:
+        self.calls: list[list[str]] = []
+        self._during = during
+
+    async def summarize(
+        self, summary: str, turns: Sequence[ConversationTurn]
+    ) -> str:
+        self.calls.append([turn.user_message for turn in turns])
+        if self._during is not None:
+            during, self._during = self._during, None
+            await during()
+        return "要約:" + ",".join(turn.user_message for turn in turns)
+
+
+def _turn(i: int) -> ConversationTurn:
+    return ConversationTurn(user_message=f"q{i}", ai_response=f"a{i}")
+
+
+def test_fold_resummarizes_when_head_is_trimmed_and_locks_other_workers():
+    """要約中に先頭が削除されたら要約し直し、ほかのワーカーは待たない"""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    plain = RedisConversationMemory(client, max_turns=4)
+    other_summarizer = _ScriptedSummarizer()
+    other = SummaryBufferConversationMemory(
+        client, other_summarizer, buffer_turns=2, max_turns=4
+    )
+
+    async def during() -> None:
+        # 別のワーカーが上限を超えて追加し、先頭のq0が削除される
+        await plain.append("s", _turn(4))
+        # 要約中のセッションはロックされているため畳み込まない
+        await other._fold("s")
+
+    summarizer = _ScriptedSummarizer(during)
+    memory = SummaryBufferConversationMemory(
+        client, summarizer, buffer_turns=2, max_turns=4
+    )
+
+    async def run() -> ConversationHistory:
+        for i in range(4):
+            await plain.append("s", _turn(i))
+        await memory._fold("s")
+        assert await client.exists("conversation_summary_lock:v1:s") == 0
+        history = await memory.load("s")
+        await client.aclose()
+        return history
+
+    history = asyncio.run(run())
+    assert summarizer.calls == [["q0", "q1"], ["q1", "q2"]]
+    assert other_summarizer.calls == []
+    # q2が要約にも直近のターンにも含まれないまま失われない
+    assert history.summary == "要約:q1,q2"
+    assert [turn.user_message for turn in history.turns] == ["q3", "q4"]
+
+
+def test_fold_trims_folded_turns_and_keeps_later_appends():
+    """要約中に末尾へ追加されたターンは残し、続けて畳み込む"""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    plain = RedisConversationMemory(client, max_turns=10)
+
+    async def during() -> None:
+        await plain.append("s", _turn(3))
+
+    summarizer = _ScriptedSummarizer(during)
+    memory = SummaryBufferConversationMemory(
+        client, summarizer, buffer_turns=1, max_turns=10
+    )
+
+    async def run() -> ConversationHistory:
+        for i in range(3):
+            await plain.append("s", _turn(i))
+        await memory._fold("s")
+        history = await memory.load("s")
+        await client.aclose()
+        return history
+
+    history = asyncio.run(run())
+    assert summarizer.calls == [["q0", "q1"], ["q2"]]
+    assert [turn.user_message for turn in history.turns] == ["q3"]
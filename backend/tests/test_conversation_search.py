@@ -0,0 +1,91 @@
+"""会話のハイブリッド検索（BM25 + ベクトル）のユニットテスト"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from app.domain.entities.conversation import Conversation
+from app.domain.value_objects.conversation_search import ConversationSearchPage
+from app.infrastructure.services.bm25_index import BM25Index, tokenize
+from app.infrastructure.services.conversation_search import (
+    HybridConversationSearch,
+)
+from app.infrastructure.services.embedding_service import (
+    HashingEmbeddingService,
+)
+from app.infrastructure.services.retriever import InProcessRetriever
+
+
+def _conversation(
+    conversation_id: int, message: str, user_id: str = "u1"
+) -> Conversation:
+    return Conversation(
+        id=conversation_id,
+        user_id=user_id,
+        session_id=f"s-{user_id}",
+        message=message,
+        response="承知しました。",
+        created_at=datetime(2026, 1, 1) + timedelta(minutes=conversation_id),
+    )
+
+
+def test_tokenize_japanese_ngrams_and_words():
+    """日本語は1文字・2文字のn-gram、英数字は単語（全角は半角に正規化）"""
+    tokens = tokenize("返金のAPI")
+
+    assert {"返", "金", "の", "返金", "金の"} <= set(tokens)
+    assert "api" in tokens
+    assert "のa" not in tokens
+    assert tokenize("ＡＰＩ") == ["api"]
+
+
+def test_bm25_ranks_and_updates_incrementally():
+    """一致の多い文書が上位になり、置き換え・削除が検索に反映される"""
+    index = BM25Index()
+    index.add(1, "返金の手続きについて教えてください")
+    index.add(2, "配送の状況を確認したい")
+    index.add(3, "返金はいつ返金されますか")
+
+    assert [doc for doc, _ in index.search("返金")] == [3, 1]
+
+    index.add(3, "ログインできません")
+    index.remove(1)
+
+    assert index.search("返金") == []
+    assert [doc for doc, _ in index.search("ログイン")] == [3]
+    assert index.stats()["documents"] == 2
+
+
+def test_hybrid_search_filters_and_paginates():
+    """ユーザーで絞り込み、融合した順位でページングする"""
+    search = HybridConversationSearch(
+        InProcessRetriever(
+            HashingEmbeddingService(dimension=128), min_score=0.2
+        )
+    )
+    conversations = [
+        _conversation(i, f"返金について質問{i}です") for i in range(1, 6)
+    ] + [
+        _conversation(6, "返金について質問です", user_id="u2"),
+        _conversation(7, "配送の状況を確認したい"),
+    ]
+
+    async def run() -> tuple[ConversationSearchPage, ...]:
+        await search.index(conversations)
+        first = await search.search("返金", user_id="u1", limit=2)
+        second = await search.search("返金", user_id="u1", limit=2, offset=2)
+        await search.remove(1)
+        after_remove = await search.search("返金", user_id="u1", limit=10)
+        latest = await search.search("", limit=1)
+        return first, second, after_remove, latest
+
+    first, second, after_remove, latest = asyncio.run(run())
+
+    first_ids = [hit.conversation_id for hit in first.hits]
+    second_ids = [hit.conversation_id for hit in second.hits]
+    assert first.total == 5
+    assert len(first_ids) == len(second_ids) == 2
+    assert not set(first_ids) & set(second_ids)
+    assert first.hits[0].score >= first.hits[1].score
+    assert {6, 7}.isdisjoint(first_ids + second_ids)
+    assert 1 not in [hit.conversation_id for hit in after_remove.hits]
+    assert [hit.conversation_id for hit in latest.hits] == [7]
@@ -0,0 +1,217 @@
+"""埋め込みの取り込みワーカー・キャッシュ・バックフィルのユニットテスト"""
+
+import asyncio
+from collections.abc import Sequence
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.domain.entities.conversation import Conversation
+from app.infrastructure.services.conversation_search import (
+    HybridConversationSearch,
+)
+from app.infrastructure.services.embedding_service import (
+    CachedEmbeddingService,
+    EmbeddingService,
+    HashingEmbeddingService,
+)
+from app.infrastructure.services.embedding_worker import (
+    BackfillCheckpoint,
+    EmbeddingIngestionWorker,
+    IngestionDocument,
+)
+from app.infrastructure.services.retriever import InProcessRetriever
+from app.infrastructure.services.vector_segments import SegmentStore
+
+
+class _CountingEmbeddingService(EmbeddingService):
+    """埋め込みの呼び出し回数とテキスト数を数える"""
+
+    def __init__(self) -> None:
+        self._inner = HashingEmbeddingService(dimension=64)
+        self.calls = 0
+        self.texts = 0
+
+    @property
+    def dimension(self) -> int:
+        return self._inner.dimension
+
+    async def embed_array(self, texts: list[str]) -> NDArray[np.float32]:
+        self.calls += 1
+        self.texts += len(texts)
+        return await self._inner.embed_array(texts)
+
+
+def test_cached_embedding_service_deduplicates_by_content():
+    """同じテキストはバッチ内でも呼び出し間でも1回だけ埋め込む"""
+    inner = _CountingEmbeddingService()
+    service = CachedEmbeddingService(inner, max_entries=2)
+
+    async def run() -> tuple[NDArray[np.float32], NDArray[np.float32]]:
+        first = await service.embed_array(["はい", "いいえ", "はい"])
+        second = await service.embed_array(["いいえ", "了解"])
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert inner.texts == 3
+    np.testing.assert_array_equal(first[0], first[2])
+    np.testing.assert_array_equal(first[1], second[0])
+    stats = service.stats()
+    assert stats["hits"] == 1
+    assert stats["deduplicated"] == 1
+    assert stats["entries"] == 2
+
+
+def test_worker_batches_retries_and_reports_lag():
+    """積んだ文書をまとめて書き込み、失敗したバッチは再試行する"""
+    batches: list[list[str]] = []
+    failures = [1]
+
+    async def sink(documents: Sequence[IngestionDocument]) -> int:
+        if failures[0]:
+            failures[0] -= 1
+            raise RuntimeError("一時的なエラー")
+        batches.append([doc_id for doc_id, _, _ in documents])
+        return len(documents)
+
+    async def run() -> dict[str, int | float]:
+        worker = EmbeddingIngestionWorker(
+            sink, batch_size=4, max_wait_ms=20, max_queue=8
+        )
+        for i in range(10):
+            worker.submit(str(i), f"本文{i}")
+        await worker.drain()
+        await worker.close()
+        return worker.stats()
+
+    stats = asyncio.run(run())
+
+    # キューの上限（8件）を超えた2件は捨てる
+    assert [doc for batch in batches for doc in batch] == [
+        str(i) for i in range(8)
+    ]
+    assert max(len(batch) for batch in batches) == 4
+    assert stats["processed"] == 8
+    assert stats["dropped"] == 2
+    assert stats["failed"] == 0
+    assert stats["queued"] == 0
+    assert stats["max_lag_ms"] > 0
+
+
+def test_backfill_resumes_from_checkpoint(tmp_path: Path):
+    """埋め込み済みの会話は再起動後のバックフィルで埋め込み直さない"""
+    table = [
+        Conversation(
+            id=i,
+            user_id="u1",
+            session_id="s1",
+            message=f"返金について質問{i}です",
+            created_at=datetime(2026, 1, 1),
+        )
+        for i in range(1, 8)
+    ]
+
+    async def fetch_page(last_id: int, limit: int) -> list[Conversation]:
+        return [c for c in table if (c.id or 0) > last_id][:limit]
+
+    def backfill() -> tuple[int, _CountingEmbeddingService, list[int]]:
+        embeddings = _CountingEmbeddingService()
+        retriever = InProcessRetriever(
+            embeddings,
+            store=SegmentStore(
+                tmp_path / "index", dimension=64, dtype="float32"
+            ),
+            min_score=0.0,
+        )
+        search = HybridConversationSearch(
+            retriever,
+            worker=EmbeddingIngestionWorker(
+                retriever.ingest_many, batch_size=2, max_wait_ms=0
+            ),
+        )
+
+        async def run() -> tuple[int, list[int]]:
+            # 読み込み中は結果が欠けるため、呼び出し側は部分一致で検索する
+            assert not search.ready
+            loaded = await search.backfill(
+                fetch_page,
+                BackfillCheckpoint(tmp_path / "index" / "backfill.json"),
+                batch_size=3,
+            )
+            assert search.ready
+            page = await search.search("返金", limit=10)
+            await search.close()
+            return loaded, [hit.conversation_id for hit in page.hits]
+
+        loaded, found = asyncio.run(run())
+        return loaded, embeddings, found
+
+    loaded, first, found = backfill()
+    assert loaded == 7
+    # 会話7件と検索クエリ1件
+    assert first.texts == 7 + 1
+    assert sorted(found) == list(range(1, 8))
+
+    table.append(
+        Conversation(
+            id=8, user_id="u1", session_id="s1", message="配送について"
+        )
+    )
+    loaded, second, found = backfill()
+    # BM25は全件を作り直し、埋め込むのは新しい会話のみ
+    assert loaded == 8
+    assert second.texts == 1 + 1
+    assert sorted(found) == list(range(1, 8))
+
+
+def test_backfill_keeps_checkpoint_before_failed_page(tmp_path: Path):
+    """書き込めなかったページからはチェックポイントを進めず、次回に再試行"""
+    table = [
+        Conversation(id=i, user_id="u1", session_id="s1", message=f"質問{i}")
+        for i in range(1, 8)
+    ]
+    outage = {"4", "5"}
+    written: list[str] = []
+
+    async def flaky_sink(documents: Sequence[IngestionDocument]) -> int:
+        if any(doc_id in outage for doc_id, _, _ in documents):
+            raise ConnectionError("embedding outage")
+        written.extend(doc_id for doc_id, _, _ in documents)
+        return len(documents)
+
+    async def fetch_page(last_id: int, limit: int) -> list[Conversation]:
+        return [c for c in table if (c.id or 0) > last_id][:limit]
+
+    checkpoint = BackfillCheckpoint(tmp_path / "backfill.json")
+
+    def backfill() -> int:
+        search = HybridConversationSearch(
+            InProcessRetriever(HashingEmbeddingService(dimension=64)),
+            worker=EmbeddingIngestionWorker(
+                flaky_sink, batch_size=3, max_wait_ms=0, max_retries=0
+            ),
+        )
+
+        async def run() -> int:
+            loaded = await search.backfill(
+                fetch_page, checkpoint, batch_size=3
+            )
+            await search.close()
+            return loaded
+
+        return asyncio.run(run())
+
+    # 2ページ目（4〜6）で失敗し、1ページ目の最後で止める
+    assert backfill() == 7
+    assert BackfillCheckpoint(tmp_path / "backfill.json").load() == 3
+    assert written == ["1", "2", "3", "7"]
+
+    # 復旧後は失敗したページから埋め込み直す
+    outage.clear()
+    written.clear()
+    assert backfill() == 7
+    assert written == ["4", "5", "6", "7"]
+    assert BackfillCheckpoint(tmp_path / "backfill.json").load() == 7
@@ -0,0 +1,77 @@
+"""フェイクLLMのユニットテスト"""
+
+import asyncio
+from datetime import datetime
+
+from langchain_core.messages import HumanMessage
+import pytest
+
+from app.domain.value_objects.message import Message
+from app.infrastructure.services.fake_llm import (
+    FakeAIService,
+    FakeChatModel,
+    FakeLLMError,
+    FakeLLMProfile,
+)
+
+
+def test_chunks_are_deterministic_per_prompt():
+    """同じプロンプトとシードからは同じ応答を作成する"""
+    profile = FakeLLMProfile(response_tokens=10, chunk_tokens=3, seed=1)
+
+    chunks = profile.chunks("こんにちは")
+
+    assert chunks == profile.chunks("こんにちは")
+    assert len(chunks) == 4
+    assert chunks != FakeLLMProfile(response_tokens=10, seed=2).chunks(
+        "こんにちは"
+    )
+
+
+def test_chat_model_streams_same_text_as_invoke():
+    """ストリームを連結した内容は通常の呼び出しの応答と一致する"""
+    model = FakeChatModel(latency_profile=FakeLLMProfile(response_tokens=8))
+    messages = [HumanMessage(content="質問")]
+
+    async def run() -> tuple[list[str], str]:
+        chunks = [
+            str(c.content) async for c in model.astream(messages) if c.content
+        ]
+        reply = await model.ainvoke(messages)
+        return chunks, str(reply.content)
+
+    chunks, reply = asyncio.run(run())
+
+    assert len(chunks) == 2
+    assert "".join(chunks) == reply
+
+
+def test_latency_profile_is_applied():
+    """最初のチャンクまでの時間とトークン速度に従って待機する"""
+    service = FakeAIService(
+        FakeLLMProfile(
+            ttft_seconds=0.05,
+            tokens_per_second=200.0,
+            chunk_tokens=2,
+            response_tokens=6,
+        )
+    )
+    message = Message(content="質問", timestamp=datetime.now(), sender="u")
+
+    async def run() -> float:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await service.generate_response(message)
+        return loop.time() - started
+
+    # TTFT 0.05秒 + チャンク間 0.01秒 × 2
+    assert asyncio.run(run()) >= 0.07
+
+
+def test_error_injection():
+    """error_rateに従って最初のチャンクの前に失敗する"""
+    service = FakeAIService(FakeLLMProfile(error_rate=1.0))
+    message = Message(content="質問", timestamp=datetime.now(), sender="u")
+
+    with pytest.raises(FakeLLMError):
+        asyncio.run(service.generate_response(message))
@@ -0,0 +1,128 @@
+"""ヘッジリクエストのユニットテスト"""
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+
+import pytest
+
+from app.infrastructure.services.hedging import HedgedStreamer
+
+
+def _streamer(**kwargs: float) -> HedgedStreamer:
+    options = {
+        "percentile": 50.0,
+        "budget_ratio": 1.0,
+        "window_size": 10,
+        "min_samples": 1,
+        "min_delay": 0.01,
+        **kwargs,
+    }
+    return HedgedStreamer(**options)  # type: ignore[arg-type]
+
+
+def _factory(
+    delays: list[float], label: str = "chunk"
+) -> tuple[Callable[[], AsyncIterator[str]], list[str]]:
+    """呼び出しごとに指定秒数待ってからチャンクを返すストリームを作成"""
+    closed: list[str] = []
+    calls = iter(range(len(delays)))
+
+    def factory() -> AsyncIterator[str]:
+        index = next(calls)
+
+        async def generate() -> AsyncGenerator[str, None]:
+            try:
+                await asyncio.sleep(delays[index])
+                yield f"{label}{index}"
+                yield "end"
+            finally:
+                closed.append(f"{label}{index}")
+
+        return generate()
+
+    return factory, closed
+
+
+async def _collect(stream: AsyncIterator[str]) -> list[str]:
+    return [chunk async for chunk in stream]
+
+
+def test_no_hedge_until_enough_samples():
+    """TTFTの計測が不足している間はヘッジしない"""
+    streamer = _streamer(min_samples=2)
+    factory, _ = _factory([0.05])
+
+    chunks = asyncio.run(_collect(streamer.stream(factory)))
+
+    assert chunks == ["chunk0", "end"]
+    assert streamer.stats()["hedges"] == 0
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    """最初のチャンクが遅ければヘッジし、先に返した方を採用する"""
+    streamer = _streamer()
+    factory, closed = _factory([0.0, 1.0, 0.0])
+
+    async def run() -> list[str]:
+        await _collect(streamer.stream(factory))
+        return await _collect(streamer.stream(factory))
+
+    chunks = asyncio.run(run())
+
+    assert chunks == ["chunk2", "end"]
+    assert sorted(closed) == ["chunk0", "chunk1", "chunk2"]
+    stats = streamer.stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+
+
+def test_budget_limits_hedges():
+    """予算が尽きている場合はヘッジせずに元の呼び出しを待つ"""
+    streamer = _streamer(budget_ratio=0.0)
+    factory, _ = _factory([0.0, 0.05, 0.0])
+
+    async def run() -> list[str]:
+        await _collect(streamer.stream(factory))
+        return await _collect(streamer.stream(factory))
+
+    assert asyncio.run(run()) == ["chunk1", "end"]
+    stats = streamer.stats()
+    assert stats["hedges"] == 0
+    assert stats["budget_exhausted"] == 1
+
+
+def test_falls_back_when_one_attempt_fails():
+    """ヘッジの一方が失敗しても、もう一方の結果を使う"""
+    streamer = _streamer()
+    calls = 0
+
+    def factory() -> AsyncIterator[str]:
+        nonlocal calls
+        calls += 1
+        index = calls
+
+        async def generate() -> AsyncGenerator[str, None]:
+            await asyncio.sleep({1: 0.0, 2: 0.05, 3: 0.1}[index])
+            if index == 2:
+                raise RuntimeError("upstream failed")
+            yield f"ok{index}"
+
+        return generate()
+
+    async def run() -> list[str]:
+        await _collect(streamer.stream(factory))
+        return await _collect(streamer.stream(factory))
+
+    assert asyncio.run(run()) == ["ok3"]
+
+
+def test_raises_when_all_attempts_fail():
+    """すべての呼び出しが失敗した場合は例外を送出する"""
+    streamer = _streamer(min_samples=0)
+
+    async def failing() -> AsyncGenerator[str, None]:
+        raise RuntimeError("upstream failed")
+        yield ""
+
+    with pytest.raises(RuntimeError, match="upstream failed"):
+        asyncio.run(_collect(streamer.stream(failing)))
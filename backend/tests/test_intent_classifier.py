@@ -0,0 +1,73 @@
+"""意図判定のユニットテスト"""
+
+from app.infrastructure.services.intent_classifier import (
+    HybridIntentClassifier,
+    KeywordIntentClassifier,
+    PrototypeIntentClassifier,
+)
+from app.infrastructure.services.keyword_matcher import KeywordMatcher
+
+
+def test_keyword_matcher_finds_overlapping_keywords():
+    """重なり合うキーワードも1回の走査ですべて見つける"""
+    matcher = KeywordMatcher({"a": ["he", "she", "hers"], "b": ["his"]})
+
+    assert matcher.find("ushers") == [("a", "she"), ("a", "he"), ("a", "hers")]
+    assert matcher.find("this") == [("b", "his")]
+    assert matcher.find("xyz") == []
+
+
+def test_keyword_matcher_normalizes_width_and_case():
+    """全角/半角と大文字小文字の揺れを吸収する"""
+    matcher = KeywordMatcher({"tool": ["API"]})
+
+    assert matcher.find("ＡＰＩを叩いて") == [("tool", "api")]
+
+
+def test_keyword_classifier_picks_most_frequent_route():
+    """出現回数が最も多いルートを選び、確信度は出現の割合"""
+    classifier = KeywordIntentClassifier(
+        {"rag": ["検索", "情報"], "tool": ["計算"]}
+    )
+
+    decision = classifier.classify("情報を検索して計算して")
+
+    assert decision.route == "rag"
+    assert decision.confidence == 2 / 3
+    assert decision.matched == ("情報", "検索")
+
+
+def test_keyword_classifier_tie_prefers_configured_order():
+    """同数の場合は設定順で先のルートを優先する"""
+    classifier = KeywordIntentClassifier({"tool": ["計算"], "rag": ["検索"]})
+
+    assert classifier.classify("検索して計算").route == "tool"
+    assert classifier.classify("こんにちは").route == "normal"
+
+
+def test_keyword_classifier_handles_long_input():
+    """最大長のメッセージでも末尾のキーワードを判定できる"""
+    classifier = KeywordIntentClassifier({"tool": ["ツール"]})
+
+    decision = classifier.classify("あ" * 9990 + "ツールを使って")
+
+    assert decision.route == "tool"
+
+
+def test_hybrid_classifier_falls_back_to_prototypes():
+    """キーワードがなければプロトタイプ類似度で判定する"""
+    hybrid = HybridIntentClassifier(
+        KeywordIntentClassifier({"tool": ["計算"]}),
+        PrototypeIntentClassifier(
+            {
+                "normal": ["こんにちは", "ありがとう"],
+                "rag": ["社内の資料から探してください"],
+            },
+            threshold=0.2,
+        ),
+    )
+
+    assert hybrid.classify("この式を計算して").source == "keyword"
+    decision = hybrid.classify("社内の資料を探してください")
+    assert decision.source == "prototype"
+    assert decision.route == "rag"
@@ -0,0 +1,241 @@
+"""クライアントの切断による生成の打ち切りのユニットテスト"""
+
+import asyncio
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+
+from app.domain.entities.conversation import Conversation
+from app.domain.entities.session import Session, SessionStatus
+from app.domain.services.context_window import ContextWindowBuilder
+from app.domain.services.interruptible_stream import consume_stream
+from app.domain.value_objects.conversation_history import ConversationHistory
+from app.domain.value_objects.conversation_turn import ConversationTurn
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.services.interruption import (
+    GenerationInterruptionTracker,
+)
+from app.infrastructure.services.langgraph_ai_service import (
+    LangGraphAIService,
+)
+from app.infrastructure.services.resilience import ResilientAIService
+from app.usecase.use_cases.chat import SendMessageUseCase
+
+
+def test_consume_stream_closes_upstream_when_send_fails(
+    make_message: Callable[..., Message],
+    slow_stream_ai_service: Callable[..., Any],
+):
+    """送信できなくなった時点で読み出しをやめ、デコレーター越しに上流を閉じる"""
+    upstream = slow_stream_ai_service()
+    service = ResilientAIService(upstream)
+    sent: list[str] = []
+
+    async def send(chunk: str) -> bool:
+        sent.append(chunk)
+        return len(sent) < 3
+
+    async def run():
+        result = await consume_stream(
+            service.generate_stream(make_message()), on_chunk=send
+        )
+        # consume_streamから戻った時点で上流は閉じている
+        return result, upstream.closed
+
+    result, closed = asyncio.run(run())
+
+    assert result.interrupted
+    assert result.response == "c0 c1 c2 "
+    assert result.chunks == 3
+    assert closed
+    assert upstream.produced == 3
+    # 打ち切りは上限の調整に使わない（実行枠は返却済み）
+    assert service.stats()["limiter"]["in_flight"] == 0
+
+
+def test_consume_stream_cancels_generation_on_disconnect(
+    make_message: Callable[..., Message],
+    slow_stream_ai_service: Callable[..., Any],
+):
+    """切断を検知したら生成中のタスクをキャンセルし、部分の回答を返す"""
+    upstream = slow_stream_ai_service(chunks=50, interval=0.02)
+
+    async def run():
+        disconnect = asyncio.Event()
+
+        async def send(chunk: str) -> bool:
+            if chunk == "c1 ":
+                disconnect.set()
+            return True
+
+        async def wait_for_disconnect() -> None:
+            await disconnect.wait()
+
+        return await consume_stream(
+            upstream.generate_stream(make_message()),
+            on_chunk=send,
+            disconnected=wait_for_disconnect,
+        )
+
+    result = asyncio.run(run())
+
+    assert result.interrupted
+    assert result.response == "c0 c1 "
+    assert upstream.closed
+    assert upstream.produced == 2
+    assert result.conversation_metadata({"lang": "ja"}) == {
+        "lang": "ja",
+        "status": "interrupted",
+    }
+
+    async def never_disconnects() -> None:
+        await asyncio.Event().wait()
+
+    # 切断しなければ最後まで読み、上流のエラーはそのまま伝える
+    completed = asyncio.run(
+        consume_stream(
+            slow_stream_ai_service(chunks=3).generate_stream(make_message()),
+            disconnected=never_disconnects,
+        )
+    )
+    assert completed.status == "completed"
+    assert completed.response == "c0 c1 c2 "
+    assert completed.conversation_metadata(None) is None
+
+    with pytest.raises(RuntimeError, match="upstream failed"):
+        asyncio.run(
+            consume_stream(
+                slow_stream_ai_service().generate_stream(make_message("fail")),
+                disconnected=never_disconnects,
+            )
+        )
+
+
+class _SessionRepository:
+    async def get_by_id(self, session_id: str) -> Session:
+        return Session(
+            session_id=session_id, user_id="u", status=SessionStatus.ACTIVE
+        )
+
+
+class _ConversationRepository:
+    def __init__(self) -> None:
+        self.saved: list[Conversation] = []
+
+    async def create(self, conversation: Conversation) -> Conversation:
+        conversation.id = len(self.saved) + 1
+        self.saved.append(conversation)
+        return conversation
+
+
+class _Memory:
+    def __init__(self) -> None:
+        self.turns: list[ConversationTurn] = []
+
+    async def load(self, session_id: str) -> ConversationHistory:
+        return ConversationHistory(turns=tuple(self.turns))
+
+    async def append(self, session_id: str, turn: ConversationTurn) -> None:
+        self.turns.append(turn)
+
+
+def test_send_message_persists_interrupted_answer(
+    slow_stream_ai_service: Callable[..., Any],
+):
+    """HTTPで切断した場合は生成を止め、状態interruptedで保存して履歴には入れない"""
+    upstream = slow_stream_ai_service(chunks=50, interval=0.02)
+    conversations = _ConversationRepository()
+    memory = _Memory()
+    use_case = SendMessageUseCase(
+        conversation_repository=conversations,
+        session_repository=_SessionRepository(),
+        ai_service=upstream,
+        conversation_memory=memory,
+        context_window_builder=ContextWindowBuilder(max_tokens=4000),
+    )
+
+    async def disconnect_after_first_chunks() -> None:
+        while upstream.produced < 3:
+            await asyncio.sleep(0.005)
+
+    conversation = asyncio.run(
+        use_case.execute(
+            user_id="u",
+            session_id="s",
+            message_content="長い説明をお願いします",
+            metadata={"lang": "ja"},
+            disconnected=disconnect_after_first_chunks,
+        )
+    )
+
+    assert conversation.is_interrupted()
+    assert conversation.response == ""
+    assert conversation.metadata == {"lang": "ja", "status": "interrupted"}
+    assert conversations.saved == [conversation]
+    assert memory.turns == []
+    # generate_responseのタスクをキャンセルし、上流も閉じる
+    assert upstream.closed and upstream.produced == 3
+
+    # 節約したトークン数は最後まで生成した回答の平均長から推定する
+    tracker = GenerationInterruptionTracker(expected_tokens=100)
+    assert tracker.record_interrupted("", channel="http") == 100
+    tracker.record_completed("c0 c1 c2 c3 c4 c5 c6 c7 c8 c9 ")
+    saved = tracker.record_interrupted("c0 c1 c2 ", channel="websocket")
+    assert tracker.expected_tokens == 10
+    assert saved == 10 - 3
+    stats = tracker.stats()
+    assert stats["interrupted"] == 2
+    assert stats["interrupted_by_channel"] == {"http": 1, "websocket": 1}
+    assert stats["estimated_saved_tokens"] == 100 + saved
+
+
+def test_send_message_over_http_keeps_fast_path(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """切断の監視があってもgenerate_responseを使い、ファストパスを通る"""
+    monkeypatch.setattr(settings, "LLM_BACKEND", "fake")
+    monkeypatch.setattr(settings, "LANGFUSE_ENABLED", False)
+    monkeypatch.setattr(settings, "FAKE_LLM_TTFT_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "FAKE_LLM_TOKENS_PER_SECOND", 0.0)
+    service = LangGraphAIService(fast_path=True)
+    graph_calls: list[str] = []
+
+    async def spy(state: dict[str, Any], *args: Any, **kwargs: Any) -> Any:
+        graph_calls.append(state["intent"].route)
+        raise AssertionError("通常会話はグラフを通さない")
+
+    def no_stream(*args: Any, **kwargs: Any) -> Any:
+        raise AssertionError("HTTPではストリームを使わない")
+
+    monkeypatch.setattr(service._graph, "ainvoke", spy)
+    monkeypatch.setattr(service, "generate_stream", no_stream)
+    conversations = _ConversationRepository()
+    memory = _Memory()
+    use_case = SendMessageUseCase(
+        conversation_repository=conversations,
+        session_repository=_SessionRepository(),
+        ai_service=service,
+        conversation_memory=memory,
+        context_window_builder=ContextWindowBuilder(max_tokens=4000),
+    )
+
+    async def never_disconnects() -> None:
+        await asyncio.Event().wait()
+
+    conversation = asyncio.run(
+        use_case.execute(
+            user_id="u",
+            session_id="s",
+            message_content="こんにちは",
+            disconnected=never_disconnects,
+        )
+    )
+
+    assert not conversation.is_interrupted()
+    assert conversation.response
+    assert graph_calls == []
+    assert memory.turns == [
+        ConversationTurn("こんにちは", conversation.response)
+    ]
@@ -0,0 +1,183 @@
+"""LangFuseのトレースのサンプリングと送信のユニットテスト"""
+
+import asyncio
+from datetime import datetime
+import json
+import threading
+from typing import Any
+
+import httpx
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+import pytest
+
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.langfuse_exporter import (
+    LangfuseTraceExporter,
+    TraceRecord,
+)
+from app.infrastructure.langfuse_handler import SampledLangfuseHandler
+from app.infrastructure.services.langgraph_ai_service import (
+    LangGraphAIService,
+)
+
+
+class _Ingestion:
+    """インジェスチョンAPIの代わりに受け取ったバッチを記録する"""
+
+    def __init__(self, gate: threading.Event | None = None) -> None:
+        self.batches: list[list[dict[str, Any]]] = []
+        self.received = threading.Event()
+        self._gate = gate
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self._gate is not None:
+            self._gate.wait(5)
+        self.batches.append(json.loads(request.content)["batch"])
+        self.received.set()
+        return httpx.Response(207, json={"successes": [], "errors": []})
+
+    def exporter(self, **kwargs: Any) -> LangfuseTraceExporter:
+        return LangfuseTraceExporter(
+            base_url="http://langfuse.test",
+            public_key="pk",
+            secret_key="sk",
+            flush_interval=0.01,
+            client=httpx.Client(transport=httpx.MockTransport(self)),
+            **kwargs,
+        )
+
+
+@pytest.fixture
+def fake_llm(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "LLM_BACKEND", "fake")
+    monkeypatch.setattr(settings, "FAKE_LLM_TTFT_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "FAKE_LLM_TOKENS_PER_SECOND", 0.0)
+    monkeypatch.setattr(settings, "FAKE_LLM_RESPONSE_TOKENS", 8)
+    monkeypatch.setattr(settings, "FAKE_LLM_CHUNK_TOKENS", 2)
+
+
+def test_sampled_stream_is_exported_in_background(fake_llm: None):
+    """サンプリングしたストリームだけを送信スレッドからまとめて送る"""
+    ingestion = _Ingestion()
+    rolls = iter([0.0, 0.99])
+    handler = SampledLangfuseHandler(
+        ingestion.exporter(),
+        sample_rate=0.5,
+        sample_on_error=False,
+        slow_seconds=0,
+        rng=lambda: next(rolls),
+    )
+    service = LangGraphAIService(fast_path=False, langfuse_handler=handler)
+    message = Message(
+        content="資料を検索して", timestamp=datetime.now(), sender="u"
+    )
+
+    async def run() -> list[str]:
+        return [
+            "".join([c async for c in service.generate_stream(message)])
+            for _ in range(2)
+        ]
+
+    responses = asyncio.run(run())
+    assert ingestion.received.wait(5)
+    handler.close()
+
+    stats = handler.stats()
+    assert stats["traces"] == 2
+    assert stats["sampled"] == {"head": 1}
+    assert stats["discarded"] == 1
+    assert stats["open_traces"] == 0
+    assert stats["export"]["exported"] == 1
+
+    events = [event for batch in ingestion.batches for event in batch]
+    trace = next(e["body"] for e in events if e["type"] == "trace-create")
+    assert trace["metadata"]["sample_reason"] == "head"
+    generations = [
+        e["body"] for e in events if e["type"] == "generation-create"
+    ]
+    answer = generations[-1]
+    assert answer["traceId"] == trace["id"]
+    assert answer["completionStartTime"] >= answer["startTime"]
+    assert answer["output"][0]["content"] == responses[0]
+    spans = {e["body"]["name"] for e in events if e["type"] == "span-create"}
+    assert "rag_chat" in spans
+    # 親の観測はすべて同じトレースに含まれる
+    ids = {e["body"]["id"] for e in events if e["type"] != "trace-create"}
+    parents = {
+        e["body"]["parentObservationId"]
+        for e in events
+        if e["type"] != "trace-create"
+    }
+    assert parents - ids == {None}
+
+
+def test_errors_and_slow_requests_are_always_sampled():
+    """サンプリングしなかった場合も、エラー・遅いリクエストは送る"""
+    ingestion = _Ingestion()
+    handler = SampledLangfuseHandler(
+        ingestion.exporter(),
+        sample_rate=0.0,
+        sample_on_error=True,
+        slow_seconds=0.05,
+    )
+    config = RunnableConfig(callbacks=[handler])
+
+    async def fail(text: str) -> str:
+        raise ValueError("boom")
+
+    async def slow(text: str) -> str:
+        await asyncio.sleep(0.06)
+        return text
+
+    async def fast(text: str) -> str:
+        return text
+
+    async def run() -> None:
+        with pytest.raises(ValueError):
+            await RunnableLambda(fail).ainvoke("a", config)
+        await RunnableLambda(slow).ainvoke("b", config)
+        await RunnableLambda(fast).ainvoke("c", config)
+
+        # キャンセル（クライアントの切断）はエラーとして送らない
+        task = asyncio.create_task(RunnableLambda(slow).ainvoke("d", config))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    handler.close()
+
+    stats = handler.stats()
+    assert stats["sampled"] == {"error": 1, "slow": 1}
+    assert stats["discarded"] == 2
+    events = [event for batch in ingestion.batches for event in batch]
+    failed = next(
+        e["body"]
+        for e in events
+        if e["type"] == "span-create" and e["body"]["input"] == "a"
+    )
+    assert failed["level"] == "ERROR"
+    assert failed["statusMessage"] == "ValueError: boom"
+
+
+def test_full_queue_drops_instead_of_blocking():
+    """送信待ちが満杯の場合は待たずに破棄する"""
+    gate = threading.Event()
+    ingestion = _Ingestion(gate)
+    exporter = ingestion.exporter(max_queue=1, batch_size=1)
+
+    results = [
+        exporter.submit(TraceRecord(id=str(i), name="t", start_time=0.0))
+        for i in range(3)
+    ]
+    gate.set()
+    exporter.close()
+
+    # 送信中の1件と待ちの1件を超えた分は破棄する
+    assert results[0] and not results[-1]
+    stats = exporter.stats()
+    assert stats["dropped"] >= 1
+    assert stats["submitted"] + stats["dropped"] == 3
+    assert stats["exported"] == stats["submitted"]
+    assert not exporter.submit(TraceRecord(id="x", name="t", start_time=0))
@@ -0,0 +1,86 @@
+"""LangGraph AIサービス（ストリーミング・ファストパス）のユニットテスト"""
+
+import asyncio
+from datetime import datetime
+from typing import Any
+
+import pytest
+
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.services.langgraph_ai_service import (
+    GraphStreamEvent,
+    LangGraphAIService,
+)
+
+
+@pytest.fixture
+def service(monkeypatch: pytest.MonkeyPatch) -> LangGraphAIService:
+    monkeypatch.setattr(settings, "LLM_BACKEND", "fake")
+    monkeypatch.setattr(settings, "LANGFUSE_ENABLED", False)
+    monkeypatch.setattr(settings, "FAKE_LLM_TTFT_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "FAKE_LLM_TOKENS_PER_SECOND", 0.0)
+    monkeypatch.setattr(settings, "FAKE_LLM_RESPONSE_TOKENS", 8)
+    monkeypatch.setattr(settings, "FAKE_LLM_CHUNK_TOKENS", 2)
+    return LangGraphAIService(fast_path=False)
+
+
+def test_rag_route_streams_tokens_through_graph(service: LangGraphAIService):
+    """RAGのルートもグラフを通り、回答ノードの完了前にチャンクが流れる"""
+    message = Message(
+        content="資料を検索して", timestamp=datetime.now(), sender="u"
+    )
+
+    async def run() -> tuple[list[GraphStreamEvent], str]:
+        events = [event async for event in service.stream_events(message)]
+        return events, await service.generate_response(message)
+
+    events, response = asyncio.run(run())
+
+    nodes = [event.node for event in events if event.kind == "node"]
+    tokens = [event.content for event in events if event.kind == "token"]
+    assert nodes == [
+        "input_node",
+        "intent_classifier",
+        "rag_chat",
+        "output_node",
+    ]
+    assert len(tokens) == 4
+    assert "".join(tokens) == response
+    first_token = next(i for i, e in enumerate(events) if e.kind == "token")
+    assert first_token < [e.node for e in events].index("rag_chat")
+
+
+def test_fast_path_skips_graph_with_same_response(
+    service: LangGraphAIService, monkeypatch: pytest.MonkeyPatch
+):
+    """通常会話はグラフを通さずに、グラフと同じ回答を返す"""
+    fast = LangGraphAIService(fast_path=True)
+    normal = Message(
+        content="こんにちは", timestamp=datetime.now(), sender="u"
+    )
+    rag = Message(
+        content="資料を検索して", timestamp=datetime.now(), sender="u"
+    )
+    graph_calls: list[str] = []
+    original = fast._graph.ainvoke
+
+    async def spy(state: dict[str, Any], *args: Any, **kwargs: Any) -> Any:
+        graph_calls.append(state["intent"].route)
+        return await original(state, *args, **kwargs)
+
+    monkeypatch.setattr(fast._graph, "ainvoke", spy)
+
+    async def run() -> tuple[str, str, str]:
+        return (
+            await fast.generate_response(normal),
+            await service.generate_response(normal),
+            await fast.generate_response(rag),
+        )
+
+    fast_response, graph_response, rag_response = asyncio.run(run())
+
+    assert fast_response == graph_response
+    assert rag_response
+    # RAGのみグラフを通り、判定済みの意図を引き継ぐ
+    assert graph_calls == ["rag"]
@@ -0,0 +1,103 @@
+"""LLM呼び出しのメトリクスのユニットテスト"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.services.langgraph_ai_service import (
+    LangGraphAIService,
+)
+from app.infrastructure.services.llm_metrics import (
+    Histogram,
+    LLMMetricsRecorder,
+    llm_call_labels,
+    llm_request_metrics,
+)
+from app.infrastructure.services.resilience import UpstreamGuard
+
+
+def test_histogram_quantile_and_prometheus_rendering():
+    """パーセンタイルはバケット内を補間し、ラベルはエスケープして出力する"""
+    histogram = Histogram((0.1, 0.2, 0.4))
+    for value in (0.05, 0.15, 0.15, 0.3):
+        histogram.observe(value)
+
+    assert histogram.cumulative()[-1] == (float("inf"), 4)
+    assert histogram.quantile(0.5) == pytest.approx(0.15)
+    assert histogram.quantile(1.0) == pytest.approx(0.4)
+    assert Histogram((1.0,)).quantile(0.5) is None
+
+    recorder = LLMMetricsRecorder(enabled=True)
+    with llm_call_labels(route="rag_chat", intent='say "hi"'):
+        timer = recorder.start("gemini", streaming=True)
+    timer.chunk()
+    timer.chunk()
+    call = timer.finish(prompt_tokens=10, completion_tokens=4)
+    assert timer.finish() is None  # 2回目は記録しない
+    recorder.start("gemini", streaming=False).finish(status="error")
+
+    assert call is not None
+    assert (call.route, call.intent, call.chunks) == (
+        "rag_chat",
+        'say "hi"',
+        2,
+    )
+    text = recorder.render_prometheus()
+    labels = 'model="gemini",route="rag_chat",intent="say \\"hi\\""'
+    assert f'llm_calls_total{{{labels},status="ok"}} 1' in text
+    assert f"llm_chunks_count{{{labels}}} 1" in text
+    assert f'llm_prompt_tokens_bucket{{{labels},le="16"}} 1' in text
+    # 失敗した呼び出しは回数のみ数え、ヒストグラムには入れない
+    assert (
+        'llm_calls_total{model="gemini",route="direct",'
+        'intent="unclassified",status="error"} 1'
+    ) in text
+    assert text.count("llm_request_duration_seconds_count") == 1
+
+
+@pytest.fixture
+def recorder(monkeypatch: pytest.MonkeyPatch) -> LLMMetricsRecorder:
+    monkeypatch.setattr(settings, "LLM_BACKEND", "fake")
+    monkeypatch.setattr(settings, "LANGFUSE_ENABLED", False)
+    monkeypatch.setattr(settings, "FAKE_LLM_TTFT_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "FAKE_LLM_TOKENS_PER_SECOND", 0.0)
+    monkeypatch.setattr(settings, "FAKE_LLM_RESPONSE_TOKENS", 8)
+    monkeypatch.setattr(settings, "FAKE_LLM_CHUNK_TOKENS", 2)
+    return LLMMetricsRecorder(enabled=True)
+
+
+def test_streamed_call_is_measured_per_request(recorder: LLMMetricsRecorder):
+    """グラフのストリームの計測結果をルート・意図付きでリクエストに集計する"""
+    service = LangGraphAIService(
+        fast_path=False, metrics=recorder, upstream_guard=UpstreamGuard()
+    )
+    message = Message(
+        content="資料を検索して", timestamp=datetime.now(), sender="u"
+    )
+
+    async def run() -> tuple[str, dict]:
+        with llm_request_metrics() as request:
+            chunks = [c async for c in service.generate_stream(message)]
+        return "".join(chunks), request.summary()
+
+    response, summary = asyncio.run(run())
+
+    assert response
+    assert summary["llm_calls"] == 1
+    assert summary["route"] == "rag_chat"
+    assert summary["intent"] == "rag"
+    assert summary["chunks"] == 4
+    assert summary["ttft_ms"] >= 10
+    assert summary["queue_wait_ms"] is not None
+    assert summary["inter_chunk_gap_ms"]["p50"] is not None
+    assert summary["prompt_tokens"] > 0
+    assert summary["completion_tokens"] > 0
+
+    stats = recorder.stats()
+    assert [(s["route"], s["calls"]) for s in stats] == [
+        ("rag_chat", {"ok": 1})
+    ]
+    assert stats[0]["llm_time_to_first_token_seconds"]["p50"] > 0
@@ -0,0 +1,70 @@
+"""モデルルーターのユニットテスト"""
+
+from app.domain.value_objects.intent import IntentDecision
+from app.infrastructure.services.model_router import ModelRouter
+
+
+def _router(**kwargs: object) -> ModelRouter:
+    return ModelRouter(
+        ["fast-a", "fast-b"],
+        ["strong"],
+        short_message_tokens=50,
+        min_intent_confidence=0.6,
+        alpha=0.5,
+        max_error_rate=0.5,
+        recovery_seconds=60.0,
+        uncertain_markers=["わかりません"],
+        **kwargs,  # type: ignore[arg-type]
+    )
+
+
+def test_short_chit_chat_goes_to_fast_model():
+    """短い雑談は高速モデル、RAGや長文は高性能モデル"""
+    router = _router()
+    normal = IntentDecision(route="normal", confidence=1.0, source="keyword")
+    rag = IntentDecision(route="rag", confidence=1.0, source="keyword")
+
+    assert router.choose(intent=normal, message_tokens=10) == "fast-a"
+    assert router.choose(intent=normal, message_tokens=100) == "strong"
+    assert router.choose(intent=rag, message_tokens=10) == "strong"
+
+
+def test_preference_overrides_routing():
+    """設定済みのモデルが希望されていればそれを使う"""
+    router = _router()
+
+    assert (
+        router.choose(intent=None, message_tokens=10, preference="strong")
+        == "strong"
+    )
+    assert (
+        router.choose(intent=None, message_tokens=10, preference="unknown")
+        == "fast-a"
+    )
+
+
+def test_prefers_lower_ttft_and_skips_failing_models():
+    """TTFTの移動平均が小さいモデルを選び、エラーが続くモデルは外す"""
+    router = _router()
+    router.record_ttft("fast-a", 0.8)
+    router.record_ttft("fast-b", 0.3)
+
+    assert router.choose(intent=None, message_tokens=10) == "fast-b"
+
+    router.record_outcome("fast-b", ok=False)
+    router.record_outcome("fast-b", ok=False)
+
+    assert router.choose(intent=None, message_tokens=10) == "fast-a"
+    assert router.stats()["fast-b"]["errors"] == 2
+
+
+def test_escalation_for_low_confidence_answers():
+    """高速モデルの低確信の回答のみ高性能モデルへエスカレーションする"""
+    router = _router()
+
+    assert router.is_low_confidence("")
+    assert router.is_low_confidence("すみません、わかりません。")
+    assert router.is_low_confidence("回答", finish_reason="SAFETY")
+    assert not router.is_low_confidence("東京です。", finish_reason="STOP")
+    assert router.escalation_model("fast-a") == "strong"
+    assert router.escalation_model("strong") is None
@@ -0,0 +1,73 @@
+"""レート制限のユニットテスト"""
+
+import asyncio
+
+import pytest
+import redis.asyncio as redis
+
+from app.domain.exceptions import RateLimitExceededError
+from app.infrastructure.services.rate_limiter import (
+    BucketLimit,
+    LocalTokenBucketLimiter,
+    RedisRateLimiter,
+)
+
+
+def test_local_bucket_allows_burst_then_blocks():
+    """容量分は連続して許可し、超えた分は補充までの待機秒数を返す"""
+    limiter = LocalTokenBucketLimiter(max_keys=10)
+    limit = BucketLimit("user_requests", capacity=2, refill_per_second=1.0)
+
+    assert limiter.consume([("u", limit, 1.0)]) == (0.0, -1)
+    assert limiter.consume([("u", limit, 1.0)]) == (0.0, -1)
+    wait, blocked = limiter.consume([("u", limit, 1.0)])
+
+    assert blocked == 0
+    assert 0.9 < wait <= 1.0
+
+
+def test_local_bucket_consumes_nothing_when_any_bucket_is_short():
+    """いずれかのバケットが足りなければ、どのバケットも消費しない"""
+    limiter = LocalTokenBucketLimiter(max_keys=10)
+    requests = BucketLimit("user_requests", capacity=5, refill_per_second=1.0)
+    tokens = BucketLimit("user_tokens", capacity=10, refill_per_second=1.0)
+
+    assert limiter.consume([("r", requests, 1.0), ("t", tokens, 8.0)])[1] < 0
+    assert limiter.consume([("r", requests, 1.0), ("t", tokens, 8.0)])[1] == 1
+    # 件数のバケットは2回目の分を消費していない
+    assert limiter.consume([("r", requests, 4.0)])[1] < 0
+
+
+def test_local_bucket_evicts_least_recently_used_keys():
+    """保持するバケット数は上限までで、古いものから捨てる"""
+    limiter = LocalTokenBucketLimiter(max_keys=2)
+    limit = BucketLimit("user_requests", capacity=1, refill_per_second=0.001)
+
+    for key in ("a", "b", "c"):
+        limiter.consume([(key, limit, 1.0)])
+
+    # 追い出された"a"は満杯のバケットとして扱われる
+    assert limiter.consume([("a", limit, 1.0)])[1] < 0
+    assert limiter.consume([("c", limit, 1.0)])[1] == 0
+
+
+def test_falls_back_to_local_buckets_when_redis_is_unavailable():
+    """Redisに接続できない場合はプロセス内のバケットで制限する"""
+    client = redis.Redis(host="127.0.0.1", port=1)
+    limiter = RedisRateLimiter(
+        client,
+        limits=(BucketLimit("user_requests", 1, 0.001),),
+        timeout=0.5,
+    )
+
+    async def run() -> None:
+        await limiter.acquire(user_id="u", session_id="s", message="a")
+        with pytest.raises(RateLimitExceededError) as exc_info:
+            await limiter.acquire(user_id="u", session_id="s", message="a")
+        assert exc_info.value.scope == "user_requests"
+        await client.aclose()
+
+    asyncio.run(run())
+    stats = limiter.stats()
+    assert stats["fallbacks"] == 2
+    assert stats["redis_available"] is False
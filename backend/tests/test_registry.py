@@ -0,0 +1,58 @@
+"""サービスレジストリのユニットテスト"""
+
+import asyncio
+
+import pytest
+
+from app.infrastructure.config import settings
+from app.infrastructure.registry import ServiceRegistry
+
+
+def test_singletons_are_shared_and_shutdown_closes_clients(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """同じレジストリからは同じインスタンスを返し、終了時にクローズする"""
+    monkeypatch.setattr(settings, "AI_SERVICE_BACKEND", "fake")
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "TOOLS_ENABLED", True)
+    # 埋め込みAPIを呼ばない
+    monkeypatch.setattr(settings, "RAG_ENABLED", False)
+    registry = ServiceRegistry()
+
+    ai_service = registry.ai_service
+    client = registry.redis
+    cache_service = registry.cache_service
+    tool_executor = registry.tool_executor
+    assert registry.ai_service is ai_service
+    assert registry.redis is client
+    assert registry.cache_service is cache_service
+    assert registry.tool_executor is tool_executor
+    # レスポンスキャッシュもプロセス共有のRedisクライアントを使う
+    assert registry.response_cache is ai_service
+
+    closed: list[str] = []
+
+    async def close_redis() -> None:
+        closed.append("redis")
+
+    monkeypatch.setattr(client, "close", close_redis)
+    assert tool_executor is not None
+    monkeypatch.setattr(tool_executor, "close", lambda: closed.append("tools"))
+
+    asyncio.run(registry.shutdown())
+
+    assert closed == ["tools", "redis"]
+    # 終了後は次回の利用時に新しく構築する
+    assert registry.redis is not client
+    assert registry.ai_service is not ai_service
+
+
+def test_rag_requires_semantic_embedding(monkeypatch: pytest.MonkeyPatch):
+    """ハッシュ埋め込みではRAGを有効にしても文書検索を作らない"""
+    monkeypatch.setattr(settings, "RAG_ENABLED", True)
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "local")
+    registry = ServiceRegistry()
+
+    assert registry.retriever is None
+    # 2回目以降は埋め込みサービスを確かめずにNoneを返す
+    assert registry._rag_disabled
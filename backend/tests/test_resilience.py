@@ -0,0 +1,115 @@
+"""同時実行数制限・サーキットブレーカーのユニットテスト"""
+
+import asyncio
+
+import pytest
+
+from app.domain.exceptions import AIServiceUnavailableError
+from app.infrastructure.services.resilience import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+)
+
+
+def _limiter(**kwargs: float) -> AdaptiveConcurrencyLimiter:
+    options = {
+        "initial_limit": 2,
+        "min_limit": 1,
+        "max_limit": 4,
+        "backoff": 0.5,
+        "latency_threshold": 1.0,
+        "max_queue": 1,
+        "max_wait": 0.05,
+        **kwargs,
+    }
+    return AdaptiveConcurrencyLimiter(**options)  # type: ignore[arg-type]
+
+
+def test_limit_grows_additively_and_shrinks_multiplicatively():
+    """成功で加算的に増え、失敗・遅延で乗算的に減る"""
+    limiter = _limiter()
+
+    async def run() -> None:
+        for _ in range(4):
+            await limiter.acquire()
+            limiter.release(latency=0.1)
+        assert limiter.limit == 3
+
+        await limiter.acquire()
+        limiter.release(latency=5.0)
+        assert limiter.limit == 1
+
+        await limiter.acquire()
+        limiter.release(failed=True)
+        assert limiter.limit == 1
+
+    asyncio.run(run())
+    assert limiter.stats()["limit_decreases"] == 1
+
+
+def test_waiter_gets_released_slot():
+    """上限に達している場合は待機し、空いた枠を受け取る"""
+    limiter = _limiter(initial_limit=1, max_wait=1.0)
+
+    async def run() -> None:
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.stats()["queue_depth"] == 1
+
+        limiter.release()
+        await waiter
+        assert limiter.stats()["in_flight"] == 1
+
+    asyncio.run(run())
+
+
+def test_rejects_when_queue_full_or_wait_times_out():
+    """待機列が満杯、または待機がタイムアウトした場合は即座に失敗する"""
+    limiter = _limiter(initial_limit=1)
+
+    async def run() -> None:
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(AIServiceUnavailableError):
+            await limiter.acquire()
+        with pytest.raises(AIServiceUnavailableError):
+            await waiter
+
+    asyncio.run(run())
+    stats = limiter.stats()
+    assert stats["rejected_queue_full"] == 1
+    assert stats["rejected_timeout"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_breaker_opens_and_probes_after_reset():
+    """連続失敗で遮断し、経過後は1件だけ試行してから復旧する"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.stats()["opens"] == 1
+
+    # reset_seconds経過後は1件だけ試行できる
+    breaker.before_call()
+    with pytest.raises(AIServiceUnavailableError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_breaker_short_circuits_while_open():
+    """遮断中の呼び出しは上流を呼ばずに失敗する"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60.0)
+    breaker.record_failure()
+
+    with pytest.raises(AIServiceUnavailableError) as exc_info:
+        breaker.before_call()
+
+    assert exc_info.value.retry_after is not None
+    assert breaker.stats()["short_circuited"] == 1
@@ -0,0 +1,211 @@
+"""完全一致レスポンスキャッシュのユニットテスト"""
+
+import asyncio
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+
+from app.domain.services import IAIService, ICacheService
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.services.langgraph_ai_service import (
+    LangGraphAIService,
+)
+from app.infrastructure.services.model_router import ModelRouter
+from app.infrastructure.services.response_cache import (
+    CachedAIService,
+    ModelResolver,
+)
+
+
+def _cached(
+    inner: IAIService,
+    cache: ICacheService,
+    model_resolver: ModelResolver | None = None,
+) -> CachedAIService:
+    return CachedAIService(
+        inner,
+        cache,
+        model_name="test-model",
+        model_resolver=model_resolver,
+        temperature=0.0,
+        system_prompt="",
+    )
+
+
+async def _stream(service: IAIService, message: Message) -> str:
+    return "".join([chunk async for chunk in service.generate_stream(message)])
+
+
+def test_stream_hit_replays_without_calling_llm(
+    make_message: Callable[..., Message],
+    scripted_ai_service: Callable[..., Any],
+    memory_cache: Any,
+):
+    """2回目の同じメッセージはLLMを呼ばずに保存済みの回答を再生する"""
+    inner = scripted_ai_service("こんにちは、元気です")
+    service = _cached(inner, memory_cache)
+
+    async def run() -> list[str]:
+        return [
+            await _stream(service, make_message("Hello World")),
+            # 全角/半角・大文字小文字・空白の揺れは同じキー
+            await _stream(service, make_message(" ＨＥＬＬＯ　ｗｏｒｌｄ ")),
+        ]
+
+    assert asyncio.run(run()) == ["こんにちは、元気です"] * 2
+    assert inner.calls == 1
+    assert service.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize(
+    "response",
+    ["エラーが発生しました: timeout", "レスポンスを生成できませんでした", ""],
+)
+def test_error_responses_are_not_cached(
+    response: str,
+    make_message: Callable[..., Message],
+    scripted_ai_service: Callable[..., Any],
+    memory_cache: Any,
+):
+    """エラー時の定型文や空の回答は保存せず、次回もLLMを呼ぶ"""
+    inner = scripted_ai_service(response, "正常な回答")
+    service = _cached(inner, memory_cache)
+
+    async def run() -> list[str]:
+        return [
+            await service.generate_response(make_message("質問")),
+            await service.generate_response(make_message("質問")),
+            await service.generate_response(make_message("質問")),
+        ]
+
+    assert asyncio.run(run()) == [response, "正常な回答", "正常な回答"]
+    assert inner.calls == 2
+    assert list(memory_cache.values.values()) == ["正常な回答"]
+
+
+def test_cancelled_stream_is_not_cached(
+    make_message: Callable[..., Message],
+    scripted_ai_service: Callable[..., Any],
+    memory_cache: Any,
+):
+    """途中で打ち切ったストリームの回答は保存しない"""
+    inner = scripted_ai_service("長い回答の続き")
+    service = _cached(inner, memory_cache)
+
+    async def run() -> None:
+        stream = service.generate_stream(make_message("質問"))
+        await anext(stream)
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert memory_cache.values == {}
+    assert service.stats()["stores"] == 0
+
+
+def test_key_separates_model_preference(
+    make_message: Callable[..., Message],
+    scripted_ai_service: Callable[..., Any],
+    memory_cache: Any,
+):
+    """モデルの指定が異なるメッセージは別のキーになり、別々に保存される"""
+    inner = scripted_ai_service("fast-answer", "quality-answer")
+    service = _cached(inner, memory_cache)
+    fast = make_message("質問", model_preference="fast")
+    quality = make_message("質問", model_preference="quality")
+
+    assert service.build_key(fast) != service.build_key(quality)
+    assert service.build_key(fast) != service.build_key(make_message("質問"))
+    assert service.build_key(fast) == service.build_key(
+        make_message("質問", model_preference="fast")
+    )
+
+    async def run() -> list[str]:
+        return [
+            await service.generate_response(fast),
+            await service.generate_response(quality),
+            await service.generate_response(fast),
+        ]
+
+    assert asyncio.run(run()) == [
+        "fast-answer",
+        "quality-answer",
+        "fast-answer",
+    ]
+    assert inner.calls == 2
+
+
+def test_key_uses_routed_model(
+    make_message: Callable[..., Message],
+    scripted_ai_service: Callable[..., Any],
+    memory_cache: Any,
+):
+    """ルーティング先のモデルが異なる回答は再利用しない"""
+    inner = scripted_ai_service("fast-answer", "strong-answer")
+    routed = ["fast-model"]
+    service = _cached(inner, memory_cache, lambda message: routed[0])
+
+    async def run() -> list[str]:
+        responses = [await service.generate_response(make_message("質問"))]
+        routed[0] = "strong-model"
+        responses.append(await service.generate_response(make_message("質問")))
+        routed[0] = "fast-model"
+        responses.append(await service.generate_response(make_message("質問")))
+        return responses
+
+    assert asyncio.run(run()) == [
+        "fast-answer",
+        "strong-answer",
+        "fast-answer",
+    ]
+    assert inner.calls == 2
+
+
+def test_tool_and_rag_answers_bypass_cache(
+    make_message: Callable[..., Message],
+    scripted_ai_service: Callable[..., Any],
+    memory_cache: Any,
+):
+    """キャッシュしないモデル（ツール・RAG）の回答は参照も保存もしない"""
+    inner = scripted_ai_service("10:00です", "10:05です")
+    service = _cached(inner, memory_cache, lambda message: None)
+
+    async def run() -> list[str]:
+        return [
+            await service.generate_response(make_message("今何時")),
+            await _stream(service, make_message("今何時")),
+        ]
+
+    assert asyncio.run(run()) == ["10:00です", "10:05です"]
+    assert inner.calls == 2
+    assert memory_cache.values == {}
+    stats = service.stats()
+    assert stats["bypassed"] == 2
+    assert stats["misses"] == 0
+
+
+def test_graph_cache_model_follows_router_and_skips_tools(
+    monkeypatch: pytest.MonkeyPatch,
+    make_message: Callable[..., Message],
+):
+    """通常会話はルーターが選ぶモデル、RAG・ツールはNone（キャッシュしない）"""
+    monkeypatch.setattr(settings, "LLM_BACKEND", "fake")
+    monkeypatch.setattr(settings, "LANGFUSE_ENABLED", False)
+    router = ModelRouter(
+        fast_models=["fast-model"],
+        strong_models=["strong-model"],
+        short_message_tokens=20,
+    )
+    service = LangGraphAIService(model_router=router)
+
+    assert service.cache_model(make_message("こんにちは")) == "fast-model"
+    assert service.cache_model(make_message("詳しく" * 20)) == "strong-model"
+    assert (
+        service.cache_model(
+            make_message("こんにちは", model_preference="strong-model")
+        )
+        == "strong-model"
+    )
+    assert service.cache_model(make_message("資料を検索して")) is None
+    assert service.cache_model(make_message("12*34を計算して")) is None
@@ -0,0 +1,267 @@
+"""文書検索（RAG）のユニットテスト"""
+
+import asyncio
+from pathlib import Path
+import threading
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+import numpy as np
+import pytest
+
+from app.domain.services.context_window import estimate_tokens
+from app.domain.value_objects.retrieved_passage import RetrievedPassage
+from app.infrastructure.config import settings
+from app.infrastructure.services.embedding_service import (
+    HashingEmbeddingService,
+    normalize_vectors,
+)
+from app.infrastructure.services.message_utils import insert_passages
+from app.infrastructure.services.quantized_index import QuantizedVectorIndex
+from app.infrastructure.services.retriever import InProcessRetriever
+from app.infrastructure.services.text_chunker import split_text
+from app.infrastructure.services.vector_index import VectorIndex
+from app.infrastructure.services.vector_segments import SegmentStore
+
+
+def _random_vectors(count: int, dimension: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return normalize_vectors(
+        rng.standard_normal((count, dimension)).astype(np.float32)
+    )
+
+
+def _clustered_vectors(count: int, dimension: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((20, dimension)).astype(np.float32)
+    noise = rng.standard_normal((count, dimension)).astype(np.float32)
+    return normalize_vectors(centers[rng.integers(0, 20, count)] + noise)
+
+
+def test_split_text_respects_budget_and_overlaps():
+    """チャンクは上限以内で、前のチャンクの末尾の文を重ねる"""
+    text = "".join(f"これは{i}番目の文です。" for i in range(30))
+
+    chunks = split_text(text, max_tokens=40, overlap_tokens=12)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 40 for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:], strict=False):
+        assert current.split(" ")[0] in previous
+
+
+def test_split_text_splits_overlong_sentence():
+    """上限を超える1文は文字数で分割する"""
+    chunks = split_text("あ" * 100, max_tokens=30)
+
+    assert len(chunks) == 4
+    assert "".join(chunks) == "あ" * 100
+
+
+def test_hnsw_recall_matches_brute_force():
+    """HNSWの上位k件は総当たりの結果とほぼ一致する"""
+    vectors = _random_vectors(2000, 32, seed=0)
+    queries = _random_vectors(50, 32, seed=1)
+    exact = VectorIndex(32, hnsw_threshold=0)
+    approximate = VectorIndex(32, hnsw_threshold=500, ef_search=64)
+    exact.add(vectors)
+    approximate.add(vectors)
+    exact.ensure_ann()
+    approximate.ensure_ann()
+
+    hits = 0
+    for query in queries:
+        expected = {row for row, _ in exact.search(query, 10)}
+        hits += len(
+            expected & {row for row, _ in approximate.search(query, 10)}
+        )
+
+    assert exact.stats()["backend"] == "brute_force"
+    assert approximate.stats()["backend"] == "hnsw"
+    assert hits / (len(queries) * 10) >= 0.9
+
+
+def test_removed_vectors_are_excluded():
+    """削除したベクトルは検索結果に含めない"""
+    vectors = _random_vectors(100, 16, seed=2)
+    for threshold in (0, 50):
+        index = VectorIndex(16, hnsw_threshold=threshold)
+        index.add(vectors)
+        index.ensure_ann()
+        index.remove([0, 1])
+
+        assert index.search(vectors[0], 1)[0][0] not in (0, 1)
+        assert len(index) == 98
+
+
+def test_quantized_index_recall_and_memory():
+    """int8のIVF索引は再順位付けで総当たりの結果とほぼ一致し、常駐量が小さい"""
+    vectors = _clustered_vectors(3000, 64, seed=4)
+    queries = _clustered_vectors(50, 64, seed=5)
+    exact = VectorIndex(64, hnsw_threshold=0)
+    quantized = QuantizedVectorIndex(
+        64, ivf_threshold=1000, lists=16, probes=8, rerank=40
+    )
+    exact.add(vectors[:2000])
+    quantized.add(vectors[:2000])
+    quantized.ensure_ann()
+    exact.add_block(vectors[2000:])
+    quantized.add_block(vectors[2000:])
+    exact.remove([0, 1])
+    quantized.remove([0, 1])
+
+    hits = 0
+    for query in queries:
+        expected = exact.search(query, 10)
+        found = quantized.search(query, 10)
+        hits += len({row for row, _ in expected} & {row for row, _ in found})
+        # 返す類似度は元のベクトルとの内積
+        assert found[0][1] == pytest.approx(
+            float(vectors[found[0][0]] @ query)
+        )
+
+    stats = quantized.stats()
+    assert stats["backend"] == "ivf_int8"
+    assert hits / (len(queries) * 10) >= 0.9
+    assert int(stats["bytes"]) * 3 < int(stats["exact_bytes"])
+    assert quantized.search(vectors[0], 1)[0][0] != 0
+
+
+def test_retriever_returns_relevant_passages_and_replaces_documents():
+    """関連する文書のチャンクを返し、同じIDの再取り込みは置き換える"""
+    retriever = InProcessRetriever(
+        HashingEmbeddingService(dimension=256), min_score=0.1
+    )
+
+    async def run() -> tuple[list[RetrievedPassage], list[RetrievedPassage]]:
+        await retriever.ingest(
+            "refund", "返金は購入から30日以内であれば受け付けます。"
+        )
+        await retriever.ingest(
+            "shipping", "配送は通常3営業日以内に行います。", {"title": "配送"}
+        )
+        before = await retriever.search("返金の期限は？", k=1)
+        await retriever.ingest("refund", "返金は受け付けていません。")
+        after = await retriever.search("返金の期限は？", k=2)
+        return before, after
+
+    before, after = asyncio.run(run())
+
+    assert [p.doc_id for p in before] == ["refund"]
+    assert "30日" in before[0].text
+    assert all("30日" not in p.text for p in after)
+    assert retriever.stats()["documents"] == 2
+
+
+def test_insert_passages_within_budget():
+    """予算内のパッセージを最後のユーザーメッセージの直前に挿入する"""
+    messages = [
+        HumanMessage(content="前の質問"),
+        AIMessage(content="前の回答"),
+        HumanMessage(content="質問"),
+    ]
+    passages = [
+        RetrievedPassage("a", "あ" * 50, 0.9),
+        RetrievedPassage("b", "ぬ" * 500, 0.8),
+        RetrievedPassage("c", "う" * 50, 0.7),
+    ]
+
+    result = insert_passages(messages, passages, max_tokens=200)
+
+    assert isinstance(result[2], SystemMessage)
+    assert result[3] is messages[2]
+    assert "あ" in result[2].content and "う" in result[2].content
+    assert "ぬ" not in result[2].content
+    assert insert_passages(messages, [], max_tokens=200) == messages
+
+
+def test_index_with_memory_mapped_blocks():
+    """読み取り専用のブロックと追記した行を連続した行番号で検索する"""
+    vectors = _random_vectors(300, 16, seed=3)
+    for threshold in (0, 150):
+        index = VectorIndex(16, hnsw_threshold=threshold)
+        index.add(vectors[:100])
+        assert index.add_block(vectors[100:200].astype(np.float16)) == 100
+        index.add(vectors[200:])
+        index.ensure_ann()
+
+        for row in (50, 150, 250):
+            assert index.search(vectors[row], 1)[0][0] == row
+        assert np.allclose(index.vectors([150]), vectors[150], atol=1e-3)
+
+
+def test_persistent_retriever_reloads_segments_and_compacts(tmp_path: Path):
+    """セグメントから再読み込みでき、圧縮後も同じ結果を返す"""
+    embedding = HashingEmbeddingService(dimension=64)
+
+    def open_retriever() -> InProcessRetriever:
+        store = SegmentStore(tmp_path, dimension=64, dtype="float16")
+        return InProcessRetriever(
+            embedding, store=store, min_score=0.0, max_segments=3
+        )
+
+    async def write() -> None:
+        retriever = open_retriever()
+        for i in range(4):
+            await retriever.ingest(f"doc{i}", f"文書{i}の本文です。")
+        await retriever.remove("doc0")
+        await retriever.close()
+        assert retriever.stats()["compactions"] == 1
+
+    async def read() -> tuple[InProcessRetriever, list[RetrievedPassage]]:
+        retriever = open_retriever()
+        return retriever, await retriever.search("文書2の本文", k=1)
+
+    asyncio.run(write())
+    retriever, passages = asyncio.run(read())
+
+    assert [p.doc_id for p in passages] == ["doc2"]
+    assert passages[0].text == "文書2の本文です。"
+    assert retriever.stats()["documents"] == 3
+    assert retriever.stats()["segments"] == 1
+    assert len(list(tmp_path.glob("seg-*"))) == 1
+
+
+def test_compaction_builds_graph_outside_write_lock(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    """圧縮のグラフ構築中も取り込みは待たされず、構築後の状態に反映される"""
+    monkeypatch.setattr(settings, "RAG_HNSW_THRESHOLD", 1)
+    store = SegmentStore(tmp_path, dimension=64, dtype="float32")
+    retriever = InProcessRetriever(
+        HashingEmbeddingService(dimension=64), store=store, min_score=0.0
+    )
+    building = threading.Event()
+    ingested = threading.Event()
+    build_state = retriever._build_state
+
+    def slow_build_state(segment):
+        building.set()
+        assert ingested.wait(5)
+        return build_state(segment)
+
+    monkeypatch.setattr(retriever, "_build_state", slow_build_state)
+
+    async def run() -> list[RetrievedPassage]:
+        for i in range(3):
+            await retriever.ingest(f"doc{i}", f"文書{i}の本文です。")
+        # しきい値に達した索引は取り込み後に裏で構築する
+        await retriever.close()
+        assert retriever.stats()["backend"] == "hnsw"
+
+        compaction = asyncio.create_task(retriever.compact())
+        assert await asyncio.to_thread(building.wait, 5)
+        await asyncio.wait_for(
+            retriever.ingest("late", "構築中に追加した文書です。"), 5
+        )
+        ingested.set()
+        await compaction
+        return await retriever.search("構築中に追加した文書", k=1)
+
+    passages = asyncio.run(run())
+
+    assert [p.doc_id for p in passages] == ["late"]
+    stats = retriever.stats()
+    assert stats["compactions"] == 1
+    assert stats["segments"] == 2
+    assert stats["documents"] == 4
+    assert stats["backend"] == "hnsw"
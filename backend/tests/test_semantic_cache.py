@@ -0,0 +1,85 @@
+"""セマンティックキャッシュのユニットテスト"""
+
+import asyncio
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+import pytest
+
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.registry import ServiceRegistry
+from app.infrastructure.services.embedding_service import (
+    CachedEmbeddingService,
+    EmbeddingService,
+    HashingEmbeddingService,
+)
+from app.infrastructure.services.semantic_cache import SemanticCacheAIService
+
+# 1語だけ違い、異なる回答が必要な質問（字面はほぼ同じ）
+_NEAR_MISS = (
+    "Pythonでリストのスコアを昇順にソートするコードを書いてください",
+    "Pythonでリストのスコアを降順にソートするコードを書いてください",
+)
+
+
+class _ConstantEmbeddingService(EmbeddingService):
+    """すべてのテキストを同じベクトルにする（意味の埋め込みの代わり）"""
+
+    @property
+    def dimension(self) -> int:
+        return 4
+
+    async def embed_array(self, texts: list[str]) -> NDArray[np.float32]:
+        return np.tile(
+            np.array([1, 0, 0, 0], dtype=np.float32), (len(texts), 1)
+        )
+
+
+def test_hashing_embedding_is_refused_for_near_miss_prompts(
+    monkeypatch: pytest.MonkeyPatch,
+    scripted_ai_service: Callable[..., Any],
+):
+    """字面の近さでは別の質問がしきい値を超えるため、ハッシュ埋め込みでは使わない"""
+    hashing = HashingEmbeddingService()
+    vectors = hashing.embed_sync(list(_NEAR_MISS))
+    assert float(vectors[0] @ vectors[1]) >= settings.SEMANTIC_CACHE_THRESHOLD
+
+    with pytest.raises(ValueError):
+        SemanticCacheAIService(
+            scripted_ai_service(), CachedEmbeddingService(hashing)
+        )
+
+    # ハッシュ埋め込み（EMBEDDING_BACKEND=local）では有効にしても使わない
+    monkeypatch.setattr(settings, "AI_SERVICE_BACKEND", "fake")
+    monkeypatch.setattr(settings, "AI_RESILIENCE_ENABLED", False)
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "local")
+    registry = ServiceRegistry()
+    assert registry.semantic_cache is None
+
+
+def test_model_preference_scopes_entries(
+    make_message: Callable[..., Message],
+    scripted_ai_service: Callable[..., Any],
+):
+    """model_preferenceが異なるリクエストには回答を再利用しない"""
+    upstream = scripted_ai_service()
+    cache = SemanticCacheAIService(upstream, _ConstantEmbeddingService())
+
+    async def run() -> list[str]:
+        return [
+            await cache.generate_response(
+                make_message("質問", model_preference=p)
+            )
+            for p in ("fast", "strong", "fast", None)
+        ]
+
+    responses = asyncio.run(run())
+
+    assert responses == ["answer-1", "answer-2", "answer-1", "answer-3"]
+    assert upstream.calls == 3
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,197 @@
+"""single-flightのユニットテスト"""
+
+import asyncio
+from collections.abc import AsyncIterator, Callable
+import contextlib
+
+import pytest
+
+from app.domain.value_objects.message import Message
+from app.infrastructure.config import settings
+from app.infrastructure.services.langgraph_ai_service import LangGraphAIService
+from app.infrastructure.services.resilience import (
+    AdaptiveConcurrencyLimiter,
+    UpstreamGuard,
+)
+from app.infrastructure.services.single_flight import StreamSingleFlight
+
+
+class _Upstream:
+    """呼び出し回数を数え、releaseされるまでチャンクを止める上流"""
+
+    def __init__(self, chunks: list[str], error: Exception | None = None):
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+        self._chunks = chunks
+        self._error = error
+
+    async def stream(self) -> AsyncIterator[str]:
+        self.calls += 1
+        try:
+            yield self._chunks[0]
+            await self.release.wait()
+            for chunk in self._chunks[1:]:
+                yield chunk
+            if self._error is not None:
+                raise self._error
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def _collect(
+    flight: StreamSingleFlight, key: str, upstream: _Upstream
+) -> str:
+    return "".join(
+        [chunk async for chunk in flight.stream(key, upstream.stream)]
+    )
+
+
+def test_concurrent_identical_streams_share_one_upstream_call():
+    """同じキーの同時ストリームは上流を1回だけ呼び、全員が全文を受け取る"""
+    flight = StreamSingleFlight()
+    upstream = _Upstream(["a", "b", "c"])
+
+    async def run() -> list[str]:
+        tasks = [
+            asyncio.create_task(_collect(flight, "k", upstream))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(run()) == ["abc"] * 5
+    assert upstream.calls == 1
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "followers": 4}
+
+
+def test_different_keys_do_not_share_upstream():
+    """キーが異なるストリームは集約しない"""
+    flight = StreamSingleFlight()
+    first = _Upstream(["x"])
+    second = _Upstream(["y"])
+    first.release.set()
+    second.release.set()
+
+    async def run() -> list[str]:
+        return await asyncio.gather(
+            _collect(flight, "k1", first), _collect(flight, "k2", second)
+        )
+
+    assert asyncio.run(run()) == ["x", "y"]
+    assert (first.calls, second.calls) == (1, 1)
+
+
+def test_subscriber_cancel_does_not_kill_leader():
+    """購読者の1人がキャンセルしても上流と先頭の購読者は続く"""
+    flight = StreamSingleFlight()
+    upstream = _Upstream(["a", "b"])
+
+    async def run() -> str:
+        leader = asyncio.create_task(_collect(flight, "k", upstream))
+        follower = asyncio.create_task(_collect(flight, "k", upstream))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await follower
+        upstream.release.set()
+        return await leader
+
+    assert asyncio.run(run()) == "ab"
+    assert upstream.calls == 1
+    assert upstream.cancelled is False
+
+
+def test_upstream_is_cancelled_when_all_subscribers_leave():
+    """全購読者がいなくなった上流は打ち切り、次のリクエストは新たに呼ぶ"""
+    flight = StreamSingleFlight()
+    upstream = _Upstream(["a", "b"])
+
+    async def run() -> str:
+        tasks = [
+            asyncio.create_task(_collect(flight, "k", upstream))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0.01)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert upstream.cancelled is True
+        assert flight.stats()["in_flight"] == 0
+        upstream.release.set()
+        return await _collect(flight, "k", upstream)
+
+    assert asyncio.run(run()) == "ab"
+    assert upstream.calls == 2
+
+
+def test_upstream_error_reaches_every_subscriber():
+    """上流のエラーは全購読者に伝わり、完了後はテーブルから外れる"""
+    flight = StreamSingleFlight()
+    upstream = _Upstream(["a"], error=RuntimeError("upstream failed"))
+
+    async def run() -> list[BaseException | str]:
+        tasks = [
+            asyncio.create_task(_collect(flight, "k", upstream))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert upstream.calls == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.parametrize("late", [False, True])
+def test_late_subscriber_receives_chunks_from_start(late: bool):
+    """途中から参加した購読者も先頭のチャンクから受け取る"""
+    flight = StreamSingleFlight()
+    upstream = _Upstream(["a", "b"])
+
+    async def run() -> list[str]:
+        leader = asyncio.create_task(_collect(flight, "k", upstream))
+        if late:
+            await asyncio.sleep(0.01)
+        follower = asyncio.create_task(_collect(flight, "k", upstream))
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        return await asyncio.gather(leader, follower)
+
+    assert asyncio.run(run()) == ["ab", "ab"]
+    assert upstream.calls == 1
+
+
+def test_followers_do_not_take_limiter_slots(
+    monkeypatch: pytest.MonkeyPatch, make_message: Callable[..., Message]
+):
+    """同時実行数制限の実行枠は上流を呼ぶ先頭のストリームだけが取る"""
+    monkeypatch.setattr(settings, "LLM_BACKEND", "fake")
+    monkeypatch.setattr(settings, "LANGFUSE_ENABLED", False)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(settings, "FAKE_LLM_TTFT_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "FAKE_LLM_TOKENS_PER_SECOND", 0.0)
+    guard = UpstreamGuard(
+        limiter=AdaptiveConcurrencyLimiter(
+            initial_limit=1, min_limit=1, max_limit=1, max_queue=0
+        )
+    )
+    service = LangGraphAIService(upstream_guard=guard)
+    message = make_message()
+
+    async def collect() -> str:
+        return "".join([c async for c in service.generate_stream(message)])
+
+    async def run() -> list[str]:
+        return await asyncio.gather(*(collect() for _ in range(3)))
+
+    responses = asyncio.run(run())
+
+    # 上限1・待機なしでも購読者は拒否されず、同じ回答を受け取る
+    assert len(set(responses)) == 1 and responses[0]
+    assert guard.stats()["limiter"]["acquired"] == 1
+    assert guard.stats()["limiter"]["rejected_queue_full"] == 0
@@ -0,0 +1,159 @@
+"""ツールの並列実行のユニットテスト"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.domain.value_objects.tool_call import ToolCall, ToolResult
+from app.infrastructure.services.tools import (
+    Tool,
+    ToolExecutor,
+    calculate,
+    create_default_tools,
+    plan_calculations,
+)
+
+
+def test_calculate_and_plan_expressions():
+    """メッセージ中の数式を抽出し、安全に評価する"""
+    calls = plan_calculations("（３＋４）×２と 2^10 を計算して。電話は不要")
+
+    assert [call["expression"] for call in calls] == ["(3+4)*2", "2**10"]
+    assert calculate("(3+4)*2") == "14"
+    assert calculate("1 / 3") == "0.333333333333"
+    with pytest.raises(ValueError):
+        calculate("__import__('os')")
+    with pytest.raises(ValueError):
+        calculate("9 ** 99999")
+
+
+def test_calculate_rejects_nested_powers_quickly():
+    """入れ子のべき乗も結果の大きさを見積もって計算する前に拒否する"""
+    started = time.perf_counter()
+    for expression in ("((9^999)^999)^999", "(9^999)^999", "2^(9^9)"):
+        with pytest.raises(ValueError):
+            calculate(expression)
+    # 上限内の結果の乗算を重ねても上限を超えない
+    with pytest.raises(ValueError):
+        calculate(
+            "(2^1000)*(2^1000)*(2^1000)*(2^1000)*(2^1000)*(2^1000)*"
+            "(2^1000)*(2^1000)*(2^1000)*(2^1000)*(2^1000)"
+        )
+    assert time.perf_counter() - started < 1
+    assert calculate("2^1000") == str(2**1000)
+    assert calculate("0.5^1000") == format(0.5**1000, ".12g")
+
+
+def test_plan_skips_dates_and_ranges_without_cue():
+    """日付・範囲に見える数式は、計算を求める語がなければ計算しない"""
+    assert plan_calculations("2024-1-15の14-16時に会議室を予約して") == []
+    assert plan_calculations("締め切りは1/15です") == []
+    assert plan_calculations("2024-1-15の14-16時、3*4人分") == [
+        {"expression": "3*4"}
+    ]
+    assert plan_calculations("100-30を計算して") == [{"expression": "100-30"}]
+
+
+def _spin(seconds: float) -> str:
+    """ワーカープロセスを占有する（プロセスプールで実行する）"""
+    time.sleep(seconds)
+    return "done"
+
+
+def test_timed_out_worker_is_terminated():
+    """タイムアウトしたワーカーを止めて、次の呼び出しは新しいプールで実行"""
+    executor = ToolExecutor(
+        [
+            Tool("spin", "", _spin, timeout=0.5, cpu_bound=True),
+            *create_default_tools(),
+        ],
+        process_workers=1,
+    )
+
+    async def run() -> tuple[list[ToolResult], list[ToolResult]]:
+        timed_out = await executor.execute([ToolCall("spin", {"seconds": 60})])
+        started = time.perf_counter()
+        results = await executor.execute(
+            [ToolCall("calculate", {"expression": "6*7"})]
+        )
+        assert time.perf_counter() - started < 30
+        return timed_out, results
+
+    try:
+        timed_out, results = asyncio.run(run())
+    finally:
+        executor.close()
+
+    assert [r.status for r in timed_out] == ["timeout"]
+    assert [(r.status, r.content) for r in results] == [("ok", "42")]
+    assert executor.stats()["pools_terminated"] == 1
+
+
+def test_executor_runs_calls_concurrently_with_limits():
+    """所要時間は最も遅いツール程度で、タイムアウト・上限・キャッシュが効く"""
+    executed: list[str] = []
+
+    async def lookup(key: str) -> str:
+        executed.append(key)
+        await asyncio.sleep(0.2)
+        return key * 10
+
+    async def hang() -> str:
+        await asyncio.sleep(10)
+        return "never"
+
+    def fail() -> str:
+        raise RuntimeError("壊れています")
+
+    executor = ToolExecutor(
+        [
+            Tool("lookup", "", lookup, max_result_chars=5),
+            Tool("hang", "", hang, timeout=0.05),
+            Tool("fail", "", fail),
+        ]
+    )
+    calls = [
+        ToolCall("lookup", {"key": "a"}, call_id="1"),
+        ToolCall("lookup", {"key": "b"}, call_id="2"),
+        ToolCall("lookup", {"key": "a"}, call_id="3"),
+        ToolCall("hang"),
+        ToolCall("fail"),
+        ToolCall("missing"),
+    ]
+
+    async def run() -> tuple[list[ToolResult], float, list[ToolResult]]:
+        started = time.perf_counter()
+        results = await executor.execute(calls)
+        elapsed = time.perf_counter() - started
+        again = await executor.execute(calls[:1])
+        return results, elapsed, again
+
+    results, elapsed, again = asyncio.run(run())
+
+    assert elapsed < 0.35
+    assert sorted(executed) == ["a", "b"]
+    assert [r.call_id for r in results[:3]] == ["1", "2", "3"]
+    assert results[0].content.startswith("aaaaa")
+    assert results[0].truncated
+    assert [r.status for r in results[3:]] == ["timeout", "error", "error"]
+    assert again[0].cached
+    stats = executor.stats()
+    assert stats["deduplicated"] == 1
+    assert stats["cache_hits"] == 1
+    assert stats["timeouts"] == 1
+
+
+def test_cpu_bound_tool_runs_in_process_pool():
+    """計算ツールはプロセスプールで実行する"""
+    executor = ToolExecutor(create_default_tools(), process_workers=1)
+
+    async def run() -> list[ToolResult]:
+        try:
+            return await executor.execute(executor.plan("12 * 12 は？"))
+        finally:
+            executor.close()
+
+    results = asyncio.run(run())
+
+    assert [(r.name, r.content) for r in results] == [("calculate", "144")]